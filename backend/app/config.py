@@ -37,4 +37,92 @@ class Config:
     
     # Other configurations
     KITCHEN_WEBHOOK_URL = os.getenv("KITCHEN_WEBHOOK_URL", "")
-    TOKEN_EXPIRY_MINUTES = int(os.getenv("TOKEN_EXPIRY_MINUTES", 10)) 
\ No newline at end of file
+    TOKEN_EXPIRY_MINUTES = int(os.getenv("TOKEN_EXPIRY_MINUTES", 10)) 
+
+    # Métricas: agregados diarios pre-calculados (migración 019).
+    # Los días se cortan con este offset (minutos respecto de UTC, Argentina = -180);
+    # pedidos de métricas con otro tzOffset recalculan desde orders.
+    METRICS_USE_ROLLUPS = os.getenv("METRICS_USE_ROLLUPS", "true").lower() == "true"
+    SALES_ROLLUP_TZ_OFFSET_MINUTES = int(os.getenv("SALES_ROLLUP_TZ_OFFSET_MINUTES", -180))
+    # Motor columnar (NumPy) para ventanas grandes de pedidos
+    METRICS_COLUMNAR_ENGINE = os.getenv("METRICS_COLUMNAR_ENGINE", "true").lower() == "true"
+    METRICS_COLUMNAR_MIN_ORDERS = int(os.getenv("METRICS_COLUMNAR_MIN_ORDERS", 5000))
+    # Filas por página al recorrer orders por keyset (PostgREST recorta cada respuesta)
+    METRICS_ORDERS_PAGE_SIZE = int(os.getenv("METRICS_ORDERS_PAGE_SIZE", 1000))
+
+    # Caché: capa compartida opcional (servidor compatible con Redis) y límites por namespace
+    CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "")
+    CACHE_LOCAL_TTL_SECONDS = int(os.getenv("CACHE_LOCAL_TTL_SECONDS", 5))
+    METRICS_CACHE_MAX_ENTRIES = int(os.getenv("METRICS_CACHE_MAX_ENTRIES", 2000))
+    AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", 5000))
+    SLUG_CACHE_MAX_ENTRIES = int(os.getenv("SLUG_CACHE_MAX_ENTRIES", 1000))
+
+    # Verificación de JWT de Supabase: "auto" verifica localmente si hay secreto o JWKS
+    # configurado, "local" siempre localmente (JWKS derivado de SUPABASE_URL), "remote"
+    # siempre con supabase.auth.get_user.
+    AUTH_VERIFY_MODE = os.getenv("AUTH_VERIFY_MODE", "auto").strip().lower()
+    SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET", "")
+    SUPABASE_JWKS_URL_EXPLICIT = os.getenv("SUPABASE_JWKS_URL", "")
+    SUPABASE_JWKS_URL = SUPABASE_JWKS_URL_EXPLICIT or (
+        f"{os.getenv('SUPABASE_URL', '').rstrip('/')}/auth/v1/.well-known/jwks.json"
+    )
+    AUTH_JWKS_REFRESH_SECONDS = int(os.getenv("AUTH_JWKS_REFRESH_SECONDS", 600))
+    AUTH_JWT_AUDIENCE = os.getenv("AUTH_JWT_AUDIENCE", "authenticated")
+    # Con verificación local, consultar igual a Supabase Auth (cacheado) para detectar sesiones revocadas
+    AUTH_REMOTE_REVOCATION_CHECK = os.getenv("AUTH_REMOTE_REVOCATION_CHECK", "false").lower() == "true"
+
+    # Consultas concurrentes a Supabase (app/db/query_executor.py)
+    DB_REQUEST_DEADLINE_SECONDS = float(os.getenv("DB_REQUEST_DEADLINE_SECONDS", 20))
+    DB_QUERY_CONCURRENCY = int(os.getenv("DB_QUERY_CONCURRENCY", 8))
+
+    # Índice compilado de promociones por sucursal (se invalida en el CRUD de promociones)
+    PROMOTION_INDEX_TTL_SECONDS = int(os.getenv("PROMOTION_INDEX_TTL_SECONDS", 300))
+    PROMOTION_INDEX_MAX_ENTRIES = int(os.getenv("PROMOTION_INDEX_MAX_ENTRIES", 500))
+
+    # Snapshot público del menú por sucursal (ETag / 304)
+    MENU_SNAPSHOT_TTL_SECONDS = int(os.getenv("MENU_SNAPSHOT_TTL_SECONDS", 120))
+    MENU_SNAPSHOT_MAX_ENTRIES = int(os.getenv("MENU_SNAPSHOT_MAX_ENTRIES", 500))
+    MENU_SNAPSHOT_MAX_AGE_SECONDS = int(os.getenv("MENU_SNAPSHOT_MAX_AGE_SECONDS", 15))
+
+    # Feed de pedidos paginado por cursor (GET /orders?limit=&cursor=&since=)
+    ORDERS_PAGE_DEFAULT_LIMIT = int(os.getenv("ORDERS_PAGE_DEFAULT_LIMIT", 50))
+    ORDERS_PAGE_MAX_LIMIT = int(os.getenv("ORDERS_PAGE_MAX_LIMIT", 500))
+    # Segundos detrás del sync_cursor que se releen en ?since= (commits tardíos); 0 = sin relectura
+    ORDERS_SYNC_OVERLAP_SECONDS = int(os.getenv("ORDERS_SYNC_OVERLAP_SECONDS", 5))
+
+    # Emisión de eventos Socket.IO fuera del request (app/services/socket_emitter.py)
+    # Ventana de coalescing en ms; 0 emite en el momento
+    SOCKET_EMIT_COALESCE_MS = int(os.getenv("SOCKET_EMIT_COALESCE_MS", 150))
+    SOCKET_EMIT_MAX_PENDING = int(os.getenv("SOCKET_EMIT_MAX_PENDING", 5000))
+
+    # Estado compartido entre workers (app/utils/shared_state.py). Vacío = todo local (un worker)
+    SHARED_STATE_URL = os.getenv("SHARED_STATE_URL", CACHE_REDIS_URL)
+    # Cola de Socket.IO para emitir desde cualquier worker a clientes conectados en otro
+    SOCKETIO_MESSAGE_QUEUE = os.getenv("SOCKETIO_MESSAGE_QUEUE", SHARED_STATE_URL)
+    # Workers de gunicorn (mismo valor que usa el Dockerfile); con más de uno la app
+    # no arranca sin un backend compartido utilizable
+    WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", 1))
+    # Vida de una llamada al mozo en el backend compartido
+    WAITER_CALL_TTL_SECONDS = int(os.getenv("WAITER_CALL_TTL_SECONDS", 86400))
+    # Llamadas cerradas (COMPLETED / CANCELLED): cuánto se conservan y cuántas como máximo
+    WAITER_CALL_FINISHED_TTL_SECONDS = int(os.getenv("WAITER_CALL_FINISHED_TTL_SECONDS", 3600))
+    WAITER_CALL_MAX_FINISHED = int(os.getenv("WAITER_CALL_MAX_FINISHED", 5000))
+
+    # Estado cacheado del token de cada mesa (app/utils/token_manager.py)
+    MESA_TOKEN_CACHE_TTL_SECONDS = int(os.getenv("MESA_TOKEN_CACHE_TTL_SECONDS", 300))
+    MESA_TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("MESA_TOKEN_CACHE_MAX_ENTRIES", 5000))
+
+    # Modo de los tokens de mesa: "stored" (aleatorio guardado en mesas.token) o
+    # "signed" (HMAC sin estado, revocable por mesas.token_generation; migración 021)
+    MESA_TOKEN_MODE = os.getenv("MESA_TOKEN_MODE", "stored")
+    # Clave HMAC de los tokens firmados; vacía = SECRET_KEY
+    MESA_TOKEN_SECRET = os.getenv("MESA_TOKEN_SECRET", "")
+
+    # Registro de slugs de restaurantes (app/middleware/tenant.py): precarga + refresco
+    # en segundo plano; 0 desactiva la precarga (sólo búsquedas por slug)
+    TENANT_REGISTRY_REFRESH_SECONDS = int(os.getenv("TENANT_REGISTRY_REFRESH_SECONDS", 60))
+    # Cuánto se recuerda que un slug no existe
+    TENANT_NEGATIVE_TTL_SECONDS = int(os.getenv("TENANT_NEGATIVE_TTL_SECONDS", 30))
+
+    # Exportaciones CSV (/reports/*.csv): filas por página del recorrido por cursor
+    REPORTS_EXPORT_PAGE_SIZE = int(os.getenv("REPORTS_EXPORT_PAGE_SIZE", 1000))
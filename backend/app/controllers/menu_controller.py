@@ -2,7 +2,9 @@
 Controller de Menú - Solo maneja HTTP, delega lógica al servicio
 """
 from flask import Blueprint, request, jsonify, g
+from ..config import Config
 from ..services.menu_service import menu_service
+from ..services.menu_snapshot_service import menu_snapshot_service
 from ..middleware.auth import require_auth, require_roles, optional_auth
 import logging
 
@@ -39,6 +41,32 @@ def get_menu():
         return jsonify({"error": str(e)}), 500
 
 
+@menu_bp.route("/public", methods=["GET"])
+def get_public_menu():
+    """Snapshot público del menú de una sucursal (ETag / 304, público)"""
+    try:
+        branch_id = request.args.get("branch_id")
+        if not branch_id:
+            return jsonify({"error": "branch_id requerido"}), 400
+        restaurant_id = getattr(g, "restaurant_id", None)
+        if not restaurant_id:
+            return jsonify({"error": "No se pudo resolver el restaurante"}), 400
+
+        entry = menu_snapshot_service.get_snapshot(restaurant_id, branch_id)
+        response = jsonify(entry["snapshot"])
+        response.set_etag(entry["version"])
+        response.headers["Cache-Control"] = (
+            f"public, max-age={Config.MENU_SNAPSHOT_MAX_AGE_SECONDS}, must-revalidate"
+        )
+        # 304 sin cuerpo si el cliente ya tiene esta versión
+        return response.make_conditional(request)
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        logger.error(f"Error al obtener snapshot del menú: {str(e)}")
+        return jsonify({"error": "Error interno del servidor"}), 500
+
+
 @menu_bp.route("", methods=["POST"])
 @require_auth
 @require_roles('desarrollador', 'admin')
@@ -58,6 +58,46 @@ def get_dashboard_summary():
         logger.error(f"Error obteniendo summary: {str(e)}")
         return jsonify({"error": "Error interno del servidor"}), 500
 
+@metrics_bp.route("/dashboard", methods=["GET"])
+@require_auth
+@require_roles('desarrollador', 'admin')
+def get_dashboard():
+    """Todas las métricas del dashboard en una sola petición"""
+    try:
+        branch_id = request.args.get("branch_id")
+        tz_offset_minutes = _parse_tz_offset_minutes()
+        force_refresh = _is_force_refresh_requested()
+        restaurant_id = metrics_access_service.get_restaurant_id(g.user_id)
+        if not restaurant_id:
+            return jsonify({
+                "summary": {
+                    "dailySales": 0,
+                    "weeklySales": 0,
+                    "monthlySales": 0,
+                    "totalOrders": 0,
+                    "averageOrderValue": 0,
+                    "totalIngredients": 0,
+                    "lowStockItems": 0,
+                    "topProducts": [],
+                },
+                "salesMonthly": {"labels": [], "values": []},
+                "ordersStatus": {"labels": [], "values": []},
+                "dailyRevenue": {"labels": [], "values": []},
+                "paymentMethods": {"labels": [], "values": []},
+                "topProducts": {"items": []},
+                "peakHours": {"labels": [], "values": []},
+            })
+        data = MetricsService.get_dashboard(
+            restaurant_id,
+            branch_id,
+            tz_offset_minutes,
+            force_refresh=force_refresh,
+        )
+        return jsonify(data)
+    except Exception as e:
+        logger.error(f"Error obteniendo dashboard de métricas: {str(e)}")
+        return jsonify({"error": "Error interno del servidor"}), 500
+
 @metrics_bp.route("/sales-monthly", methods=["GET"])
 @require_auth
 @require_roles('desarrollador', 'admin')
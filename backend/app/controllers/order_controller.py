@@ -37,20 +37,52 @@ def _resolve_authorized_restaurant():
 @require_auth
 @require_roles("desarrollador", "admin", "caja", "cocina")
 def list_orders():
-    """Listar pedidos (filtrable por branch y status)."""
+    """
+    Listar pedidos (filtrable por branch, status y fechas).
+
+    Sin parámetros de paginación devuelve la lista completa (compatibilidad).
+    Con limit/cursor devuelve una página {"orders", "next_cursor", "sync_cursor"};
+    con since=<sync_cursor> sólo los pedidos creados o modificados desde entonces
+    (sin filtrar por status: también llegan los que salieron del filtro).
+    """
     try:
         branch_id = request.args.get("branch_id") or getattr(g, "user_branch_id", None)
         restaurant_id, err = require_restaurant_scope()
         if err:
             return err
         status = request.args.get("status")
+        limit = request.args.get("limit", type=int)
+        cursor = request.args.get("cursor")
+        since = request.args.get("since")
+
+        if since:
+            result = order_service.list_orders_since(
+                since,
+                restaurant_id=restaurant_id,
+                branch_id=branch_id,
+                limit=limit,
+            )
+            return jsonify(result), 200
+
+        date_from = request.args.get("from")
+        date_to = request.args.get("to")
+        if limit is not None or cursor or date_from or date_to:
+            result = order_service.list_orders_page(
+                restaurant_id=restaurant_id,
+                branch_id=branch_id,
+                status=status,
+                date_from=date_from,
+                date_to=date_to,
+                limit=limit,
+                cursor=cursor,
+            )
+            return jsonify(result), 200
+
         orders = order_service.get_all_orders(
             branch_id=branch_id,
             restaurant_id=restaurant_id,
+            status=status,
         )
-        if status:
-            status_normalized = status.strip().upper()
-            orders = [order for order in orders if (order.get("status") or "").upper() == status_normalized]
         return jsonify(orders), 200
     except ValueError as e:
         return jsonify({"error": str(e)}), 400
@@ -32,6 +32,28 @@ def list_groups():
         return jsonify({"error": "Error al listar grupos de opciones"}), 500
 
 
+@product_options_bp.route("/groups/bulk", methods=["GET"])
+def list_groups_bulk():
+    """Grupos de opciones de todos los productos de una sucursal, por productId."""
+    try:
+        branch_id = request.args.get("branch_id") or request.args.get("branchId")
+        if not branch_id:
+            return jsonify({"error": "branch_id es requerido"}), 400
+
+        restaurant_id = getattr(g, "restaurant_id", None)
+        if not restaurant_id:
+            user_id = getattr(g, "user_id", None)
+            if not user_id:
+                return jsonify({"error": "No se pudo resolver el restaurante"}), 400
+            restaurant_id = product_options_service.resolve_restaurant_id(user_id)
+        data = product_options_service.groups_for_branch(restaurant_id, branch_id)
+        return jsonify({"data": data}), 200
+    except Exception as e:
+        logger.error(f"Error listando grupos de opciones por sucursal: {str(e)}")
+        logger.error(traceback.format_exc())
+        return jsonify({"error": "Error al listar grupos de opciones"}), 500
+
+
 @product_options_bp.route("/groups", methods=["POST"])
 @require_auth
 @require_roles("desarrollador", "admin")
@@ -1,12 +1,15 @@
 import csv
 import io
+import itertools
 from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterator, List
 from flask import Blueprint, Response, g, request
+from ..config import Config
 from ..middleware.auth import require_auth, require_roles
 from ..services.metrics_access_service import metrics_access_service
 from ..services.ingredients_service import ingredients_service
 from ..db.supabase_client import supabase
-from ..utils.retry import execute_with_retry
+from ..utils.keyset import iter_keyset_pages
 from ..utils.logger import setup_logger
 from ..utils.tenant import get_restaurant_id
 
@@ -29,6 +32,115 @@ def _get_restaurant_id():
         return None
 
 
+def _csv_response(
+    filename: str,
+    header: List[str],
+    pages: Iterator[List[Dict]],
+    to_row: Callable[[Dict], List],
+) -> Response:
+    """
+    CSV en streaming: cada página del recorrido por cursor se escribe a la
+    respuesta apenas llega, con memoria constante sin importar el rango.
+    """
+    # La primera consulta corre antes de enviar headers: si falla, el llamador responde 500
+    first_page = next(pages, [])
+
+    def _generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(header)
+        yield buffer.getvalue().encode("utf-8-sig")  # BOM for Excel
+        try:
+            for page in itertools.chain([first_page], pages):
+                buffer.seek(0)
+                buffer.truncate(0)
+                for item in page:
+                    writer.writerow(to_row(item))
+                yield buffer.getvalue().encode("utf-8")
+        except Exception as e:
+            # Ya se enviaron headers: se relanza para abortar la respuesta chunked y
+            # que la descarga falle a la vista, en lugar de un CSV válido pero incompleto
+            logger.error(f"Error exportando {filename} a mitad del archivo: {e}")
+            raise
+
+    return Response(
+        _generate(),
+        mimetype="text/csv",
+        headers={
+            "Content-Disposition": f"attachment; filename={filename}",
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
+def _format_date(raw_date) -> str:
+    raw_date = raw_date or ""
+    try:
+        dt = datetime.fromisoformat(raw_date.replace("Z", "+00:00"))
+        return dt.strftime("%Y-%m-%d %H:%M")
+    except Exception:
+        return raw_date
+
+
+def _sales_row(o: Dict) -> List:
+    return [
+        _format_date(o.get("creation_date")),
+        o.get("id", ""),
+        o.get("total_amount", ""),
+        o.get("status", ""),
+        o.get("payment_method", ""),
+        o.get("branch_id", ""),
+    ]
+
+
+def _stock_row(ing: Dict) -> List:
+    current = float(ing.get("current_stock") or 0)
+    minimum = float(ing.get("min_stock") or 0)
+    unit_cost = ing.get("unit_cost")
+    valor_total = round(current * float(unit_cost), 2) if unit_cost is not None else ""
+    costo = round(float(unit_cost), 2) if unit_cost is not None else ""
+    track = ing.get("track_stock", True)
+    if not track:
+        estado = "sin_seguimiento"
+    elif current <= 0:
+        estado = "sin_stock"
+    elif current <= minimum:
+        estado = "critico"
+    elif current < minimum * 2:
+        estado = "bajo"
+    else:
+        estado = "ok"
+    return [
+        ing.get("name", ""),
+        ing.get("unit", ""),
+        round(current, 2),
+        round(minimum, 2),
+        costo,
+        valor_total,
+        estado,
+        "si" if track else "no",
+        ing.get("branch_id", ""),
+    ]
+
+
+def _movement_row(r: Dict) -> List:
+    ing = r.get("ingredients") or {}
+    return [
+        _format_date(r.get("created_at")),
+        ing.get("name", ""),
+        ing.get("unit", ""),
+        r.get("type", ""),
+        r.get("qty", ""),
+        r.get("reason", ""),
+        r.get("source", ""),
+        r.get("branch_id", ""),
+    ]
+
+
+def _today() -> str:
+    return datetime.now(timezone.utc).strftime('%Y%m%d')
+
+
 @reports_bp.route("/sales.csv", methods=["GET"])
 @require_auth
 @require_roles("desarrollador", "admin")
@@ -46,46 +158,22 @@ def export_sales_csv():
         start = datetime.now(timezone.utc) - timedelta(days=days)
         start_iso = start.isoformat()
 
-        def _run():
+        def _query():
             q = (
                 supabase.table("orders")
                 .select("id, creation_date, total_amount, status, payment_method, branch_id")
                 .eq("restaurant_id", restaurant_id)
                 .gte("creation_date", start_iso)
-                .order("creation_date", desc=True)
             )
             if branch_id:
                 q = q.eq("branch_id", branch_id)
-            return q.execute()
-
-        resp = execute_with_retry(_run)
-        orders = resp.data or []
-
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow(["fecha", "order_id", "total", "estado", "metodo_pago", "sucursal_id"])
-        for o in orders:
-            raw_date = o.get("creation_date") or ""
-            try:
-                dt = datetime.fromisoformat(raw_date.replace("Z", "+00:00"))
-                fecha = dt.strftime("%Y-%m-%d %H:%M")
-            except Exception:
-                fecha = raw_date
-            writer.writerow([
-                fecha,
-                o.get("id", ""),
-                o.get("total_amount", ""),
-                o.get("status", ""),
-                o.get("payment_method", ""),
-                o.get("branch_id", ""),
-            ])
-
-        csv_bytes = output.getvalue().encode("utf-8-sig")  # BOM for Excel
-        filename = f"ventas_{datetime.now(timezone.utc).strftime('%Y%m%d')}.csv"
-        return Response(
-            csv_bytes,
-            mimetype="text/csv",
-            headers={"Content-Disposition": f"attachment; filename={filename}"},
+            return q
+
+        return _csv_response(
+            f"ventas_{_today()}.csv",
+            ["fecha", "order_id", "total", "estado", "metodo_pago", "sucursal_id"],
+            iter_keyset_pages(_query, "creation_date", True, Config.REPORTS_EXPORT_PAGE_SIZE),
+            _sales_row,
         )
     except Exception as e:
         logger.error(f"Error exportando sales CSV: {e}")
@@ -104,61 +192,24 @@ def export_stock_csv():
 
         branch_id = request.args.get("branch_id")
 
-        def _run():
+        def _query():
             q = (
                 supabase.table("ingredients")
-                .select("name, unit, current_stock, min_stock, unit_cost, track_stock, branch_id")
+                .select("id, name, unit, current_stock, min_stock, unit_cost, track_stock, branch_id")
                 .eq("restaurant_id", restaurant_id)
-                .order("name")
             )
             if branch_id:
                 q = q.eq("branch_id", branch_id)
-            return q.execute()
-
-        resp = execute_with_retry(_run)
-        ingredients = resp.data or []
-
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow([
-            "nombre", "unidad", "stock_actual", "stock_minimo",
-            "costo_unitario", "valor_total", "estado", "seguimiento_stock", "sucursal_id"
-        ])
-        for ing in ingredients:
-            current = float(ing.get("current_stock") or 0)
-            minimum = float(ing.get("min_stock") or 0)
-            unit_cost = ing.get("unit_cost")
-            valor_total = round(current * float(unit_cost), 2) if unit_cost is not None else ""
-            costo = round(float(unit_cost), 2) if unit_cost is not None else ""
-            track = ing.get("track_stock", True)
-            if not track:
-                estado = "sin_seguimiento"
-            elif current <= 0:
-                estado = "sin_stock"
-            elif current <= minimum:
-                estado = "critico"
-            elif current < minimum * 2:
-                estado = "bajo"
-            else:
-                estado = "ok"
-            writer.writerow([
-                ing.get("name", ""),
-                ing.get("unit", ""),
-                round(current, 2),
-                round(minimum, 2),
-                costo,
-                valor_total,
-                estado,
-                "si" if track else "no",
-                ing.get("branch_id", ""),
-            ])
-
-        csv_bytes = output.getvalue().encode("utf-8-sig")
-        filename = f"stock_{datetime.now(timezone.utc).strftime('%Y%m%d')}.csv"
-        return Response(
-            csv_bytes,
-            mimetype="text/csv",
-            headers={"Content-Disposition": f"attachment; filename={filename}"},
+            return q
+
+        return _csv_response(
+            f"stock_{_today()}.csv",
+            [
+                "nombre", "unidad", "stock_actual", "stock_minimo",
+                "costo_unitario", "valor_total", "estado", "seguimiento_stock", "sucursal_id"
+            ],
+            iter_keyset_pages(_query, "name", False, Config.REPORTS_EXPORT_PAGE_SIZE),
+            _stock_row,
         )
     except Exception as e:
         logger.error(f"Error exportando stock CSV: {e}")
@@ -180,12 +231,11 @@ def export_movements_csv():
         date_from = request.args.get("date_from")
         date_to = request.args.get("date_to")
 
-        def _run():
+        def _query():
             q = (
                 supabase.table("stock_movements")
                 .select("*, ingredients(name, unit)")
                 .eq("restaurant_id", restaurant_id)
-                .order("created_at", desc=True)
             )
             if branch_id:
                 q = q.eq("branch_id", branch_id)
@@ -195,39 +245,13 @@ def export_movements_csv():
                 q = q.gte("created_at", date_from)
             if date_to:
                 q = q.lte("created_at", date_to)
-            return q.execute()
-
-        resp = execute_with_retry(_run)
-        rows = resp.data or []
-
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow(["fecha", "ingrediente", "unidad", "tipo", "cantidad", "motivo", "origen", "sucursal_id"])
-        for r in rows:
-            ing = r.get("ingredients") or {}
-            raw_date = r.get("created_at") or ""
-            try:
-                dt = datetime.fromisoformat(raw_date.replace("Z", "+00:00"))
-                fecha = dt.strftime("%Y-%m-%d %H:%M")
-            except Exception:
-                fecha = raw_date
-            writer.writerow([
-                fecha,
-                ing.get("name", ""),
-                ing.get("unit", ""),
-                r.get("type", ""),
-                r.get("qty", ""),
-                r.get("reason", ""),
-                r.get("source", ""),
-                r.get("branch_id", ""),
-            ])
-
-        csv_bytes = output.getvalue().encode("utf-8-sig")
-        filename = f"movimientos_{datetime.now(timezone.utc).strftime('%Y%m%d')}.csv"
-        return Response(
-            csv_bytes,
-            mimetype="text/csv",
-            headers={"Content-Disposition": f"attachment; filename={filename}"},
+            return q
+
+        return _csv_response(
+            f"movimientos_{_today()}.csv",
+            ["fecha", "ingrediente", "unidad", "tipo", "cantidad", "motivo", "origen", "sucursal_id"],
+            iter_keyset_pages(_query, "created_at", True, Config.REPORTS_EXPORT_PAGE_SIZE),
+            _movement_row,
         )
     except Exception as e:
         logger.error(f"Error exportando movements CSV: {e}")
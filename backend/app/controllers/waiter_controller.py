@@ -78,6 +78,7 @@ def create_waiter_call():
                 branch_id=resolved_branch_id,
                 token=None,
                 skip_token_validation=True,
+                restaurant_id=restaurant_id,
             )
         else:
             call, already_pending = waiter_service.create_waiter_call(
@@ -85,6 +86,7 @@ def create_waiter_call():
                 mesa_id=mesa_id,
                 branch_id=branch_id,
                 token=token,
+                restaurant_id=getattr(g, "restaurant_id", None),
             )
 
         try:
@@ -0,0 +1,147 @@
+"""
+Ejecución concurrente de consultas independientes a Supabase.
+
+run_queries recibe callables sin argumentos (query.execute, lambdas o funciones
+que ya envuelven una consulta) y los corre a la vez: con green threads si el
+worker es eventlet (socket parcheado) y con un pool de threads si no. Devuelve
+los resultados en el mismo orden, así la latencia es la del round trip más
+lento y no la suma.
+
+Todas las llamadas de un request comparten un deadline (DB_REQUEST_DEADLINE_SECONDS,
+iniciado en before_request). Los callables corren fuera del contexto de Flask:
+no deben usar g ni request.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, List, Optional, Sequence
+
+from flask import g, has_app_context
+
+from ..config import Config
+from ..utils.retry import execute_with_retry
+
+try:
+    import eventlet
+    from eventlet import patcher as _eventlet_patcher
+except ImportError:  # pragma: no cover - depende del entorno
+    eventlet = None
+    _eventlet_patcher = None
+
+
+class QueryDeadlineExceeded(TimeoutError):
+    """Las consultas no terminaron antes del deadline del request."""
+
+
+_thread_pool: Optional[ThreadPoolExecutor] = None
+
+
+def start_request_deadline() -> None:
+    """Hook de before_request: fija el deadline compartido por las consultas del request."""
+    g.db_deadline = time.monotonic() + Config.DB_REQUEST_DEADLINE_SECONDS
+
+
+def remaining_time() -> Optional[float]:
+    """Segundos que le quedan al request actual (None fuera de un request con deadline)."""
+    if not has_app_context():
+        return None
+    deadline = g.get("db_deadline")
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def run_queries(
+    calls: Sequence[Callable[[], Any]],
+    timeout: Optional[float] = None,
+    retry: bool = True,
+    return_exceptions: bool = False,
+) -> List[Any]:
+    """
+    Ejecuta calls concurrentemente y devuelve sus resultados en orden.
+
+    Args:
+        calls: callables sin argumentos
+        timeout: límite propio en segundos (se usa el menor entre este y el del request)
+        retry: envolver cada llamada en execute_with_retry
+        return_exceptions: devolver la excepción en su posición en lugar de propagarla
+
+    Raises:
+        QueryDeadlineExceeded: si se agota el tiempo antes de tener todos los resultados
+    """
+    if not calls:
+        return []
+
+    limit = _effective_timeout(timeout)
+    if limit is not None and limit <= 0:
+        raise QueryDeadlineExceeded("Deadline del request agotado")
+
+    wrapped = [_wrap(call, retry) for call in calls]
+    if len(wrapped) == 1:
+        results = [wrapped[0]()]
+    elif _use_green_threads():
+        results = _run_green(wrapped, limit)
+    else:
+        results = _run_threads(wrapped, limit)
+
+    if not return_exceptions:
+        for result in results:
+            if isinstance(result, _Failure):
+                raise result.error
+    return [result.error if isinstance(result, _Failure) else result for result in results]
+
+
+class _Failure:
+    __slots__ = ("error",)
+
+    def __init__(self, error: BaseException) -> None:
+        self.error = error
+
+
+def _wrap(call: Callable[[], Any], retry: bool) -> Callable[[], Any]:
+    def _run():
+        try:
+            return execute_with_retry(call) if retry else call()
+        except Exception as exc:
+            return _Failure(exc)
+
+    return _run
+
+
+def _effective_timeout(timeout: Optional[float]) -> Optional[float]:
+    remaining = remaining_time()
+    if remaining is None:
+        return timeout
+    if timeout is None:
+        return remaining
+    return min(timeout, remaining)
+
+
+def _use_green_threads() -> bool:
+    return _eventlet_patcher is not None and _eventlet_patcher.is_monkey_patched("socket")
+
+
+def _run_green(calls: List[Callable[[], Any]], limit: Optional[float]) -> List[Any]:
+    pool = eventlet.GreenPool(len(calls))
+    threads = [pool.spawn(call) for call in calls]
+    try:
+        with eventlet.Timeout(limit, QueryDeadlineExceeded("Consultas fuera de tiempo")):
+            return [thread.wait() for thread in threads]
+    except QueryDeadlineExceeded:
+        for thread in threads:
+            thread.kill()
+        raise
+
+
+def _run_threads(calls: List[Callable[[], Any]], limit: Optional[float]) -> List[Any]:
+    global _thread_pool
+    if _thread_pool is None:
+        _thread_pool = ThreadPoolExecutor(
+            max_workers=Config.DB_QUERY_CONCURRENCY, thread_name_prefix="supabase-query"
+        )
+    futures = [_thread_pool.submit(call) for call in calls]
+    _, pending = wait(futures, timeout=limit)
+    if pending:
+        for future in pending:
+            future.cancel()
+        raise QueryDeadlineExceeded("Consultas fuera de tiempo")
+    return [future.result() for future in futures]
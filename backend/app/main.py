@@ -3,8 +3,13 @@ from flask_cors import CORS
 from .config import Config
 from .utils.logger import setup_logger
 from .socketio import socketio
+from .utils.cache import cache_stats, start_invalidation_listener
+from .utils.shared_state import ensure_backend_for_workers, socketio_message_queue
 
 def create_app():
+    # Con varios workers, no arrancar sin backend compartido (ver shared_state)
+    ensure_backend_for_workers()
+
     app = Flask(__name__)
     app.config.from_object(Config)
     
@@ -18,14 +23,36 @@ def create_app():
         max_age=3600  # Cache preflight requests por 1 hora
     )
 
-    socketio.init_app(app)
+    # Con cola (SOCKETIO_MESSAGE_QUEUE) un emit desde cualquier worker llega a los
+    # clientes conectados en los demás. Se pasa acá y no al construir SocketIO:
+    # con message_queue el constructor inicializa un servidor aparte y los
+    # handlers registrados antes de init_app se perderían.
+    message_queue = socketio_message_queue()
+    if message_queue:
+        socketio.init_app(app, message_queue=message_queue)
+    else:
+        socketio.init_app(app)
+    # Con estado compartido, escuchar las invalidaciones de caché de los demás workers
+    start_invalidation_listener(socketio.start_background_task)
     
     setup_logger(__name__)
     app.logger.info(f"CORS configurado - Origins permitidos: {Config.CORS_ORIGINS}")
     
-    # Register multi-tenant middleware
-    from .middleware.tenant import tenant_middleware
+    # Register multi-tenant middleware (slugs precargados y refrescados en segundo plano)
+    from .middleware.tenant import start_tenant_registry, tenant_middleware, tenant_registry, verify_internal_key
+    start_tenant_registry(socketio.start_background_task)
     app.before_request(tenant_middleware)
+
+    # Deadline compartido por las consultas concurrentes del request
+    from .db.query_executor import start_request_deadline
+    app.before_request(start_request_deadline)
+
+    # Suscriptores de eventos de dominio (agregados de ventas, caché de métricas)
+    from .services import metrics_service, sales_rollup_service  # noqa: F401
+
+    # Handlers de Socket.IO (conexión autenticada y salas por sucursal)
+    from .services import realtime  # noqa: F401
+    from .services.socket_emitter import socket_emitter
     
     # Endpoints básicos
     @app.route("/")
@@ -52,6 +79,17 @@ def create_app():
             "cors_origins": Config.CORS_ORIGINS
         })
 
+    @app.route("/health/stats")
+    def health_stats():
+        # /health es público (ruta global): los contadores internos sólo con la clave del proxy
+        if not verify_internal_key():
+            return jsonify({"error": "Unauthorized - Invalid internal key"}), 401
+        return jsonify({
+            "cache": cache_stats(),
+            "realtime": socket_emitter.stats(),
+            "tenants": tenant_registry.stats(),
+        })
+
     @app.errorhandler(404)
     def handle_404(e):
         return jsonify({"error": "Ruta no encontrada"}), 404
@@ -4,18 +4,28 @@ Alternativa a Spring Security para Flask
 """
 from functools import wraps
 from flask import request, jsonify, g
+from ..config import Config
 from ..db.supabase_client import supabase
+from ..utils.cache import get_cache
+from ..utils import jwt_verifier
 from ..utils.retry import _is_transient_network_error
 import logging
 import base64
+import hashlib
 import json
 import time
 from typing import Dict, Optional
 
 logger = logging.getLogger(__name__)
 
-_auth_cache: Dict[str, Dict] = {}
 _AUTH_CACHE_TTL_SECONDS = 300
+# Clave = sha256 del JWT, para no guardar tokens en claro (ni en la caché compartida)
+_auth_cache = get_cache(
+    "auth",
+    max_entries=Config.AUTH_CACHE_MAX_ENTRIES,
+    ttl_seconds=_AUTH_CACHE_TTL_SECONDS,
+    shared=True,
+)
 _AUTH_CACHE_SKEW_SECONDS = 30
 _AUTH_VERIFY_RETRIES = 2
 _AUTH_VERIFY_RETRY_DELAY_SECONDS = 0.2
@@ -57,6 +67,39 @@ def verify_token(token):
     if cached_user:
         return cached_user
 
+    if jwt_verifier.local_verification_enabled():
+        try:
+            claims = jwt_verifier.verify_jwt(token)
+        except jwt_verifier.JwtVerificationUnavailable as e:
+            # Sin clave local para este token: seguir con la verificación remota
+            logger.info(f"Verificación local no disponible, usando Supabase Auth: {e}")
+        except jwt_verifier.jwt.InvalidTokenError as e:
+            logger.info(f"Token rechazado localmente: {e}")
+            raise AuthenticationError("Token inválido")
+        else:
+            if Config.AUTH_REMOTE_REVOCATION_CHECK:
+                return _verify_token_remote(token)
+            verified_user = _build_user(claims.get('sub'), claims.get('email'), claims.get('app_metadata'))
+            _cache_verified_user(token, verified_user)
+            return verified_user
+
+    return _verify_token_remote(token)
+
+
+def _build_user(user_id, email, app_metadata) -> Dict:
+    # Extraer metadata (role SOLO desde app_metadata)
+    app_metadata = app_metadata if isinstance(app_metadata, dict) else {}
+    return {
+        'id': user_id,
+        'email': email,
+        'role': app_metadata.get('role'),
+        'org_id': app_metadata.get('org_id') or app_metadata.get('restaurant_id'),
+        'branch_id': app_metadata.get('branch_id')
+    }
+
+
+def _verify_token_remote(token):
+    """Verificar token con supabase.auth.get_user (detecta sesiones revocadas)"""
     last_error: Optional[Exception] = None
     for attempt in range(_AUTH_VERIFY_RETRIES):
         try:
@@ -67,18 +110,7 @@ def verify_token(token):
                 raise AuthenticationError("Token inválido")
 
             user = response.user
-
-            # Extraer metadata (role SOLO desde app_metadata)
-            app_metadata = user.app_metadata or {}
-            role = app_metadata.get('role')
-
-            verified_user = {
-                'id': user.id,
-                'email': user.email,
-                'role': role,
-                'org_id': app_metadata.get('org_id') or app_metadata.get('restaurant_id'),
-                'branch_id': app_metadata.get('branch_id')
-            }
+            verified_user = _build_user(user.id, user.email, user.app_metadata)
             _cache_verified_user(token, verified_user)
             return verified_user
         except AuthenticationError:
@@ -120,18 +152,12 @@ def _decode_token_exp(token: str) -> Optional[int]:
         return None
 
 
-def _get_cached_user(token: str) -> Optional[Dict]:
-    cached = _auth_cache.get(token)
-    if not cached:
-        return None
+def _auth_cache_key(token: str) -> str:
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
 
-    expires_at = cached.get('expires_at', 0)
-    now = int(time.time())
-    if expires_at <= now + _AUTH_CACHE_SKEW_SECONDS:
-        _auth_cache.pop(token, None)
-        return None
 
-    user = cached.get('user')
+def _get_cached_user(token: str) -> Optional[Dict]:
+    user = _auth_cache.get(_auth_cache_key(token))
     return user if isinstance(user, dict) else None
 
 
@@ -141,10 +167,13 @@ def _cache_verified_user(token: str, user: Dict) -> None:
     cache_exp = now + _AUTH_CACHE_TTL_SECONDS
     if token_exp is not None:
         cache_exp = min(cache_exp, int(token_exp))
-    _auth_cache[token] = {
-        'user': user,
-        'expires_at': cache_exp
-    }
+    # La entrada vence _AUTH_CACHE_SKEW_SECONDS antes que el token
+    _auth_cache.set(_auth_cache_key(token), user, ttl_seconds=cache_exp - now - _AUTH_CACHE_SKEW_SECONDS)
+
+
+def invalidate_cached_user(token: str) -> None:
+    """Descarta la verificación cacheada de un token (p. ej. al cerrar sesión)."""
+    _auth_cache.delete(_auth_cache_key(token))
 
 
 def require_auth(f):
@@ -5,16 +5,26 @@ Handles restaurant slug resolution and restaurant_id injection
 from flask import request, g, jsonify
 import os
 import logging
+import threading
 import time
+from typing import Dict, Optional
 
+from ..config import Config
+from ..utils.cache import get_cache, invalidate, on_remote_invalidation
 from ..utils.retry import execute_with_retry
 
 logger = logging.getLogger(__name__)
 
-# Simple in-memory cache for slug to restaurant_id mapping
-# In production, consider using Redis or similar
-_slug_cache = {}
+# Bounded LRU + TTL cache for slug to restaurant_id mapping
+# (shared across workers when CACHE_REDIS_URL is configured)
 _cache_ttl = 300  # 5 minutes
+_SLUG_NAMESPACE = "tenant-slug"
+_slug_cache = get_cache(
+    _SLUG_NAMESPACE,
+    max_entries=Config.SLUG_CACHE_MAX_ENTRIES,
+    ttl_seconds=_cache_ttl,
+    shared=True,
+)
 
 INTERNAL_PROXY_KEY = os.getenv('INTERNAL_PROXY_KEY')
 FLASK_ENV = os.getenv('FLASK_ENV', 'production')
@@ -46,17 +56,170 @@ def verify_internal_key():
     request_key = request.headers.get('X-Internal-Key')
     return request_key == INTERNAL_PROXY_KEY
 
-def get_restaurant_id_from_slug(slug):
+class _Flight:
+    """One in-progress slug lookup; concurrent callers wait on it instead of querying."""
+
+    __slots__ = ("done", "result")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+class TenantRegistry:
     """
-    Get restaurant_id from slug
-    Uses cache to avoid repeated database queries
+    slug -> restaurant_id for every restaurant, loaded at startup and refreshed
+    in the background every TENANT_REGISTRY_REFRESH_SECONDS, so known slugs never
+    wait on Supabase. Slugs missing from the map (restaurants created since the
+    last refresh) fall back to a single-slug lookup: concurrent lookups of the
+    same slug share one query, and "not found" answers are negative-cached for
+    TENANT_NEGATIVE_TTL_SECONDS so bots and typos don't hit the database.
     """
-    now_ts = time.time()
-    cached_data = _slug_cache.get(slug)
-    if cached_data and (now_ts - cached_data.get('cached_at', 0)) <= _cache_ttl:
-        return cached_data['restaurant_id']
 
-    # Query database (using Supabase in this case)
+    FLIGHT_WAIT_SECONDS = 5
+
+    PAGE_SIZE = 1000
+
+    def __init__(self, refresh_seconds, negative_ttl_seconds, max_negative_entries):
+        self.refresh_seconds = refresh_seconds
+        self._slugs: Dict[str, str] = {}
+        self._loaded_at = 0.0
+        self._misses = get_cache(
+            "tenant-slug-miss",
+            max_entries=max_negative_entries,
+            ttl_seconds=negative_ttl_seconds,
+        )
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        self._refresher_started = False
+        self._counters = {"hits": 0, "negative_hits": 0, "lookups": 0, "collapsed": 0, "flight_timeouts": 0, "reloads": 0}
+
+    def lookup(self, slug: str) -> Optional[str]:
+        restaurant_id = self._slugs.get(slug)
+        if restaurant_id:
+            self._count("hits")
+            return restaurant_id
+        if self._misses.get(slug):
+            self._count("negative_hits")
+            return None
+        return self._single_flight(slug)
+
+    def reload(self) -> int:
+        """Load every slug and swap the map. Keeps the previous map if the query fails."""
+        from ..db.supabase_client import supabase
+
+        slugs: Dict[str, str] = {}
+        start = 0
+        while True:
+            def _run(start=start):
+                return (
+                    supabase.table('restaurants')
+                    .select('id, slug')
+                    .order('id')
+                    .range(start, start + self.PAGE_SIZE - 1)
+                    .execute()
+                )
+
+            rows = execute_with_retry(_run).data or []
+            for row in rows:
+                if row.get('slug') and row.get('id'):
+                    slugs[row['slug']] = row['id']
+            if len(rows) < self.PAGE_SIZE:
+                break
+            start += self.PAGE_SIZE
+
+        self._slugs = slugs
+        self._loaded_at = time.time()
+        self._count("reloads")
+        return len(slugs)
+
+    def remember(self, slug: str, restaurant_id: str) -> None:
+        with self._lock:
+            self._slugs = {**self._slugs, slug: restaurant_id}
+        self._misses.delete(slug)
+
+    def forget(self, slug: Optional[str] = None) -> None:
+        """Drop one slug (or all) from the map and the negative cache."""
+        with self._lock:
+            if slug:
+                self._slugs = {k: v for k, v in self._slugs.items() if k != slug}
+            else:
+                self._slugs = {}
+                self._loaded_at = 0.0
+        if slug:
+            self._misses.delete(slug)
+        else:
+            self._misses.clear()
+
+    def start(self, start_task) -> bool:
+        """Preload and keep refreshing in a background task (socketio.start_background_task)."""
+        if self.refresh_seconds <= 0:
+            return False
+        with self._lock:
+            if self._refresher_started:
+                return False
+            self._refresher_started = True
+        start_task(self._run)
+        return True
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                **self._counters,
+                "slugs": len(self._slugs),
+                "loaded_at": self._loaded_at or None,
+                "in_flight": len(self._flights),
+            }
+
+    def _run(self):
+        from ..socketio import socketio
+
+        while True:
+            try:
+                count = self.reload()
+                logger.info(f"Tenant registry loaded: {count} restaurants")
+            except Exception as e:
+                logger.warning(f"Tenant registry refresh failed, keeping previous map: {e}")
+            socketio.sleep(self.refresh_seconds)
+
+    def _single_flight(self, slug: str) -> Optional[str]:
+        with self._lock:
+            flight = self._flights.get(slug)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._flights[slug] = flight
+            else:
+                self._counters["collapsed"] += 1
+        if not leader:
+            if flight.done.wait(timeout=self.FLIGHT_WAIT_SECONDS):
+                return flight.result
+            # The leader is stuck: a timeout is not "not found", look it up ourselves
+            self._count("flight_timeouts")
+            return _fetch_restaurant_id(slug, self._misses)
+
+        self._count("lookups")
+        try:
+            flight.result = _fetch_restaurant_id(slug, self._misses)
+            if flight.result:
+                self.remember(slug, flight.result)
+        finally:
+            with self._lock:
+                self._flights.pop(slug, None)
+            flight.done.set()
+        return flight.result
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+
+def _fetch_restaurant_id(slug, misses):
+    """Single-slug lookup (shared slug cache, then Supabase). Negative-caches "not found"."""
+    cached_id = _slug_cache.get(slug)
+    if cached_id:
+        return cached_id
+
     try:
         from ..db.supabase_client import supabase
 
@@ -65,40 +228,70 @@ def get_restaurant_id_from_slug(slug):
                 supabase.table('restaurants')
                 .select('id')
                 .eq('slug', slug)
-                .single()
+                .limit(1)
                 .execute()
             )
 
         response = execute_with_retry(_run, retries=2, delay=0.2)
-        
+
         if not response.data:
+            misses.set(slug, True)
             return None
-        
-        restaurant_id = response.data['id']
-        
+
+        restaurant_id = response.data[0]['id']
+
         # Cache the result
-        _slug_cache[slug] = {
-            'restaurant_id': restaurant_id,
-            'slug': slug,
-            'cached_at': now_ts,
-        }
-        
+        _slug_cache.set(slug, restaurant_id)
+
         return restaurant_id
     except Exception as e:
         logger.error(f"Error fetching restaurant for slug '{slug}': {str(e)}")
         # Si hay cache previa (aunque vencida), usarla para tolerar
         # fallas transitorias de red/DNS y evitar caídas completas.
-        if cached_data and cached_data.get('restaurant_id'):
+        stale_id = _slug_cache.get_stale(slug)
+        if stale_id:
             logger.warning(
                 f"Using stale slug cache for '{slug}' due to lookup error"
             )
-            return cached_data['restaurant_id']
+            return stale_id
         return None
 
-def clear_slug_cache():
-    """Clear the slug cache (useful for testing or when restaurants are updated)"""
-    global _slug_cache
-    _slug_cache = {}
+
+tenant_registry = TenantRegistry(
+    refresh_seconds=Config.TENANT_REGISTRY_REFRESH_SECONDS,
+    negative_ttl_seconds=Config.TENANT_NEGATIVE_TTL_SECONDS,
+    max_negative_entries=Config.SLUG_CACHE_MAX_ENTRIES,
+)
+
+
+def get_restaurant_id_from_slug(slug):
+    """
+    Get restaurant_id from slug
+    Served from the tenant registry; only unknown slugs reach the database
+    """
+    if not slug:
+        return None
+    return tenant_registry.lookup(slug)
+
+def start_tenant_registry(start_task):
+    """Preload all slugs and keep them fresh in the background."""
+    return tenant_registry.start(start_task)
+
+def clear_slug_cache(slug=None):
+    """
+    Clear the slug cache, or a single slug (useful for testing or when restaurants are updated).
+    Broadcast on the cache invalidation channel so every worker drops it too.
+    """
+    invalidate(_SLUG_NAMESPACE, slug or "")
+    tenant_registry.forget(slug)
+
+
+def _forget_remote(prefixes):
+    for prefix in prefixes:
+        tenant_registry.forget(prefix or None)
+
+
+on_remote_invalidation(_SLUG_NAMESPACE, _forget_remote)
 
 def tenant_middleware():
     """
@@ -0,0 +1,65 @@
+"""
+Eventos de dominio en proceso.
+
+Los servicios publican lo que pasó con un pedido (creado, cambio de estado) y
+los interesados (agregados de ventas, caché de métricas) se suscriben, así el
+flujo del pedido no conoce a cada consumidor. Los handlers corren en el mismo
+hilo, en orden de suscripción; un error en uno se loguea y no afecta al resto
+ni a quien publica.
+"""
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from ..utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+ORDER_CREATED = "order.created"
+ORDER_STATUS_CHANGED = "order.status_changed"
+
+EventHandler = Callable[[Dict[str, Any]], None]
+
+_subscribers: Dict[str, List[EventHandler]] = {}
+_lock = threading.Lock()
+
+
+def subscribe(event_name: str, handler: EventHandler) -> None:
+    """Registra un handler para un evento (idempotente)."""
+    with _lock:
+        handlers = _subscribers.setdefault(event_name, [])
+        if handler not in handlers:
+            handlers.append(handler)
+
+
+def publish(event_name: str, payload: Dict[str, Any]) -> None:
+    """Entrega el evento a todos sus handlers."""
+    with _lock:
+        handlers = list(_subscribers.get(event_name, ()))
+    event = {"name": event_name, **payload}
+    for handler in handlers:
+        try:
+            handler(event)
+        except Exception as e:
+            logger.warning(f"Handler {getattr(handler, '__name__', handler)} falló para {event_name}: {e}")
+
+
+def publish_order_event(
+    event_name: str,
+    order: Optional[Dict[str, Any]],
+    previous_status: Optional[str] = None,
+) -> None:
+    """Publica un evento de pedido con los campos que usan los suscriptores."""
+    if not order or not order.get("id"):
+        return
+    publish(
+        event_name,
+        {
+            "order_id": order.get("id"),
+            "restaurant_id": order.get("restaurant_id"),
+            "branch_id": order.get("branch_id"),
+            "mesa_id": order.get("mesa_id"),
+            "status": order.get("status"),
+            "previous_status": previous_status,
+            "creation_date": order.get("creation_date"),
+        },
+    )
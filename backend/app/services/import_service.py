@@ -7,6 +7,8 @@ from typing import Dict, List
 from ..db.supabase_client import supabase
 from ..utils.units import ALLOWED_UNITS, normalize_unit
 from .ingredients_service import ingredients_service
+from .recipe_graph import invalidate_recipe_graph
+from .menu_snapshot_service import invalidate_menu_snapshot
 
 
 def _parse_csv_bytes(data: bytes) -> List[Dict]:
@@ -24,11 +26,19 @@ class ImportService:
         Importa ingredientes desde un CSV.
         Columnas esperadas: nombre, unidad, stock_actual, costo_unitario, stock_minimo, track_stock
         Hace upsert por (name, restaurant_id). Si cambia stock registra movimiento tipo 'import'.
+        Si un nombre se repite en el archivo vale la última fila, como si se
+        aplicaran en orden. Los ingredientes nuevos se crean con su stock real y su
+        movimiento solo queda registrado; los movimientos se registran juntos al
+        final, con un insert y una sola actualización atómica de current_stock.
         Retorna: {created, updated, errors: [{row, message}]}
         """
         rows = _parse_csv_bytes(file_bytes)
         created = updated = 0
         errors: List[Dict] = []
+        movements: List[Dict] = []
+        movement_rows: List[int] = []
+        # Una entrada por ingrediente (nombre sin distinguir mayúsculas): la última fila válida
+        parsed: Dict[str, Dict] = {}
 
         REQUIRED = {"nombre", "unidad"}
 
@@ -62,6 +72,22 @@ class ImportService:
                 errors.append({"row": row_num, "message": f"Valor numérico inválido: {e}"})
                 continue
 
+            parsed[name.lower()] = {
+                "row": row_num,
+                "name": name,
+                "unit": unit,
+                "new_stock": new_stock,
+                "unit_cost": unit_cost,
+                "min_stock": min_stock,
+                "track_stock": track_stock,
+            }
+
+        for entry in parsed.values():
+            row_num = entry["row"]
+            name = entry["name"]
+            new_stock = entry["new_stock"]
+            unit_cost = entry["unit_cost"]
+
             # Buscar si ya existe
             existing_resp = (
                 supabase.table("ingredients")
@@ -79,7 +105,11 @@ class ImportService:
                     old_stock = float(existing.get("current_stock") or 0)
                     delta = round(new_stock - old_stock, 4)
 
-                    update_data: Dict = {"unit": unit, "min_stock": min_stock, "track_stock": track_stock}
+                    update_data: Dict = {
+                        "unit": entry["unit"],
+                        "min_stock": entry["min_stock"],
+                        "track_stock": entry["track_stock"],
+                    }
                     if unit_cost is not None:
                         update_data["unit_cost"] = unit_cost
                     if branch_id:
@@ -88,45 +118,56 @@ class ImportService:
                     supabase.table("ingredients").update(update_data).eq("id", ing_id).execute()
 
                     if delta != 0:
-                        ingredients_service.record_movement(
-                            ingredient_id=ing_id,
-                            qty=delta,
-                            movement_type="import",
-                            restaurant_id=restaurant_id,
-                            reason="Importación CSV",
-                            source="csv_import",
-                            user_id=user_id,
-                            branch_id=branch_id or existing.get("branch_id"),
-                        )
+                        movements.append({
+                            "ingredient_id": ing_id,
+                            "qty": delta,
+                            "type": "import",
+                            "reason": "Importación CSV",
+                            "source": "csv_import",
+                            "branch_id": branch_id or existing.get("branch_id"),
+                        })
+                        movement_rows.append(row_num)
                     updated += 1
                 else:
                     insert_data = {
                         "restaurant_id": restaurant_id,
                         "branch_id": branch_id or None,
                         "name": name,
-                        "unit": unit,
+                        "unit": entry["unit"],
                         "current_stock": new_stock,
                         "unit_cost": unit_cost,
-                        "min_stock": min_stock,
-                        "track_stock": track_stock,
+                        "min_stock": entry["min_stock"],
+                        "track_stock": entry["track_stock"],
                     }
                     resp = supabase.table("ingredients").insert(insert_data).execute()
                     new_row = (resp.data or [None])[0]
                     if new_row and new_stock > 0:
-                        ingredients_service.record_movement(
-                            ingredient_id=str(new_row["id"]),
-                            qty=new_stock,
-                            movement_type="import",
-                            restaurant_id=restaurant_id,
-                            reason="Importación CSV (creación)",
-                            source="csv_import",
-                            user_id=user_id,
-                            branch_id=branch_id or None,
-                        )
+                        # El stock ya quedó en el insert: el movimiento solo deja constancia
+                        movements.append({
+                            "ingredient_id": str(new_row["id"]),
+                            "qty": new_stock,
+                            "type": "import",
+                            "reason": "Importación CSV (creación)",
+                            "source": "csv_import",
+                            "branch_id": branch_id or None,
+                            "stock_applied": True,
+                        })
+                        movement_rows.append(row_num)
                     created += 1
             except Exception as e:
                 errors.append({"row": row_num, "message": f"Error al guardar: {e}"})
 
+        if movements:
+            try:
+                ingredients_service.record_movements_bulk(
+                    movements,
+                    restaurant_id=restaurant_id,
+                    user_id=user_id,
+                )
+            except Exception as e:
+                for row_num in movement_rows:
+                    errors.append({"row": row_num, "message": f"Error al registrar movimiento de stock: {e}"})
+
         return {"created": created, "updated": updated, "errors": errors}
 
     def import_products(
@@ -220,6 +261,9 @@ class ImportService:
             except Exception as e:
                 errors.append({"row": row_num, "message": f"Error al guardar: {e}"})
 
+        if created or updated:
+            invalidate_recipe_graph(restaurant_id)
+            invalidate_menu_snapshot(restaurant_id)
         return {"created": created, "updated": updated, "errors": errors}
 
 
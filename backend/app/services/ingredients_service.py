@@ -4,9 +4,11 @@ from datetime import datetime, timezone
 from typing import Dict, List, Optional
 from ..db.supabase_client import supabase
 from ..services.menu_service import menu_service
+from ..services.menu_snapshot_service import invalidate_menu_snapshot
 from ..utils.retry import execute_with_retry
 from ..utils.units import ALLOWED_UNITS, normalize_unit, to_display_unit
 from ..utils.logger import setup_logger
+from ..utils.supabase_errors import is_missing_function_error
 
 
 logger = setup_logger(__name__)
@@ -178,10 +180,6 @@ class IngredientsService:
                     logger.warning(
                         f"No se pudo registrar waste inicial para ingrediente {row.get('id')}: {e}"
                     )
-        menu_service.sync_unavailable_from_stock(
-            restaurant_id=restaurant_id,
-            branch_id=row.get("branch_id"),
-        )
         return _row_to_camel(row)
 
     def record_movement(
@@ -194,39 +192,145 @@ class IngredientsService:
         source: Optional[str] = None,
         user_id: Optional[str] = None,
         branch_id: Optional[str] = None,
-    ) -> None:
-        """Registra un movimiento de stock e incrementa/decrementa current_stock."""
-        ingredient_id_value = ingredient_id
-        if isinstance(ingredient_id, str):
-            if ingredient_id.isdigit() or (ingredient_id.startswith("-") and ingredient_id[1:].isdigit()):
-                ingredient_id_value = int(ingredient_id)
-
-        movement_payload = {
-            "ingredient_id": ingredient_id_value,
-            "qty": qty,
-            "type": movement_type,
-            "reason": reason,
-            "source": source,
-            "user_id": self._normalize_optional_uuid(user_id),
-            "branch_id": self._normalize_optional_uuid(branch_id),
-            "restaurant_id": restaurant_id,
-            "created_at": datetime.now(timezone.utc).isoformat(),
+    ) -> Optional[float]:
+        """
+        Registra un movimiento de stock y aplica qty a current_stock de forma
+        atómica. Devuelve el stock resultante (None si el ingrediente no existe).
+        """
+        new_stocks = self.record_movements_bulk(
+            [{
+                "ingredient_id": ingredient_id,
+                "qty": qty,
+                "type": movement_type,
+                "reason": reason,
+                "source": source,
+            }],
+            restaurant_id=restaurant_id,
+            user_id=user_id,
+            branch_id=branch_id,
+        )
+        return new_stocks.get(str(ingredient_id))
+
+    def record_movements_bulk(
+        self,
+        movements: List[Dict],
+        restaurant_id: str,
+        user_id: Optional[str] = None,
+        branch_id: Optional[str] = None,
+    ) -> Dict[str, float]:
+        """
+        Registra varios movimientos con un único insert y aplica los deltas
+        de current_stock agregados por ingrediente en una sola llamada.
+
+        Cada movimiento: {ingredient_id, qty, type, reason?, source?, branch_id?, stock_applied?}.
+        Con stock_applied el movimiento solo se registra: su qty ya está en current_stock.
+        Devuelve {ingredient_id: stock_resultante}.
+        """
+        if not movements:
+            return {}
+
+        created_at = datetime.now(timezone.utc).isoformat()
+        normalized_user_id = self._normalize_optional_uuid(user_id)
+        normalized_branch_id = self._normalize_optional_uuid(branch_id)
+
+        rows = []
+        deltas: Dict[str, float] = {}
+        for movement in movements:
+            ingredient_id = movement.get("ingredient_id")
+            if ingredient_id is None:
+                continue
+            qty = float(movement.get("qty") or 0)
+            rows.append({
+                "ingredient_id": self._coerce_ingredient_id(ingredient_id),
+                "qty": qty,
+                "type": movement.get("type"),
+                "reason": movement.get("reason"),
+                "source": movement.get("source"),
+                "user_id": normalized_user_id,
+                "branch_id": (
+                    self._normalize_optional_uuid(movement["branch_id"])
+                    if "branch_id" in movement
+                    else normalized_branch_id
+                ),
+                "restaurant_id": restaurant_id,
+                "created_at": created_at,
+            })
+            if movement.get("stock_applied"):
+                continue
+            key = str(ingredient_id)
+            deltas[key] = deltas.get(key, 0.0) + qty
+
+        if not rows:
+            return {}
+
+        execute_with_retry(lambda: supabase.table("stock_movements").insert(rows).execute())
+        new_stocks = self.apply_stock_deltas(deltas)
+        # El snapshot público publica si cada opción tiene stock: cruzar cero lo desactualiza.
+        # Todo el restaurante: los movimientos pueden traer su propia sucursal.
+        if any(
+            (new_stock - deltas.get(ingredient_id, 0.0) > 0) != (new_stock > 0)
+            for ingredient_id, new_stock in new_stocks.items()
+        ):
+            invalidate_menu_snapshot(restaurant_id)
+        menu_service.sync_availability_for_ingredients(
+            restaurant_id=restaurant_id,
+            ingredient_ids=list(deltas.keys()),
+            branch_id=branch_id,
+        )
+        return new_stocks
+
+    def apply_stock_deltas(self, deltas: Dict[str, float]) -> Dict[str, float]:
+        """
+        Suma deltas relativos a current_stock de forma atómica en Postgres
+        (RPC apply_ingredient_stock_deltas). Devuelve {ingredient_id: stock_resultante}.
+        """
+        payload = [
+            {"ingredient_id": self._coerce_ingredient_id(ingredient_id), "delta": round(float(delta), 4)}
+            for ingredient_id, delta in deltas.items()
+            if delta
+        ]
+        if not payload:
+            return {}
+
+        try:
+            response = supabase.rpc("apply_ingredient_stock_deltas", {"p_deltas": payload}).execute()
+        except Exception as exc:
+            if not is_missing_function_error(exc, "apply_ingredient_stock_deltas"):
+                raise
+            logger.warning(
+                "RPC apply_ingredient_stock_deltas no disponible; aplicando deltas uno por uno"
+            )
+            return self._apply_stock_deltas_fallback(payload)
+
+        return {
+            str(row.get("ingredient_id")): float(row.get("current_stock") or 0)
+            for row in (response.data or [])
         }
-        supabase.table("stock_movements").insert(movement_payload).execute()
 
-        # Actualizar current_stock como incremento relativo
-        current_resp = (
-            supabase.table("ingredients")
-            .select("current_stock")
-            .eq("id", ingredient_id)
-            .limit(1)
-            .execute()
+    def _apply_stock_deltas_fallback(self, payload: List[Dict]) -> Dict[str, float]:
+        ids = [entry["ingredient_id"] for entry in payload]
+        current_resp = execute_with_retry(
+            lambda: supabase.table("ingredients").select("id, current_stock").in_("id", ids).execute()
         )
-        current_row = (current_resp.data or [None])[0]
-        if current_row is not None:
-            old_stock = float(current_row.get("current_stock") or 0)
-            new_stock = round(old_stock + qty, 4)
-            supabase.table("ingredients").update({"current_stock": new_stock}).eq("id", ingredient_id).execute()
+        current_by_id = {str(row.get("id")): row for row in (current_resp.data or [])}
+
+        result: Dict[str, float] = {}
+        for entry in payload:
+            key = str(entry["ingredient_id"])
+            current_row = current_by_id.get(key)
+            if current_row is None:
+                continue
+            new_stock = round(float(current_row.get("current_stock") or 0) + entry["delta"], 4)
+            supabase.table("ingredients").update({"current_stock": new_stock}).eq("id", entry["ingredient_id"]).execute()
+            result[key] = new_stock
+        return result
+
+    @staticmethod
+    def _coerce_ingredient_id(ingredient_id):
+        if isinstance(ingredient_id, str):
+            if ingredient_id.isdigit() or (ingredient_id.startswith("-") and ingredient_id[1:].isdigit()):
+                return int(ingredient_id)
+        return ingredient_id
 
     def list_movements(
         self,
@@ -345,31 +449,31 @@ class IngredientsService:
             delta = round(new_stock - old_stock, 4)
             if delta != 0:
                 movement_branch_id = current.get("branch_id") or payload.get("branch_id")
+                movements = [{
+                    "ingredient_id": ingredient_id,
+                    "qty": delta,
+                    "type": "adjustment",
+                    "reason": payload.get("reason"),
+                    "source": "manual",
+                }]
+                if delta > 0 and effective_waste_percent > 0:
+                    waste_qty = round(delta * (effective_waste_percent / 100.0), 4)
+                    if waste_qty > 0:
+                        movements.append({
+                            "ingredient_id": ingredient_id,
+                            "qty": -waste_qty,
+                            "type": "waste",
+                            "reason": f"Desecho automático {effective_waste_percent}% sobre carga de stock",
+                            "source": "manual",
+                        })
                 try:
-                    self.record_movement(
-                        ingredient_id=ingredient_id,
-                        qty=delta,
-                        movement_type="adjustment",
+                    self.record_movements_bulk(
+                        movements,
                         restaurant_id=restaurant_id,
-                        reason=payload.get("reason"),
-                        source="manual",
                         user_id=user_id,
                         branch_id=movement_branch_id,
                     )
-                    if delta > 0 and effective_waste_percent > 0:
-                        waste_qty = round(delta * (effective_waste_percent / 100.0), 4)
-                        if waste_qty > 0:
-                            self.record_movement(
-                                ingredient_id=ingredient_id,
-                                qty=-waste_qty,
-                                movement_type="waste",
-                                restaurant_id=restaurant_id,
-                                reason=f"Desecho automático {effective_waste_percent}% sobre carga de stock",
-                                source="manual",
-                                user_id=user_id,
-                                branch_id=movement_branch_id,
-                            )
-                    # record_movement ya actualizó current_stock — no volver a actualizar
+                    # record_movements_bulk ya actualizó current_stock — no volver a actualizar
                     del update_data["current_stock"]
                 except Exception as e:
                     logger.error(
@@ -409,7 +513,7 @@ class IngredientsService:
                         raise ValueError("No se pudo registrar el movimiento de desecho") from e
 
         if not update_data:
-            # Solo cambió el stock, ya fue actualizado por record_movement
+            # Solo cambió el stock, ya fue actualizado por record_movements_bulk
             updated_resp = (
                 supabase.table("ingredients")
                 .select("*")
@@ -431,8 +535,9 @@ class IngredientsService:
         row = (response.data or [None])[0]
         if not row:
             raise Exception("No se pudo actualizar el ingrediente")
-        menu_service.sync_unavailable_from_stock(
+        menu_service.sync_availability_for_ingredients(
             restaurant_id=restaurant_id,
+            ingredient_ids=[str(ingredient_id)],
             branch_id=row.get("branch_id"),
         )
         return _row_to_camel(row)
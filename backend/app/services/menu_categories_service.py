@@ -3,6 +3,7 @@ from typing import Dict, List
 from ..db.supabase_client import supabase
 from ..services.branches_service import branches_service
 from ..utils.retry import execute_with_retry
+from .menu_snapshot_service import invalidate_menu_snapshot
 
 
 class MenuCategoriesService:
@@ -61,6 +62,7 @@ class MenuCategoriesService:
         category = (response.data or [None])[0]
         if not category:
             raise Exception("No se pudo crear la categoría")
+        invalidate_menu_snapshot(restaurant_id, branch_id)
         return category
 
     def update_category(self, user_id: str, category_id: str, payload: Dict) -> Dict:
@@ -88,6 +90,7 @@ class MenuCategoriesService:
         category = (response.data or [None])[0]
         if not category:
             raise LookupError("Categoría no encontrada")
+        invalidate_menu_snapshot(restaurant_id, branch_id)
         return category
 
     def delete_category(self, user_id: str, category_id: str, branch_id: str) -> None:
@@ -103,6 +106,7 @@ class MenuCategoriesService:
         )
         if not response.data:
             raise LookupError("Categoría no encontrada")
+        invalidate_menu_snapshot(restaurant_id, branch_id)
 
 
 menu_categories_service = MenuCategoriesService()
@@ -6,6 +6,12 @@ from ..db.supabase_client import supabase
 from ..utils.logger import setup_logger
 from ..services.branches_service import branches_service
 from ..utils.retry import execute_with_retry
+from .recipe_graph import (
+    get_products_using_ingredients,
+    get_recipe_graph,
+    invalidate_recipe_graph,
+)
+from .menu_snapshot_service import invalidate_menu_snapshot
 
 logger = setup_logger(__name__)
 
@@ -52,14 +58,6 @@ class MenuService:
                     branch_id=branch_id,
                 )
 
-            # Para backoffice autenticado, refrescar disponibilidad basada en stock
-            # antes de devolver el listado. Evita estados stale en el panel admin.
-            if user_id and not mesa_id:
-                self.sync_unavailable_from_stock(
-                    restaurant_id=restaurant_id,
-                    branch_id=branch_id,
-                )
-
             query = supabase.table("menu").select("*")
             query = query.eq("restaurant_id", restaurant_id)
             if branch_id:
@@ -93,91 +91,113 @@ class MenuService:
         Sincroniza disponibilidad de productos en base al stock de ingredientes de receta.
         Si falta stock -> available=false.
         Si hay stock suficiente -> available=true.
+
+        Recetas y disponibilidad salen del grafo cacheado de la sucursal; el
+        stock se lee en una sola consulta y los cambios se escriben en bloque.
         """
         try:
-            menu_query = (
-                supabase.table("menu")
-                .select("id, branch_id, available")
-                .eq("restaurant_id", restaurant_id)
-            )
-            if branch_id:
-                menu_query = menu_query.eq("branch_id", branch_id)
-            if product_ids:
-                menu_query = menu_query.in_("id", product_ids)
+            graph = get_recipe_graph(restaurant_id, branch_id)
+            if product_ids is None:
+                candidates = list(graph.keys())
+            else:
+                candidates = [str(product_id) for product_id in product_ids if str(product_id) in graph]
+            return self._sync_products_availability(restaurant_id, branch_id, graph, candidates)
+        except Exception as e:
+            logger.warning(f"No se pudo sincronizar disponibilidad por stock: {str(e)}")
+            return 0
 
-            menu_rows = (execute_with_retry(menu_query.execute).data or [])
-            updated_count = 0
+    def sync_availability_for_ingredients(
+        self,
+        restaurant_id: str,
+        ingredient_ids: List[str],
+        branch_id: Optional[str] = None,
+    ) -> int:
+        """
+        Recalcula disponibilidad solo de los productos cuya receta usa alguno
+        de los ingredientes cuyo stock cambió.
+        """
+        if not ingredient_ids:
+            return 0
+        try:
+            graph = get_recipe_graph(restaurant_id, branch_id)
+            candidates = get_products_using_ingredients(restaurant_id, branch_id, ingredient_ids)
+            return self._sync_products_availability(restaurant_id, branch_id, graph, list(candidates))
+        except Exception as e:
+            logger.warning(f"No se pudo sincronizar disponibilidad por stock: {str(e)}")
+            return 0
 
-            for product in menu_rows:
-                product_id = product.get("id")
-                product_branch_id = product.get("branch_id")
-                if product_id is None:
-                    continue
+    def _sync_products_availability(
+        self,
+        restaurant_id: str,
+        branch_id: Optional[str],
+        graph: Dict[str, Dict],
+        product_ids: List[str],
+    ) -> int:
+        products = [
+            (product_id, graph[product_id])
+            for product_id in product_ids
+            if graph.get(product_id, {}).get("recipe")
+        ]
+        if not products:
+            return 0
 
-                recipe_query = (
-                    supabase.table("recipes")
-                    .select("ingredient_id, quantity")
-                    .eq("restaurant_id", restaurant_id)
-                    .eq("product_id", product_id)
-                )
-                recipe_rows = (execute_with_retry(recipe_query.execute).data or [])
-                if not recipe_rows:
-                    continue
+        ingredient_ids = {
+            ingredient_id
+            for _, product in products
+            for ingredient_id, _ in product["recipe"]
+        }
+        ingredients_query = (
+            supabase.table("ingredients")
+            .select("id, branch_id, current_stock, track_stock")
+            .eq("restaurant_id", restaurant_id)
+            .in_("id", list(ingredient_ids))
+        )
+        ingredient_rows = (execute_with_retry(ingredients_query.execute).data or [])
+        ingredients_by_id = {str(row.get("id")): row for row in ingredient_rows}
 
-                ingredient_ids = [row.get("ingredient_id") for row in recipe_rows if row.get("ingredient_id") is not None]
-                if not ingredient_ids:
+        flips: Dict[bool, List[str]] = {True: [], False: []}
+        for product_id, product in products:
+            product_branch_id = product.get("branch_id")
+            insufficient = False
+            for ingredient_id, required in product["recipe"]:
+                ingredient = ingredients_by_id.get(ingredient_id)
+                if not ingredient or (
+                    product_branch_id and ingredient.get("branch_id") != product_branch_id
+                ):
+                    insufficient = True
+                    break
+                if ingredient.get("track_stock") is False:
                     continue
+                try:
+                    current = float(ingredient.get("current_stock") or 0)
+                except (TypeError, ValueError):
+                    current = 0.0
+                if current < required:
+                    insufficient = True
+                    break
 
-                ingredients_query = (
-                    supabase.table("ingredients")
-                    .select("id, current_stock, track_stock")
-                    .eq("restaurant_id", restaurant_id)
-                    .in_("id", ingredient_ids)
-                )
-                if product_branch_id:
-                    ingredients_query = ingredients_query.eq("branch_id", product_branch_id)
-                ingredient_rows = (execute_with_retry(ingredients_query.execute).data or [])
-                ingredients_by_id = {row.get("id"): row for row in ingredient_rows}
+            desired_available = not insufficient
+            if bool(product.get("available")) != desired_available:
+                flips[desired_available].append(product_id)
 
-                insufficient = False
-                for recipe in recipe_rows:
-                    ingredient = ingredients_by_id.get(recipe.get("ingredient_id"))
-                    if not ingredient:
-                        insufficient = True
-                        break
-                    if ingredient.get("track_stock") is False:
-                        continue
-                    try:
-                        required = float(recipe.get("quantity") or 0)
-                    except (TypeError, ValueError):
-                        required = 0.0
-                    try:
-                        current = float(ingredient.get("current_stock") or 0)
-                    except (TypeError, ValueError):
-                        current = 0.0
-                    if current < required:
-                        insufficient = True
-                        break
+        updated_count = 0
+        for desired_available, ids in flips.items():
+            if not ids:
+                continue
+            update_query = (
+                supabase.table("menu")
+                .update({"available": desired_available})
+                .in_("id", ids)
+                .eq("restaurant_id", restaurant_id)
+            )
+            execute_with_retry(update_query.execute)
+            updated_count += len(ids)
 
-                desired_available = not insufficient
-                current_available = bool(product.get("available"))
-                if current_available != desired_available:
-                    update_query = (
-                        supabase.table("menu")
-                        .update({"available": desired_available})
-                        .eq("id", product_id)
-                        .eq("restaurant_id", restaurant_id)
-                    )
-                    if product_branch_id:
-                        update_query = update_query.eq("branch_id", product_branch_id)
-                    execute_with_retry(update_query.execute)
-                    updated_count += 1
+        if updated_count:
+            invalidate_recipe_graph(restaurant_id, branch_id)
+            invalidate_menu_snapshot(restaurant_id, branch_id)
+        return updated_count
 
-            return updated_count
-        except Exception as e:
-            logger.warning(f"No se pudo sincronizar disponibilidad por stock: {str(e)}")
-            return 0
-    
     def get_item_by_id(
         self,
         item_id: int,
@@ -264,6 +284,8 @@ class MenuService:
             
             created_item = response.data[0]
             logger.info(f"Producto creado: {created_item['name']} (ID: {created_item['id']})")
+            invalidate_recipe_graph(restaurant_id, resolved_branch_id)
+            invalidate_menu_snapshot(restaurant_id, resolved_branch_id)
             
             return self._normalize_menu_item(created_item)
             
@@ -331,6 +353,8 @@ class MenuService:
             
             updated_item = response.data[0]
             logger.info(f"Producto actualizado: {updated_item['name']} (ID: {item_id})")
+            invalidate_recipe_graph(restaurant_id, resolved_branch_id)
+            invalidate_menu_snapshot(restaurant_id, resolved_branch_id)
             
             return self._normalize_menu_item(updated_item)
             
@@ -370,6 +394,8 @@ class MenuService:
                 raise Exception("No se pudo eliminar el producto")
             
             logger.info(f"Producto eliminado: ID {item_id}")
+            invalidate_recipe_graph(restaurant_id, resolved_branch_id)
+            invalidate_menu_snapshot(restaurant_id, resolved_branch_id)
             return True
             
         except Exception as e:
@@ -0,0 +1,187 @@
+"""
+Snapshot público del menú por sucursal.
+
+Junta en una sola respuesta lo que la carta del comensal pedía por separado:
+categorías, productos disponibles con su precio después de promos por unidad,
+grupos de opciones con sus ítems (con inStock, sin la cantidad) y promociones
+visibles. Se arma una vez, se
+versiona con un hash del contenido (ETag) y se guarda en la caché compartida;
+mientras nada cambie, los QR escaneados reciben 304 sin tocar la base.
+Las escrituras de menú, categorías, opciones, disponibilidad y promociones
+invalidan el snapshot y el próximo pedido lo vuelve a armar.
+"""
+import hashlib
+import json
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from ..config import Config
+from ..db.query_executor import run_queries
+from ..db.supabase_client import supabase
+from ..utils.cache import get_cache, invalidate
+from ..utils.logger import setup_logger
+from .promotion_engine import display_prices
+from .promotion_index import get_promotion_index
+
+logger = setup_logger(__name__)
+
+MENU_SNAPSHOT_NAMESPACE = "menu-snapshot"
+
+_snapshot_cache = get_cache(
+    MENU_SNAPSHOT_NAMESPACE,
+    max_entries=Config.MENU_SNAPSHOT_MAX_ENTRIES,
+    ttl_seconds=Config.MENU_SNAPSHOT_TTL_SECONDS,
+    shared=True,
+)
+
+_PUBLIC_PROMOTION_FIELDS = ("id", "name", "type", "value", "description", "applicable_products")
+
+
+class MenuSnapshotService:
+    def get_cached(self, restaurant_id: str, branch_id: str) -> Optional[Dict[str, Any]]:
+        """Snapshot vigente ({"version", "snapshot"}) sin consultar la base, o None."""
+        entry = _snapshot_cache.get(_cache_key(restaurant_id, branch_id))
+        return entry if isinstance(entry, dict) and entry.get("version") else None
+
+    def get_snapshot(self, restaurant_id: str, branch_id: str) -> Dict[str, Any]:
+        """Devuelve {"version", "snapshot"}, armándolo si no está en caché."""
+        entry = self.get_cached(restaurant_id, branch_id)
+        if entry is None:
+            entry = self.build(restaurant_id, branch_id)
+            _snapshot_cache.set(_cache_key(restaurant_id, branch_id), entry)
+        return entry
+
+    def build(self, restaurant_id: str, branch_id: str) -> Dict[str, Any]:
+        def _run_branch():
+            return (
+                supabase.table("branches")
+                .select("id, restaurant_id")
+                .eq("id", branch_id)
+                .limit(1)
+                .execute()
+            )
+
+        def _run_menu():
+            return (
+                supabase.table("menu")
+                .select("*")
+                .eq("restaurant_id", restaurant_id)
+                .eq("branch_id", branch_id)
+                .eq("available", True)
+                .execute()
+            )
+
+        def _run_categories():
+            return (
+                supabase.table("menu_categories")
+                .select("id, name, active")
+                .eq("restaurant_id", restaurant_id)
+                .eq("branch_id", branch_id)
+                .order("name", desc=False)
+                .execute()
+            )
+
+        branch_resp, menu_resp, categories_resp = run_queries(
+            [_run_branch, _run_menu, _run_categories]
+        )
+        branch = (branch_resp.data or [None])[0]
+        if not branch or branch.get("restaurant_id") != restaurant_id:
+            raise LookupError("Sucursal no encontrada")
+
+        # Import diferido: menu_service importa este módulo para invalidar
+        from .menu_service import menu_service
+        from .product_options_service import product_options_service
+
+        items = [menu_service._normalize_menu_item(row) for row in (menu_resp.data or [])]
+        items.sort(key=lambda item: (item["category"] or "", item["name"] or "", item["id"]))
+        option_groups = product_options_service.groups_by_product(
+            restaurant_id, [item["id"] for item in items]
+        )
+        priced = display_prices(items, restaurant_id, branch_id)
+
+        snapshot_items = []
+        for item, price in zip(items, priced):
+            snapshot_items.append({
+                **{k: v for k, v in item.items() if k not in ("created_at", "updated_at")},
+                "displayPrice": price["finalPrice"],
+                "promotionId": price["promotionId"],
+                "hasOptions": bool(option_groups.get(item["id"])),
+            })
+
+        categories: List[str] = [
+            row["name"] for row in (categories_resp.data or []) if row.get("active", True)
+        ]
+        for item in items:
+            if item["category"] and item["category"] not in categories:
+                categories.append(item["category"])
+
+        snapshot = {
+            "branchId": branch_id,
+            "categories": categories,
+            "items": snapshot_items,
+            "optionGroups": {
+                product_id: [_public_group(group) for group in groups]
+                for product_id, groups in option_groups.items()
+            },
+            "promotions": _public_promotions(restaurant_id, branch_id),
+        }
+        version = hashlib.sha256(
+            json.dumps(snapshot, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()[:20]
+        snapshot["version"] = version
+        snapshot["generatedAt"] = datetime.now(timezone.utc).isoformat()
+        logger.info(
+            f"Snapshot de menú armado: restaurant={restaurant_id} branch={branch_id} "
+            f"items={len(snapshot_items)} version={version}"
+        )
+        return {"version": version, "snapshot": snapshot}
+
+
+def _public_group(group: Dict[str, Any]) -> Dict[str, Any]:
+    # La cantidad exacta cambia con cada pedido y no va en el snapshot; sólo si hay
+    # stock (inStock). Los movimientos que cruzan cero invalidan el snapshot
+    # (ingredients_service.record_movements_bulk).
+    return {
+        **{k: v for k, v in group.items() if k not in ("createdAt", "updatedAt", "items")},
+        "items": [
+            {
+                **{k: v for k, v in item.items() if k not in ("currentStock", "createdAt", "updatedAt")},
+                "inStock": _safe_stock(item.get("currentStock")) > 0,
+            }
+            for item in group.get("items") or []
+        ],
+    }
+
+
+def _safe_stock(value: Any) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _public_promotions(restaurant_id: str, branch_id: str) -> List[Dict[str, Any]]:
+    """Promos visibles al comensal (applies_to_all), igual que /promotions/public."""
+    index = get_promotion_index(restaurant_id, branch_id)
+    return [
+        {field: promo.raw.get(field) for field in _PUBLIC_PROMOTION_FIELDS}
+        for promo in index.promotions
+        if promo.raw.get("applies_to_all")
+    ]
+
+
+def _cache_key(restaurant_id: str, branch_id: Optional[str]) -> str:
+    return f"{restaurant_id}:{branch_id or 'all'}"
+
+
+def invalidate_menu_snapshot(restaurant_id: Optional[str], branch_id: Optional[str] = None) -> None:
+    """Descarta el snapshot de una sucursal, o de todo el restaurante si no se indica sucursal."""
+    if not restaurant_id:
+        invalidate(MENU_SNAPSHOT_NAMESPACE)
+    elif branch_id:
+        invalidate(MENU_SNAPSHOT_NAMESPACE, _cache_key(restaurant_id, branch_id))
+    else:
+        invalidate(MENU_SNAPSHOT_NAMESPACE, f"{restaurant_id}:")
+
+
+menu_snapshot_service = MenuSnapshotService()
@@ -9,7 +9,15 @@ import secrets
 
 from ..db.supabase_client import supabase
 from ..utils.logger import setup_logger
-from ..utils.token_manager import generate_token, validate_token, renew_token
+from ..utils.token_manager import (
+    generate_token,
+    get_mesa_token_state,
+    invalidate_token_state,
+    issue_signed_token,
+    renew_token,
+    signed_tokens_enabled,
+    validate_token,
+)
 from ..utils.retry import execute_with_retry
 
 logger = setup_logger(__name__)
@@ -128,6 +136,8 @@ class MesaService:
             response = supabase.table("mesas").insert(insert_data).execute()
             if not response.data:
                 raise Exception("No se pudo crear la mesa")
+            # Puede haber quedado cacheada como inexistente
+            invalidate_token_state(mesa_id, branch_id)
 
             generate_token(mesa_id, branch_id, expiry_minutes=30)
             new_mesa = self.get_mesa_by_id(mesa_id, branch_id=branch_id) or response.data[0]
@@ -162,6 +172,8 @@ class MesaService:
                 logger.warning(f"Mesa no encontrada para actualizar: {mesa_id}")
                 return None
 
+            # Sin sucursal puede haber tocado la mesa en varias: se descarta todo el estado cacheado
+            invalidate_token_state()
             updated_mesa = response.data[0]
             logger.info(f"Mesa {mesa_id} marcada como {'activa' if is_active else 'inactiva'}")
             return updated_mesa
@@ -233,6 +245,7 @@ class MesaService:
                 return None
 
             updated = response.data[0]
+            invalidate_token_state(mesa_id, branch_id)
 
             # Si cambió el mesa_id, regenerar token para el nuevo ID
             if update_data.get("mesa_id"):
@@ -255,6 +268,9 @@ class MesaService:
         Generar un nuevo token para una mesa
         """
         try:
+            if signed_tokens_enabled():
+                return self._issue_signed_session(mesa_id, branch_id, expiry_minutes)
+
             mesa = self.get_mesa_by_id(mesa_id, branch_id=branch_id)
             if not mesa:
                 raise ValueError(f"La mesa {mesa_id} no existe")
@@ -281,6 +297,7 @@ class MesaService:
 
             if not response.data:
                 raise Exception("No se pudo actualizar el token de mesa")
+            invalidate_token_state(mesa_id, branch_id)
 
             logger.info(f"Token generado para mesa {mesa_id}, expira en {expiry_minutes} minutos")
 
@@ -306,17 +323,8 @@ class MesaService:
             if not token:
                 raise ValueError("Token requerido")
 
+            # validate_token ya verifica vencimiento y estado de la mesa (con caché)
             is_valid = validate_token(mesa_id, branch_id, token)
-            mesa = self.get_mesa_by_id(mesa_id, branch_id=branch_id)
-            if mesa and mesa.get("token") == token:
-                expires_at = mesa.get("token_expires_at")
-                if expires_at:
-                    if isinstance(expires_at, str):
-                        expires_at = datetime.fromisoformat(expires_at.replace("Z", "+00:00"))
-
-                    if datetime.now(timezone.utc) > expires_at:
-                        is_valid = False
-                        logger.warning(f"Token expirado para mesa {mesa_id}")
 
             logger.info(f"Token validado para mesa {mesa_id}: {'válido' if is_valid else 'inválido'}")
 
@@ -337,6 +345,9 @@ class MesaService:
         Renovar el token de una mesa
         """
         try:
+            if signed_tokens_enabled():
+                return self._issue_signed_session(mesa_id, branch_id, expiry_minutes)
+
             mesa = self.get_mesa_by_id(mesa_id, branch_id=branch_id)
             if not mesa:
                 raise ValueError(f"La mesa {mesa_id} no existe")
@@ -360,6 +371,7 @@ class MesaService:
 
             if not response.data:
                 raise Exception("No se pudo actualizar el token de mesa")
+            invalidate_token_state(mesa_id, branch_id)
 
             logger.info(f"Token renovado para mesa {mesa_id}")
 
@@ -383,6 +395,10 @@ class MesaService:
         try:
             if not branch_id:
                 raise ValueError("branch_id requerido")
+            if signed_tokens_enabled():
+                # Sin estado: cada sesión recibe su propio token firmado
+                return self._issue_signed_session(mesa_id, branch_id, expiry_minutes)
+
             mesa = self.get_mesa_by_id(mesa_id, branch_id=branch_id)
             if not mesa:
                 raise ValueError(f"La mesa {mesa_id} no existe")
@@ -417,6 +433,23 @@ class MesaService:
             logger.error(f"Error obteniendo sesión para mesa {mesa_id}: {str(e)}")
             raise Exception("Error al obtener sesión de mesa")
 
+    def _issue_signed_session(self, mesa_id: str, branch_id: str, expiry_minutes: int) -> Dict:
+        """Token firmado a partir del estado cacheado de la mesa (sin escrituras)."""
+        state = get_mesa_token_state(mesa_id, branch_id)
+        if not state.get("exists"):
+            raise ValueError(f"La mesa {mesa_id} no existe")
+        if not state.get("is_active"):
+            raise ValueError(f"La mesa {mesa_id} no está activa")
+
+        token, expires_at = issue_signed_token(mesa_id, branch_id, expiry_minutes=expiry_minutes)
+        return {
+            "mesa_id": mesa_id,
+            "token": token,
+            "expires_in_minutes": expiry_minutes,
+            "expires_at": expires_at.isoformat(),
+            "allowed_payment_methods": state.get("allowed_payment_methods"),
+        }
+
     def delete_mesa(self, mesa_id: str, branch_id: str) -> bool:
         """
         Eliminar una mesa (requiere branch_id).
@@ -437,6 +470,7 @@ class MesaService:
                 .eq("branch_id", branch_id)
                 .execute()
             )
+            invalidate_token_state(mesa_id, branch_id)
 
             logger.info(f"Mesa {mesa_id} eliminada")
             return True
@@ -0,0 +1,185 @@
+"""
+Motor columnar (NumPy) para agregar métricas sobre ventanas grandes de pedidos.
+
+Convierte creation_date y total_amount en arrays y agrupa por mes / día / hora
+local con aritmética entera, en lugar de parsear y formatear fecha por fecha.
+Recibe la ventana completa (MetricsService la lee paginada). NumPy está en
+requirements.txt; si faltara, MetricsService sigue con el loop en Python.
+"""
+import warnings
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..config import Config
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depende del entorno
+    np = None
+
+_US_PER_MINUTE = 60 * 1_000_000
+
+
+def is_available(order_count: int) -> bool:
+    """True si conviene (y se puede) usar el motor columnar para esta cantidad de pedidos."""
+    return (
+        np is not None
+        and Config.METRICS_COLUMNAR_ENGINE
+        and order_count >= Config.METRICS_COLUMNAR_MIN_ORDERS
+    )
+
+
+def sales_monthly_totals(
+    orders: List[Dict[str, Any]],
+    offset_minutes: int,
+    start_local: datetime,
+    month_keys: List[str],
+) -> Dict[str, float]:
+    """Equivalente columnar de _sales_monthly_totals: suma de pedidos PAID por mes local."""
+    from .metrics_service import _ensure_utc
+
+    totals = {key: 0.0 for key in month_keys}
+    local_us, valid = _local_epoch_us(orders, offset_minutes)
+    mask = _paid_mask(orders) & valid & (local_us >= _epoch_us(_ensure_utc(start_local)))
+    if not mask.any():
+        return totals
+    amounts = _order_totals([orders[idx] for idx in np.flatnonzero(mask)])
+
+    months = local_us[mask].astype("datetime64[us]").astype("datetime64[M]")
+    unique_months, inverse = np.unique(months, return_inverse=True)
+    sums = np.bincount(inverse, weights=amounts, minlength=len(unique_months))
+    for month, total in zip(np.datetime_as_string(unique_months, unit="M"), sums):
+        if month in totals:
+            totals[month] += float(total)
+    return totals
+
+
+def top_products_bucket(
+    orders: List[Dict[str, Any]],
+    offset_minutes: int,
+    start_local: datetime,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Equivalente columnar del loop de get_top_products: aplana los items de los
+    pedidos PAID de la ventana en una tabla (pedido, producto, cantidad) y agrega.
+    """
+    from .metrics_service import _ensure_utc, _normalize_product_id, _safe_float
+
+    local_us, valid = _local_epoch_us(orders, offset_minutes)
+    in_window = _paid_mask(orders) & valid & (local_us >= _epoch_us(_ensure_utc(start_local)))
+
+    order_idx: List[int] = []
+    product_idx: List[int] = []
+    quantities: List[float] = []
+    products: Dict[str, int] = {}
+    product_meta: List[Tuple[Any, Optional[Any]]] = []
+    for idx in np.flatnonzero(in_window):
+        items = orders[idx].get("items")
+        if not isinstance(items, list):
+            continue
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            pid = _normalize_product_id(
+                item.get("item_id") or item.get("product_id") or item.get("id")
+            )
+            if pid is None:
+                continue
+            qty = _safe_float(item.get("quantity") or item.get("qty") or 0)
+            if qty <= 0:
+                continue
+            key = str(pid)
+            position = products.get(key)
+            if position is None:
+                position = len(product_meta)
+                products[key] = position
+                name = (
+                    item.get("name")
+                    or item.get("title")
+                    or item.get("product_name")
+                    or item.get("producto")
+                )
+                product_meta.append((pid, name))
+            order_idx.append(int(idx))
+            product_idx.append(position)
+            quantities.append(qty)
+
+    if not product_meta:
+        return {}
+
+    product_arr = np.asarray(product_idx, dtype=np.int64)
+    qty_totals = np.bincount(
+        product_arr, weights=np.asarray(quantities, dtype=np.float64), minlength=len(product_meta)
+    )
+    # Un pedido cuenta una sola vez por producto aunque lo repita en varias líneas
+    pairs = np.unique(np.asarray(order_idx, dtype=np.int64) * len(product_meta) + product_arr)
+    orders_count = np.bincount(pairs % len(product_meta), minlength=len(product_meta))
+
+    bucket: Dict[str, Dict[str, Any]] = {}
+    for key, position in products.items():
+        pid, name = product_meta[position]
+        bucket[key] = {
+            "product_id": pid,
+            "name": str(name) if name else "Producto",
+            "quantity": float(qty_totals[position]),
+            "orders_count": int(orders_count[position]),
+        }
+    return bucket
+
+
+def _local_epoch_us(
+    orders: List[Dict[str, Any]],
+    offset_minutes: int,
+) -> Tuple["np.ndarray", "np.ndarray"]:
+    """
+    Devuelve (microsegundos locales desde epoch, máscara de fechas válidas).
+    NumPy parsea en bloque las fechas ISO; si alguna no se puede parsear se recurre
+    a _parse_order_datetime fila por fila.
+    """
+    from .metrics_service import _ensure_utc, _parse_order_datetime
+
+    raw = [order.get("creation_date") for order in orders]
+    try:
+        with warnings.catch_warnings():
+            # NumPy avisa que convierte los offsets a UTC, que es justo lo que queremos.
+            # El caso común (+00:00) se recorta antes porque parsear offsets es lento.
+            warnings.simplefilter("ignore", UserWarning)
+            parsed = np.array(
+                [
+                    value[:-6] if isinstance(value, str) and value.endswith("+00:00") else value
+                    for value in raw
+                ],
+                dtype="datetime64[us]",
+            )
+        epoch_us = parsed.astype(np.int64)
+        valid = ~np.isnat(parsed)
+    except ValueError:
+        epoch_us = np.zeros(len(raw), dtype=np.int64)
+        valid = np.zeros(len(raw), dtype=bool)
+        for idx, value in enumerate(raw):
+            dt = _parse_order_datetime(value)
+            if dt is not None:
+                epoch_us[idx] = _epoch_us(_ensure_utc(dt))
+                valid[idx] = True
+    return epoch_us + offset_minutes * _US_PER_MINUTE, valid
+
+
+def _paid_mask(orders: List[Dict[str, Any]]) -> "np.ndarray":
+    return np.array([order.get("status") for order in orders], dtype=object) == "PAID"
+
+
+def _order_totals(orders: List[Dict[str, Any]]) -> "np.ndarray":
+    """total_amount como float; las filas sin total se calculan desde los items."""
+    from .metrics_service import _get_order_total
+
+    try:
+        amounts = np.array([order.get("total_amount") for order in orders], dtype=np.float64)
+    except (TypeError, ValueError):
+        return np.array([_get_order_total(order) for order in orders], dtype=np.float64)
+    for idx in np.flatnonzero(np.isnan(amounts)):
+        amounts[idx] = _get_order_total(orders[idx])
+    return amounts
+
+
+def _epoch_us(dt: datetime) -> int:
+    return int(round(dt.timestamp() * 1_000_000))
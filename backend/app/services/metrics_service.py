@@ -1,11 +1,23 @@
-from datetime import datetime, timedelta, timezone
-import time
+from datetime import date, datetime, timedelta, timezone
 from typing import Dict, List, Any, Optional
+from ..config import Config
 from ..db.supabase_client import supabase
+from ..db.query_executor import run_queries
+from ..utils.cache import get_cache, invalidate, invalidate_many
+from ..utils.keyset import iter_keyset_pages
 from ..utils.retry import execute_with_retry
+from . import metrics_columnar
+from .domain_events import ORDER_CREATED, ORDER_STATUS_CHANGED, subscribe
+from .sales_rollup_service import sales_rollup_service
 
-_METRICS_CACHE: Dict[str, Dict[str, Any]] = {}
 _METRICS_CACHE_TTL_SECONDS = 3 * 60 * 60
+_METRICS_NAMESPACE = "metrics"
+_METRICS_CACHE = get_cache(
+    _METRICS_NAMESPACE,
+    max_entries=Config.METRICS_CACHE_MAX_ENTRIES,
+    ttl_seconds=_METRICS_CACHE_TTL_SECONDS,
+    shared=True,
+)
 _ACCEPTED_ORDER_STATUSES = {
     "PAYMENT_APPROVED",
     "PAID",
@@ -16,21 +28,73 @@ _ACCEPTED_ORDER_STATUSES = {
 _CANCELLED_ORDER_STATUSES = {
     "CANCELLED",
 }
+# Ventana y tamaño de los widgets que arma /metrics/dashboard
+_DASHBOARD_DAYS = 30
+_DASHBOARD_TOP_PRODUCTS_LIMIT = 8
+# Días hacia atrás que cubre cada widget cacheado (None = histórico)
+_WIDGET_WINDOW_DAYS = {
+    "summary": 30,
+    "orders-status": 30,
+    "top-products": _DASHBOARD_DAYS,
+    "peak-hours": _DASHBOARD_DAYS,
+    "daily-revenue": 7,
+    "sales-monthly": 365,
+    "payment-methods": None,
+    "dashboard": None,
+}
+_PAYMENT_METHOD_LABELS = {
+    "BILLETERA": "Billetera",
+    "CARD": "Tarjeta",
+    "CASH": "Efectivo",
+    "QR": "QR",
+}
 
 def _cache_get(key: str) -> Optional[Any]:
-    entry = _METRICS_CACHE.get(key)
-    if not entry:
-        return None
-    if entry.get("expires_at", 0) <= time.time():
-        _METRICS_CACHE.pop(key, None)
-        return None
-    return entry.get("value")
+    return _METRICS_CACHE.get(key)
 
 def _cache_set(key: str, value: Any) -> None:
-    _METRICS_CACHE[key] = {
-        "value": value,
-        "expires_at": time.time() + _METRICS_CACHE_TTL_SECONDS,
-    }
+    _METRICS_CACHE.set(key, value)
+
+def invalidate_metrics_cache(restaurant_id: Optional[str]) -> None:
+    """Descarta las métricas cacheadas de un restaurante (todas sus sucursales, en todos los workers)."""
+    if restaurant_id:
+        invalidate(_METRICS_NAMESPACE, f"{restaurant_id}:")
+
+def invalidate_metrics_for_order(
+    restaurant_id: Optional[str],
+    branch_id: Optional[str],
+    creation_date: Any,
+) -> None:
+    """
+    Descarta solo lo que un cambio en este pedido puede alterar: su sucursal y el
+    agregado "all", y solo los widgets cuya ventana incluye la fecha del pedido.
+    """
+    if not restaurant_id:
+        return
+    dt = _parse_order_datetime(creation_date)
+    age_days = None
+    if dt:
+        age_days = (datetime.now(timezone.utc) - _ensure_utc(dt)).total_seconds() / 86400
+    branch_keys = {"all", str(branch_id)} if branch_id else {"all"}
+    prefixes = []
+    for branch_key in branch_keys:
+        for widget, window_days in _WIDGET_WINDOW_DAYS.items():
+            # +1 día de margen por el corte en hora local
+            if window_days is not None and age_days is not None and age_days > window_days + 1:
+                continue
+            prefixes.append(f"{restaurant_id}:{branch_key}:{widget}:")
+    # Un solo mensaje y un solo acceso a la capa compartida para todos los prefijos
+    invalidate_many(_METRICS_NAMESPACE, prefixes)
+
+def _on_order_event(event: Dict[str, Any]) -> None:
+    invalidate_metrics_for_order(
+        event.get("restaurant_id"),
+        event.get("branch_id"),
+        event.get("creation_date"),
+    )
+
+subscribe(ORDER_CREATED, _on_order_event)
+subscribe(ORDER_STATUS_CHANGED, _on_order_event)
 
 class MetricsService:
     @staticmethod
@@ -42,7 +106,7 @@ class MetricsService:
     ) -> Dict[str, Any]:
         """Resumen de métricas para el dashboard"""
         try:
-            cache_key = f"summary:{restaurant_id}:{branch_id or 'all'}:{tz_offset_minutes or 0}"
+            cache_key = f"{restaurant_id}:{branch_id or 'all'}:summary:{tz_offset_minutes or 0}"
             if not force_refresh:
                 cached = _cache_get(cache_key)
                 if cached is not None:
@@ -56,13 +120,27 @@ class MetricsService:
             month_start = now_local - timedelta(days=30)
             month_start_iso = _ensure_utc(month_start).isoformat()
 
-            query = supabase.table("orders").select(
-                "total_amount, items, creation_date, status"
-            ).eq("restaurant_id", restaurant_id).gte("creation_date", month_start_iso)
-            if branch_id:
-                query = query.eq("branch_id", branch_id)
-            response = execute_with_retry(query.execute)
-            orders = response.data or []
+            if sales_rollup_service.supports_offset(offset_minutes):
+                result = _from_rollups(
+                    "resumen", _summary_from_rollups, restaurant_id, branch_id, now_local
+                )
+                if result is not None:
+                    _cache_set(cache_key, result)
+                    return result
+
+            # Pedidos e ingredientes no dependen entre sí: un solo round trip de espera
+            orders, ingredient_stats = run_queries(
+                [
+                    lambda: _fetch_orders(
+                        restaurant_id,
+                        branch_id,
+                        "total_amount, items, creation_date, status",
+                        since_iso=month_start_iso,
+                    ),
+                    lambda: _get_ingredient_stats(restaurant_id, branch_id),
+                ],
+                retry=False,
+            )
 
             daily_sales = 0.0
             weekly_sales = 0.0
@@ -97,27 +175,7 @@ class MetricsService:
             top_list.sort(key=lambda x: (-x["quantity"], -x["revenue"], x["name"]))
             top_list = top_list[:5]
 
-            def _run_ingredients():
-                query = (
-                    supabase.table("ingredients")
-                    .select("current_stock, min_stock, track_stock, restaurant_id, branch_id")
-                    .eq("restaurant_id", restaurant_id)
-                )
-                if branch_id:
-                    query = query.eq("branch_id", branch_id)
-                return query.execute()
-            ingredients_resp = execute_with_retry(_run_ingredients)
-            ingredients = ingredients_resp.data or []
-            total_ingredients = len(ingredients)
-            low_stock_items = 0
-            for ing in ingredients:
-                track = ing.get("track_stock", True)
-                if not track:
-                    continue
-                current = _safe_float(ing.get("current_stock"))
-                minimum = _safe_float(ing.get("min_stock"))
-                if current <= minimum:
-                    low_stock_items += 1
+            total_ingredients, low_stock_items = ingredient_stats
 
             result = {
                 "dailySales": round(daily_sales, 2),
@@ -144,6 +202,70 @@ class MetricsService:
                 "topProducts": [],
             }
     @staticmethod
+    def get_dashboard(
+        restaurant_id: str,
+        branch_id: Optional[str] = None,
+        tz_offset_minutes: Optional[int] = None,
+        force_refresh: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Todas las métricas del dashboard en una sola respuesta.
+        Lee una única vez los pedidos (o los agregados) y calcula cada serie en una
+        sola pasada; cada clave tiene el mismo formato que su endpoint individual.
+        """
+        try:
+            cache_key = f"{restaurant_id}:{branch_id or 'all'}:dashboard:{tz_offset_minutes or 0}"
+            if not force_refresh:
+                cached = _cache_get(cache_key)
+                if cached is not None:
+                    return cached
+
+            offset_minutes = tz_offset_minutes or 0
+            result = None
+            if sales_rollup_service.supports_offset(offset_minutes):
+                result = _from_rollups(
+                    "dashboard", _dashboard_from_rollups, restaurant_id, branch_id, offset_minutes
+                )
+            if result is None:
+                result = _dashboard_from_orders(restaurant_id, branch_id, offset_minutes)
+
+            # Los widgets individuales quedan precalentados con los mismos valores
+            key_prefix = f"{restaurant_id}:{branch_id or 'all'}"
+            tz_key = tz_offset_minutes or 0
+            _cache_set(f"{key_prefix}:summary:{tz_key}", result["summary"])
+            _cache_set(f"{key_prefix}:sales-monthly:{tz_key}", result["salesMonthly"])
+            _cache_set(f"{key_prefix}:orders-status:{tz_key}", result["ordersStatus"])
+            _cache_set(f"{key_prefix}:daily-revenue:{tz_key}", result["dailyRevenue"])
+            _cache_set(f"{key_prefix}:payment-methods:{tz_key}", result["paymentMethods"])
+            _cache_set(
+                f"{key_prefix}:top-products:{tz_key}:{_DASHBOARD_DAYS}:{_DASHBOARD_TOP_PRODUCTS_LIMIT}",
+                result["topProducts"],
+            )
+            _cache_set(f"{key_prefix}:peak-hours:{tz_key}:{_DASHBOARD_DAYS}", result["peakHours"])
+            _cache_set(cache_key, result)
+            return result
+        except Exception as e:
+            print(f"Error getting dashboard: {e}")
+            return {
+                "summary": {
+                    "dailySales": 0,
+                    "weeklySales": 0,
+                    "monthlySales": 0,
+                    "totalOrders": 0,
+                    "averageOrderValue": 0,
+                    "totalIngredients": 0,
+                    "lowStockItems": 0,
+                    "topProducts": [],
+                },
+                "salesMonthly": {"labels": [], "values": []},
+                "ordersStatus": {"labels": [], "values": []},
+                "dailyRevenue": {"labels": [], "values": []},
+                "paymentMethods": {"labels": [], "values": []},
+                "topProducts": {"items": []},
+                "peakHours": {"labels": [], "values": []},
+            }
+
+    @staticmethod
     def get_sales_monthly(
         restaurant_id: str,
         branch_id: Optional[str] = None,
@@ -152,7 +274,7 @@ class MetricsService:
     ) -> Dict[str, List]:
         """Obtiene las ventas mensuales del último año"""
         try:
-            cache_key = f"sales-monthly:{restaurant_id}:{branch_id or 'all'}:{tz_offset_minutes or 0}"
+            cache_key = f"{restaurant_id}:{branch_id or 'all'}:sales-monthly:{tz_offset_minutes or 0}"
             if not force_refresh:
                 cached = _cache_get(cache_key)
                 if cached is not None:
@@ -163,38 +285,37 @@ class MetricsService:
             now_local = _apply_tz_offset(now_utc, offset_minutes)
             start = now_local - timedelta(days=365)
             start_iso = _ensure_utc(start).isoformat()
-            query = supabase.table("orders").select(
-                "total_amount, items, creation_date, status"
-            ).eq("restaurant_id", restaurant_id).eq("status", "PAID").gte("creation_date", start_iso)
-            if branch_id:
-                query = query.eq("branch_id", branch_id)
-            response = execute_with_retry(query.execute)
-            orders = response.data or []
-
-            # Mapear por mes (últimos 12)
-            month_labels = []
-            month_keys = []
-            for i in range(12):
-                dt = (now_local.replace(day=1) - timedelta(days=30 * (11 - i)))
-                key = dt.strftime("%Y-%m")
-                label = dt.strftime("%b").capitalize()
-                month_labels.append(label)
-                month_keys.append(key)
-
-            totals = {key: 0.0 for key in month_keys}
-            for order in orders:
-                status = order.get("status")
-                if status != "PAID":
-                    continue
-                dt = _parse_order_datetime(order.get("creation_date"))
-                if not dt:
-                    continue
-                local_dt = _apply_tz_offset(dt, offset_minutes)
-                if local_dt < start:
-                    continue
-                key = local_dt.strftime("%Y-%m")
-                if key in totals:
-                    totals[key] += _get_order_total(order)
+
+            month_labels, month_keys = _month_buckets(now_local)
+
+            if sales_rollup_service.supports_offset(offset_minutes):
+                daily = _from_rollups(
+                    "ventas mensuales",
+                    sales_rollup_service.get_daily,
+                    restaurant_id,
+                    branch_id,
+                    start.date(),
+                    now_local.date(),
+                )
+                if daily is not None:
+                    result = _sales_monthly_from_daily(daily, month_labels, month_keys)
+                    _cache_set(cache_key, result)
+                    return result
+
+            # Paginado: el motor columnar solo se activa con ventanas más grandes
+            # que lo que PostgREST devuelve en una sola respuesta
+            orders = _fetch_orders(
+                restaurant_id,
+                branch_id,
+                "total_amount, items, creation_date, status",
+                since_iso=start_iso,
+                status="PAID",
+            )
+
+            if metrics_columnar.is_available(len(orders)):
+                totals = metrics_columnar.sales_monthly_totals(orders, offset_minutes, start, month_keys)
+            else:
+                totals = _sales_monthly_totals(orders, offset_minutes, start, month_keys)
 
             values = [round(totals[key], 2) for key in month_keys]
             result = {"labels": month_labels, "values": values}
@@ -213,24 +334,32 @@ class MetricsService:
     ) -> Dict[str, List]:
         """Obtiene el conteo de pedidos por estado"""
         try:
-            cache_key = f"orders-status:{restaurant_id}:{branch_id or 'all'}:{tz_offset_minutes or 0}"
+            cache_key = f"{restaurant_id}:{branch_id or 'all'}:orders-status:{tz_offset_minutes or 0}"
             if not force_refresh:
                 cached = _cache_get(cache_key)
                 if cached is not None:
                     return cached
 
             offset_minutes = tz_offset_minutes or 0
-            _, start, start_iso, period_meta = _build_rolling_period(
+            now_local, start, start_iso, period_meta = _build_rolling_period(
                 days=30,
                 offset_minutes=offset_minutes,
             )
-            query = supabase.table("orders").select(
-                "status"
-            ).eq("restaurant_id", restaurant_id).gte("creation_date", start_iso)
-            if branch_id:
-                query = query.eq("branch_id", branch_id)
-            response = execute_with_retry(query.execute)
-            orders = response.data or []
+            if sales_rollup_service.supports_offset(offset_minutes):
+                daily = _from_rollups(
+                    "estado de pedidos",
+                    sales_rollup_service.get_daily,
+                    restaurant_id,
+                    branch_id,
+                    start.date(),
+                    now_local.date(),
+                )
+                if daily is not None:
+                    result = _orders_status_from_daily(daily, start.date(), period_meta)
+                    _cache_set(cache_key, result)
+                    return result
+
+            orders = _fetch_orders(restaurant_id, branch_id, "status, creation_date", since_iso=start_iso)
 
             accepted = 0
             cancelled = 0
@@ -261,7 +390,7 @@ class MetricsService:
     ) -> Dict[str, List]:
         """Obtiene los ingresos diarios de la última semana"""
         try:
-            cache_key = f"daily-revenue:{restaurant_id}:{branch_id or 'all'}:{tz_offset_minutes or 0}"
+            cache_key = f"{restaurant_id}:{branch_id or 'all'}:daily-revenue:{tz_offset_minutes or 0}"
             if not force_refresh:
                 cached = _cache_get(cache_key)
                 if cached is not None:
@@ -272,22 +401,32 @@ class MetricsService:
             now_local = _apply_tz_offset(now_utc, offset_minutes)
             start = now_local - timedelta(days=6)
             start_iso = _ensure_utc(start).isoformat()
-            query = supabase.table("orders").select(
-                "total_amount, items, creation_date, status"
-            ).eq("restaurant_id", restaurant_id).eq("status", "PAID").gte("creation_date", start_iso)
-            if branch_id:
-                query = query.eq("branch_id", branch_id)
-            response = execute_with_retry(query.execute)
-            orders = response.data or []
-
-            labels = []
-            keys = []
-            for i in range(7):
-                dt = (start + timedelta(days=i))
-                keys.append(dt.strftime("%Y-%m-%d"))
-                labels.append(dt.strftime("%a"))
-            totals = {key: 0.0 for key in keys}
 
+            labels, keys = _week_buckets(start)
+
+            if sales_rollup_service.supports_offset(offset_minutes):
+                daily = _from_rollups(
+                    "ingresos diarios",
+                    sales_rollup_service.get_daily,
+                    restaurant_id,
+                    branch_id,
+                    start.date(),
+                    now_local.date(),
+                )
+                if daily is not None:
+                    result = _daily_revenue_from_daily(daily, labels, keys)
+                    _cache_set(cache_key, result)
+                    return result
+
+            orders = _fetch_orders(
+                restaurant_id,
+                branch_id,
+                "total_amount, items, creation_date, status",
+                since_iso=start_iso,
+                status="PAID",
+            )
+
+            totals = {key: 0.0 for key in keys}
             for order in orders:
                 status = order.get("status")
                 if status != "PAID":
@@ -317,7 +456,7 @@ class MetricsService:
     ) -> Dict[str, Any]:
         """Obtiene el uso de métodos de pago"""
         try:
-            cache_key = f"payment-methods:{restaurant_id}:{branch_id or 'all'}:{tz_offset_minutes or 0}"
+            cache_key = f"{restaurant_id}:{branch_id or 'all'}:payment-methods:{tz_offset_minutes or 0}"
             if not force_refresh:
                 cached = _cache_get(cache_key)
                 if cached is not None:
@@ -326,51 +465,20 @@ class MetricsService:
             offset_minutes = tz_offset_minutes or 0
             now_utc = datetime.now(timezone.utc)
             now_local = _apply_tz_offset(now_utc, offset_minutes)
-            query = supabase.table("orders").select(
-                "payment_method, creation_date"
-            ).eq("restaurant_id", restaurant_id)
-            if branch_id:
-                query = query.eq("branch_id", branch_id)
-            response = execute_with_retry(query.execute)
-            orders = response.data or []
-
-            counts = {
-                "Billetera": 0,
-                "Tarjeta": 0,
-                "Efectivo": 0,
-                "QR": 0,
-            }
-            first_order_date_local: Optional[str] = None
 
-            for order in orders:
-                dt = _parse_order_datetime(order.get("creation_date"))
-                if dt:
-                    local_dt = _apply_tz_offset(dt, offset_minutes)
-                    local_date = local_dt.date().isoformat()
-                    if first_order_date_local is None or local_date < first_order_date_local:
-                        first_order_date_local = local_date
-
-                method = (order.get("payment_method") or "").upper()
-                if method == "BILLETERA":
-                    counts["Billetera"] += 1
-                elif method == "CARD":
-                    counts["Tarjeta"] += 1
-                elif method == "CASH":
-                    counts["Efectivo"] += 1
-                elif method == "QR":
-                    counts["QR"] += 1
-
-            labels = list(counts.keys())
-            values = [counts[label] for label in labels]
-            result = {
-                "labels": labels,
-                "values": values,
-                "period": {
-                    "type": "all_time",
-                    "from": first_order_date_local,
-                    "to": now_local.date().isoformat(),
-                },
-            }
+            if sales_rollup_service.supports_offset(offset_minutes):
+                daily = _from_rollups(
+                    "métodos de pago", sales_rollup_service.get_daily, restaurant_id, branch_id
+                )
+                if daily is not None:
+                    result = _payment_methods_from_daily(daily, now_local)
+                    _cache_set(cache_key, result)
+                    return result
+
+            counts, first_order_date_local = _count_payment_methods(
+                restaurant_id, branch_id, offset_minutes
+            )
+            result = _payment_methods_result(counts, first_order_date_local, now_local)
             _cache_set(cache_key, result)
             return result
         except Exception as e:
@@ -390,99 +498,44 @@ class MetricsService:
         Obtiene los productos más vendidos (últimos N días).
         """
         try:
-            cache_key = f"top-products:{restaurant_id}:{branch_id or 'all'}:{tz_offset_minutes or 0}:{days}:{limit}"
+            cache_key = f"{restaurant_id}:{branch_id or 'all'}:top-products:{tz_offset_minutes or 0}:{days}:{limit}"
             if not force_refresh:
                 cached = _cache_get(cache_key)
                 if cached is not None:
                     return cached
 
             offset_minutes = tz_offset_minutes or 0
-            _, start, start_iso, period_meta = _build_rolling_period(
+            now_local, start, start_iso, period_meta = _build_rolling_period(
                 days=max(1, days),
                 offset_minutes=offset_minutes,
             )
 
-            query = supabase.table("orders").select(
-                "items, creation_date, status"
-            ).eq("restaurant_id", restaurant_id).eq("status", "PAID").gte("creation_date", start_iso)
-            if branch_id:
-                query = query.eq("branch_id", branch_id)
-            response = execute_with_retry(query.execute)
-            orders = response.data or []
-
-            bucket: Dict[str, Dict[str, Any]] = {}
-            product_ids: set = set()
-
-            for order in orders:
-                if order.get("status") != "PAID":
-                    continue
-                dt = _parse_order_datetime(order.get("creation_date"))
-                if not dt:
-                    continue
-                local_dt = _apply_tz_offset(dt, offset_minutes)
-                if local_dt < start:
-                    continue
-
-                items = order.get("items") or []
-                if not isinstance(items, list):
-                    continue
-
-                seen_products_in_order = set()
-                for item in items:
-                    if not isinstance(item, dict):
-                        continue
-                    pid_raw = item.get("item_id") or item.get("product_id") or item.get("id")
-                    pid = _normalize_product_id(pid_raw)
-                    if pid is None:
-                        continue
-                    name = (
-                        item.get("name")
-                        or item.get("title")
-                        or item.get("product_name")
-                        or item.get("producto")
+            if sales_rollup_service.supports_offset(offset_minutes):
+                products = _from_rollups(
+                    "productos más vendidos",
+                    sales_rollup_service.get_products,
+                    restaurant_id,
+                    branch_id,
+                    start.date(),
+                    now_local.date(),
+                )
+                if products is not None:
+                    top_list = _finalize_top_products(
+                        _product_bucket_from_rollups(products), restaurant_id, branch_id, limit
                     )
-                    qty = _safe_float(item.get("quantity") or item.get("qty") or 0)
-                    if qty <= 0:
-                        continue
-                    key = str(pid)
-                    if key not in bucket:
-                        bucket[key] = {
-                            "product_id": pid,
-                            "name": str(name) if name else "Producto",
-                            "quantity": 0.0,
-                            "orders_count": 0,
-                        }
-                    bucket[key]["quantity"] += qty
-                    seen_products_in_order.add(key)
-                    product_ids.add(pid)
-
-                for key in seen_products_in_order:
-                    if key in bucket:
-                        bucket[key]["orders_count"] += 1
-
-            # Keep only existing products from menu and attach current data.
-            menu_by_id: Dict[str, Dict[str, Any]] = {}
-            if product_ids:
-                menu_query = supabase.table("menu").select("id, name, image_url").in_("id", list(product_ids))
-                if branch_id:
-                    menu_query = menu_query.eq("branch_id", branch_id)
-                menu_query = menu_query.eq("restaurant_id", restaurant_id)
-                menu_resp = execute_with_retry(menu_query.execute)
-                for row in (menu_resp.data or []):
-                    menu_by_id[str(row.get("id"))] = row
-
-            top_list = [item for key, item in bucket.items() if key in menu_by_id]
-            top_list.sort(key=lambda x: (-x["quantity"], x["name"]))
-            top_list = top_list[:max(1, limit)]
-
-            for item in top_list:
-                menu_row = menu_by_id.get(str(item.get("product_id")))
-                if not menu_row:
-                    item["image_url"] = None
-                    continue
-                item["name"] = menu_row.get("name") or item.get("name") or "Producto"
-                item["image_url"] = menu_row.get("image_url")
+                    result = {"items": top_list, "period": period_meta}
+                    _cache_set(cache_key, result)
+                    return result
+
+            orders = _fetch_orders(
+                restaurant_id, branch_id, "items, creation_date, status", since_iso=start_iso, status="PAID"
+            )
 
+            if metrics_columnar.is_available(len(orders)):
+                bucket = metrics_columnar.top_products_bucket(orders, offset_minutes, start)
+            else:
+                bucket = _top_products_bucket(orders, offset_minutes, start)
+            top_list = _finalize_top_products(bucket, restaurant_id, branch_id, limit)
             result = {"items": top_list, "period": period_meta}
             _cache_set(cache_key, result)
             return result
@@ -501,7 +554,7 @@ class MetricsService:
         Obtiene picos por horario (últimos N días).
         """
         try:
-            cache_key = f"peak-hours:{restaurant_id}:{branch_id or 'all'}:{tz_offset_minutes or 0}:{days}"
+            cache_key = f"{restaurant_id}:{branch_id or 'all'}:peak-hours:{tz_offset_minutes or 0}:{days}"
             cached = _cache_get(cache_key)
             if cached is not None:
                 return cached
@@ -511,18 +564,25 @@ class MetricsService:
             now_local = _apply_tz_offset(now_utc, offset_minutes)
             start = now_local - timedelta(days=max(1, days))
             start_iso = _ensure_utc(start).isoformat()
+            labels = [f"{hour:02d}:00" for hour in range(24)]
+
+            if sales_rollup_service.supports_offset(offset_minutes):
+                daily = _from_rollups(
+                    "horarios pico",
+                    sales_rollup_service.get_daily,
+                    restaurant_id,
+                    branch_id,
+                    start.date(),
+                    now_local.date(),
+                )
+                if daily is not None:
+                    result = {"labels": labels, "values": _peak_hours_from_daily(daily, start.date())}
+                    _cache_set(cache_key, result)
+                    return result
 
-            query = (
-                supabase.table("orders")
-                .select("creation_date, status")
-                .eq("restaurant_id", restaurant_id)
-                .eq("status", "PAID")
-                .gte("creation_date", start_iso)
+            orders = _fetch_orders(
+                restaurant_id, branch_id, "creation_date, status", since_iso=start_iso, status="PAID"
             )
-            if branch_id:
-                query = query.eq("branch_id", branch_id)
-            response = execute_with_retry(query.execute)
-            orders = response.data or []
 
             counts = {hour: 0 for hour in range(24)}
             for order in orders:
@@ -532,7 +592,6 @@ class MetricsService:
                 local_dt = _apply_tz_offset(dt, offset_minutes)
                 counts[local_dt.hour] += 1
 
-            labels = [f"{hour:02d}:00" for hour in range(24)]
             values = [counts[hour] for hour in range(24)]
             result = {"labels": labels, "values": values}
             _cache_set(cache_key, result)
@@ -662,3 +721,556 @@ def _accumulate_top_products(bucket: Dict[str, Dict[str, float]], items: Any) ->
             bucket[key] = {"name": str(name), "quantity": 0.0, "revenue": 0.0}
         bucket[key]["quantity"] += qty
         bucket[key]["revenue"] += revenue
+
+
+def _from_rollups(label: str, builder, *args) -> Optional[Any]:
+    """Ejecuta una lectura de agregados; None indica que hay que recalcular desde orders."""
+    try:
+        return builder(*args)
+    except Exception as e:
+        print(f"Agregados de ventas no disponibles ({label}), se recalcula desde orders: {e}")
+        return None
+
+
+def _summary_from_rollups(
+    restaurant_id: str,
+    branch_id: Optional[str],
+    now_local: datetime,
+    daily: Optional[Dict[str, Dict[str, Any]]] = None,
+    products: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> Dict[str, Any]:
+    today = now_local.date()
+    week_start = today - timedelta(days=6)
+    month_start = today - timedelta(days=30)
+    if daily is None:
+        daily = sales_rollup_service.get_daily(restaurant_id, branch_id, month_start, today)
+    if products is None:
+        products = sales_rollup_service.get_products(restaurant_id, branch_id, month_start, today)
+
+    daily_sales = 0.0
+    weekly_sales = 0.0
+    monthly_sales = 0.0
+    paid_orders_month = 0
+    total_orders_month = 0
+    for day, row in daily.items():
+        if day < month_start.isoformat():
+            continue
+        monthly_sales += row["revenue"]
+        paid_orders_month += row["paid_orders"]
+        total_orders_month += row["orders_created"]
+        if day >= week_start.isoformat():
+            weekly_sales += row["revenue"]
+        if day == today.isoformat():
+            daily_sales += row["revenue"]
+
+    avg_order_value = monthly_sales / paid_orders_month if paid_orders_month else 0.0
+
+    top_list = []
+    for product_id, row in products.items():
+        if row["quantity"] <= 0:
+            continue
+        name = row.get("name") or f"Producto {product_id}"
+        top_list.append({"name": str(name), "quantity": row["quantity"], "revenue": row["revenue"]})
+    top_list.sort(key=lambda x: (-x["quantity"], -x["revenue"], x["name"]))
+
+    total_ingredients, low_stock_items = _get_ingredient_stats(restaurant_id, branch_id)
+    return {
+        "dailySales": round(daily_sales, 2),
+        "weeklySales": round(weekly_sales, 2),
+        "monthlySales": round(monthly_sales, 2),
+        "totalOrders": total_orders_month,
+        "averageOrderValue": round(avg_order_value, 2),
+        "totalIngredients": total_ingredients,
+        "lowStockItems": low_stock_items,
+        "topProducts": top_list[:5],
+    }
+
+
+def _get_ingredient_stats(restaurant_id: str, branch_id: Optional[str]) -> tuple[int, int]:
+    """Devuelve (total de ingredientes, ingredientes con stock bajo)."""
+    def _run_ingredients():
+        query = (
+            supabase.table("ingredients")
+            .select("current_stock, min_stock, track_stock, restaurant_id, branch_id")
+            .eq("restaurant_id", restaurant_id)
+        )
+        if branch_id:
+            query = query.eq("branch_id", branch_id)
+        return query.execute()
+    ingredients_resp = execute_with_retry(_run_ingredients)
+    ingredients = ingredients_resp.data or []
+    low_stock_items = 0
+    for ing in ingredients:
+        track = ing.get("track_stock", True)
+        if not track:
+            continue
+        current = _safe_float(ing.get("current_stock"))
+        minimum = _safe_float(ing.get("min_stock"))
+        if current <= minimum:
+            low_stock_items += 1
+    return len(ingredients), low_stock_items
+
+
+def _finalize_top_products(
+    bucket: Dict[str, Dict[str, Any]],
+    restaurant_id: str,
+    branch_id: Optional[str],
+    limit: int,
+) -> List[Dict[str, Any]]:
+    # Keep only existing products from menu and attach current data.
+    menu_by_id: Dict[str, Dict[str, Any]] = {}
+    product_ids = [item["product_id"] for item in bucket.values()]
+    if product_ids:
+        menu_query = supabase.table("menu").select("id, name, image_url").in_("id", product_ids)
+        if branch_id:
+            menu_query = menu_query.eq("branch_id", branch_id)
+        menu_query = menu_query.eq("restaurant_id", restaurant_id)
+        menu_resp = execute_with_retry(menu_query.execute)
+        for row in (menu_resp.data or []):
+            menu_by_id[str(row.get("id"))] = row
+
+    top_list = [item for key, item in bucket.items() if key in menu_by_id]
+    top_list.sort(key=lambda x: (-x["quantity"], x["name"]))
+    top_list = top_list[:max(1, limit)]
+
+    for item in top_list:
+        menu_row = menu_by_id.get(str(item.get("product_id")))
+        if not menu_row:
+            item["image_url"] = None
+            continue
+        item["name"] = menu_row.get("name") or item.get("name") or "Producto"
+        item["image_url"] = menu_row.get("image_url")
+    return top_list
+
+
+def _dashboard_from_orders(
+    restaurant_id: str,
+    branch_id: Optional[str],
+    offset_minutes: int,
+) -> Dict[str, Any]:
+    """
+    Una sola consulta a orders con las columnas que usan todos los widgets y una
+    sola pasada. Cada serie respeta el mismo corte que su método individual.
+    """
+    now_local, month_start, _, period_meta = _build_rolling_period(
+        days=_DASHBOARD_DAYS,
+        offset_minutes=offset_minutes,
+    )
+    day_start = now_local.replace(hour=0, minute=0, second=0, microsecond=0)
+    week_start = now_local - timedelta(days=6)
+    year_start = now_local - timedelta(days=365)
+    # Los métodos individuales filtran creation_date en la base contra estos valores
+    week_cutoff = _ensure_utc(week_start)
+    month_cutoff = _ensure_utc(month_start)
+    year_cutoff = _ensure_utc(year_start)
+
+    month_labels, month_keys = _month_buckets(now_local)
+    day_labels, day_keys = _week_buckets(week_start)
+
+    # La ventana común llega hasta la serie con fecha más larga (ventas mensuales);
+    # medios de pago es histórico y se cuenta aparte leyendo solo esa columna
+    orders = _fetch_orders(
+        restaurant_id,
+        branch_id,
+        "total_amount, items, creation_date, status",
+        since_iso=year_cutoff.isoformat(),
+    )
+
+    daily_sales = 0.0
+    weekly_sales = 0.0
+    monthly_sales = 0.0
+    paid_orders_month = 0
+    total_orders_month = 0
+    summary_products: Dict[str, Dict[str, float]] = {}
+    monthly_totals = {key: 0.0 for key in month_keys}
+    daily_totals = {key: 0.0 for key in day_keys}
+    accepted = 0
+    cancelled = 0
+    product_bucket: Dict[str, Dict[str, Any]] = {}
+    hour_counts = [0] * 24
+
+    for order in orders:
+        dt = _parse_order_datetime(order.get("creation_date"))
+        if not dt:
+            continue
+        utc_dt = _ensure_utc(dt)
+        local_dt = _apply_tz_offset(dt, offset_minutes)
+        local_date = local_dt.date().isoformat()
+
+        in_month_window = utc_dt >= month_cutoff
+        if in_month_window:
+            if local_dt >= month_start:
+                total_orders_month += 1
+            status = str(order.get("status") or "").upper()
+            if status in _CANCELLED_ORDER_STATUSES:
+                cancelled += 1
+            elif status in _ACCEPTED_ORDER_STATUSES:
+                accepted += 1
+
+        if order.get("status") != "PAID":
+            continue
+        total = _get_order_total(order)
+
+        if utc_dt >= year_cutoff and local_dt >= year_start:
+            month_key = local_dt.strftime("%Y-%m")
+            if month_key in monthly_totals:
+                monthly_totals[month_key] += total
+        if utc_dt >= week_cutoff and local_date in daily_totals:
+            daily_totals[local_date] += total
+        if not in_month_window:
+            continue
+
+        hour_counts[local_dt.hour] += 1
+        if local_dt >= day_start:
+            daily_sales += total
+        if local_dt >= week_start:
+            weekly_sales += total
+        if local_dt >= month_start:
+            monthly_sales += total
+            paid_orders_month += 1
+            _accumulate_top_products(summary_products, order.get("items"))
+            _accumulate_product_bucket(product_bucket, order.get("items"))
+
+    summary_top = list(summary_products.values())
+    summary_top.sort(key=lambda x: (-x["quantity"], -x["revenue"], x["name"]))
+    payment_counts, first_order_date_local = _count_payment_methods(
+        restaurant_id, branch_id, offset_minutes
+    )
+    total_ingredients, low_stock_items = _get_ingredient_stats(restaurant_id, branch_id)
+    avg_order_value = monthly_sales / paid_orders_month if paid_orders_month else 0.0
+
+    return {
+        "summary": {
+            "dailySales": round(daily_sales, 2),
+            "weeklySales": round(weekly_sales, 2),
+            "monthlySales": round(monthly_sales, 2),
+            "totalOrders": total_orders_month,
+            "averageOrderValue": round(avg_order_value, 2),
+            "totalIngredients": total_ingredients,
+            "lowStockItems": low_stock_items,
+            "topProducts": summary_top[:5],
+        },
+        "salesMonthly": {
+            "labels": month_labels,
+            "values": [round(monthly_totals[key], 2) for key in month_keys],
+        },
+        "ordersStatus": {
+            "labels": ["Aceptados", "Cancelados"],
+            "values": [accepted, cancelled],
+            "period": period_meta,
+        },
+        "dailyRevenue": {
+            "labels": day_labels,
+            "values": [round(daily_totals[key], 2) for key in day_keys],
+        },
+        "paymentMethods": _payment_methods_result(payment_counts, first_order_date_local, now_local),
+        "topProducts": {
+            "items": _finalize_top_products(
+                product_bucket, restaurant_id, branch_id, _DASHBOARD_TOP_PRODUCTS_LIMIT
+            ),
+            "period": period_meta,
+        },
+        "peakHours": {
+            "labels": [f"{hour:02d}:00" for hour in range(24)],
+            "values": hour_counts,
+        },
+    }
+
+
+def _dashboard_from_rollups(
+    restaurant_id: str,
+    branch_id: Optional[str],
+    offset_minutes: int,
+) -> Dict[str, Any]:
+    """Mismo resultado que _dashboard_from_orders leyendo una vez cada tabla de agregados."""
+    now_local, month_start, _, period_meta = _build_rolling_period(
+        days=_DASHBOARD_DAYS,
+        offset_minutes=offset_minutes,
+    )
+    daily = sales_rollup_service.get_daily(restaurant_id, branch_id)
+    products = sales_rollup_service.get_products(
+        restaurant_id, branch_id, month_start.date(), now_local.date()
+    )
+    month_labels, month_keys = _month_buckets(now_local)
+    day_labels, day_keys = _week_buckets(now_local - timedelta(days=6))
+    return {
+        "summary": _summary_from_rollups(restaurant_id, branch_id, now_local, daily, products),
+        "salesMonthly": _sales_monthly_from_daily(daily, month_labels, month_keys),
+        "ordersStatus": _orders_status_from_daily(daily, month_start.date(), period_meta),
+        "dailyRevenue": _daily_revenue_from_daily(daily, day_labels, day_keys),
+        "paymentMethods": _payment_methods_from_daily(daily, now_local),
+        "topProducts": {
+            "items": _finalize_top_products(
+                _product_bucket_from_rollups(products),
+                restaurant_id,
+                branch_id,
+                _DASHBOARD_TOP_PRODUCTS_LIMIT,
+            ),
+            "period": period_meta,
+        },
+        "peakHours": {
+            "labels": [f"{hour:02d}:00" for hour in range(24)],
+            "values": _peak_hours_from_daily(daily, month_start.date()),
+        },
+    }
+
+
+def _month_buckets(now_local: datetime) -> tuple[List[str], List[str]]:
+    """Etiquetas y claves YYYY-MM de los últimos 12 meses."""
+    month_labels = []
+    month_keys = []
+    for i in range(12):
+        dt = (now_local.replace(day=1) - timedelta(days=30 * (11 - i)))
+        month_keys.append(dt.strftime("%Y-%m"))
+        month_labels.append(dt.strftime("%b").capitalize())
+    return month_labels, month_keys
+
+
+def _week_buckets(start: datetime) -> tuple[List[str], List[str]]:
+    """Etiquetas y claves YYYY-MM-DD de los 7 días a partir de start."""
+    labels = []
+    keys = []
+    for i in range(7):
+        dt = (start + timedelta(days=i))
+        keys.append(dt.strftime("%Y-%m-%d"))
+        labels.append(dt.strftime("%a"))
+    return labels, keys
+
+
+def _fetch_orders(
+    restaurant_id: str,
+    branch_id: Optional[str],
+    columns: str,
+    since_iso: Optional[str] = None,
+    status: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Todos los pedidos del filtro recorridos por keyset en (creation_date, id): una
+    sola consulta queda recortada por el máximo de filas de PostgREST.
+    """
+    def _query():
+        query = supabase.table("orders").select(f"id, {columns}").eq("restaurant_id", restaurant_id)
+        if branch_id:
+            query = query.eq("branch_id", branch_id)
+        if status:
+            query = query.eq("status", status)
+        if since_iso:
+            query = query.gte("creation_date", since_iso)
+        return query
+
+    orders: List[Dict[str, Any]] = []
+    for page in iter_keyset_pages(_query, "creation_date", True, Config.METRICS_ORDERS_PAGE_SIZE):
+        orders.extend(page)
+    return orders
+
+
+def _count_payment_methods(
+    restaurant_id: str,
+    branch_id: Optional[str],
+    offset_minutes: int,
+) -> tuple[Dict[str, int], Optional[str]]:
+    """
+    Conteo histórico por medio de pago y primer día local con pedidos. Recorre por
+    id (los pedidos sin creation_date también cuentan) trayendo solo dos columnas.
+    """
+    def _query():
+        query = supabase.table("orders").select(
+            "id, payment_method, creation_date"
+        ).eq("restaurant_id", restaurant_id)
+        if branch_id:
+            query = query.eq("branch_id", branch_id)
+        return query
+
+    counts = _empty_payment_counts()
+    first_order_date_local: Optional[str] = None
+    for page in iter_keyset_pages(_query, "id", False, Config.METRICS_ORDERS_PAGE_SIZE):
+        for order in page:
+            dt = _parse_order_datetime(order.get("creation_date"))
+            if dt:
+                local_date = _apply_tz_offset(dt, offset_minutes).date().isoformat()
+                if first_order_date_local is None or local_date < first_order_date_local:
+                    first_order_date_local = local_date
+            _count_payment_method(counts, order.get("payment_method"))
+    return counts, first_order_date_local
+
+
+def _empty_payment_counts() -> Dict[str, int]:
+    return {label: 0 for label in _PAYMENT_METHOD_LABELS.values()}
+
+
+def _count_payment_method(counts: Dict[str, int], payment_method: Any) -> None:
+    label = _PAYMENT_METHOD_LABELS.get((payment_method or "").upper())
+    if label:
+        counts[label] += 1
+
+
+def _payment_methods_result(
+    counts: Dict[str, int],
+    first_order_date_local: Optional[str],
+    now_local: datetime,
+) -> Dict[str, Any]:
+    labels = list(counts.keys())
+    return {
+        "labels": labels,
+        "values": [counts[label] for label in labels],
+        "period": {
+            "type": "all_time",
+            "from": first_order_date_local,
+            "to": now_local.date().isoformat(),
+        },
+    }
+
+
+def _sales_monthly_from_daily(
+    daily: Dict[str, Dict[str, Any]],
+    month_labels: List[str],
+    month_keys: List[str],
+) -> Dict[str, List]:
+    totals = {key: 0.0 for key in month_keys}
+    for day, row in daily.items():
+        if day[:7] in totals:
+            totals[day[:7]] += row["revenue"]
+    return {"labels": month_labels, "values": [round(totals[key], 2) for key in month_keys]}
+
+
+def _orders_status_from_daily(
+    daily: Dict[str, Dict[str, Any]],
+    start_day: date,
+    period_meta: Dict[str, Any],
+) -> Dict[str, Any]:
+    rows = [row for day, row in daily.items() if day >= start_day.isoformat()]
+    return {
+        "labels": ["Aceptados", "Cancelados"],
+        "values": [
+            sum(row["accepted_orders"] for row in rows),
+            sum(row["cancelled_orders"] for row in rows),
+        ],
+        "period": period_meta,
+    }
+
+
+def _daily_revenue_from_daily(
+    daily: Dict[str, Dict[str, Any]],
+    labels: List[str],
+    keys: List[str],
+) -> Dict[str, List]:
+    values = [round(daily[key]["revenue"] if key in daily else 0.0, 2) for key in keys]
+    return {"labels": labels, "values": values}
+
+
+def _payment_methods_from_daily(
+    daily: Dict[str, Dict[str, Any]],
+    now_local: datetime,
+) -> Dict[str, Any]:
+    # orders_* cuenta todos los pedidos por medio de pago, igual que el recorrido de orders
+    counts = _empty_payment_counts()
+    counts["Billetera"] = sum(row["orders_wallet"] for row in daily.values())
+    counts["Tarjeta"] = sum(row["orders_card"] for row in daily.values())
+    counts["Efectivo"] = sum(row["orders_cash"] for row in daily.values())
+    counts["QR"] = sum(row["orders_qr"] for row in daily.values())
+    days_with_orders = [day for day, row in daily.items() if row["orders_created"] > 0]
+    first_day = min(days_with_orders) if days_with_orders else None
+    return _payment_methods_result(counts, first_day, now_local)
+
+
+def _peak_hours_from_daily(daily: Dict[str, Dict[str, Any]], start_day: date) -> List[int]:
+    values = [0] * 24
+    for day, row in daily.items():
+        if day < start_day.isoformat():
+            continue
+        for hour, count in enumerate(row["paid_orders_by_hour"]):
+            values[hour] += count
+    return values
+
+
+def _product_bucket_from_rollups(products: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    bucket: Dict[str, Dict[str, Any]] = {}
+    for key, row in products.items():
+        pid = _normalize_product_id(key)
+        if pid is None or row["quantity"] <= 0:
+            continue
+        bucket[str(pid)] = {
+            "product_id": pid,
+            "name": str(row.get("name") or "Producto"),
+            "quantity": row["quantity"],
+            "orders_count": row["orders_count"],
+        }
+    return bucket
+
+
+def _sales_monthly_totals(
+    orders: List[Dict[str, Any]],
+    offset_minutes: int,
+    start: datetime,
+    month_keys: List[str],
+) -> Dict[str, float]:
+    totals = {key: 0.0 for key in month_keys}
+    for order in orders:
+        status = order.get("status")
+        if status != "PAID":
+            continue
+        dt = _parse_order_datetime(order.get("creation_date"))
+        if not dt:
+            continue
+        local_dt = _apply_tz_offset(dt, offset_minutes)
+        if local_dt < start:
+            continue
+        key = local_dt.strftime("%Y-%m")
+        if key in totals:
+            totals[key] += _get_order_total(order)
+    return totals
+
+
+def _top_products_bucket(
+    orders: List[Dict[str, Any]],
+    offset_minutes: int,
+    start: datetime,
+) -> Dict[str, Dict[str, Any]]:
+    bucket: Dict[str, Dict[str, Any]] = {}
+    for order in orders:
+        if order.get("status") != "PAID":
+            continue
+        dt = _parse_order_datetime(order.get("creation_date"))
+        if not dt:
+            continue
+        local_dt = _apply_tz_offset(dt, offset_minutes)
+        if local_dt < start:
+            continue
+        _accumulate_product_bucket(bucket, order.get("items"))
+    return bucket
+
+
+def _accumulate_product_bucket(bucket: Dict[str, Dict[str, Any]], items: Any) -> None:
+    """Suma cantidades por product_id y cuenta en cuántos pedidos aparece cada uno."""
+    if not isinstance(items, list):
+        return
+    seen_products_in_order = set()
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        pid_raw = item.get("item_id") or item.get("product_id") or item.get("id")
+        pid = _normalize_product_id(pid_raw)
+        if pid is None:
+            continue
+        name = (
+            item.get("name")
+            or item.get("title")
+            or item.get("product_name")
+            or item.get("producto")
+        )
+        qty = _safe_float(item.get("quantity") or item.get("qty") or 0)
+        if qty <= 0:
+            continue
+        key = str(pid)
+        if key not in bucket:
+            bucket[key] = {
+                "product_id": pid,
+                "name": str(name) if name else "Producto",
+                "quantity": 0.0,
+                "orders_count": 0,
+            }
+        bucket[key]["quantity"] += qty
+        seen_products_in_order.add(key)
+
+    for key in seen_products_in_order:
+        bucket[key]["orders_count"] += 1
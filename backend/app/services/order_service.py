@@ -2,21 +2,30 @@
 Servicio de Pedidos - Lógica de negocio para órdenes (Supabase)
 """
 from typing import List, Dict, Optional, Union, Tuple
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 import uuid
 
+from ..config import Config
 from ..db.supabase_client import supabase
+from ..db.query_executor import run_queries
 from ..db.models import OrderStatus
 from ..utils.token_manager import validate_token, renew_token, invalidate_token
 from ..utils.logger import setup_logger
 from ..utils.retry import execute_with_retry
-from ..socketio import socketio
+from ..utils.keyset import apply_keyset, decode_cursor, encode_cursor, order_keyset, split_page
 from ..services.cash_service import cash_service
 from .ingredients_service import ingredients_service
 from .promotion_engine import apply_promotions_to_items
+from .recipe_graph import get_recipe_graph
+from .domain_events import ORDER_CREATED, ORDER_STATUS_CHANGED, publish_order_event
+from .realtime import ORDER_CREATED_CHANGE, ORDER_UPDATED_CHANGE, emit_order_delta
 
 logger = setup_logger(__name__)
 
+# Tipos de cursor del feed de pedidos: historial por creation_date y sync por updated_at
+_PAGE_CURSOR = "orders"
+_SYNC_CURSOR = "orders-sync"
+
 
 class OrderService:
     """Servicio para manejar operaciones de pedidos"""
@@ -27,9 +36,13 @@ class OrderService:
         self,
         branch_id: Optional[str] = None,
         restaurant_id: Optional[str] = None,
+        status: Optional[str] = None,
     ) -> List[Dict]:
         """
-        Obtener todos los pedidos
+        Obtener todos los pedidos (más nuevos primero)
+
+        Recorre el feed paginado por cursor hasta agotarlo, así la respuesta no
+        queda truncada por el tope de filas de PostgREST.
 
         Returns:
             Lista de pedidos serializados
@@ -38,25 +51,192 @@ class OrderService:
             Exception: Si hay error al consultar la base de datos
         """
         try:
-            query = supabase.table("orders").select("*")
-            if restaurant_id:
-                query = query.eq("restaurant_id", restaurant_id)
-            if branch_id:
-                query = query.eq("branch_id", branch_id)
-            response = execute_with_retry(query.execute)
-            orders = response.data or []
-            orders.sort(
-                key=lambda order: order.get("created_at")
-                or order.get("creation_date")
-                or "",
-                reverse=True,
-            )
-            return [self._serialize_order(order) for order in orders]
+            orders: List[Dict] = []
+            cursor = None
+            while True:
+                page = self.list_orders_page(
+                    restaurant_id=restaurant_id,
+                    branch_id=branch_id,
+                    status=status,
+                    limit=Config.ORDERS_PAGE_MAX_LIMIT,
+                    cursor=cursor,
+                    include_sync_cursor=False,
+                )
+                orders.extend(page["orders"])
+                cursor = page["next_cursor"]
+                if not cursor:
+                    return orders
 
         except Exception as e:
             logger.error(f"Error al obtener pedidos: {str(e)}")
             raise Exception(f"Error al consultar pedidos: {str(e)}")
 
+    def list_orders_page(
+        self,
+        restaurant_id: Optional[str] = None,
+        branch_id: Optional[str] = None,
+        status: Optional[str] = None,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        include_sync_cursor: bool = True,
+    ) -> Dict:
+        """
+        Una página de pedidos ordenada por creation_date (desc) e id.
+
+        Returns:
+            {"orders", "next_cursor", "sync_cursor"}: next_cursor pide la página
+            siguiente (None si no hay más); sync_cursor es la marca desde la cual
+            pedir cambios con list_orders_since.
+
+        Raises:
+            ValueError: Si el cursor o los filtros no son válidos
+        """
+        limit = self._page_limit(limit)
+
+        def _run_page():
+            query = self._orders_query(restaurant_id, branch_id, status)
+            if date_from:
+                query = query.gte("creation_date", date_from)
+            if date_to:
+                query = query.lt("creation_date", date_to)
+            if cursor:
+                value, row_id = decode_cursor(cursor, _PAGE_CURSOR)
+                query = apply_keyset(query, "creation_date", value, row_id, descending=True)
+            query = order_keyset(query, "creation_date", descending=True)
+            return query.limit(limit + 1).execute()
+
+        def _run_watermark():
+            query = self._orders_query(restaurant_id, branch_id, None, columns="id, updated_at")
+            return order_keyset(query, "updated_at", descending=True).limit(1).execute()
+
+        if cursor:
+            # Validar antes de consultar: un cursor roto es un 400, no un 500
+            decode_cursor(cursor, _PAGE_CURSOR)
+        calls = [_run_page, _run_watermark] if include_sync_cursor else [_run_page]
+        responses = run_queries(calls)
+        rows, next_cursor = split_page(responses[0].data or [], limit, _PAGE_CURSOR, "creation_date")
+
+        sync_cursor = None
+        if include_sync_cursor:
+            latest = (responses[1].data or [None])[0]
+            if latest and latest.get("updated_at"):
+                sync_cursor = encode_cursor(_SYNC_CURSOR, latest["updated_at"], latest["id"])
+
+        return {
+            "orders": [self._serialize_order(order) for order in rows],
+            "next_cursor": next_cursor,
+            "sync_cursor": sync_cursor,
+        }
+
+    def list_orders_since(
+        self,
+        since: str,
+        restaurant_id: Optional[str] = None,
+        branch_id: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> Dict:
+        """
+        Pedidos creados o modificados después del sync_cursor del cliente,
+        en orden de updated_at (asc). No se filtra por estado: un pedido que sale
+        del filtro del cliente (p. ej. pasa a DELIVERED) también tiene que llegar.
+
+        updated_at sale de clock_timestamp() en el trigger, así que una transacción
+        que confirma tarde puede quedar con una marca anterior al cursor ya
+        entregado: además de la página se relee una ventana corta detrás del cursor
+        (ORDERS_SYNC_OVERLAP_SECONDS) y se descartan ids repetidos. El cliente
+        aplica los pedidos por id, así que recibir de nuevo uno ya visto es inocuo.
+
+        Returns:
+            {"orders", "sync_cursor", "has_more"}: el cliente guarda sync_cursor
+            para el próximo pedido; con has_more sigue pidiendo sin esperar.
+
+        Raises:
+            ValueError: Si el cursor no es válido
+        """
+        limit = self._page_limit(limit)
+        value, row_id = decode_cursor(since, _SYNC_CURSOR)
+        overlap_from = self._sync_overlap_start(value)
+
+        def _run_changes():
+            query = self._orders_query(restaurant_id, branch_id, None)
+            query = apply_keyset(query, "updated_at", value, row_id, descending=False)
+            return order_keyset(query, "updated_at", descending=False).limit(limit + 1).execute()
+
+        def _run_overlap():
+            query = self._orders_query(restaurant_id, branch_id, None)
+            query = query.gte("updated_at", overlap_from).lte("updated_at", value)
+            query = order_keyset(query, "updated_at", descending=False)
+            return query.limit(Config.ORDERS_PAGE_MAX_LIMIT).execute()
+
+        calls = [_run_changes, _run_overlap] if overlap_from else [_run_changes]
+        responses = run_queries(calls)
+        rows = responses[0].data or []
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        sync_cursor = since
+        if rows:
+            last = rows[-1]
+            sync_cursor = encode_cursor(_SYNC_CURSOR, last.get("updated_at"), last.get("id"))
+
+        # La relectura va primero: sus marcas son anteriores a las de la página
+        merged: List[Dict] = []
+        seen_ids = set()
+        overlap_rows = (responses[1].data or []) if overlap_from else []
+        for order in overlap_rows + rows:
+            order_id = str(order.get("id"))
+            if order_id in seen_ids:
+                continue
+            seen_ids.add(order_id)
+            merged.append(order)
+        return {
+            "orders": [self._serialize_order(order) for order in merged],
+            "sync_cursor": sync_cursor,
+            "has_more": has_more,
+        }
+
+    @staticmethod
+    def _sync_overlap_start(value: str) -> Optional[str]:
+        """Inicio (ISO) de la ventana que se relee detrás del cursor; None si está desactivada."""
+        overlap = Config.ORDERS_SYNC_OVERLAP_SECONDS
+        if overlap <= 0:
+            return None
+        try:
+            cursor_dt = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        except ValueError:
+            raise ValueError("cursor inválido")
+        return (cursor_dt - timedelta(seconds=overlap)).isoformat()
+
+    @staticmethod
+    def _orders_query(
+        restaurant_id: Optional[str],
+        branch_id: Optional[str],
+        status: Optional[str],
+        columns: str = "*",
+    ):
+        query = supabase.table("orders").select(columns)
+        if restaurant_id:
+            query = query.eq("restaurant_id", restaurant_id)
+        if branch_id:
+            query = query.eq("branch_id", branch_id)
+        if status:
+            statuses = [s.strip().upper() for s in status.split(",") if s.strip()]
+            if len(statuses) == 1:
+                query = query.eq("status", statuses[0])
+            elif statuses:
+                query = query.in_("status", statuses)
+        return query
+
+    @staticmethod
+    def _page_limit(limit: Optional[int]) -> int:
+        if limit is None:
+            return Config.ORDERS_PAGE_DEFAULT_LIMIT
+        if limit < 1:
+            raise ValueError("limit debe ser mayor a 0")
+        return min(limit, Config.ORDERS_PAGE_MAX_LIMIT)
+
     def get_order_by_id(
         self,
         order_id: str,
@@ -312,15 +492,13 @@ class OrderService:
                 .execute()
             )
             updated = (response.data or [None])[0]
+            publish_order_event(ORDER_STATUS_CHANGED, updated, previous_status=order.get("status"))
             if updated and updated.get("branch_id"):
                 try:
                     invalidate_token(updated.get("mesa_id"), updated.get("branch_id"))
                 except Exception:
                     pass
-            try:
-                socketio.emit("orders:updated", {"branch_id": updated.get("branch_id"), "mesa_id": updated.get("mesa_id")})
-            except Exception:
-                pass
+            self.emit_order_changed(updated)
             return self._serialize_order(updated) if updated else None
         except Exception as e:
             logger.error(f"No se pudo marcar PAID el último pedido de mesa {mesa_id}: {str(e)}")
@@ -490,14 +668,14 @@ class OrderService:
                     )
                     raise ValueError(f"No se pudo registrar el cobro en caja: {str(cash_error)}")
 
+            if current_status != status_value:
+                publish_order_event(ORDER_STATUS_CHANGED, updated_order, previous_status=current_status)
+
             logger.info(
                 f"Pedido {order_id}: Estado actualizado de {current_status} a {status_value}"
             )
 
-            try:
-                socketio.emit("orders:updated", {"branch_id": updated_order.get("branch_id"), "mesa_id": updated_order.get("mesa_id")})
-            except Exception:
-                pass
+            self.emit_order_changed(updated_order)
 
             return self._serialize_order(updated_order)
 
@@ -688,44 +866,48 @@ class OrderService:
         order_id: str,
         user_id: Optional[str] = None,
     ) -> None:
-        """Descuenta el stock de ingredientes según las recetas de cada producto vendido."""
+        """
+        Descuenta el stock de ingredientes según las recetas de cada producto vendido.
+
+        Toma las recetas del grafo cacheado de la sucursal, inserta los
+        movimientos en bloque y aplica los deltas de stock en una única llamada.
+        """
         try:
+            lines = []
             for item in items:
                 product_id = item.get("id")
                 if not product_id:
                     continue
-                quantity = int(item.get("quantity", 1))
+                try:
+                    quantity = int(item.get("quantity", 1))
+                except (TypeError, ValueError):
+                    quantity = 1
+                lines.append((product_id, quantity, item))
+            if not lines:
+                return
 
-                recipes_resp = (
-                    supabase.table("recipes")
-                    .select("ingredient_id, quantity")
-                    .eq("product_id", product_id)
-                    .eq("restaurant_id", restaurant_id)
-                    .execute()
-                )
-                recipes = recipes_resp.data or []
-                for recipe in recipes:
-                    ing_id = recipe.get("ingredient_id")
-                    recipe_qty = float(recipe.get("quantity", 0))
+            graph = get_recipe_graph(restaurant_id, branch_id)
+
+            movements = []
+            for product_id, quantity, item in lines:
+                product_row = graph.get(str(product_id)) or {}
+                for ing_id, recipe_qty in product_row.get("recipe", []):
                     if not ing_id or recipe_qty <= 0:
                         continue
-                    consumed = round(recipe_qty * quantity, 4)
-                    try:
-                        ingredients_service.record_movement(
-                            ingredient_id=str(ing_id),
-                            qty=-consumed,
-                            movement_type="sale",
-                            restaurant_id=restaurant_id,
-                            reason=f"Venta ítem: {item.get('name', product_id)}",
-                            source=f"order:{order_id}",
-                            user_id=user_id,
-                            branch_id=branch_id,
-                        )
-                    except Exception as e:
-                        logger.warning(
-                            f"No se pudo descontar stock de ingrediente {ing_id} "
-                            f"para pedido {order_id}: {e}"
-                        )
+                    movements.append({
+                        "ingredient_id": ing_id,
+                        "qty": -round(recipe_qty * quantity, 4),
+                        "type": "sale",
+                        "reason": f"Venta ítem: {item.get('name', product_id)}",
+                        "source": f"order:{order_id}",
+                    })
+
+            ingredients_service.record_movements_bulk(
+                movements,
+                restaurant_id=restaurant_id,
+                user_id=user_id,
+                branch_id=branch_id,
+            )
         except Exception as e:
             logger.warning(f"Error consumiendo ingredientes para pedido {order_id}: {e}")
 
@@ -869,13 +1051,11 @@ class OrderService:
                 branch_id=new_order.get("branch_id", branch_id),
                 order_id=order_id,
             )
+            publish_order_event(ORDER_CREATED, new_order)
             logger.info(
                 f"[socket] emit orders:updated branch_id={new_order.get('branch_id')} mesa_id={mesa_id}"
             )
-            try:
-                socketio.emit("orders:updated", {"branch_id": new_order.get("branch_id"), "mesa_id": mesa_id})
-            except Exception:
-                pass
+            self.emit_order_changed(new_order, ORDER_CREATED_CHANGE, mesa_id=mesa_id)
             return self._serialize_order(new_order)
         except ValueError:
             raise
@@ -932,6 +1112,29 @@ class OrderService:
 
         return new in valid_transitions[current]
 
+    def emit_order_changed(
+        self,
+        order: Optional[Dict],
+        change: str = ORDER_UPDATED_CHANGE,
+        mesa_id: Optional[str] = None,
+    ) -> None:
+        """Notifica a la sucursal el pedido (fila de orders) ya serializado."""
+        if not order:
+            return
+        try:
+            serialized = self._serialize_order(order)
+        except Exception as e:
+            # Sin pedido el evento viaja igual y los clientes hacen resync
+            logger.warning(f"No se pudo serializar el pedido {order.get('id')} para el evento: {e}")
+            serialized = None
+        emit_order_delta(
+            serialized,
+            change,
+            order.get("restaurant_id"),
+            order.get("branch_id"),
+            mesa_id=mesa_id,
+        )
+
     def _serialize_order(self, order: Dict) -> Dict:
         items = order.get("items") or []
         total_amount = order.get("total_amount")
@@ -950,6 +1153,7 @@ class OrderService:
             "total_amount": float(total_amount) if total_amount is not None else 0,
             "created_at": created_at,
             "creation_date": order.get("creation_date") or created_at,
+            "updated_at": order.get("updated_at"),
             "payment_status": payment_status,
             "payment_method": order.get("payment_method"),
             "restaurant_id": order.get("restaurant_id"),
@@ -974,49 +1178,24 @@ class OrderService:
         if not items:
             return
 
+        # Disponibilidad y recetas salen del grafo cacheado de la sucursal;
+        # solo el stock actual se consulta en vivo.
+        graph = get_recipe_graph(restaurant_id, branch_id)
+
         # 1) No vender productos marcados como no disponibles
-        product_ids = []
+        unavailable = []
         for item in items:
             product_id = item.get("id") or item.get("item_id") or item.get("product_id")
-            if product_id is not None:
-                product_ids.append(product_id)
-
-        if product_ids:
-            menu_query = supabase.table("menu").select("id, name, available")
-            if restaurant_id:
-                menu_query = menu_query.eq("restaurant_id", restaurant_id)
-            if branch_id:
-                menu_query = menu_query.eq("branch_id", branch_id)
-            menu_resp = execute_with_retry(lambda: menu_query.in_("id", product_ids).execute())
-            menu_rows = menu_resp.data or []
-            menu_by_id = {row.get("id"): row for row in menu_rows}
-
-            unavailable = []
-            for item in items:
-                product_id = item.get("id") or item.get("item_id") or item.get("product_id")
-                if product_id is None:
-                    continue
-                product_row = menu_by_id.get(product_id)
-                if product_row and product_row.get("available") is False:
-                    unavailable.append(item.get("name") or product_row.get("name") or str(product_id))
-            if unavailable:
-                raise ValueError("Producto no disponible: " + ", ".join(sorted(set(unavailable))))
+            if product_id is None:
+                continue
+            product_row = graph.get(str(product_id))
+            if product_row and product_row.get("available") is False:
+                unavailable.append(item.get("name") or product_row.get("name") or str(product_id))
+        if unavailable:
+            raise ValueError("Producto no disponible: " + ", ".join(sorted(set(unavailable))))
 
         # 2) Validar consumo de ingredientes por receta + opcionales
-        recipe_rows = []
-        if product_ids:
-            recipe_query = (
-                supabase.table("recipes")
-                .select("product_id, ingredient_id, quantity")
-                .in_("product_id", product_ids)
-            )
-            if restaurant_id:
-                recipe_query = recipe_query.eq("restaurant_id", restaurant_id)
-            recipe_resp = execute_with_retry(recipe_query.execute)
-            recipe_rows = recipe_resp.data or []
-
-        required_by_ingredient: Dict = {}
-        option_ingredient_ids = set()
+        required_by_ingredient: Dict[str, float] = {}
         for item in items:
             raw_quantity = item.get("quantity", 1)
             try:
@@ -1026,27 +1205,19 @@ class OrderService:
 
             product_id = item.get("id") or item.get("item_id") or item.get("product_id")
             if product_id is not None:
-                for row in recipe_rows:
-                    if row.get("product_id") != product_id:
-                        continue
-                    ingredient_id = row.get("ingredient_id")
-                    if ingredient_id is None:
-                        continue
-                    try:
-                        unit_qty = float(row.get("quantity") or 0)
-                    except (TypeError, ValueError):
-                        unit_qty = 0.0
+                product_row = graph.get(str(product_id)) or {}
+                for ingredient_id, unit_qty in product_row.get("recipe", []):
                     required_by_ingredient[ingredient_id] = required_by_ingredient.get(ingredient_id, 0.0) + (unit_qty * item_quantity)
 
             for option in (item.get("selectedOptions") or []):
                 ingredient_id = option.get("ingredientId") or option.get("ingredient_id")
                 if ingredient_id is None:
                     continue
-                option_ingredient_ids.add(ingredient_id)
+                ingredient_id = str(ingredient_id)
                 # Cada opcional seleccionado consume 1 unidad por cada cantidad del item
                 required_by_ingredient[ingredient_id] = required_by_ingredient.get(ingredient_id, 0.0) + float(item_quantity)
 
-        ingredient_ids = set(required_by_ingredient.keys()) | option_ingredient_ids
+        ingredient_ids = set(required_by_ingredient.keys())
         if not ingredient_ids:
             return
 
@@ -1057,7 +1228,7 @@ class OrderService:
             ingredients_query = ingredients_query.eq("branch_id", branch_id)
         ingredients_resp = execute_with_retry(lambda: ingredients_query.in_("id", list(ingredient_ids)).execute())
         ingredients_rows = ingredients_resp.data or []
-        ingredients_by_id = {row.get("id"): row for row in ingredients_rows}
+        ingredients_by_id = {str(row.get("id")): row for row in ingredients_rows}
 
         shortages = []
         for ingredient_id, required_qty in required_by_ingredient.items():
@@ -1083,43 +1254,39 @@ class OrderService:
         restaurant_id: str,
         branch_id: Optional[str],
     ) -> Tuple[Optional[str], Optional[str]]:
-        restaurant_name = None
-        branch_name = None
+        def _run_restaurant():
+            return (
+                supabase.table("restaurants")
+                .select("name")
+                .eq("id", restaurant_id)
+                .limit(1)
+                .execute()
+            )
 
-        try:
-            def _run_restaurant():
-                return (
-                    supabase.table("restaurants")
-                    .select("name")
-                    .eq("id", restaurant_id)
-                    .limit(1)
-                    .execute()
-                )
+        def _run_branch():
+            return (
+                supabase.table("branches")
+                .select("name")
+                .eq("id", branch_id)
+                .limit(1)
+                .execute()
+            )
 
-            restaurant_resp = execute_with_retry(_run_restaurant)
-            restaurant_row = (restaurant_resp.data or [None])[0]
-            if restaurant_row:
-                restaurant_name = restaurant_row.get("name")
+        calls = [_run_restaurant, _run_branch] if branch_id else [_run_restaurant]
+        try:
+            responses = run_queries(calls, return_exceptions=True)
         except Exception:
-            restaurant_name = None
+            return None, None
 
-        if branch_id:
-            try:
-                def _run_branch():
-                    return (
-                        supabase.table("branches")
-                        .select("name")
-                        .eq("id", branch_id)
-                        .limit(1)
-                        .execute()
-                    )
-
-                branch_resp = execute_with_retry(_run_branch)
-                branch_row = (branch_resp.data or [None])[0]
-                if branch_row:
-                    branch_name = branch_row.get("name")
-            except Exception:
-                branch_name = None
+        names = []
+        for resp in responses:
+            if isinstance(resp, Exception):
+                names.append(None)
+                continue
+            row = (resp.data or [None])[0]
+            names.append(row.get("name") if row else None)
+        restaurant_name = names[0]
+        branch_name = names[1] if branch_id else None
 
         return restaurant_name, branch_name
 
@@ -11,6 +11,7 @@ from ..services.mercadopago_service import MercadoPagoService
 from ..services.menu_service import menu_service
 from ..utils.logger import setup_logger
 from ..utils.token_manager import invalidate_token
+from .domain_events import ORDER_CREATED, ORDER_STATUS_CHANGED, publish_order_event
 
 logger = setup_logger(__name__)
 # Global fallback instance (used only when restaurant context is unavailable)
@@ -90,6 +91,8 @@ class PaymentService:
             supabase.table("orders").update(
                 {"updated_at": PaymentService._now_iso()}
             ).eq("id", new_order["id"]).execute()
+            # Recién acá el pedido queda firme (sin preferencia se borra más arriba)
+            publish_order_event(ORDER_CREATED, new_order)
 
             logger.info(
                 f"Pago inicializado - mesa_id: {mesa_id}, monto: {total_amount}, order_id: {new_order['id']}"
@@ -179,6 +182,7 @@ class PaymentService:
 
         if not response.data:
             raise Exception("No se pudo actualizar el pedido")
+        publish_order_event(ORDER_STATUS_CHANGED, response.data[0], previous_status=order.get("status"))
 
         PaymentService._payment_ids[external_reference] = payment_id
 
@@ -211,13 +215,18 @@ class PaymentService:
             logger.warning("Payment failure sin external_reference")
             return
 
+        order = PaymentService._get_order(external_reference)
         now_iso = PaymentService._now_iso()
         update_data = {
             "status": OrderStatus.PAYMENT_REJECTED.value,
             "updated_at": now_iso,
         }
 
-        supabase.table("orders").update(update_data).eq("id", external_reference).execute()
+        response = supabase.table("orders").update(update_data).eq("id", external_reference).execute()
+        if response.data:
+            publish_order_event(
+                ORDER_STATUS_CHANGED, response.data[0], previous_status=(order or {}).get("status")
+            )
 
         logger.info(f"Pago rechazado - order_id: {external_reference}")
 
@@ -230,6 +239,7 @@ class PaymentService:
             logger.warning("Payment pending sin external_reference")
             return None
 
+        order = PaymentService._get_order(external_reference)
         update_data = {
             "status": OrderStatus.PAYMENT_PENDING.value,
             "updated_at": PaymentService._now_iso(),
@@ -243,6 +253,9 @@ class PaymentService:
         )
 
         if response.data:
+            publish_order_event(
+                ORDER_STATUS_CHANGED, response.data[0], previous_status=(order or {}).get("status")
+            )
             logger.info(f"Pago pendiente - order_id: {external_reference}")
             return external_reference
 
@@ -272,6 +285,7 @@ class PaymentService:
         if not response.data:
             raise Exception("No se pudo actualizar el pedido")
 
+        publish_order_event(ORDER_STATUS_CHANGED, response.data[0], previous_status=order.get("status"))
         return response.data[0]
 
     @staticmethod
@@ -314,6 +328,7 @@ class PaymentService:
         if not response.data:
             raise Exception("No se pudo actualizar el pedido")
 
+        publish_order_event(ORDER_STATUS_CHANGED, response.data[0], previous_status=order.get("status"))
         return response.data[0]
 
     @staticmethod
@@ -2,6 +2,7 @@ from typing import Dict, List, Optional
 from ..db.supabase_client import supabase
 from ..utils.retry import execute_with_retry
 from ..utils.units import to_display_unit
+from .menu_snapshot_service import invalidate_menu_snapshot
 
 
 def _group_to_camel(row: Dict, items: Optional[List[Dict]] = None) -> Dict:
@@ -34,6 +35,24 @@ def _item_to_camel(row: Dict) -> Dict:
     }
 
 
+_GROUP_WITH_ITEMS_SELECT = "*, product_option_items(*, ingredients(name, unit, current_stock))"
+
+
+def _groups_by_product(rows: List[Dict]) -> Dict[str, List[Dict]]:
+    """Agrupa filas de product_option_groups (con ítems embebidos) por product_id."""
+    result: Dict[str, List[Dict]] = {}
+    for group in rows:
+        group.pop("menu", None)
+        items = sorted(
+            group.pop("product_option_items", None) or [],
+            key=lambda row: row.get("created_at") or "",
+        )
+        result.setdefault(str(group["product_id"]), []).append(
+            _group_to_camel(group, [_item_to_camel(i) for i in items])
+        )
+    return result
+
+
 class ProductOptionsService:
     def resolve_restaurant_id(self, user_id: str) -> str:
         resp = (
@@ -51,33 +70,39 @@ class ProductOptionsService:
     # ── Groups ──────────────────────────────────────────────
 
     def list_groups(self, restaurant_id: str, product_id: str) -> List[Dict]:
-        """List all option groups for a product, including their items."""
+        """List all option groups for a product, including their items (one embedded query)."""
+        return self.groups_by_product(restaurant_id, [product_id]).get(str(product_id), [])
+
+    def groups_by_product(self, restaurant_id: str, product_ids: List[str]) -> Dict[str, List[Dict]]:
+        """Grupos de opciones (con sus ítems) de varios productos en una sola consulta."""
+        if not product_ids:
+            return {}
+
         def _run():
             return (
                 supabase.table("product_option_groups")
-                .select("*")
-                .eq("product_id", product_id)
+                .select(_GROUP_WITH_ITEMS_SELECT)
                 .eq("restaurant_id", restaurant_id)
+                .in_("product_id", product_ids)
                 .order("created_at")
                 .execute()
             )
 
-        response = execute_with_retry(_run)
-        groups = response.data or []
+        return _groups_by_product(execute_with_retry(_run).data or [])
 
-        result = []
-        for group in groups:
-            items_resp = (
-                supabase.table("product_option_items")
-                .select("*, ingredients(name, unit, current_stock)")
-                .eq("group_id", group["id"])
+    def groups_for_branch(self, restaurant_id: str, branch_id: str) -> Dict[str, List[Dict]]:
+        """Grupos de opciones de todos los productos de una sucursal, por product_id."""
+        def _run():
+            return (
+                supabase.table("product_option_groups")
+                .select(f"{_GROUP_WITH_ITEMS_SELECT}, menu!inner(branch_id)")
                 .eq("restaurant_id", restaurant_id)
+                .eq("menu.branch_id", branch_id)
                 .order("created_at")
                 .execute()
             )
-            items = [_item_to_camel(i) for i in (items_resp.data or [])]
-            result.append(_group_to_camel(group, items))
-        return result
+
+        return _groups_by_product(execute_with_retry(_run).data or [])
 
     def create_group(self, restaurant_id: str, payload: Dict) -> Dict:
         product_id = payload.get("productId")
@@ -104,6 +129,7 @@ class ProductOptionsService:
         row = (response.data or [None])[0]
         if not row:
             raise Exception("No se pudo crear el grupo de opciones")
+        invalidate_menu_snapshot(restaurant_id)
         return _group_to_camel(row, items=[])
 
     def update_group(self, restaurant_id: str, group_id: str, payload: Dict) -> Dict:
@@ -143,6 +169,7 @@ class ProductOptionsService:
         row = (response.data or [None])[0]
         if not row:
             raise Exception("No se pudo actualizar el grupo")
+        invalidate_menu_snapshot(restaurant_id)
         return _group_to_camel(row)
 
     def delete_group(self, restaurant_id: str, group_id: str) -> None:
@@ -166,6 +193,7 @@ class ProductOptionsService:
         )
         if not response.data:
             raise Exception("No se pudo eliminar el grupo")
+        invalidate_menu_snapshot(restaurant_id)
 
     # ── Items ───────────────────────────────────────────────
 
@@ -209,6 +237,7 @@ class ProductOptionsService:
         row = (response.data or [None])[0]
         if not row:
             raise Exception("No se pudo agregar la opción")
+        invalidate_menu_snapshot(restaurant_id)
 
         full = (
             supabase.table("product_option_items")
@@ -239,6 +268,7 @@ class ProductOptionsService:
             raise ValueError("No hay datos para actualizar")
 
         supabase.table("product_option_items").update(update_data).eq("id", item_id).execute()
+        invalidate_menu_snapshot(restaurant_id)
 
         full = (
             supabase.table("product_option_items")
@@ -270,6 +300,7 @@ class ProductOptionsService:
         )
         if not response.data:
             raise Exception("No se pudo eliminar la opción")
+        invalidate_menu_snapshot(restaurant_id)
 
 
 product_options_service = ProductOptionsService()
@@ -1,10 +1,11 @@
 """
 Motor de aplicación de promociones automáticas.
 Procesa los ítems de un pedido y aplica descuentos según las promotions activas y no manuales.
+Las promociones salen del índice compilado por sucursal (promotion_index), sin consultas por pedido.
 """
 from datetime import datetime, timezone, time as dt_time
-from typing import Dict, List, Tuple
-from .promotions_service import promotions_service
+from typing import Dict, List, Optional, Tuple
+from .promotion_index import CompiledPromotion, get_promotion_index
 from ..utils.logger import setup_logger
 
 _logger = setup_logger(__name__)
@@ -15,59 +16,49 @@ def _current_time() -> dt_time:
     return now.time()
 
 
-def _promotion_applies_to_item(promotion: Dict, product_id) -> bool:
-    """Devuelve True si la promotion aplica a ese product_id."""
-    applicable = promotion.get("applicable_products") or []
-    if not applicable:
-        return True  # Sin restricción = aplica a todos
-    str_id = str(product_id)
-    return any(str(p) == str_id for p in applicable)
-
-
-def _in_time_window(promotion: Dict) -> bool:
-    """Verifica si la hora actual está dentro del rango start_time–end_time de la promotion."""
-    start_t = promotion.get("start_time")
-    end_t = promotion.get("end_time")
-    if not start_t or not end_t:
-        return True
-    try:
-        now = _current_time()
-        # start_time/end_time son strings "HH:MM:SS" o "HH:MM"
-        def parse_t(s):
-            parts = s.split(":")
-            return dt_time(int(parts[0]), int(parts[1]))
-        st = parse_t(start_t)
-        et = parse_t(end_t)
-        return st <= now <= et
-    except Exception:
-        return True
-
-
-def _is_active_day(promotion: Dict) -> bool:
-    """Verifica si hoy es un día activo para la promotion según days_of_week."""
-    days = promotion.get("days_of_week")
-    if not days:
-        return True  # null = todos los días
+def _current_weekday() -> int:
     # Python weekday(): Monday=0..Sunday=6
     # Nuestra convención: 0=Domingo, 1=Lunes...6=Sábado
     today_py = datetime.now(timezone.utc).weekday()  # 0=Mon
-    today_mapped = (today_py + 1) % 7  # Mon=1, Tue=2...Sat=6, Sun=0
-    return today_mapped in days
+    return (today_py + 1) % 7  # Mon=1, Tue=2...Sat=6, Sun=0
 
 
-def _in_date_range(promotion: Dict) -> bool:
-    """Verifica si la fecha actual está dentro del rango start_date–end_date."""
-    start_d = promotion.get("start_date")
-    end_d = promotion.get("end_date")
-    today = datetime.now(timezone.utc).date()
-    try:
-        if start_d and datetime.fromisoformat(start_d).date() > today:
-            return False
-        if end_d and datetime.fromisoformat(end_d).date() < today:
-            return False
-    except Exception:
-        pass
-    return True
+def _matching_items(
+    promo: CompiledPromotion,
+    result_items: List[Dict],
+    positions_by_product: Dict[str, List[int]],
+) -> List[Dict]:
+    """Ítems del pedido a los que aplica la promo, en el orden del pedido."""
+    if promo.products is None:
+        return result_items
+    positions: List[int] = []
+    for pid in promo.products:
+        positions.extend(positions_by_product.get(pid, ()))
+    positions.sort()
+    return [result_items[pos] for pos in positions]
+
+
+# Promos que descuentan un porcentaje por unidad, sin depender del resto del carrito
+_PER_UNIT_TYPES = ("discount", "timeframe")
+
+
+def _prepare_items(items: List[Dict]) -> Tuple[List[Dict], Dict[str, List[int]]]:
+    """Clona los items (para no mutar el original) e indexa sus posiciones por producto."""
+    result_items = [dict(item) for item in items]
+    positions_by_product: Dict[str, List[int]] = {}
+    for pos, it in enumerate(result_items):
+        it.setdefault("discountAmount", 0.0)
+        it.setdefault("promotionId", None)
+        # finalPrice arranca con el precio base (ya podría tener selectedOptions incluidos)
+        it["finalPrice"] = float(it.get("price", 0))
+        positions_by_product.setdefault(str(it.get("id")), []).append(pos)
+    return result_items, positions_by_product
+
+
+def _is_current(promo: CompiledPromotion, today, weekday: int) -> bool:
+    if not promo.active or not promo.in_date_range(today) or not promo.is_active_day(weekday):
+        return False
+    return promo.type != "timeframe" or promo.in_time_window(_current_time())
 
 
 def apply_promotions_to_items(
@@ -83,140 +74,43 @@ def apply_promotions_to_items(
         - items_modificados: copia de items con finalPrice, discountAmount, promotionId por ítem
         - savings_summary: [{id, name, type, saving_amount}]
     """
-    promotions = promotions_service.list_active_for_branch(restaurant_id, branch_id)
-    _logger.info(f"Engine: found {len(promotions)} promos for restaurant={restaurant_id} branch={branch_id}")
-    for p in promotions:
-        _logger.info(f"  Promo: id={p.get('id')} name={p.get('name')} type={p.get('type')} active={p.get('active')} is_manual={p.get('is_manual')} branch_id={p.get('branch_id')} applicable_products={p.get('applicable_products')}")
-    if not promotions:
+    index = get_promotion_index(restaurant_id, branch_id)
+    if not len(index):
         return _items_with_final_price(items), []
+    candidates = index.candidates(it.get("id") for it in items)
+    _logger.info(
+        f"Engine: {len(index)} promos for restaurant={restaurant_id} branch={branch_id}, "
+        f"{len(candidates)} candidates for this cart"
+    )
 
-    # Clonar items para no mutar el original
-    result_items = [dict(item) for item in items]
-    for it in result_items:
-        it.setdefault("discountAmount", 0.0)
-        it.setdefault("promotionId", None)
-        # finalPrice arranca con el precio base (ya podría tener selectedOptions incluidos)
-        it["finalPrice"] = float(it.get("price", 0))
-
+    result_items, positions_by_product = _prepare_items(items)
+    today = datetime.now(timezone.utc).date()
+    weekday = _current_weekday()
     savings: Dict[str, float] = {}  # promotion_id → total ahorrado
 
-    for promo in promotions:
-        if not promo.get("active"):
-            continue
-        if not _in_date_range(promo):
-            continue
-        if not _is_active_day(promo):
+    for promo in candidates:
+        if not _is_current(promo, today, weekday):
             continue
 
-        promo_type = promo.get("type", "")
-        promo_id = str(promo.get("id", ""))
-        value = float(promo.get("value") or 0)
-
-        if promo_type == "discount":
-            for it in result_items:
-                if not _promotion_applies_to_item(promo, it.get("id")):
-                    continue
-                unit_price = float(it.get("price", 0))
-                discount_unit = round(unit_price * value / 100, 2)
-                it["finalPrice"] = round(it["finalPrice"] - discount_unit, 2)
-                it["discountAmount"] = round(it.get("discountAmount", 0) + discount_unit, 2)
-                it["promotionId"] = promo_id
-                savings[promo_id] = savings.get(promo_id, 0) + discount_unit * int(it.get("quantity", 1))
-
-        elif promo_type == "timeframe":
-            if not _in_time_window(promo):
-                continue
-            for it in result_items:
-                if not _promotion_applies_to_item(promo, it.get("id")):
-                    continue
-                unit_price = float(it.get("price", 0))
-                discount_unit = round(unit_price * value / 100, 2)
-                it["finalPrice"] = round(it["finalPrice"] - discount_unit, 2)
-                it["discountAmount"] = round(it.get("discountAmount", 0) + discount_unit, 2)
-                it["promotionId"] = promo_id
-                savings[promo_id] = savings.get(promo_id, 0) + discount_unit * int(it.get("quantity", 1))
+        promo_type = promo.type
+        promo_id = promo.id
+
+        if promo_type in _PER_UNIT_TYPES:
+            _apply_percentage(promo, _matching_items(promo, result_items, positions_by_product), savings)
 
         elif promo_type == "2x1":
-            # Cross-product 2x1: de cada par de unidades elegibles, la más barata es gratis
-            eligible = [it for it in result_items if _promotion_applies_to_item(promo, it.get("id"))]
-            # Expandir a unidades individuales ordenadas por precio ascendente
-            units = []
-            for it in eligible:
-                qty = int(it.get("quantity", 1))
-                unit_price = float(it.get("price", 0))
-                for _ in range(qty):
-                    units.append({"item": it, "price": unit_price})
-            units.sort(key=lambda u: u["price"])
-            total_units = len(units)
-            free_count = total_units // 2
-            if free_count > 0:
-                # Las free_count unidades más baratas son gratis
-                free_units = units[:free_count]
-                # Acumular descuento por item
-                discount_per_item: Dict[int, float] = {}
-                for u in free_units:
-                    item_idx = id(u["item"])
-                    discount_per_item[item_idx] = discount_per_item.get(item_idx, 0) + u["price"]
-                for it in eligible:
-                    disc = discount_per_item.get(id(it), 0)
-                    if disc > 0:
-                        qty = int(it.get("quantity", 1))
-                        per_unit_discount = round(disc / qty, 2)
-                        it["finalPrice"] = round(it["finalPrice"] - per_unit_discount, 2)
-                        it["discountAmount"] = round(it.get("discountAmount", 0) + per_unit_discount, 2)
-                        it["promotionId"] = promo_id
-                        savings[promo_id] = savings.get(promo_id, 0) + disc
+            eligible = _matching_items(promo, result_items, positions_by_product)
+            _apply_two_for_one(eligible, promo_id, savings)
 
         elif promo_type == "combo":
-            # Verificar si todos los productos del combo están en el pedido con cantidad suficiente
-            combo_items = promotions_service.get_combo_items(promo_id)
-            if not combo_items:
-                continue
-            combo_price = value  # valor del combo = precio especial total
-            matched = True
-            for ci in combo_items:
-                ci_product_id = str(ci["product_id"])
-                ci_qty = int(ci.get("quantity", 1))
-                order_qty = sum(
-                    int(it.get("quantity", 1))
-                    for it in result_items
-                    if str(it.get("id")) == ci_product_id
-                )
-                if order_qty < ci_qty:
-                    matched = False
-                    break
-
-            if matched:
-                # Calcular precio normal del combo para saber el descuento
-                normal_total = sum(
-                    float(it.get("price", 0)) * min(
-                        int(it.get("quantity", 1)),
-                        next((int(ci["quantity"]) for ci in combo_items if str(ci["product_id"]) == str(it.get("id"))), 0)
-                    )
-                    for it in result_items
-                    if any(str(ci["product_id"]) == str(it.get("id")) for ci in combo_items)
-                )
-                combo_saving = max(0, round(normal_total - combo_price, 2))
-                if combo_saving > 0:
-                    # Distribuir el descuento proporcialmente entre los ítems del combo
-                    for ci in combo_items:
-                        ci_product_id = str(ci["product_id"])
-                        for it in result_items:
-                            if str(it.get("id")) == ci_product_id:
-                                unit_price = float(it.get("price", 0))
-                                proportion = unit_price / normal_total if normal_total else 0
-                                discount_unit = round(combo_saving * proportion, 2)
-                                it["finalPrice"] = round(it["finalPrice"] - discount_unit, 2)
-                                it["discountAmount"] = round(it.get("discountAmount", 0) + discount_unit, 2)
-                                it["promotionId"] = promo_id
-                    savings[promo_id] = savings.get(promo_id, 0) + combo_saving
+            _apply_combo(promo, result_items, positions_by_product, savings)
 
     # Asegurar finalPrice >= 0
     for it in result_items:
         it["finalPrice"] = max(0.0, it["finalPrice"])
 
     savings_summary = [
-        {"id": pid, "name": _promo_name(promotions, pid), "saving_amount": round(amt, 2)}
+        {"id": pid, "name": index.names.get(pid, ""), "saving_amount": round(amt, 2)}
         for pid, amt in savings.items()
         if amt > 0
     ]
@@ -224,6 +118,30 @@ def apply_promotions_to_items(
     return result_items, savings_summary
 
 
+def display_prices(
+    items: List[Dict],
+    restaurant_id: str,
+    branch_id: str,
+) -> List[Dict]:
+    """
+    Precio de carta de cada ítem con las promos por unidad (discount / timeframe)
+    vigentes. 2x1 y combos dependen del carrito y no cambian el precio mostrado.
+    """
+    index = get_promotion_index(restaurant_id, branch_id)
+    if not len(index):
+        return _items_with_final_price(items)
+
+    result_items, positions_by_product = _prepare_items(items)
+    today = datetime.now(timezone.utc).date()
+    weekday = _current_weekday()
+    for promo in index.candidates(positions_by_product.keys()):
+        if promo.type in _PER_UNIT_TYPES and _is_current(promo, today, weekday):
+            _apply_percentage(promo, _matching_items(promo, result_items, positions_by_product))
+    for it in result_items:
+        it["finalPrice"] = max(0.0, it["finalPrice"])
+    return result_items
+
+
 def _items_with_final_price(items: List[Dict]) -> List[Dict]:
     result = []
     for it in items:
@@ -235,8 +153,94 @@ def _items_with_final_price(items: List[Dict]) -> List[Dict]:
     return result
 
 
-def _promo_name(promotions: List[Dict], promo_id: str) -> str:
-    for p in promotions:
-        if str(p.get("id")) == promo_id:
-            return p.get("name", "")
-    return ""
+def _apply_discount(it: Dict, per_unit_discount: float, promo_id: str) -> None:
+    it["finalPrice"] = round(it["finalPrice"] - per_unit_discount, 2)
+    it["discountAmount"] = round(it.get("discountAmount", 0) + per_unit_discount, 2)
+    it["promotionId"] = promo_id
+
+
+def _apply_percentage(
+    promo: CompiledPromotion,
+    matching: List[Dict],
+    savings: Optional[Dict[str, float]] = None,
+) -> None:
+    for it in matching:
+        unit_price = float(it.get("price", 0))
+        discount_unit = round(unit_price * promo.value / 100, 2)
+        _apply_discount(it, discount_unit, promo.id)
+        if savings is not None:
+            savings[promo.id] = savings.get(promo.id, 0) + discount_unit * int(it.get("quantity", 1))
+
+
+def _apply_two_for_one(eligible: List[Dict], promo_id: str, savings: Dict[str, float]) -> None:
+    """
+    Cross-product 2x1: de cada par de unidades elegibles, la más barata es gratis.
+    Trabaja con (precio, cantidad) por línea: ordenar las líneas por precio (estable)
+    da el mismo orden que expandir y ordenar unidad por unidad.
+    """
+    lines = [
+        (float(it.get("price", 0)), int(it.get("quantity", 1)), it)
+        for it in eligible
+    ]
+    free_count = sum(qty for _, qty, _ in lines) // 2
+    if free_count <= 0:
+        return
+    lines.sort(key=lambda line: line[0])
+    for unit_price, qty, it in lines:
+        if free_count <= 0:
+            break
+        free_units = min(qty, free_count)
+        free_count -= free_units
+        disc = unit_price * free_units
+        if disc > 0:
+            _apply_discount(it, round(disc / qty, 2), promo_id)
+            savings[promo_id] = savings.get(promo_id, 0) + disc
+
+
+def _apply_combo(
+    promo: CompiledPromotion,
+    result_items: List[Dict],
+    positions_by_product: Dict[str, List[int]],
+    savings: Dict[str, float],
+) -> None:
+    """
+    Combo a precio fijo (promo.value), aplicado tantas veces como alcance la
+    cantidad pedida de cada producto requerido. El ahorro se reparte entre las
+    unidades consumidas, proporcional a su precio.
+    """
+    requirements = promo.combo_requirements
+    if not requirements:
+        return
+
+    order_qty: Dict[str, int] = {}
+    for pid in requirements:
+        order_qty[pid] = sum(
+            int(result_items[pos].get("quantity", 1))
+            for pos in positions_by_product.get(pid, ())
+        )
+    times = min(order_qty[pid] // qty for pid, qty in requirements.items())
+    if times <= 0:
+        return
+
+    # Unidades que consume el combo, tomadas de las líneas en el orden del pedido
+    consumed: List[Tuple[Dict, int]] = []
+    normal_total = 0.0
+    for pid, qty in requirements.items():
+        remaining = qty * times
+        for pos in positions_by_product.get(pid, ()):
+            if remaining <= 0:
+                break
+            it = result_items[pos]
+            units = min(int(it.get("quantity", 1)), remaining)
+            remaining -= units
+            consumed.append((it, units))
+            normal_total += float(it.get("price", 0)) * units
+
+    combo_saving = max(0, round(normal_total - promo.value * times, 2))
+    if combo_saving <= 0 or not normal_total:
+        return
+    for it, units in consumed:
+        qty = int(it.get("quantity", 1))
+        line_saving = combo_saving * float(it.get("price", 0)) * units / normal_total
+        _apply_discount(it, round(line_saving / qty, 2), promo.id)
+    savings[promo.id] = savings.get(promo.id, 0) + combo_saving
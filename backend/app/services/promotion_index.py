@@ -0,0 +1,167 @@
+"""
+Índice compilado de promociones por (restaurante, sucursal).
+
+Las promociones activas se leen una vez, se pre-parsean (fechas, días, franja
+horaria, productos aplicables como set, requisitos de combo) y se guardan en
+caché. Aplicar promociones a un carrito no hace consultas: sólo mira las
+promociones que aplican a todos los productos más las indexadas por los
+productos del carrito. El CRUD de promociones invalida el índice del restaurante.
+"""
+from datetime import date, datetime, time as dt_time
+from typing import Dict, FrozenSet, List, Optional
+
+from ..config import Config
+from ..utils.cache import get_cache, invalidate
+from ..utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+PROMOTION_INDEX_NAMESPACE = "promotion-index"
+
+# Local (no compartida): el índice guarda objetos compilados, no JSON
+_index_cache = get_cache(
+    PROMOTION_INDEX_NAMESPACE,
+    max_entries=Config.PROMOTION_INDEX_MAX_ENTRIES,
+    ttl_seconds=Config.PROMOTION_INDEX_TTL_SECONDS,
+)
+
+
+def _parse_time(value) -> dt_time:
+    # start_time/end_time son strings "HH:MM:SS" o "HH:MM"
+    parts = value.split(":")
+    return dt_time(int(parts[0]), int(parts[1]))
+
+
+class CompiledPromotion:
+    """Promoción con sus condiciones ya parseadas."""
+
+    __slots__ = (
+        "id", "name", "type", "value", "active",
+        "start_date", "end_date", "days", "start_time", "end_time",
+        "products", "combo_requirements", "raw",
+    )
+
+    def __init__(self, promotion: Dict) -> None:
+        self.raw = promotion
+        self.id = str(promotion.get("id", ""))
+        self.name = promotion.get("name", "")
+        self.type = promotion.get("type", "")
+        self.value = float(promotion.get("value") or 0)
+        self.active = bool(promotion.get("active"))
+
+        # Si start_date no se puede parsear se ignora el rango completo
+        self.start_date: Optional[date] = None
+        self.end_date: Optional[date] = None
+        try:
+            if promotion.get("start_date"):
+                self.start_date = datetime.fromisoformat(promotion["start_date"]).date()
+            if promotion.get("end_date"):
+                self.end_date = datetime.fromisoformat(promotion["end_date"]).date()
+        except Exception:
+            if self.start_date is None:
+                self.end_date = None
+
+        # Convención 0=Domingo, 1=Lunes...6=Sábado; None = todos los días
+        days = promotion.get("days_of_week")
+        self.days: Optional[FrozenSet[int]] = frozenset(days) if days else None
+
+        self.start_time: Optional[dt_time] = None
+        self.end_time: Optional[dt_time] = None
+        if promotion.get("start_time") and promotion.get("end_time"):
+            try:
+                self.start_time = _parse_time(promotion["start_time"])
+                self.end_time = _parse_time(promotion["end_time"])
+            except Exception:
+                self.start_time = self.end_time = None
+
+        applicable = promotion.get("applicable_products") or []
+        self.products: Optional[FrozenSet[str]] = (
+            frozenset(str(p) for p in applicable) if applicable else None
+        )
+
+        # product_id → unidades requeridas por cada combo
+        self.combo_requirements: Dict[str, int] = {}
+        for ci in promotion.get("combo_items") or []:
+            if ci.get("product_id") is None:
+                continue
+            pid = str(ci["product_id"])
+            self.combo_requirements[pid] = (
+                self.combo_requirements.get(pid, 0) + max(1, int(ci.get("quantity", 1)))
+            )
+
+    def applies_to(self, product_id) -> bool:
+        return self.products is None or str(product_id) in self.products
+
+    def in_date_range(self, today: date) -> bool:
+        if self.start_date and self.start_date > today:
+            return False
+        if self.end_date and self.end_date < today:
+            return False
+        return True
+
+    def is_active_day(self, weekday_mapped: int) -> bool:
+        return self.days is None or weekday_mapped in self.days
+
+    def in_time_window(self, now: dt_time) -> bool:
+        if self.start_time is None or self.end_time is None:
+            return True
+        return self.start_time <= now <= self.end_time
+
+
+class PromotionIndex:
+    """Promociones compiladas de una sucursal, indexadas por producto."""
+
+    __slots__ = ("promotions", "universal", "by_product", "names")
+
+    def __init__(self, promotions: List[Dict]) -> None:
+        self.promotions: List[CompiledPromotion] = [CompiledPromotion(p) for p in promotions]
+        # Posiciones (orden original) de las promos sin restricción de producto
+        self.universal: List[int] = []
+        self.by_product: Dict[str, List[int]] = {}
+        self.names: Dict[str, str] = {}
+        for position, promo in enumerate(self.promotions):
+            self.names.setdefault(promo.id, promo.name)
+            keys = promo.products
+            if promo.type == "combo":
+                keys = frozenset(promo.combo_requirements)
+            if keys is None:
+                self.universal.append(position)
+                continue
+            for pid in keys:
+                self.by_product.setdefault(pid, []).append(position)
+
+    def __len__(self) -> int:
+        return len(self.promotions)
+
+    def candidates(self, product_ids) -> List[CompiledPromotion]:
+        """Promos que pueden aplicar a alguno de los productos, en el orden original."""
+        positions = set(self.universal)
+        for pid in product_ids:
+            positions.update(self.by_product.get(str(pid), ()))
+        return [self.promotions[position] for position in sorted(positions)]
+
+
+def _cache_key(restaurant_id: str, branch_id: Optional[str]) -> str:
+    return f"{restaurant_id}:{branch_id or 'all'}"
+
+
+def get_promotion_index(restaurant_id: str, branch_id: Optional[str]) -> PromotionIndex:
+    """Devuelve (compilando si hace falta) el índice de la sucursal."""
+    key = _cache_key(restaurant_id, branch_id)
+    index = _index_cache.get(key)
+    if index is None:
+        from .promotions_service import promotions_service
+
+        promotions = promotions_service.list_active_for_branch(restaurant_id, branch_id)
+        index = PromotionIndex(promotions)
+        _index_cache.set(key, index)
+        logger.info(
+            f"Índice de promociones compilado: restaurant={restaurant_id} "
+            f"branch={branch_id} promos={len(index)}"
+        )
+    return index
+
+
+def invalidate_promotion_index(restaurant_id: Optional[str] = None) -> None:
+    """Descarta los índices de un restaurante (o todos)."""
+    invalidate(PROMOTION_INDEX_NAMESPACE, f"{restaurant_id}:" if restaurant_id else "")
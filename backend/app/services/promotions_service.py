@@ -1,6 +1,9 @@
 from typing import Dict, List, Optional
 from ..utils.retry import execute_with_retry
 from ..db.supabase_client import supabase
+from ..db.query_executor import run_queries
+from .promotion_index import invalidate_promotion_index
+from .menu_snapshot_service import invalidate_menu_snapshot
 
 
 def _clean_time(value):
@@ -89,16 +92,19 @@ class PromotionsService:
 
         seen = set()
         promos = []
-        for q in _run():
-            resp = execute_with_retry(lambda q=q: q.execute())
+        # Las consultas son independientes: se ejecutan a la vez y se combinan en orden
+        for resp in run_queries([q.execute for q in _run()]):
             for p in (resp.data or []):
                 if p["id"] not in seen:
                     seen.add(p["id"])
                     promos.append(p)
 
-        for p in promos:
-            if p.get("type") == "combo":
-                p["combo_items"] = self.get_combo_items(p["id"])
+        combos = [p for p in promos if p.get("type") == "combo"]
+        combo_items = run_queries(
+            [lambda p=p: self.get_combo_items(p["id"]) for p in combos]
+        )
+        for p, items in zip(combos, combo_items):
+            p["combo_items"] = items
         return promos
 
     def get_combo_items(self, promotion_id: str) -> List[Dict]:
@@ -160,6 +166,8 @@ class PromotionsService:
             self.set_combo_items(promo["id"], payload["combo_items"])
             promo["combo_items"] = self.get_combo_items(promo["id"])
 
+        invalidate_promotion_index(restaurant_id)
+        invalidate_menu_snapshot(restaurant_id)
         return promo
 
     def update_promotion(self, user_id: str, promotion_id: str, payload: Dict) -> Dict:
@@ -217,6 +225,8 @@ class PromotionsService:
             self.set_combo_items(promotion_id, payload["combo_items"])
             promo["combo_items"] = self.get_combo_items(promotion_id)
 
+        invalidate_promotion_index(restaurant_id)
+        invalidate_menu_snapshot(restaurant_id)
         return promo
 
     def delete_promotion(self, user_id: str, promotion_id: str) -> None:
@@ -238,6 +248,8 @@ class PromotionsService:
         response = supabase.table("promotions").delete().eq("id", promotion_id).execute()
         if not response.data:
             raise Exception("No se pudo eliminar la promoción")
+        invalidate_promotion_index(restaurant_id)
+        invalidate_menu_snapshot(restaurant_id)
 
 
 promotions_service = PromotionsService()
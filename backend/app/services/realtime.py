@@ -0,0 +1,264 @@
+"""
+Notificaciones en tiempo real (Socket.IO) por restaurante, sucursal y rol.
+
+Cada conexión se autentica con el JWT de Supabase al conectar y se une a las
+salas de su restaurante: la de su sucursal (o la de "todas las sucursales" si
+el usuario no tiene una fija) y la de su rol dentro de esa sucursal. Los
+servicios emiten con emit_to_branch y el evento sólo llega a quienes miran esa
+sucursal, en lugar de difundirse a todos los clientes de todos los restaurantes.
+
+Los eventos de pedidos llevan el pedido serializado y un número de secuencia
+por sucursal (más un epoch por proceso): las pantallas aplican el cambio sin
+volver a pedir GET /orders y, si detectan un salto en la secuencia o un epoch
+distinto, hacen un único refetch completo (resync). Un evento sin pedido
+también pide resync.
+"""
+import threading
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from flask import request
+from flask_socketio import ConnectionRefusedError, emit, join_room
+
+from ..db.supabase_client import supabase
+from ..middleware.auth import AuthenticationError, get_token_from_request, verify_token
+from ..middleware.tenant import get_restaurant_id_from_slug
+from ..socketio import socketio
+from ..utils.cache import get_cache
+from ..utils.logger import setup_logger
+from ..utils.retry import execute_with_retry
+from ..utils.shared_state import get_shared_client
+from .socket_emitter import socket_emitter
+
+logger = setup_logger(__name__)
+
+ORDERS_UPDATED = "orders:updated"
+WAITER_CALLS_UPDATED = "waiter_calls:updated"
+# Servidor → cliente al conectar: secuencia vigente de su sucursal (línea base)
+ORDERS_SEQUENCE = "orders:sequence"
+
+ORDER_EVENT_VERSION = 2
+ORDER_CREATED_CHANGE = "created"
+ORDER_UPDATED_CHANGE = "updated"
+
+# Roles con pantallas en vivo (cajero, cocina, administración)
+STAFF_ROLES = ("desarrollador", "admin", "caja", "cocina")
+# La cocina no atiende llamadas al mozo
+WAITER_CALL_ROLES = ("desarrollador", "admin", "caja")
+
+_ALL_BRANCHES = "*"
+
+# Cambia en cada arranque: los clientes descartan secuencias de un epoch anterior.
+# Con estado compartido el epoch y las secuencias viven en el backend y son los
+# mismos para todos los workers.
+_local_epoch = uuid.uuid4().hex[:12]
+_shared_epoch: Optional[str] = None
+_EPOCH_KEY = "realtime:epoch"
+_sequences: Dict[Tuple[str, str], int] = {}
+_sequence_lock = threading.Lock()
+
+# branch_id → restaurant_id, para emits que sólo conocen la sucursal
+_branch_restaurant_cache = get_cache("branch-restaurant", max_entries=5000, ttl_seconds=3600)
+
+
+def room_name(restaurant_id: str, branch_id: Optional[str] = None, role: Optional[str] = None) -> str:
+    """Sala de una sucursal (o de todas, sin branch_id), opcionalmente acotada a un rol."""
+    name = f"restaurant:{restaurant_id}:branch:{branch_id or _ALL_BRANCHES}"
+    return f"{name}:role:{role}" if role else name
+
+
+def rooms_for_connection(restaurant_id: str, branch_id: Optional[str], role: str) -> List[str]:
+    return [room_name(restaurant_id, branch_id), room_name(restaurant_id, branch_id, role)]
+
+
+def target_rooms(
+    restaurant_id: str,
+    branch_id: Optional[str],
+    roles: Optional[Iterable[str]] = None,
+) -> List[str]:
+    """Salas que deben recibir un evento de la sucursal (incluye a quien mira todas)."""
+    branches = [branch_id, None] if branch_id else [None]
+    if roles is None:
+        return [room_name(restaurant_id, b) for b in branches]
+    return [room_name(restaurant_id, b, role) for b in branches for role in roles]
+
+
+def emit_to_branch(
+    event: str,
+    payload: Dict[str, Any],
+    restaurant_id: Optional[str],
+    branch_id: Optional[str],
+    roles: Optional[Iterable[str]] = None,
+) -> None:
+    """Emite un evento sólo a las salas de la sucursal. Nunca falla hacia el llamador."""
+    try:
+        restaurant_id = restaurant_id or _restaurant_for_branch(branch_id)
+        if not restaurant_id:
+            logger.warning(f"Evento {event} sin restaurante resoluble (branch={branch_id}); no se emite")
+            return
+        socket_emitter.emit(event, payload, target_rooms(restaurant_id, branch_id, roles))
+    except Exception as e:
+        logger.warning(f"No se pudo emitir {event}: {e}")
+
+
+def next_sequence(restaurant_id: str, branch_id: Optional[str]) -> int:
+    client = get_shared_client()
+    if client is not None:
+        try:
+            return int(client.incr(_sequence_key(restaurant_id, branch_id)))
+        except Exception as e:
+            logger.warning(f"Secuencia compartida no disponible, usando la local: {e}")
+    key = (str(restaurant_id), str(branch_id or _ALL_BRANCHES))
+    with _sequence_lock:
+        seq = _sequences.get(key, 0) + 1
+        _sequences[key] = seq
+    return seq
+
+
+def current_sequence(restaurant_id: str, branch_id: Optional[str]) -> Dict[str, Any]:
+    client = get_shared_client()
+    if client is not None:
+        try:
+            raw = client.get(_sequence_key(restaurant_id, branch_id))
+            return {"branch_id": branch_id, "seq": int(raw or 0), "epoch": current_epoch()}
+        except Exception as e:
+            logger.warning(f"Secuencia compartida no disponible, usando la local: {e}")
+    key = (str(restaurant_id), str(branch_id or _ALL_BRANCHES))
+    with _sequence_lock:
+        seq = _sequences.get(key, 0)
+    return {"branch_id": branch_id, "seq": seq, "epoch": _local_epoch}
+
+
+def current_epoch() -> str:
+    global _shared_epoch
+    if _shared_epoch:
+        return _shared_epoch
+    client = get_shared_client()
+    if client is None:
+        return _local_epoch
+    try:
+        # El primer worker que arranca fija el epoch; los demás lo adoptan
+        client.set(_EPOCH_KEY, _local_epoch, nx=True)
+        raw = client.get(_EPOCH_KEY)
+        _shared_epoch = raw.decode() if isinstance(raw, bytes) else str(raw)
+        return _shared_epoch
+    except Exception as e:
+        logger.warning(f"Epoch compartido no disponible: {e}")
+        return _local_epoch
+
+
+def _sequence_key(restaurant_id: str, branch_id: Optional[str]) -> str:
+    return f"realtime:seq:{restaurant_id}:{branch_id or _ALL_BRANCHES}"
+
+
+def emit_order_delta(
+    order: Optional[Dict[str, Any]],
+    change: str,
+    restaurant_id: Optional[str],
+    branch_id: Optional[str],
+    mesa_id: Optional[str] = None,
+) -> None:
+    """
+    Emite orders:updated con el pedido serializado y la secuencia de la sucursal.
+
+    Conserva branch_id y mesa_id de la versión anterior del evento, así los
+    clientes viejos siguen funcionando (refetch al recibirlo). Con order=None
+    el evento es una señal de resync: el cliente debe volver a pedir la lista.
+    """
+    try:
+        restaurant_id = restaurant_id or _restaurant_for_branch(branch_id)
+        if not restaurant_id:
+            logger.warning(f"Delta de pedido sin restaurante resoluble (branch={branch_id}); no se emite")
+            return
+        payload = {
+            "v": ORDER_EVENT_VERSION,
+            "change": change,
+            "branch_id": branch_id,
+            "mesa_id": mesa_id or (order or {}).get("mesa_id"),
+            "epoch": current_epoch(),
+            "order": order,
+        }
+
+        # La secuencia se asigna al salir: los cambios del mismo pedido que se
+        # coalescen no dejan huecos que los clientes confundan con pérdidas
+        def _with_sequence(pending: Dict[str, Any]) -> Dict[str, Any]:
+            return {**pending, "seq": next_sequence(restaurant_id, branch_id)}
+
+        socket_emitter.emit(
+            ORDERS_UPDATED,
+            payload,
+            target_rooms(restaurant_id, branch_id),
+            coalesce_key=(order or {}).get("id"),
+            prepare=_with_sequence,
+        )
+    except Exception as e:
+        logger.warning(f"No se pudo emitir {ORDERS_UPDATED}: {e}")
+
+
+def _restaurant_for_branch(branch_id: Optional[str]) -> Optional[str]:
+    if not branch_id:
+        return None
+    cached = _branch_restaurant_cache.get(branch_id)
+    if cached:
+        return cached
+
+    def _run():
+        return (
+            supabase.table("branches")
+            .select("restaurant_id")
+            .eq("id", branch_id)
+            .limit(1)
+            .execute()
+        )
+
+    rows = execute_with_retry(_run).data or []
+    restaurant_id = rows[0].get("restaurant_id") if rows else None
+    if restaurant_id:
+        _branch_restaurant_cache.set(branch_id, restaurant_id)
+    return restaurant_id
+
+
+@socketio.on("connect")
+def handle_connect(auth=None):
+    """
+    Autentica la conexión y la une a sus salas.
+
+    El cliente manda en `auth`: token (JWT de Supabase), restaurantSlug y
+    opcionalmente branchId (sólo usuarios sin sucursal fija pueden elegirla).
+    """
+    auth = auth if isinstance(auth, dict) else {}
+    token = auth.get("token") or get_token_from_request()
+    if not token:
+        raise ConnectionRefusedError("unauthorized")
+    try:
+        user = verify_token(token)
+    except AuthenticationError:
+        raise ConnectionRefusedError("unauthorized")
+
+    role = user.get("role")
+    if role not in STAFF_ROLES:
+        raise ConnectionRefusedError("forbidden")
+
+    slug = auth.get("restaurantSlug") or request.args.get("restaurantSlug")
+    restaurant_id = get_restaurant_id_from_slug(slug) if slug else user.get("org_id")
+    if not restaurant_id:
+        raise ConnectionRefusedError("restaurant not found")
+    if role != "desarrollador" and str(user.get("org_id") or "") != str(restaurant_id):
+        raise ConnectionRefusedError("forbidden")
+
+    requested_branch = auth.get("branchId") or request.args.get("branchId")
+    user_branch = user.get("branch_id")
+    if user_branch and requested_branch and str(requested_branch) != str(user_branch):
+        raise ConnectionRefusedError("forbidden")
+    branch_id = user_branch or requested_branch
+    if branch_id and not user_branch and str(_restaurant_for_branch(branch_id) or "") != str(restaurant_id):
+        raise ConnectionRefusedError("forbidden")
+
+    for room in rooms_for_connection(restaurant_id, branch_id, role):
+        join_room(room)
+    emit(ORDERS_SEQUENCE, current_sequence(restaurant_id, branch_id))
+    logger.info(
+        f"Socket conectado: user={user.get('id')} role={role} "
+        f"restaurant={restaurant_id} branch={branch_id or _ALL_BRANCHES}"
+    )
+
@@ -0,0 +1,113 @@
+"""
+Grafo de recetas por sucursal.
+
+Guarda, para cada producto del menú, su disponibilidad y los ingredientes que
+consume por unidad. Se arma con una sola consulta (menu + recipes embebidas)
+y se cachea unos segundos, así validar un carrito no depende de su tamaño.
+El stock actual NO forma parte del grafo: siempre se lee en vivo.
+La caché es compartida entre workers y las invalidaciones se publican, así un
+cambio de receta o disponibilidad no queda oculto en la copia de otro proceso.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from ..db.supabase_client import supabase
+from ..utils.cache import get_cache, invalidate
+from ..utils.retry import execute_with_retry
+
+_RECIPE_GRAPH_NAMESPACE = "recipe-graph"
+_RECIPE_GRAPH_TTL_SECONDS = 30
+_RECIPE_GRAPH_MAX_ENTRIES = 500
+_RECIPE_GRAPH_CACHE = get_cache(
+    _RECIPE_GRAPH_NAMESPACE,
+    max_entries=_RECIPE_GRAPH_MAX_ENTRIES,
+    ttl_seconds=_RECIPE_GRAPH_TTL_SECONDS,
+    shared=True,
+)
+
+
+def _cache_key(restaurant_id: Optional[str], branch_id: Optional[str]) -> str:
+    # Termina en ":" para que la clave sirva como prefijo exacto al invalidar
+    return f"{restaurant_id or 'all'}:{branch_id or 'all'}:"
+
+
+def get_recipe_graph(
+    restaurant_id: Optional[str],
+    branch_id: Optional[str],
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Devuelve {product_id: {"name", "available", "branch_id", "recipe": [[ingredient_id, qty]]}}
+    con ids normalizados a str.
+    """
+    return _get_entry(restaurant_id, branch_id)["value"]
+
+
+def get_products_using_ingredients(
+    restaurant_id: Optional[str],
+    branch_id: Optional[str],
+    ingredient_ids: Iterable[Any],
+) -> Set[str]:
+    """Índice inverso: productos cuya receta usa alguno de los ingredientes dados."""
+    by_ingredient = _get_entry(restaurant_id, branch_id)["by_ingredient"]
+    product_ids: Set[str] = set()
+    for ingredient_id in ingredient_ids:
+        product_ids.update(by_ingredient.get(str(ingredient_id), ()))
+    return product_ids
+
+
+def _get_entry(restaurant_id: Optional[str], branch_id: Optional[str]) -> Dict[str, Any]:
+    key = _cache_key(restaurant_id, branch_id)
+    entry = _RECIPE_GRAPH_CACHE.get(key)
+    if entry is not None:
+        return entry
+
+    def _run():
+        query = supabase.table("menu").select(
+            "id, name, available, branch_id, recipes(ingredient_id, quantity)"
+        )
+        if restaurant_id:
+            query = query.eq("restaurant_id", restaurant_id)
+        if branch_id:
+            query = query.eq("branch_id", branch_id)
+        return query.execute()
+
+    rows = execute_with_retry(_run).data or []
+    # Solo listas y dicts: el grafo se guarda como JSON en la capa compartida
+    graph: Dict[str, Dict[str, Any]] = {}
+    by_ingredient: Dict[str, List[str]] = {}
+    for row in rows:
+        product_id = row.get("id")
+        if product_id is None:
+            continue
+        product_key = str(product_id)
+        recipe: List[List[Any]] = []
+        for recipe_row in (row.get("recipes") or []):
+            ingredient_id = recipe_row.get("ingredient_id")
+            if ingredient_id is None:
+                continue
+            try:
+                unit_qty = float(recipe_row.get("quantity") or 0)
+            except (TypeError, ValueError):
+                unit_qty = 0.0
+            recipe.append([str(ingredient_id), unit_qty])
+            products = by_ingredient.setdefault(str(ingredient_id), [])
+            if product_key not in products:
+                products.append(product_key)
+        graph[product_key] = {
+            "name": row.get("name"),
+            "available": row.get("available"),
+            "branch_id": row.get("branch_id"),
+            "recipe": recipe,
+        }
+
+    entry = {"value": graph, "by_ingredient": by_ingredient}
+    _RECIPE_GRAPH_CACHE.set(key, entry)
+    return entry
+
+
+def invalidate_recipe_graph(restaurant_id: Optional[str], branch_id: Optional[str] = None) -> None:
+    """Descarta el grafo de una sucursal, o de todo el restaurante si branch_id es None."""
+    if branch_id:
+        invalidate(_RECIPE_GRAPH_NAMESPACE, _cache_key(restaurant_id, branch_id))
+        invalidate(_RECIPE_GRAPH_NAMESPACE, _cache_key(restaurant_id, None))
+        return
+    invalidate(_RECIPE_GRAPH_NAMESPACE, f"{restaurant_id or 'all'}:")
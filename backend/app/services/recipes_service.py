@@ -1,6 +1,7 @@
 from typing import Dict, List, Optional
 from ..db.supabase_client import supabase
 from ..services.menu_service import menu_service
+from .recipe_graph import invalidate_recipe_graph
 from ..utils.retry import execute_with_retry
 from ..utils.units import to_display_unit
 
@@ -92,6 +93,7 @@ class RecipesService:
         row = (response.data or [None])[0]
         if not row:
             raise Exception("No se pudo agregar el ingrediente a la receta")
+        invalidate_recipe_graph(restaurant_id)
         try:
             menu_service.sync_unavailable_from_stock(
                 restaurant_id=restaurant_id,
@@ -122,6 +124,7 @@ class RecipesService:
         row = (response.data or [None])[0]
         if not row:
             raise LookupError("Receta no encontrada")
+        invalidate_recipe_graph(restaurant_id)
         try:
             menu_service.sync_unavailable_from_stock(
                 restaurant_id=restaurant_id,
@@ -148,6 +151,7 @@ class RecipesService:
         )
         if not response.data:
             raise LookupError("Receta no encontrada")
+        invalidate_recipe_graph(restaurant_id)
         try:
             menu_service.sync_unavailable_from_stock(
                 restaurant_id=restaurant_id,
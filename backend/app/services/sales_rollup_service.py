@@ -0,0 +1,178 @@
+"""
+Agregados de ventas pre-calculados (sales_daily_rollups / sales_product_daily_rollups).
+
+Los renglones se mantienen en Postgres con record_order_rollup(), que es
+idempotente: se llama cada vez que un pedido se crea o cambia de estado y solo
+aplica la diferencia contra lo ya contabilizado.
+"""
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+from ..config import Config
+from ..db.supabase_client import supabase
+from ..utils.logger import setup_logger
+from ..utils.retry import execute_with_retry
+from ..utils.supabase_errors import is_missing_function_error
+from .domain_events import ORDER_CREATED, ORDER_STATUS_CHANGED, subscribe
+
+logger = setup_logger(__name__)
+
+_PAGE_SIZE = 1000
+
+_DAILY_COLUMNS = (
+    "local_date, revenue, orders_created, paid_orders, cancelled_orders, "
+    "payments_card, payments_cash, payments_qr, payments_wallet, paid_orders_by_hour, "
+    "accepted_orders, orders_card, orders_cash, orders_qr, orders_wallet"
+)
+_DAILY_COUNTERS = (
+    "orders_created",
+    "paid_orders",
+    "cancelled_orders",
+    "payments_card",
+    "payments_cash",
+    "payments_qr",
+    "payments_wallet",
+    "accepted_orders",
+    "orders_card",
+    "orders_cash",
+    "orders_qr",
+    "orders_wallet",
+)
+
+
+class SalesRollupService:
+    def __init__(self) -> None:
+        self.tz_offset_minutes = Config.SALES_ROLLUP_TZ_OFFSET_MINUTES
+        self.enabled = Config.METRICS_USE_ROLLUPS
+
+    def supports_offset(self, tz_offset_minutes: Optional[int]) -> bool:
+        """Los agregados solo sirven si el día local coincide con el que se usó al armarlos."""
+        return self.enabled and (tz_offset_minutes or 0) == self.tz_offset_minutes
+
+    def record_order(self, order_id: Optional[str]) -> None:
+        """Contabiliza el estado actual del pedido. Nunca interrumpe el flujo que lo llama."""
+        if not order_id:
+            return
+        try:
+            supabase.rpc(
+                "record_order_rollup",
+                {"p_order_id": order_id, "p_tz_offset_minutes": self.tz_offset_minutes},
+            ).execute()
+        except Exception as e:
+            if is_missing_function_error(e, "record_order_rollup"):
+                logger.info("RPC record_order_rollup no disponible; se omite agregado de ventas")
+                return
+            logger.warning(f"No se pudo actualizar agregados de ventas para pedido {order_id}: {e}")
+
+    def backfill(self, restaurant_id: Optional[str] = None) -> int:
+        """Recorre el histórico de pedidos y completa los agregados. Devuelve pedidos procesados."""
+        response = supabase.rpc(
+            "backfill_sales_rollups",
+            {"p_restaurant_id": restaurant_id, "p_tz_offset_minutes": self.tz_offset_minutes},
+        ).execute()
+        return int(response.data or 0)
+
+    def get_daily(
+        self,
+        restaurant_id: str,
+        branch_id: Optional[str],
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Devuelve {YYYY-MM-DD: renglón} sumando sucursales cuando branch_id es None.
+        paid_orders_by_hour queda como lista de 24 enteros.
+        """
+        rows = self._fetch_all(
+            "sales_daily_rollups", _DAILY_COLUMNS, restaurant_id, branch_id, date_from, date_to
+        )
+        by_date: Dict[str, Dict[str, Any]] = {}
+        for row in rows:
+            key = str(row.get("local_date"))
+            entry = by_date.get(key)
+            if entry is None:
+                entry = {"revenue": 0.0, "paid_orders_by_hour": [0] * 24}
+                entry.update({counter: 0 for counter in _DAILY_COUNTERS})
+                by_date[key] = entry
+            entry["revenue"] += float(row.get("revenue") or 0)
+            for counter in _DAILY_COUNTERS:
+                entry[counter] += int(row.get(counter) or 0)
+            hours = row.get("paid_orders_by_hour") or []
+            for hour, count in enumerate(hours[:24]):
+                entry["paid_orders_by_hour"][hour] += int(count or 0)
+        return by_date
+
+    def get_products(
+        self,
+        restaurant_id: str,
+        branch_id: Optional[str],
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+    ) -> Dict[str, Dict[str, Any]]:
+        """Devuelve {product_id: {name, quantity, revenue, orders_count}} del rango."""
+        rows = self._fetch_all(
+            "sales_product_daily_rollups",
+            "local_date, product_id, name, quantity, revenue, orders_count",
+            restaurant_id,
+            branch_id,
+            date_from,
+            date_to,
+        )
+        by_product: Dict[str, Dict[str, Any]] = {}
+        for row in rows:
+            product_id = row.get("product_id")
+            if product_id is None:
+                continue
+            entry = by_product.setdefault(
+                str(product_id),
+                {"name": row.get("name"), "quantity": 0.0, "revenue": 0.0, "orders_count": 0},
+            )
+            entry["name"] = entry.get("name") or row.get("name")
+            entry["quantity"] += float(row.get("quantity") or 0)
+            entry["revenue"] += float(row.get("revenue") or 0)
+            entry["orders_count"] += int(row.get("orders_count") or 0)
+        return by_product
+
+    def _fetch_all(
+        self,
+        table: str,
+        columns: str,
+        restaurant_id: str,
+        branch_id: Optional[str],
+        date_from: Optional[date],
+        date_to: Optional[date],
+    ) -> List[Dict]:
+        rows: List[Dict] = []
+        offset = 0
+        while True:
+            def _run():
+                query = (
+                    supabase.table(table)
+                    .select(columns)
+                    .eq("restaurant_id", restaurant_id)
+                    .eq("tz_offset_minutes", self.tz_offset_minutes)
+                )
+                if branch_id:
+                    query = query.eq("branch_id", branch_id)
+                if date_from:
+                    query = query.gte("local_date", date_from.isoformat())
+                if date_to:
+                    query = query.lte("local_date", date_to.isoformat())
+                return query.order("local_date").range(offset, offset + _PAGE_SIZE - 1).execute()
+
+            page = execute_with_retry(_run).data or []
+            rows.extend(page)
+            if len(page) < _PAGE_SIZE:
+                return rows
+            offset += _PAGE_SIZE
+
+
+sales_rollup_service = SalesRollupService()
+
+
+def _on_order_event(event: Dict[str, Any]) -> None:
+    sales_rollup_service.record_order(event.get("order_id"))
+
+
+subscribe(ORDER_CREATED, _on_order_event)
+subscribe(ORDER_STATUS_CHANGED, _on_order_event)
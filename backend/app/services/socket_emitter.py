@@ -0,0 +1,135 @@
+"""
+Emisor de eventos Socket.IO fuera del request, con coalescing por ventana.
+
+Los servicios encolan (evento, payload, salas) y vuelven enseguida; una tarea de
+fondo vacía la cola cada SOCKET_EMIT_COALESCE_MS y emite en lote. Si dentro de
+la ventana llega otro evento con la misma clave (evento + salas + clave de
+coalescing, p. ej. el id del pedido) reemplaza al pendiente en lugar de sumarse:
+en hora pico cinco cambios del mismo pedido salen como una sola notificación.
+Con ventana 0 (o sin servidor Socket.IO inicializado) se emite en el momento.
+Si la cola está llena el evento también sale en el momento, en el hilo que lo
+encola: descartarlo no dejaría hueco en la secuencia (se asigna al emitir) y
+los clientes nunca se enterarían de que tienen que resincronizar.
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+from ..config import Config
+from ..socketio import socketio
+from ..utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+PayloadHook = Callable[[Dict[str, Any]], Dict[str, Any]]
+
+
+class _PendingEvent:
+    __slots__ = ("event", "payload", "rooms", "prepare")
+
+    def __init__(self, event: str, payload: Dict[str, Any], rooms: list, prepare: Optional[PayloadHook]):
+        self.event = event
+        self.payload = payload
+        self.rooms = rooms
+        self.prepare = prepare
+
+
+class CoalescingEmitter:
+    def __init__(self, window_ms: int, max_pending: int) -> None:
+        self.window_seconds = max(0, window_ms) / 1000.0
+        self.max_pending = max_pending
+        self._pending: "OrderedDict[Tuple[Hashable, ...], _PendingEvent]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._flusher_started = False
+        self._counters = {
+            "enqueued": 0,
+            "coalesced": 0,
+            "emitted": 0,
+            "overflowed": 0,
+            "errors": 0,
+            "batches": 0,
+        }
+
+    def emit(
+        self,
+        event: str,
+        payload: Dict[str, Any],
+        rooms: Iterable[str],
+        coalesce_key: Hashable = None,
+        prepare: Optional[PayloadHook] = None,
+    ) -> None:
+        """
+        Encola un evento. prepare (opcional) se llama al emitir, con el payload
+        final: sirve para datos que dependen del orden real de salida (secuencias).
+        """
+        rooms = list(rooms)
+        if self.window_seconds <= 0 or socketio.server is None:
+            self._count("enqueued")
+            self._emit_now(_PendingEvent(event, payload, rooms, prepare))
+            return
+
+        key = (event, tuple(rooms), coalesce_key)
+        overflow = None
+        with self._lock:
+            self._counters["enqueued"] += 1
+            if key in self._pending:
+                self._pending[key] = _PendingEvent(event, payload, rooms, prepare)
+                self._counters["coalesced"] += 1
+            elif len(self._pending) >= self.max_pending:
+                self._counters["overflowed"] += 1
+                overflow = _PendingEvent(event, payload, rooms, prepare)
+            else:
+                self._pending[key] = _PendingEvent(event, payload, rooms, prepare)
+            start_flusher = not self._flusher_started
+            self._flusher_started = True
+        if start_flusher:
+            socketio.start_background_task(self._run)
+        if overflow is not None:
+            logger.warning(f"Cola de eventos llena ({self.max_pending}); {event} se emite sin coalescing")
+            self._emit_now(overflow)
+
+    def flush(self) -> int:
+        """Emite todo lo pendiente. Devuelve cuántos eventos salieron."""
+        with self._lock:
+            batch = list(self._pending.values())
+            self._pending.clear()
+            if batch:
+                self._counters["batches"] += 1
+        for pending in batch:
+            self._emit_now(pending)
+        return len(batch)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._counters,
+                "pending": len(self._pending),
+                "window_ms": int(self.window_seconds * 1000),
+            }
+
+    def _run(self) -> None:
+        while True:
+            socketio.sleep(self.window_seconds)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error vaciando la cola de eventos: {e}")
+
+    def _emit_now(self, pending: _PendingEvent) -> None:
+        try:
+            payload = pending.prepare(pending.payload) if pending.prepare else pending.payload
+            socketio.emit(pending.event, payload, to=pending.rooms)
+            self._count("emitted")
+        except Exception as e:
+            self._count("errors")
+            logger.warning(f"No se pudo emitir {pending.event}: {e}")
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+
+socket_emitter = CoalescingEmitter(
+    window_ms=Config.SOCKET_EMIT_COALESCE_MS,
+    max_pending=Config.SOCKET_EMIT_MAX_PENDING,
+)
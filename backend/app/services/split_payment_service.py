@@ -10,8 +10,9 @@ from ..db.models import OrderStatus
 from ..utils.retry import execute_with_retry
 from ..utils.logger import setup_logger
 from ..utils.supabase_errors import is_missing_relation_error, is_undefined_column_error
-from ..socketio import socketio
 from .cash_service import cash_service
+from .domain_events import ORDER_STATUS_CHANGED, publish_order_event
+from .order_service import order_service
 
 logger = setup_logger(__name__)
 
@@ -135,6 +136,12 @@ class SplitPaymentService:
             "paid_amount": new_paid_amount,
         }
         self._update_order_with_paid_amount_fallback(order_id, order_update)
+        if new_status != order.get("status"):
+            publish_order_event(
+                ORDER_STATUS_CHANGED,
+                {**order, "status": new_status},
+                previous_status=order.get("status"),
+            )
 
         # 5. Record cash movement if payment row exists
         if payment_persisted:
@@ -151,13 +158,12 @@ class SplitPaymentService:
                 )
 
         # 6. Emit socket event
-        try:
-            socketio.emit("orders:updated", {
-                "branch_id": branch_id or order.get("branch_id"),
-                "mesa_id": order.get("mesa_id"),
-            })
-        except Exception:
-            pass
+        order_service.emit_order_changed({
+            **order,
+            **order_update,
+            "restaurant_id": restaurant_id or order.get("restaurant_id"),
+            "branch_id": branch_id or order.get("branch_id"),
+        })
 
         return {
             "payment": payment,
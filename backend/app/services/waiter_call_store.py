@@ -0,0 +1,283 @@
+"""
+Almacenamiento de llamadas al mozo.
+
+WaiterService sólo conoce esta interfaz; la implementación sale de la
+configuración: en memoria del proceso (un worker) o en el backend compartido
+(SHARED_STATE_URL), donde todos los workers ven las mismas llamadas y la
+detección de duplicados es atómica (SET NX por mesa).
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from ..config import Config
+from ..utils.logger import setup_logger
+from ..utils.shared_state import get_shared_client
+
+logger = setup_logger(__name__)
+
+# Recibe una copia de la llamada y devuelve la versión a guardar (o la misma si no cambia)
+CallMutation = Callable[[Dict], Dict]
+
+
+class LocalWaiterCallStore:
+    """
+    Llamadas en memoria del proceso, indexadas:
+        (branch_id, mesa_id) → id de la llamada PENDING   (duplicados en O(1))
+        branch_id → status → ids                          (listado por sucursal)
+    Las llamadas cerradas vencen a los finished_ttl segundos (y se conservan como
+    máximo max_finished); las PENDING olvidadas, a los pending_ttl segundos.
+    """
+
+    def __init__(
+        self,
+        finished_ttl_seconds: float = 3600,
+        pending_ttl_seconds: float = 86400,
+        max_finished: int = 5000,
+    ) -> None:
+        self.finished_ttl = finished_ttl_seconds
+        self.pending_ttl = pending_ttl_seconds
+        self.max_finished = max(0, int(max_finished))
+        self._calls: Dict[str, Dict] = {}
+        self._pending_by_mesa: Dict[Tuple[str, str], str] = {}
+        self._by_branch: Dict[str, Dict[str, Set[str]]] = {}
+        # id → instante de alta / cierre, en orden de llegada (para vencer desde el frente)
+        self._pending_since: "OrderedDict[str, float]" = OrderedDict()
+        self._finished_at: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add_if_no_pending(self, call: Dict) -> Tuple[Dict, bool]:
+        """Guarda la llamada salvo que la mesa ya tenga una PENDING; devuelve (llamada, ya_existía)."""
+        mesa_key = _mesa_key(call)
+        with self._lock:
+            self._evict_expired(time.time())
+            existing_id = self._pending_by_mesa.get(mesa_key)
+            if existing_id is not None:
+                return dict(self._calls[existing_id]), True
+            stored = dict(call)
+            self._calls[stored['id']] = stored
+            self._index(stored)
+            return dict(stored), False
+
+    def get(self, call_id: str) -> Optional[Dict]:
+        with self._lock:
+            call = self._calls.get(call_id)
+            return dict(call) if call else None
+
+    def update(self, call_id: str, mutate: CallMutation) -> Optional[Dict]:
+        """Aplica mutate de forma atómica. None si la llamada no existe."""
+        with self._lock:
+            current = self._calls.get(call_id)
+            if current is None:
+                return None
+            updated = mutate(dict(current))
+            if updated != current:
+                self._unindex(current)
+                self._calls[call_id] = updated
+                self._index(updated)
+            self._evict_expired(time.time())
+            return dict(updated)
+
+    def list(self, status: Optional[str] = None, branch_id: Optional[str] = None) -> List[Dict]:
+        with self._lock:
+            self._evict_expired(time.time())
+            if branch_id is not None:
+                branches = [self._by_branch.get(str(branch_id), {})]
+            else:
+                branches = list(self._by_branch.values())
+            ids: List[str] = []
+            for statuses in branches:
+                if status:
+                    ids.extend(statuses.get(status, ()))
+                else:
+                    for status_ids in statuses.values():
+                        ids.extend(status_ids)
+            return [dict(self._calls[call_id]) for call_id in ids]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._calls.clear()
+            self._pending_by_mesa.clear()
+            self._by_branch.clear()
+            self._pending_since.clear()
+            self._finished_at.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    def _index(self, call: Dict) -> None:
+        call_id = call['id']
+        status = call.get('status')
+        self._by_branch.setdefault(str(call.get('branch_id')), {}).setdefault(status, set()).add(call_id)
+        if status == 'PENDING':
+            self._pending_by_mesa[_mesa_key(call)] = call_id
+            self._pending_since.setdefault(call_id, time.time())
+        else:
+            self._finished_at[call_id] = time.time()
+            self._finished_at.move_to_end(call_id)
+
+    def _unindex(self, call: Dict) -> None:
+        call_id = call['id']
+        branch_key = str(call.get('branch_id'))
+        statuses = self._by_branch.get(branch_key)
+        if statuses is not None:
+            status_ids = statuses.get(call.get('status'))
+            if status_ids is not None:
+                status_ids.discard(call_id)
+                if not status_ids:
+                    del statuses[call.get('status')]
+            if not statuses:
+                del self._by_branch[branch_key]
+        if self._pending_by_mesa.get(_mesa_key(call)) == call_id:
+            del self._pending_by_mesa[_mesa_key(call)]
+        self._pending_since.pop(call_id, None)
+        self._finished_at.pop(call_id, None)
+
+    def _evict_expired(self, now: float) -> None:
+        while self._finished_at:
+            call_id, finished_at = next(iter(self._finished_at.items()))
+            if finished_at + self.finished_ttl > now and len(self._finished_at) <= self.max_finished:
+                break
+            self._drop(call_id)
+        while self._pending_since:
+            call_id, since = next(iter(self._pending_since.items()))
+            if since + self.pending_ttl > now:
+                break
+            self._drop(call_id)
+
+    def _drop(self, call_id: str) -> None:
+        call = self._calls.pop(call_id, None)
+        if call is not None:
+            self._unindex(call)
+        else:
+            self._pending_since.pop(call_id, None)
+            self._finished_at.pop(call_id, None)
+
+
+class SharedWaiterCallStore:
+    """
+    Llamadas en un servidor compatible con Redis:
+        waiter:call:<id>                  JSON de la llamada (con TTL)
+        waiter:pending:<branch>:<mesa>    id de la llamada PENDING de la mesa (SET NX)
+        waiter:branch:<branch>            ids de la sucursal
+        waiter:branches                   sucursales con llamadas
+    """
+
+    PREFIX = "waiter"
+
+    def __init__(self, client, ttl_seconds: int, finished_ttl_seconds: Optional[int] = None) -> None:
+        self._client = client
+        self._ttl = max(60, int(ttl_seconds))
+        self._finished_ttl = max(1, int(finished_ttl_seconds or self._ttl))
+
+    def add_if_no_pending(self, call: Dict) -> Tuple[Dict, bool]:
+        pending_key = self._pending_key(call.get('branch_id'), call.get('mesa_id'))
+        for _ in range(2):
+            if self._client.set(pending_key, call['id'], nx=True, ex=self._ttl):
+                pipe = self._client.pipeline()
+                pipe.set(self._call_key(call['id']), json.dumps(call), ex=self._ttl)
+                pipe.sadd(self._branch_key(call.get('branch_id')), call['id'])
+                pipe.sadd(f"{self.PREFIX}:branches", str(call.get('branch_id')))
+                pipe.execute()
+                return dict(call), False
+            existing = self.get(_decode(self._client.get(pending_key)))
+            if existing and existing.get('status') == 'PENDING':
+                return existing, True
+            # Índice huérfano (llamada vencida o ya cerrada): liberar y reintentar
+            self._client.delete(pending_key)
+        raise RuntimeError("No se pudo registrar la llamada al mozo")
+
+    def get(self, call_id: Optional[str]) -> Optional[Dict]:
+        if not call_id:
+            return None
+        raw = self._client.get(self._call_key(call_id))
+        return json.loads(raw) if raw else None
+
+    def update(self, call_id: str, mutate: CallMutation) -> Optional[Dict]:
+        key = self._call_key(call_id)
+        result: Dict[str, Optional[Dict]] = {}
+
+        def _transaction(pipe):
+            raw = pipe.get(key)
+            if not raw:
+                result['call'] = None
+                return
+            current = json.loads(raw)
+            updated = mutate(dict(current))
+            pipe.multi()
+            ttl = self._ttl if updated.get('status') == 'PENDING' else self._finished_ttl
+            pipe.set(key, json.dumps(updated), ex=ttl)
+            if current.get('status') == 'PENDING' and updated.get('status') != 'PENDING':
+                pipe.delete(self._pending_key(updated.get('branch_id'), updated.get('mesa_id')))
+            result['call'] = updated
+
+        # WATCH sobre la llamada: si otro worker la cambia en el medio, se reintenta
+        self._client.transaction(_transaction, key)
+        return result.get('call')
+
+    def list(self, status: Optional[str] = None, branch_id: Optional[str] = None) -> List[Dict]:
+        if branch_id:
+            branches = [branch_id]
+        else:
+            branches = [_decode(b) for b in self._client.smembers(f"{self.PREFIX}:branches")]
+        calls: List[Dict] = []
+        for branch in branches:
+            branch_key = self._branch_key(branch)
+            ids = [_decode(i) for i in self._client.smembers(branch_key)]
+            if not ids:
+                continue
+            raws = self._client.mget([self._call_key(i) for i in ids])
+            expired = [call_id for call_id, raw in zip(ids, raws) if raw is None]
+            if expired:
+                self._client.srem(branch_key, *expired)
+            for raw in raws:
+                if raw is None:
+                    continue
+                call = json.loads(raw)
+                if not status or call.get('status') == status:
+                    calls.append(call)
+        return calls
+
+    def clear(self) -> None:
+        keys = list(self._client.scan_iter(match=f"{self.PREFIX}:*", count=500))
+        if keys:
+            self._client.delete(*keys)
+
+    def _call_key(self, call_id: str) -> str:
+        return f"{self.PREFIX}:call:{call_id}"
+
+    def _pending_key(self, branch_id, mesa_id) -> str:
+        return f"{self.PREFIX}:pending:{branch_id}:{mesa_id}"
+
+    def _branch_key(self, branch_id) -> str:
+        return f"{self.PREFIX}:branch:{branch_id}"
+
+
+def _mesa_key(call: Dict) -> Tuple[str, str]:
+    return (str(call.get('branch_id')), str(call.get('mesa_id')))
+
+
+def _decode(value) -> Optional[str]:
+    if isinstance(value, bytes):
+        return value.decode()
+    return value
+
+
+def create_waiter_call_store():
+    """Store compartido si hay backend configurado; si no, en memoria."""
+    client = get_shared_client()
+    if client is not None:
+        logger.info("Llamadas al mozo en el backend compartido")
+        return SharedWaiterCallStore(
+            client,
+            Config.WAITER_CALL_TTL_SECONDS,
+            finished_ttl_seconds=Config.WAITER_CALL_FINISHED_TTL_SECONDS,
+        )
+    return LocalWaiterCallStore(
+        finished_ttl_seconds=Config.WAITER_CALL_FINISHED_TTL_SECONDS,
+        pending_ttl_seconds=Config.WAITER_CALL_TTL_SECONDS,
+        max_finished=Config.WAITER_CALL_MAX_FINISHED,
+    )
@@ -5,12 +5,12 @@ Contiene toda la logica de negocio de notificaciones al mozo
 
 from typing import Dict, List, Optional, Tuple
 from datetime import datetime, timezone
-import threading
 import uuid
 from ..utils.logger import setup_logger
 from ..services.order_service import order_service
 from ..utils.token_manager import validate_token
-from ..socketio import socketio
+from .realtime import WAITER_CALL_ROLES, WAITER_CALLS_UPDATED, emit_to_branch
+from .waiter_call_store import create_waiter_call_store
 
 logger = setup_logger(__name__)
 
@@ -40,8 +40,8 @@ class WaiterService:
     def __init__(self):
         """Inicializar el servicio"""
         self.logger = logger
-        self._calls: Dict[str, Dict] = {}
-        self._lock = threading.Lock()
+        # En memoria o en el backend compartido (varios workers), según configuración
+        self._store = create_waiter_call_store()
 
     @staticmethod
     def _now_iso() -> str:
@@ -54,6 +54,7 @@ class WaiterService:
         branch_id: Optional[str] = None,
         token: Optional[str] = None,
         skip_token_validation: bool = False,
+        restaurant_id: Optional[str] = None,
     ) -> Tuple[Dict, bool]:
         """
         Crear una nueva llamada al mozo.
@@ -64,6 +65,7 @@ class WaiterService:
                   message y usuario_id opcionales.
             mesa_id: Mesa a validar (si no viene en data).
             token: Token de mesa a validar.
+            restaurant_id: Restaurante de la sucursal (para notificar sólo a su sala).
 
         Returns:
             Tupla con (llamada, already_pending)
@@ -109,43 +111,37 @@ class WaiterService:
 
             usuario_id = data.get('usuario_id', '')
             message = data.get('message', '')
-            with self._lock:
-                # Evitar duplicados: si ya existe una llamada PENDING para la mesa, devolverla
-                for call in self._calls.values():
-                    if call.get('mesa_id') == mesa_id and call.get('status') == 'PENDING':
-                        logger.info(
-                            f"Llamada PENDING ya existente para mesa_id: {mesa_id}. "
-                            "No se crea un duplicado."
-                        )
-                        return dict(call), True
-
-                call_id = str(uuid.uuid4())
-                now = self._now_iso()
-                new_call = {
-                    'id': call_id,
-                    'mesa_id': mesa_id,
-                    'branch_id': branch_id,
-                    'payment_method': payment_method,
-                    'status': 'PENDING',
-                    'usuario_id': usuario_id,
-                    'message': message,
-                    'motivo': motivo or '',
-                    'created_at': now,
-                    'updated_at': now,
-                }
-                self._calls[call_id] = new_call
+            now = self._now_iso()
+            new_call = {
+                'id': str(uuid.uuid4()),
+                'mesa_id': mesa_id,
+                'branch_id': branch_id,
+                'restaurant_id': restaurant_id,
+                'payment_method': payment_method,
+                'status': 'PENDING',
+                'usuario_id': usuario_id,
+                'message': message,
+                'motivo': motivo or '',
+                'created_at': now,
+                'updated_at': now,
+            }
+            # Evitar duplicados: si ya existe una llamada PENDING para la mesa, devolverla
+            stored_call, already_pending = self._store.add_if_no_pending(new_call)
+            if already_pending:
+                logger.info(
+                    f"Llamada PENDING ya existente para mesa_id: {mesa_id}. "
+                    "No se crea un duplicado."
+                )
+                return stored_call, True
 
             logger.info(
                 f"Nueva llamada al mozo creada - mesa_id: {mesa_id}, "
                 f"payment_method: {payment_method}"
             )
 
-            try:
-                socketio.emit("waiter_calls:updated", {"branch_id": branch_id})
-            except Exception:
-                pass
+            self._emit_calls_updated(stored_call)
 
-            return dict(new_call), False
+            return stored_call, False
 
         except (ValueError, PermissionError):
             raise
@@ -185,19 +181,12 @@ class WaiterService:
                         f"status debe ser uno de: {', '.join(self.VALID_STATUSES)}"
                     )
 
-            with self._lock:
-                calls = list(self._calls.values())
-
-            if status:
-                calls = [call for call in calls if call.get('status') == status]
-            if branch_id:
-                calls = [call for call in calls if call.get('branch_id') == branch_id]
-
+            calls = self._store.list(status=status, branch_id=branch_id)
             calls.sort(key=lambda call: call.get('created_at', ''), reverse=True)
 
             logger.info(f"Obtenidas {len(calls)} llamadas al mozo (status: {status or 'ALL'})")
 
-            return [dict(call) for call in calls]
+            return calls
 
         except ValueError:
             raise
@@ -240,13 +229,11 @@ class WaiterService:
                 f"Status debe ser uno de: {', '.join(self.VALID_STATUSES)}"
             )
 
-        with self._lock:
-            current = self._calls.get(call_id)
-            if not current:
-                logger.warning(f"Llamada no encontrada: {call_id}")
-                return None
+        previous: Dict[str, Optional[str]] = {}
 
+        def _transition(current: Dict) -> Dict:
             current_status = current.get('status')
+            previous['status'] = current_status
 
             # Validar transicion
             allowed = self.ALLOWED_TRANSITIONS.get(current_status, [])
@@ -258,17 +245,20 @@ class WaiterService:
 
             current['status'] = new_status
             current['updated_at'] = self._now_iso()
-            updated_call = dict(current)
+            return current
+
+        updated_call = self._store.update(call_id, _transition)
+        if not updated_call:
+            logger.warning(f"Llamada no encontrada: {call_id}")
+            return None
+        current_status = previous.get('status')
 
         logger.info(
             f"Estado de llamada actualizado - call_id: {call_id}, "
             f"{current_status} -> {new_status}"
         )
 
-        try:
-            socketio.emit("waiter_calls:updated", {"branch_id": updated_call.get("branch_id")})
-        except Exception:
-            pass
+        self._emit_calls_updated(updated_call)
         return updated_call
 
     def delete_call(self, call_id: str) -> Optional[Dict]:
@@ -285,20 +275,18 @@ class WaiterService:
             Exception: Si hay error interno
         """
         try:
-            with self._lock:
-                existing = self._calls.get(call_id)
-
-                if not existing:
-                    logger.warning(f"Llamada no encontrada para eliminar: {call_id}")
-                    return None
-
+            def _cancel(existing: Dict) -> Dict:
                 # Si ya esta cancelada o completada, devolver sin cambios
                 if existing.get('status') in ('CANCELLED', 'COMPLETED'):
-                    return dict(existing)
-
+                    return existing
                 existing['status'] = 'CANCELLED'
                 existing['updated_at'] = self._now_iso()
-                deleted_call = dict(existing)
+                return existing
+
+            deleted_call = self._store.update(call_id, _cancel)
+            if not deleted_call:
+                logger.warning(f"Llamada no encontrada para eliminar: {call_id}")
+                return None
 
             logger.info(f"Llamada al mozo cancelada (soft delete) - call_id: {call_id}")
 
@@ -308,6 +296,16 @@ class WaiterService:
             logger.error(f"Error al cancelar llamada: {str(e)}")
             raise Exception("Error interno del servidor")
 
+    @staticmethod
+    def _emit_calls_updated(call: Dict) -> None:
+        emit_to_branch(
+            WAITER_CALLS_UPDATED,
+            {"branch_id": call.get("branch_id")},
+            call.get("restaurant_id"),
+            call.get("branch_id"),
+            roles=WAITER_CALL_ROLES,
+        )
+
     # Metodos privados de validacion
 
     @staticmethod
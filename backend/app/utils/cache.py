@@ -0,0 +1,427 @@
+"""
+Caché en memoria con LRU + TTL por namespace y capa compartida opcional.
+
+Cada namespace (metrics, auth, tenant-slug, ...) tiene su propio límite de
+entradas y TTL, y cuenta hits / misses / evictions. Si CACHE_REDIS_URL está
+configurado (o SHARED_STATE_URL) y el paquete redis está instalado, los
+namespaces marcados como shared también leen y escriben en un servidor
+compatible con Redis, así varios workers comparten resultados; en ese caso la
+copia local vive pocos segundos. Las invalidaciones se publican además en un
+canal para que los demás workers descarten sus copias locales (incluidos los
+namespaces que sólo viven en memoria, como el índice de promociones).
+
+Para invalidar por prefijo sin recorrer el keyspace (SCAN), cada clave
+compartida se registra en un set índice por cada prefijo que termina en ":" o
+"|" ("r1:", "r1:b1:", ...); invalidar lee solo el índice del prefijo.
+"""
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from ..config import Config
+from . import shared_state
+from .logger import setup_logger
+
+logger = setup_logger(__name__)
+
+_MISSING = object()
+
+
+class _SharedTier:
+    """Cliente perezoso a un servidor compatible con Redis. Los errores nunca se propagan."""
+
+    def __init__(self, url: Optional[str]) -> None:
+        self.url = url
+        self._client = None
+        self._disabled_until = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return shared_state.backend_available(self.url)
+
+    def _get_client(self):
+        if not self.enabled or time.time() < self._disabled_until:
+            return None
+        if self._client is None:
+            self._client = shared_state.connect(
+                self.url, socket_timeout=0.2, socket_connect_timeout=0.2
+            )
+        return self._client
+
+    def _backoff(self, exc: Exception) -> None:
+        # Si el servidor no responde, dejar de intentarlo un rato
+        logger.warning(f"Caché compartida no disponible ({self.url}): {exc}")
+        self._disabled_until = time.time() + 30
+
+    def get(self, key: str) -> Any:
+        client = self._get_client()
+        if client is None:
+            return _MISSING
+        try:
+            raw = client.get(key)
+        except Exception as exc:
+            self._backoff(exc)
+            return _MISSING
+        if raw is None:
+            return _MISSING
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return _MISSING
+
+    def set(
+        self,
+        key: str,
+        value: Any,
+        ttl_seconds: float,
+        index_keys: Iterable[str] = (),
+        index_ttl_seconds: float = 0,
+    ) -> None:
+        client = self._get_client()
+        if client is None:
+            return
+        try:
+            # Valor e índices en un solo round trip
+            pipe = client.pipeline(transaction=False)
+            pipe.set(key, json.dumps(value, default=str), ex=max(1, int(ttl_seconds)))
+            for index_key in index_keys:
+                pipe.sadd(index_key, key)
+                pipe.expire(index_key, max(1, int(index_ttl_seconds)))
+            pipe.execute()
+        except Exception as exc:
+            self._backoff(exc)
+
+    def delete(self, key: str) -> None:
+        client = self._get_client()
+        if client is None:
+            return
+        try:
+            client.delete(key)
+        except Exception as exc:
+            self._backoff(exc)
+
+    def publish(self, channel: str, message: Dict[str, Any]) -> None:
+        client = self._get_client()
+        if client is None:
+            return
+        try:
+            client.publish(channel, json.dumps(message))
+        except Exception as exc:
+            self._backoff(exc)
+
+    def delete_indexed(self, lookups: List[Tuple[str, str]]) -> None:
+        """
+        Borra, para cada (índice, prefijo), las claves del índice que empiezan con
+        el prefijo. Dos round trips en total: leer los índices y borrar.
+        """
+        client = self._get_client()
+        if client is None or not lookups:
+            return
+        try:
+            pipe = client.pipeline(transaction=False)
+            for index_key, _ in lookups:
+                pipe.smembers(index_key)
+            found = pipe.execute()
+
+            pipe = client.pipeline(transaction=False)
+            for (index_key, prefix), members in zip(lookups, found):
+                keys = [
+                    key for key in (_decode(member) for member in members or ())
+                    if key.startswith(prefix)
+                ]
+                if keys:
+                    pipe.delete(*keys)
+                    pipe.srem(index_key, *keys)
+            pipe.execute()
+        except Exception as exc:
+            self._backoff(exc)
+
+
+def _decode(value: Any) -> str:
+    return value.decode("utf-8") if isinstance(value, bytes) else str(value)
+
+
+_INDEX_SEPARATORS = (":", "|")
+
+
+def _index_levels(key: str) -> List[str]:
+    """Prefijos de key que terminan en un separador, del vacío al más largo."""
+    levels = [""]
+    for pos, char in enumerate(key):
+        if char in _INDEX_SEPARATORS:
+            levels.append(key[: pos + 1])
+    return levels
+
+
+_shared_tier = _SharedTier(Config.CACHE_REDIS_URL or Config.SHARED_STATE_URL)
+
+
+class NamespaceCache:
+    """LRU + TTL acotado para un namespace. Thread-safe."""
+
+    def __init__(
+        self,
+        namespace: str,
+        max_entries: int,
+        ttl_seconds: float,
+        shared: bool = False,
+    ) -> None:
+        self.namespace = namespace
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = ttl_seconds
+        self.shared = shared
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Valor vigente o default. Las entradas vencidas quedan para get_stale hasta ser desplazadas."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                self.expirations += 1
+
+        if self._uses_shared_tier():
+            value = _shared_tier.get(self._shared_key(key))
+            if value is not _MISSING:
+                self._store_local(key, value, self.ttl_seconds)
+                with self._lock:
+                    self.hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return default
+
+    def get_stale(self, key: Hashable, default: Any = None) -> Any:
+        """Último valor conocido aunque haya vencido (para tolerar fallas de la fuente)."""
+        with self._lock:
+            entry = self._entries.get(key)
+        return entry[0] if entry is not None else default
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        if ttl <= 0:
+            return
+        self._store_local(key, value, ttl)
+        if self._uses_shared_tier():
+            # Los índices duran al menos el TTL del namespace: un set con TTL corto
+            # no debe dejar sin indexar claves más largas del mismo prefijo
+            _shared_tier.set(
+                self._shared_key(key),
+                value,
+                ttl,
+                [self._index_key(level) for level in _index_levels(str(key))],
+                max(ttl, self.ttl_seconds),
+            )
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+        if self._uses_shared_tier():
+            _shared_tier.delete(self._shared_key(key))
+
+    def invalidate_prefix(self, prefix: str) -> int:
+        """
+        Descarta las claves (str) que empiezan con prefix en este worker y en la capa
+        compartida. Devuelve cuántas había en local. Para avisar a los demás workers
+        usar invalidate().
+        """
+        return self.invalidate_prefixes([prefix])
+
+    def invalidate_prefixes(self, prefixes: Iterable[str]) -> int:
+        """Como invalidate_prefix para varios prefijos, con un solo acceso a la capa compartida."""
+        prefixes = list(dict.fromkeys(prefixes))
+        dropped = sum(self.drop_local(prefix) for prefix in prefixes)
+        if self._uses_shared_tier():
+            _shared_tier.delete_indexed([
+                (self._index_key(_index_levels(prefix)[-1]), self._shared_key(prefix))
+                for prefix in prefixes
+            ])
+        return dropped
+
+    def clear(self) -> None:
+        self.invalidate_prefixes([""])
+
+    def drop_local(self, prefix: str = "") -> int:
+        """Descarta sólo la copia en memoria (prefix vacío = todo)."""
+        with self._lock:
+            if not prefix:
+                dropped = len(self._entries)
+                self._entries.clear()
+                return dropped
+            keys = [k for k in self._entries if isinstance(k, str) and k.startswith(prefix)]
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "shared": self._uses_shared_tier(),
+            }
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry[1] > time.time()
+
+    def _store_local(self, key: Hashable, value: Any, ttl: float) -> None:
+        if self._uses_shared_tier():
+            ttl = min(ttl, Config.CACHE_LOCAL_TTL_SECONDS)
+        now = time.time()
+        with self._lock:
+            self._entries[key] = (value, now + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _uses_shared_tier(self) -> bool:
+        return self.shared and _shared_tier.enabled
+
+    def _shared_key(self, key: Hashable) -> str:
+        return f"cache:{self.namespace}:{key}"
+
+    def _index_key(self, level: str) -> str:
+        return f"cache-index:{self.namespace}:{level}"
+
+
+_registry: Dict[str, NamespaceCache] = {}
+_registry_lock = threading.Lock()
+
+
+def get_cache(
+    namespace: str,
+    max_entries: int,
+    ttl_seconds: float,
+    shared: bool = False,
+) -> NamespaceCache:
+    """Devuelve (creando si hace falta) la caché de un namespace."""
+    with _registry_lock:
+        cache = _registry.get(namespace)
+        if cache is None:
+            cache = NamespaceCache(namespace, max_entries, ttl_seconds, shared=shared)
+            _registry[namespace] = cache
+        return cache
+
+
+def invalidate(namespace: str, prefix: str = "") -> None:
+    """Hook de invalidación: descarta un namespace completo o las claves con un prefijo."""
+    invalidate_many(namespace, [prefix])
+
+
+def invalidate_many(namespace: str, prefixes: Iterable[str]) -> None:
+    """Invalida varios prefijos de un namespace con un solo mensaje a los demás workers."""
+    prefixes = list(dict.fromkeys(prefixes))
+    if not prefixes:
+        return
+    if "" in prefixes:
+        prefixes = [""]
+    cache = _registry.get(namespace)
+    if cache is not None:
+        cache.invalidate_prefixes(prefixes)
+    # Los demás workers descartan su copia local al recibir el mensaje
+    _shared_tier.publish(
+        _INVALIDATION_CHANNEL,
+        {"origin": _ORIGIN, "namespace": namespace, "prefixes": prefixes},
+    )
+
+
+_INVALIDATION_CHANNEL = "cache:invalidate"
+# Identifica a este proceso para ignorar sus propios mensajes
+_ORIGIN = uuid.uuid4().hex
+
+
+_remote_hooks: Dict[str, List[Callable[[List[str]], None]]] = {}
+
+
+def on_remote_invalidation(namespace: str, callback: Callable[[List[str]], None]) -> None:
+    """
+    Registra callback(prefixes) para las invalidaciones de otros workers sobre un
+    namespace: sirve para estado en memoria que no vive en una NamespaceCache.
+    """
+    with _registry_lock:
+        _remote_hooks.setdefault(namespace, []).append(callback)
+
+
+def apply_remote_invalidation(message: Dict[str, Any]) -> bool:
+    """Aplica una invalidación publicada por otro worker. True si se aplicó."""
+    if message.get("origin") == _ORIGIN:
+        return False
+    namespace = message.get("namespace") or ""
+    cache = _registry.get(namespace)
+    hooks = _remote_hooks.get(namespace, [])
+    if cache is None and not hooks:
+        return False
+    prefixes = message.get("prefixes")
+    if not isinstance(prefixes, list):
+        prefixes = [message.get("prefix") or ""]
+    prefixes = [prefix or "" for prefix in prefixes]
+    if cache is not None:
+        for prefix in prefixes:
+            cache.drop_local(prefix)
+    for hook in hooks:
+        try:
+            hook(prefixes)
+        except Exception as exc:
+            logger.warning(f"Hook de invalidación de {namespace} falló: {exc}")
+    return True
+
+
+def start_invalidation_listener(start_task) -> bool:
+    """
+    Escucha las invalidaciones de otros workers. start_task lanza la tarea de
+    fondo (socketio.start_background_task, que bajo eventlet es un greenthread).
+    """
+    if not _shared_tier.enabled:
+        return False
+    start_task(_listen_invalidations)
+    return True
+
+
+def _listen_invalidations() -> None:
+    while True:
+        try:
+            client = _shared_tier._get_client()
+            if client is None:
+                time.sleep(30)
+                continue
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(_INVALIDATION_CHANNEL)
+            for message in pubsub.listen():
+                try:
+                    apply_remote_invalidation(json.loads(message["data"]))
+                except (TypeError, ValueError, KeyError):
+                    continue
+        except Exception as exc:
+            logger.warning(f"Canal de invalidaciones interrumpido, reintentando: {exc}")
+            time.sleep(5)
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Contadores por namespace (hits, misses, evictions, tamaño)."""
+    with _registry_lock:
+        caches = list(_registry.values())
+    return {cache.namespace: cache.stats() for cache in caches}
@@ -0,0 +1,149 @@
+"""
+Verificación local de JWT de Supabase (sin llamar a supabase.auth.get_user).
+
+Soporta el secreto HS256 del proyecto (SUPABASE_JWT_SECRET) y claves asimétricas
+publicadas en el JWKS de Supabase Auth (RS256 / ES256). El JWKS se cachea y se
+refresca en segundo plano; un kid desconocido fuerza un refresco (con límite).
+"""
+import json
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+import jwt
+
+from ..config import Config
+from .logger import setup_logger
+
+logger = setup_logger(__name__)
+
+_ASYMMETRIC_ALGORITHMS = {"RS256", "ES256"}
+_FORCED_REFRESH_MIN_INTERVAL_SECONDS = 30
+
+
+class JwtVerificationUnavailable(Exception):
+    """No hay material de claves para verificar localmente (usar verificación remota)."""
+
+
+class _JwksCache:
+    def __init__(self, url: str, refresh_seconds: int) -> None:
+        self.url = url
+        self.refresh_seconds = refresh_seconds
+        self._keys: Dict[str, Any] = {}
+        self._fetched_at = 0.0
+        self._last_forced = 0.0
+        self._last_failure = 0.0
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    def get_key(self, kid: Optional[str]) -> Any:
+        if not self._keys:
+            # Sin copia local: un solo intento sincrónico por ventana; mientras el
+            # JWKS siga caído se responde enseguida en lugar de esperar timeouts
+            if self._backing_off():
+                raise JwtVerificationUnavailable("JWKS no disponible")
+            self.refresh()
+            if not self._keys:
+                raise JwtVerificationUnavailable("JWKS no disponible")
+        elif time.time() - self._fetched_at > self.refresh_seconds:
+            self._refresh_in_background()
+
+        key = self._keys.get(kid or "")
+        if (
+            key is None
+            and time.time() - self._last_forced > _FORCED_REFRESH_MIN_INTERVAL_SECONDS
+            and not self._backing_off()
+        ):
+            # Rotación de claves: el kid todavía no está en la copia local
+            self._last_forced = time.time()
+            self.refresh()
+            key = self._keys.get(kid or "")
+        if key is None:
+            if not self._keys:
+                raise JwtVerificationUnavailable("JWKS no disponible")
+            raise jwt.InvalidTokenError(f"kid desconocido: {kid}")
+        return key
+
+    def refresh(self) -> None:
+        try:
+            response = httpx.get(self.url, timeout=httpx.Timeout(3.0, connect=1.0))
+            response.raise_for_status()
+            keys: Dict[str, Any] = {}
+            for jwk in response.json().get("keys", []):
+                kid = jwk.get("kid")
+                if not kid or jwk.get("alg") not in _ASYMMETRIC_ALGORITHMS:
+                    continue
+                keys[kid] = jwt.PyJWK.from_json(json.dumps(jwk)).key
+            with self._lock:
+                self._keys = keys
+                self._fetched_at = time.time()
+        except Exception as e:
+            self._last_failure = time.time()
+            logger.warning(f"No se pudo actualizar JWKS desde {self.url}: {e}")
+
+    def _backing_off(self) -> bool:
+        """True si el último refresco falló hace menos del intervalo mínimo."""
+        return time.time() - self._last_failure < _FORCED_REFRESH_MIN_INTERVAL_SECONDS
+
+    def _refresh_in_background(self) -> None:
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def _run():
+            try:
+                self.refresh()
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=_run, name="jwks-refresh", daemon=True).start()
+
+
+_jwks_cache: Optional[_JwksCache] = None
+
+
+def _get_jwks_cache() -> _JwksCache:
+    global _jwks_cache
+    if _jwks_cache is None:
+        _jwks_cache = _JwksCache(Config.SUPABASE_JWKS_URL, Config.AUTH_JWKS_REFRESH_SECONDS)
+    return _jwks_cache
+
+
+def local_verification_enabled() -> bool:
+    mode = Config.AUTH_VERIFY_MODE
+    if mode == "local":
+        return True
+    if mode == "auto":
+        return bool(Config.SUPABASE_JWT_SECRET or Config.SUPABASE_JWKS_URL_EXPLICIT)
+    return False
+
+
+def verify_jwt(token: str) -> Dict[str, Any]:
+    """
+    Verifica firma, exp y audiencia y devuelve los claims.
+
+    Raises:
+        jwt.InvalidTokenError: token inválido o vencido
+        JwtVerificationUnavailable: no hay clave con la que verificar este token
+    """
+    header = jwt.get_unverified_header(token)
+    alg = header.get("alg")
+    if alg == "HS256":
+        if not Config.SUPABASE_JWT_SECRET:
+            raise JwtVerificationUnavailable("SUPABASE_JWT_SECRET no configurado")
+        key: Any = Config.SUPABASE_JWT_SECRET
+    elif alg in _ASYMMETRIC_ALGORITHMS:
+        key = _get_jwks_cache().get_key(header.get("kid"))
+    else:
+        raise jwt.InvalidAlgorithmError(f"Algoritmo no soportado: {alg}")
+
+    return jwt.decode(
+        token,
+        key=key,
+        algorithms=[alg],
+        audience=Config.AUTH_JWT_AUDIENCE or None,
+        options={"require": ["exp", "sub"], "verify_aud": bool(Config.AUTH_JWT_AUDIENCE)},
+    )
@@ -0,0 +1,90 @@
+"""
+Paginación keyset (por cursor) sobre PostgREST.
+
+El cursor es opaco para el cliente: codifica el valor de la columna de orden y
+el id de la última fila devuelta. La página siguiente filtra "después de" ese
+par, así no hay OFFSET ni filas salteadas cuando entran pedidos nuevos.
+"""
+import base64
+import json
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from .retry import execute_with_retry
+
+
+def encode_cursor(kind: str, value: Any, row_id: Any) -> str:
+    raw = json.dumps({"k": kind, "v": value, "id": row_id}, separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, kind: str) -> Tuple[Any, Any]:
+    """Devuelve (valor, id). ValueError si el cursor no es válido o es de otro tipo."""
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(cursor + padding).decode("utf-8"))
+    except Exception:
+        raise ValueError("cursor inválido")
+    if not isinstance(data, dict) or data.get("k") != kind or data.get("v") is None or data.get("id") is None:
+        raise ValueError("cursor inválido")
+    return data["v"], data["id"]
+
+
+def apply_keyset(query, column: str, cursor_value: Any, cursor_id: Any, descending: bool):
+    """Filtra las filas posteriores a (cursor_value, cursor_id) en el orden (column, id)."""
+    op = "lt" if descending else "gt"
+    value = _quote(cursor_value)
+    row_id = _quote(cursor_id)
+    return query.or_(f"{column}.{op}.{value},and({column}.eq.{value},id.{op}.{row_id})")
+
+
+def order_keyset(query, column: str, descending: bool):
+    return query.order(column, desc=descending).order("id", desc=descending)
+
+
+def split_page(
+    rows: List[Dict],
+    limit: int,
+    kind: str,
+    column: str,
+) -> Tuple[List[Dict], Optional[str]]:
+    """Recorta la fila extra pedida (limit + 1) y arma el cursor siguiente si hay más."""
+    has_more = len(rows) > limit
+    page = rows[:limit]
+    if not has_more or not page:
+        return page, None
+    last = page[-1]
+    return page, encode_cursor(kind, last.get(column), last.get("id"))
+
+
+def iter_keyset_pages(
+    build_query: Callable[[], Any],
+    column: str,
+    descending: bool,
+    page_size: int,
+) -> Iterator[List[Dict]]:
+    """
+    Recorre la consulta completa en páginas de page_size, en orden (column, id).
+    build_query arma la consulta con sus filtros (sin orden ni límite); las filas
+    deben traer column e id. Termina con la primera página vacía y no con una
+    corta: PostgREST puede recortar a menos filas (db-max-rows) que page_size.
+    """
+    cursor: Optional[Tuple[Any, Any]] = None
+    while True:
+        def _run(cursor=cursor):
+            query = build_query()
+            if cursor is not None:
+                query = apply_keyset(query, column, cursor[0], cursor[1], descending)
+            return order_keyset(query, column, descending).limit(page_size).execute()
+
+        rows = execute_with_retry(_run).data or []
+        if not rows:
+            return
+        yield rows
+        last = rows[-1]
+        cursor = (last.get(column), last.get("id"))
+
+
+def _quote(value: Any) -> str:
+    # Entre comillas dobles: los timestamps llevan ":" y "+" que PostgREST no debe interpretar
+    text = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{text}"'
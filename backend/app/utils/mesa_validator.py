@@ -2,12 +2,18 @@
 Utilidad para validar mesa_id y token contra la base de datos Supabase.
 """
 
+import secrets
 from datetime import datetime, timezone
+from typing import Optional
+
 from ..db.supabase_client import supabase
 from ..utils.logger import setup_logger
 
 logger = setup_logger(__name__)
 
+# Sólo las columnas que mira la validación (no select('*'))
+_MESA_TOKEN_COLUMNS = 'id, mesa_id, branch_id, restaurant_id, token, token_expires_at, is_active'
+
 
 class MesaValidationError(Exception):
     """Excepción personalizada para errores de validación de mesa."""
@@ -27,13 +33,14 @@ def is_null_or_empty(value) -> bool:
     return False
 
 
-def validate_mesa_token(mesa_id: str, token: str) -> dict:
+def validate_mesa_token(mesa_id: str, token: str, branch_id: Optional[str] = None) -> dict:
     """
     Valida que mesa_id y token sean válidos y existan en la base de datos.
     
     Args:
         mesa_id: ID de la mesa (ej: "1", "2")
         token: Token del QR de la mesa
+        branch_id: Sucursal de la mesa (recomendado: el mesa_id se repite entre sucursales)
     
     Returns:
         dict con los datos de la mesa si es válida
@@ -50,13 +57,16 @@ def validate_mesa_token(mesa_id: str, token: str) -> dict:
     
     # Buscar la mesa en Supabase
     try:
-        response = supabase.table('mesas').select('*').eq('mesa_id', mesa_id).single().execute()
+        query = supabase.table('mesas').select(_MESA_TOKEN_COLUMNS).eq('mesa_id', mesa_id)
+        if branch_id:
+            query = query.eq('branch_id', branch_id)
+        response = query.limit(1).execute()
         
         if not response.data:
             logger.warning(f"Mesa no encontrada: mesa_id={mesa_id}")
             raise MesaValidationError(f"Mesa '{mesa_id}' no encontrada", 404)
         
-        mesa = response.data
+        mesa = response.data[0]
         
     except MesaValidationError:
         raise
@@ -69,8 +79,8 @@ def validate_mesa_token(mesa_id: str, token: str) -> dict:
         raise MesaValidationError("Error interno al validar mesa", 500)
     
     # Validar que el token coincida
-    if mesa.get('token') != token:
-        logger.warning(f"Token inválido para mesa {mesa_id}: esperado={mesa.get('token')[:20]}..., recibido={token[:20] if token else 'None'}...")
+    if not mesa.get('token') or not secrets.compare_digest(mesa.get('token'), token):
+        logger.warning(f"Token inválido para mesa {mesa_id}")
         raise MesaValidationError("Token inválido para esta mesa", 401)
     
     # Validar que la mesa esté activa
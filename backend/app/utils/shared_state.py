@@ -0,0 +1,110 @@
+"""
+Backend de estado compartido entre workers y contenedores.
+
+Con SHARED_STATE_URL apuntando a un servidor compatible con Redis, el estado
+que antes vivía en memoria del proceso (llamadas al mozo, capa compartida de la
+caché, invalidaciones, secuencias de eventos, cola de Socket.IO) se comparte y
+la app puede correr con N workers. Sin URL todo sigue siendo local, como con
+un único worker. Con WEB_CONCURRENCY > 1 el backend es obligatorio:
+ensure_backend_for_workers() hace fallar el arranque si no está disponible.
+
+La URL "fakeredis://<nombre>" usa fakeredis (dependencia de desarrollo) como
+sustituto en proceso, para tests y desarrollo sin servidor.
+"""
+import threading
+from typing import Dict, Optional
+
+from ..config import Config
+from .logger import setup_logger
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - depende del entorno
+    redis = None
+
+logger = setup_logger(__name__)
+
+FAKE_SCHEME = "fakeredis://"
+
+_clients: Dict[str, object] = {}
+_fake_servers: Dict[str, object] = {}
+_lock = threading.Lock()
+
+
+def backend_available(url: Optional[str]) -> bool:
+    if not url:
+        return False
+    if url.startswith(FAKE_SCHEME):
+        try:
+            import fakeredis  # noqa: F401
+        except ImportError:
+            return False
+        return True
+    return redis is not None
+
+
+def connect(url: str, **options):
+    """Cliente (reutilizado por URL y opciones) para la URL dada."""
+    key = f"{url}|{sorted(options.items())}"
+    with _lock:
+        client = _clients.get(key)
+        if client is not None:
+            return client
+        if url.startswith(FAKE_SCHEME):
+            import fakeredis
+
+            # Mismo "servidor" para todos los clientes de la URL: simula varios workers
+            server = _fake_servers.setdefault(url, fakeredis.FakeServer())
+            client = fakeredis.FakeRedis(server=server)
+        else:
+            client = redis.Redis.from_url(url, **options)
+        _clients[key] = client
+        return client
+
+
+def get_shared_client():
+    """Cliente del backend compartido, o None si la app corre con estado local."""
+    url = Config.SHARED_STATE_URL
+    if not backend_available(url):
+        return None
+    return connect(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+
+
+def shared_state_enabled() -> bool:
+    return backend_available(Config.SHARED_STATE_URL)
+
+
+def socketio_message_queue() -> Optional[str]:
+    """URL de la cola de Socket.IO (sólo servidores reales: fakeredis no cruza procesos)."""
+    url = Config.SOCKETIO_MESSAGE_QUEUE
+    if url and not url.startswith(FAKE_SCHEME) and redis is not None:
+        return url
+    if url:
+        logger.warning(f"SOCKETIO_MESSAGE_QUEUE={url} no utilizable; Socket.IO queda local al proceso")
+    return None
+
+
+def ensure_backend_for_workers() -> None:
+    """
+    Con más de un worker, exige un servidor real y alcanzable para el estado
+    compartido y la cola de Socket.IO. RuntimeError si no lo hay: cada worker con
+    su propio estado serviría llamadas, cachés y eventos inconsistentes.
+    """
+    workers = Config.WEB_CONCURRENCY
+    if workers <= 1:
+        return
+    url = Config.SHARED_STATE_URL
+    if not url or url.startswith(FAKE_SCHEME):
+        raise RuntimeError(
+            f"WEB_CONCURRENCY={workers} requiere SHARED_STATE_URL apuntando a un servidor compatible con Redis"
+        )
+    if redis is None:
+        raise RuntimeError(f"WEB_CONCURRENCY={workers} requiere el paquete redis (pip install redis)")
+    try:
+        get_shared_client().ping()
+    except Exception as exc:
+        raise RuntimeError(f"Estado compartido no disponible en {url}: {exc}") from exc
+    if socketio_message_queue() is None:
+        raise RuntimeError(
+            f"WEB_CONCURRENCY={workers} requiere SOCKETIO_MESSAGE_QUEUE apuntando a un servidor compatible con Redis"
+        )
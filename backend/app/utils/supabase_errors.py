@@ -57,3 +57,20 @@ def is_undefined_column_error(exc: Exception, column_name: str = "") -> bool:
         return False
 
     return any("column" in message and "does not exist" in message for message in messages)
+
+
+def is_missing_function_error(exc: Exception, *function_names: str) -> bool:
+    messages, code = _extract_messages_and_code(exc)
+    function_tokens = tuple(
+        (name or "").lower() for name in function_names if name
+    )
+    function_match = not function_tokens or _contains_any(messages, function_tokens)
+
+    if code in {"PGRST202", "42883"} and function_match:
+        return True
+
+    text_markers = (
+        "could not find the function",
+        "function does not exist",
+    )
+    return function_match and _contains_any(messages, text_markers)
@@ -1,20 +1,62 @@
 """
 Token Manager - Gestión segura de tokens en Supabase
+
+El estado del token de cada mesa (sha256 del token, vencimiento, activa) se
+cachea por (branch_id, mesa_id): validar el token del QR es en el caso común
+una comparación en memoria, sin ir a la tabla mesas. Toda escritura del token
+o de la mesa (generate_token, invalidate_token, update/delete de mesas) pasa
+por invalidate_token_state o escribe el estado nuevo en la caché.
+
+Con MESA_TOKEN_MODE=signed los tokens nuevos no se guardan: son
+"m1.<claims>.<firma>" con HMAC-SHA256 sobre mesa, sucursal, restaurante,
+vencimiento y la generación de tokens de la mesa. Validarlos sólo requiere la
+generación vigente (del estado cacheado); invalidate_token la incrementa y
+revoca todos los emitidos. Los tokens guardados siguen validando en ambos modos.
 """
+import base64
+import hashlib
+import hmac
+import json
 import secrets
 import logging
+import time
 from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
 
+from ..config import Config
 from ..db.supabase_client import supabase
+from .cache import get_cache, invalidate
+from .supabase_errors import is_missing_function_error
 
 logger = logging.getLogger(__name__)
 
+_TOKEN_CACHE_NAMESPACE = "mesa-token"
+# Sólo el hash del token: nunca se guarda en claro (ni en la caché compartida)
+_token_state_cache = get_cache(
+    _TOKEN_CACHE_NAMESPACE,
+    max_entries=Config.MESA_TOKEN_CACHE_MAX_ENTRIES,
+    ttl_seconds=Config.MESA_TOKEN_CACHE_TTL_SECONDS,
+    shared=True,
+)
+
+SIGNED_TOKEN_PREFIX = "m1."
+_STATE_COLUMNS = "token, token_expires_at, is_active, restaurant_id, allowed_payment_methods"
+
+
+def signed_tokens_enabled() -> bool:
+    return (Config.MESA_TOKEN_MODE or "").strip().lower() == "signed"
+
 
 def generate_token(mesa_id: str, branch_id: str, expiry_minutes: int = 10) -> str:
     """
     Genera un token seguro y lo almacena en Supabase.
     """
     try:
+        if signed_tokens_enabled():
+            token, _expires_at = issue_signed_token(mesa_id, branch_id, expiry_minutes)
+            logger.info(f"Token firmado emitido para mesa {mesa_id}, expira en {expiry_minutes} minutos")
+            return token
+
         token = secrets.token_urlsafe(32)
         expiry = datetime.now(timezone.utc) + timedelta(minutes=expiry_minutes)
         now_iso = _now_iso()
@@ -36,6 +78,7 @@ def generate_token(mesa_id: str, branch_id: str, expiry_minutes: int = 10) -> st
         if not response.data:
             raise ValueError(f"Mesa {mesa_id} no existe en la base de datos")
 
+        _store_token_state(mesa_id, branch_id, response.data[0])
         logger.info(f"Token generado para mesa {mesa_id}, expira en {expiry_minutes} minutos")
         return token
 
@@ -46,42 +89,36 @@ def generate_token(mesa_id: str, branch_id: str, expiry_minutes: int = 10) -> st
 
 def validate_token(mesa_id: str, branch_id: str, token: str) -> bool:
     """
-    Valida un token contra Supabase.
+    Valida un token usando el estado cacheado de la mesa (Supabase sólo en un miss).
     """
     try:
-        response = (
-            supabase.table("mesas")
-            .select("token, token_expires_at, is_active")
-            .eq("mesa_id", mesa_id)
-            .eq("branch_id", branch_id)
-            .execute()
-        )
+        if signed_tokens_enabled() and token and token.startswith(SIGNED_TOKEN_PREFIX):
+            return _validate_signed_token(mesa_id, branch_id, token)
 
-        data = response.data or []
-        if not data:
+        state = _get_token_state(mesa_id, branch_id)
+        if state is not None and state.get("exists") and not _token_matches(state, token):
+            # La copia puede estar desactualizada (token regenerado por otro worker):
+            # antes de rechazar, releer una vez de la base
+            state = _get_token_state(mesa_id, branch_id, refresh=True)
+
+        if state is None or not state.get("exists"):
             logger.warning(f"Intento de validar token para mesa inexistente: {mesa_id}")
             return False
 
-        mesa = data[0]
-
-        if not mesa.get("is_active", False):
+        if not state.get("is_active"):
             logger.warning(f"Intento de usar token en mesa inactiva: {mesa_id}")
             return False
 
-        current_token = mesa.get("token")
-        if not current_token:
+        if not state.get("token_hash"):
             logger.warning(f"No hay token generado para mesa: {mesa_id}")
             return False
 
-        if not secrets.compare_digest(current_token, token):
+        if not _token_matches(state, token):
             logger.warning(f"Token inválido para mesa: {mesa_id}")
             return False
 
-        expires_at = mesa.get("token_expires_at")
-        if isinstance(expires_at, str):
-            expires_at = datetime.fromisoformat(expires_at.replace("Z", "+00:00"))
-
-        if expires_at < datetime.now(timezone.utc):
+        expires_at = _parse_expiry(state.get("token_expires_at"))
+        if expires_at is None or expires_at < datetime.now(timezone.utc):
             logger.warning(f"Token expirado para mesa: {mesa_id}")
             _clear_expired_token(mesa_id, branch_id)
             return False
@@ -94,6 +131,192 @@ def validate_token(mesa_id: str, branch_id: str, token: str) -> bool:
         return False
 
 
+def issue_signed_token(mesa_id: str, branch_id: str, expiry_minutes: int = 10) -> Tuple[str, datetime]:
+    """
+    Emite un token firmado con la generación vigente de la mesa (sin escribir en
+    Supabase). Devuelve (token, vencimiento).
+    """
+    state = _get_token_state(mesa_id, branch_id)
+    if not state.get("exists"):
+        raise ValueError(f"Mesa {mesa_id} no existe en la base de datos")
+
+    expires_at = datetime.now(timezone.utc) + timedelta(minutes=expiry_minutes)
+    claims = {
+        "m": str(mesa_id),
+        "b": str(branch_id),
+        "r": str(state.get("restaurant_id") or ""),
+        "e": int(expires_at.timestamp()),
+        "g": int(state.get("token_generation") or 0),
+    }
+    body = _b64encode(json.dumps(claims, separators=(",", ":"), sort_keys=True).encode("utf-8"))
+    signing_input = f"{SIGNED_TOKEN_PREFIX}{body}"
+    return f"{signing_input}.{_b64encode(_sign(signing_input))}", expires_at
+
+
+def decode_signed_token(token: Optional[str]) -> Optional[Dict]:
+    """Claims del token si la firma es válida (no verifica vencimiento ni generación)."""
+    if not token or not token.startswith(SIGNED_TOKEN_PREFIX):
+        return None
+    signing_input, _, signature = token.rpartition(".")
+    if not signature or signing_input == SIGNED_TOKEN_PREFIX.rstrip("."):
+        return None
+    if not secrets.compare_digest(_b64encode(_sign(signing_input)), signature):
+        return None
+    try:
+        claims = json.loads(_b64decode(signing_input[len(SIGNED_TOKEN_PREFIX):]))
+    except ValueError:
+        return None
+    return claims if isinstance(claims, dict) else None
+
+
+def get_mesa_token_state(mesa_id: str, branch_id: str) -> Dict:
+    """Estado cacheado de la mesa (exists, is_active, restaurant_id, allowed_payment_methods, ...)."""
+    return dict(_get_token_state(mesa_id, branch_id))
+
+
+def _validate_signed_token(mesa_id: str, branch_id: str, token: str) -> bool:
+    claims = decode_signed_token(token)
+    if claims is None or claims.get("m") != str(mesa_id) or claims.get("b") != str(branch_id):
+        logger.warning(f"Token firmado inválido para mesa: {mesa_id}")
+        return False
+
+    if int(claims.get("e") or 0) < time.time():
+        logger.warning(f"Token firmado expirado para mesa: {mesa_id}")
+        return False
+
+    state = _get_token_state(mesa_id, branch_id)
+    if not state.get("exists"):
+        logger.warning(f"Intento de validar token para mesa inexistente: {mesa_id}")
+        return False
+    if not state.get("is_active"):
+        logger.warning(f"Intento de usar token en mesa inactiva: {mesa_id}")
+        return False
+    if claims.get("r") and state.get("restaurant_id") and claims["r"] != str(state["restaurant_id"]):
+        logger.warning(f"Token firmado de otro restaurante para mesa: {mesa_id}")
+        return False
+    if int(claims.get("g") or 0) != int(state.get("token_generation") or 0):
+        logger.warning(f"Token firmado revocado para mesa: {mesa_id}")
+        return False
+
+    logger.info(f"Token firmado validado para mesa: {mesa_id}")
+    return True
+
+
+def _bump_token_generation(mesa_id: str, branch_id: str) -> None:
+    """Incrementa la generación de la mesa: revoca los tokens firmados ya emitidos."""
+    try:
+        supabase.rpc(
+            "bump_mesa_token_generation",
+            {"p_mesa_id": str(mesa_id), "p_branch_id": str(branch_id)},
+        ).execute()
+    except Exception as exc:
+        if not is_missing_function_error(exc, "bump_mesa_token_generation"):
+            raise
+        logger.warning("RPC bump_mesa_token_generation no disponible; incremento no atómico")
+        current = _get_token_state(mesa_id, branch_id, refresh=True)
+        (
+            supabase.table("mesas")
+            .update({"token_generation": int(current.get("token_generation") or 0) + 1})
+            .eq("mesa_id", mesa_id)
+            .eq("branch_id", branch_id)
+            .execute()
+        )
+
+
+def _sign(signing_input: str) -> bytes:
+    secret = (Config.MESA_TOKEN_SECRET or Config.SECRET_KEY).encode("utf-8")
+    return hmac.new(secret, signing_input.encode("utf-8"), hashlib.sha256).digest()
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(value: str) -> bytes:
+    try:
+        return base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+    except (ValueError, TypeError) as exc:
+        raise ValueError("token mal formado") from exc
+
+
+def invalidate_token_state(mesa_id: Optional[str] = None, branch_id: Optional[str] = None) -> None:
+    """
+    Descarta el estado cacheado del token de una mesa (en todos los workers).
+    Sin branch_id (o sin mesa_id) descarta el namespace completo.
+    """
+    if mesa_id is None or branch_id is None:
+        invalidate(_TOKEN_CACHE_NAMESPACE)
+    else:
+        invalidate(_TOKEN_CACHE_NAMESPACE, _state_key(mesa_id, branch_id))
+
+
+def _get_token_state(mesa_id: str, branch_id: str, refresh: bool = False) -> Optional[Dict]:
+    """Estado del token de la mesa: de la caché o, en un miss, de Supabase."""
+    key = _state_key(mesa_id, branch_id)
+    if not refresh:
+        cached = _token_state_cache.get(key)
+        if cached is not None:
+            return cached
+
+    columns = f"{_STATE_COLUMNS}, token_generation" if signed_tokens_enabled() else _STATE_COLUMNS
+    response = (
+        supabase.table("mesas")
+        .select(columns)
+        .eq("mesa_id", mesa_id)
+        .eq("branch_id", branch_id)
+        .limit(1)
+        .execute()
+    )
+    data = response.data or []
+    state = _state_from_row(data[0]) if data else {"exists": False}
+    _token_state_cache.set(key, state)
+    return state
+
+
+def _store_token_state(mesa_id: str, branch_id: str, row: Dict) -> None:
+    """Write-through: el estado recién escrito reemplaza al cacheado en todos los workers."""
+    invalidate_token_state(mesa_id, branch_id)
+    if "is_active" in row and "token" in row:
+        _token_state_cache.set(_state_key(mesa_id, branch_id), _state_from_row(row))
+
+
+def _state_from_row(row: Dict) -> Dict:
+    token = row.get("token")
+    return {
+        "exists": True,
+        "token_hash": _hash_token(token) if token else None,
+        "token_expires_at": row.get("token_expires_at"),
+        "is_active": bool(row.get("is_active", False)),
+        "restaurant_id": row.get("restaurant_id"),
+        "allowed_payment_methods": row.get("allowed_payment_methods"),
+        "token_generation": int(row.get("token_generation") or 0),
+    }
+
+
+def _token_matches(state: Dict, token: Optional[str]) -> bool:
+    expected = state.get("token_hash")
+    if not expected or not token:
+        return False
+    return secrets.compare_digest(expected, _hash_token(token))
+
+
+def _hash_token(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def _parse_expiry(value) -> Optional[datetime]:
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+
+
+def _state_key(mesa_id: str, branch_id: str) -> str:
+    # Terminada en "|" para que invalidar "b1|1|" no arrastre a la mesa 10
+    return f"{branch_id}|{mesa_id}|"
+
+
 def renew_token(mesa_id: str, branch_id: str, expiry_minutes: int = 10) -> str:
     logger.info(f"Renovando token para mesa: {mesa_id}")
     return generate_token(mesa_id, branch_id, expiry_minutes)
@@ -101,9 +324,11 @@ def renew_token(mesa_id: str, branch_id: str, expiry_minutes: int = 10) -> str:
 
 def invalidate_token(mesa_id: str, branch_id: str) -> bool:
     """
-    Invalida el token actual de una mesa.
+    Invalida el token actual de una mesa (y, en modo firmado, todos los emitidos).
     """
     try:
+        if signed_tokens_enabled():
+            _bump_token_generation(mesa_id, branch_id)
         now_iso = _now_iso()
         response = (
             supabase.table("mesas")
@@ -119,6 +344,7 @@ def invalidate_token(mesa_id: str, branch_id: str) -> bool:
             .execute()
         )
 
+        invalidate_token_state(mesa_id, branch_id)
         logger.info(f"Token invalidado para mesa: {mesa_id}")
         return bool(response.data)
 
@@ -167,6 +393,7 @@ def _clear_expired_token(mesa_id: str, branch_id: str) -> None:
         supabase.table("mesas").update(
             {"token_expires_at": now_iso, "updated_at": now_iso}
         ).eq("mesa_id", mesa_id).eq("branch_id", branch_id).execute()
+        invalidate_token_state(mesa_id, branch_id)
     except Exception as e:
         logger.error(f"Error limpiando token expirado: {str(e)}")
 
@@ -186,6 +413,7 @@ def cleanup_expired_tokens() -> int:
 
         count = len(response.data or [])
         if count > 0:
+            invalidate_token_state()
             logger.info(f"Limpiados {count} tokens expirados")
 
         return count
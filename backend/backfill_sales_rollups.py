@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Script para recalcular los agregados de ventas (migración 019) desde orders
+"""
+
+import sys
+import os
+
+# Agregar el directorio del proyecto al path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.main import create_app
+from app.services.sales_rollup_service import sales_rollup_service
+
+def backfill(restaurant_id=None):
+    """Contabilizar todos los pedidos (o los de un restaurante) en los agregados"""
+    app = create_app()
+
+    with app.app_context():
+        try:
+            scope = f"restaurante {restaurant_id}" if restaurant_id else "todos los restaurantes"
+            print(f"Recalculando agregados de ventas para {scope}...")
+
+            processed = sales_rollup_service.backfill(restaurant_id)
+
+            print(f"✅ {processed} pedidos procesados")
+        except Exception as e:
+            print(f"❌ Error al recalcular agregados: {e}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    backfill(sys.argv[1] if len(sys.argv) > 1 else None)
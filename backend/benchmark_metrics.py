@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark del motor columnar de métricas contra el loop en Python.
+
+Genera pedidos sintéticos (no consulta Supabase) y mide ventas mensuales y
+productos más vendidos con ambos motores.
+
+Uso: python benchmark_metrics.py [cantidades...]   (por defecto 10000 100000 1000000)
+"""
+
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+# Agregar el directorio del proyecto al path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# El benchmark no habla con Supabase, pero importar los servicios crea el cliente
+os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+os.environ.setdefault("SUPABASE_KEY", "benchmark-key")
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key")
+
+from app.services import metrics_columnar
+from app.services import metrics_service
+
+OFFSET_MINUTES = -180
+
+
+def build_orders(count, seed=42):
+    """Pedidos PAID del último año con 1 a 4 items de un menú de 200 productos"""
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    orders = []
+    for _ in range(count):
+        created = now - timedelta(seconds=rng.randint(0, 365 * 24 * 3600))
+        items = []
+        for _ in range(rng.randint(1, 4)):
+            product_id = rng.randint(1, 200)
+            items.append({
+                "item_id": product_id,
+                "name": f"Producto {product_id}",
+                "quantity": rng.randint(1, 3),
+                "price": 1500.0,
+            })
+        orders.append({
+            "status": "PAID",
+            "creation_date": created.isoformat(),
+            "total_amount": round(rng.uniform(1000, 20000), 2),
+            "items": items,
+        })
+    return orders
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def run(count):
+    orders = build_orders(count)
+    now_local = metrics_service._apply_tz_offset(datetime.now(timezone.utc), OFFSET_MINUTES)
+    year_start = now_local - timedelta(days=365)
+    month_start = now_local - timedelta(days=30)
+    _, month_keys = metrics_service._month_buckets(now_local)
+
+    py_monthly, py_monthly_s = timed(
+        lambda: metrics_service._sales_monthly_totals(orders, OFFSET_MINUTES, year_start, month_keys)
+    )
+    np_monthly, np_monthly_s = timed(
+        lambda: metrics_columnar.sales_monthly_totals(orders, OFFSET_MINUTES, year_start, month_keys)
+    )
+    py_top, py_top_s = timed(
+        lambda: metrics_service._top_products_bucket(orders, OFFSET_MINUTES, month_start)
+    )
+    np_top, np_top_s = timed(
+        lambda: metrics_columnar.top_products_bucket(orders, OFFSET_MINUTES, month_start)
+    )
+
+    same_monthly = all(abs(py_monthly[k] - np_monthly[k]) < 0.01 for k in month_keys)
+    same_top = py_top.keys() == np_top.keys() and all(
+        py_top[k]["quantity"] == np_top[k]["quantity"]
+        and py_top[k]["orders_count"] == np_top[k]["orders_count"]
+        for k in py_top
+    )
+    print(
+        f"{count:>9} pedidos | ventas mensuales: python {py_monthly_s:7.3f}s "
+        f"numpy {np_monthly_s:7.3f}s ({py_monthly_s / max(np_monthly_s, 1e-9):5.1f}x) | "
+        f"top productos: python {py_top_s:7.3f}s numpy {np_top_s:7.3f}s "
+        f"({py_top_s / max(np_top_s, 1e-9):5.1f}x) | iguales: {same_monthly and same_top}"
+    )
+
+
+if __name__ == "__main__":
+    if metrics_columnar.np is None:
+        print("❌ NumPy no está instalado (pip install numpy)")
+        sys.exit(1)
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    for size in sizes:
+        run(size)
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark del motor de promociones.
+
+Genera promociones y carritos sintéticos (no consulta Supabase: el índice se
+compila desde promociones en memoria) y mide apply_promotions_to_items con
+carritos grandes y muchas promociones activas.
+
+Uso: python benchmark_promotions.py [promociones] [repeticiones]   (por defecto 500 200)
+"""
+
+import os
+import random
+import sys
+import time
+
+# Agregar el directorio del proyecto al path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# El benchmark no habla con Supabase, pero importar los servicios crea el cliente
+os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+os.environ.setdefault("SUPABASE_KEY", "benchmark-key")
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key")
+
+from app.services import promotion_engine, promotion_index
+from app.services.promotions_service import promotions_service
+
+PRODUCTS = 300
+
+
+def build_promotions(count, seed=7):
+    """Mezcla de descuentos, franjas horarias, 2x1 y combos sobre un menú de PRODUCTS productos"""
+    rng = random.Random(seed)
+    promotions = []
+    for idx in range(count):
+        promo_type = rng.choice(["discount", "timeframe", "2x1", "combo"])
+        promo = {
+            "id": f"promo-{idx}",
+            "name": f"Promo {idx}",
+            "type": promo_type,
+            "value": rng.randint(5, 30) if promo_type != "combo" else rng.randint(1000, 3000),
+            "active": True,
+            "applicable_products": rng.sample(range(1, PRODUCTS + 1), rng.randint(1, 5)),
+        }
+        if promo_type == "combo":
+            promo["combo_items"] = [
+                {"product_id": pid, "quantity": rng.randint(1, 2)}
+                for pid in rng.sample(range(1, PRODUCTS + 1), 2)
+            ]
+        promotions.append(promo)
+    return promotions
+
+
+def build_cart(lines, units_per_line, seed=11):
+    rng = random.Random(seed)
+    return [
+        {"id": rng.randint(1, PRODUCTS), "price": float(rng.randint(500, 5000)), "quantity": units_per_line}
+        for _ in range(lines)
+    ]
+
+
+def timed(fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat
+
+
+def run(promotion_count, repeat):
+    promotions = build_promotions(promotion_count)
+    promotions_service.list_active_for_branch = lambda *_args, **_kw: promotions
+    promotion_index.invalidate_promotion_index()
+
+    compile_s = timed(lambda: promotion_index.PromotionIndex(promotions), 5)
+    print(f"{promotion_count} promociones | compilar índice: {compile_s * 1000:8.3f} ms")
+
+    for lines, units in ((5, 2), (50, 4), (20, 200), (200, 50)):
+        cart = build_cart(lines, units)
+        per_cart = timed(
+            lambda: promotion_engine.apply_promotions_to_items(cart, "bench-restaurant", "bench-branch"),
+            repeat,
+        )
+        print(f"  carrito {lines:>4} líneas x {units:>3} unidades: {per_cart * 1000:8.3f} ms por pedido")
+
+
+if __name__ == "__main__":
+    promotion_total = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    repetitions = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    run(promotion_total, repetitions)
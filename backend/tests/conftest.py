@@ -11,3 +11,5 @@ if str(BACKEND_ROOT) not in sys.path:
 os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
 os.environ.setdefault("SUPABASE_KEY", "test-anon-key")
 os.environ.setdefault("SECRET_KEY", "test-secret-key")
+# No background tenant slug preloading during tests.
+os.environ.setdefault("TENANT_REGISTRY_REFRESH_SECONDS", "0")
@@ -0,0 +1,41 @@
+import time
+
+from app.utils.cache import NamespaceCache
+
+
+def test_lru_evicts_least_recently_used():
+    cache = NamespaceCache("test-lru", max_entries=2, ttl_seconds=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "b" queda como el menos usado
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    stats = cache.stats()
+    assert stats["size"] == 2
+    assert stats["evictions"] == 1
+    assert stats["hits"] == 3
+    assert stats["misses"] == 1
+
+
+def test_expired_entries_miss_but_remain_available_as_stale():
+    cache = NamespaceCache("test-ttl", max_entries=10, ttl_seconds=60)
+    cache.set("slug", "r1", ttl_seconds=0.01)
+    time.sleep(0.02)
+
+    assert cache.get("slug") is None
+    assert cache.get_stale("slug") == "r1"
+    assert cache.stats()["expirations"] == 1
+
+
+def test_invalidate_prefix_only_drops_matching_keys():
+    cache = NamespaceCache("test-prefix", max_entries=10, ttl_seconds=60)
+    cache.set("r1:summary:all:0", {"dailySales": 1})
+    cache.set("r1:peak-hours:b1:0:30", {"values": []})
+    cache.set("r2:summary:all:0", {"dailySales": 2})
+
+    assert cache.invalidate_prefix("r1:") == 2
+    assert cache.get("r1:summary:all:0") is None
+    assert cache.get("r2:summary:all:0") == {"dailySales": 2}
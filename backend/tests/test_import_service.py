@@ -0,0 +1,80 @@
+import types
+
+from app.services import import_service as import_module
+
+
+class _FakeIngredients:
+    """Tabla ingredients en memoria: ilike por nombre exacto sin distinguir mayúsculas."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.inserted = []
+        self.updated = []
+
+    def table(self, _name):
+        return _FakeQuery(self)
+
+
+class _FakeQuery:
+    def __init__(self, store):
+        self.store = store
+        self.op = "select"
+        self.payload = None
+        self.name = None
+
+    def select(self, *_a, **_k):
+        return self
+
+    def insert(self, payload):
+        self.op, self.payload = "insert", payload
+        return self
+
+    def update(self, payload):
+        self.op, self.payload = "update", payload
+        return self
+
+    def ilike(self, _column, value):
+        self.name = value.lower()
+        return self
+
+    def __getattr__(self, _name):
+        return lambda *_a, **_k: self
+
+    def execute(self):
+        if self.op == "insert":
+            row = {**self.payload, "id": f"new-{len(self.store.inserted) + 1}"}
+            self.store.inserted.append(row)
+            self.store.rows.append(row)
+            return types.SimpleNamespace(data=[row])
+        if self.op == "update":
+            self.store.updated.append(self.payload)
+            return types.SimpleNamespace(data=[])
+        found = [r for r in self.store.rows if r["name"].lower() == self.name]
+        return types.SimpleNamespace(data=found[:1])
+
+
+def test_import_collapses_duplicates_and_creates_with_real_stock(monkeypatch):
+    store = _FakeIngredients([{"id": "i1", "name": "Leche", "current_stock": 10, "branch_id": "b1"}])
+    recorded = []
+    monkeypatch.setattr(import_module, "supabase", store)
+    monkeypatch.setattr(
+        import_module.ingredients_service,
+        "record_movements_bulk",
+        lambda movements, **_k: recorded.extend(movements),
+    )
+    csv_bytes = (
+        "nombre,unidad,stock_actual\n"
+        "Leche,l,15\n"
+        "leche,l,12\n"
+        "Azúcar,kg,3\n"
+        "AZÚCAR,kg,5\n"
+    ).encode("utf-8")
+
+    result = import_module.import_service.import_ingredients("u1", "r1", "b1", csv_bytes)
+
+    assert result == {"created": 1, "updated": 1, "errors": []}
+    # Vale la última fila: un solo delta contra el stock leído, sin apilar filas
+    assert [(m["ingredient_id"], m["qty"]) for m in recorded if not m.get("stock_applied")] == [("i1", 2.0)]
+    # El ingrediente nuevo nace con su stock; el movimiento solo lo registra
+    assert [row["current_stock"] for row in store.inserted] == [5.0]
+    assert [(m["ingredient_id"], m["qty"]) for m in recorded if m.get("stock_applied")] == [("new-1", 5.0)]
@@ -0,0 +1,21 @@
+import pytest
+
+from app.utils import jwt_verifier
+
+
+def test_empty_jwks_backs_off_after_a_failed_refresh(monkeypatch):
+    calls = []
+
+    def _failing_get(*_a, **_k):
+        calls.append(1)
+        raise jwt_verifier.httpx.ConnectError("caído")
+
+    monkeypatch.setattr(jwt_verifier.httpx, "get", _failing_get)
+    cache = jwt_verifier._JwksCache("https://auth.example/jwks", 600)
+
+    for _ in range(5):
+        with pytest.raises(jwt_verifier.JwtVerificationUnavailable):
+            cache.get_key("kid-1")
+
+    # Un solo intento: ni refresco forzado tras el fallo ni reintentos por request
+    assert len(calls) == 1
@@ -0,0 +1,66 @@
+import types
+
+from app.services import menu_service as menu_service_module
+
+
+class _FakeQuery:
+    def __init__(self, table, log, rows):
+        self.table = table
+        self.log = log
+        self.rows = rows
+        self.op = "select"
+        self.payload = None
+        self.ids = None
+
+    def select(self, *_a, **_k):
+        return self
+
+    def update(self, payload):
+        self.op = "update"
+        self.payload = payload
+        return self
+
+    def in_(self, _column, values):
+        self.ids = list(values)
+        return self
+
+    def eq(self, *_a, **_k):
+        return self
+
+    def execute(self):
+        self.log.append((self.table, self.op, self.payload, self.ids))
+        return types.SimpleNamespace(data=self.rows if self.op == "select" else [])
+
+
+def test_sync_for_ingredients_only_touches_affected_products(monkeypatch):
+    graph = {
+        "1": {"name": "Latte", "available": True, "branch_id": "b1", "recipe": [("10", 0.2)]},
+        "2": {"name": "Tostado", "available": False, "branch_id": "b1", "recipe": [("20", 1.0)]},
+        "3": {"name": "Cortado", "available": True, "branch_id": "b1", "recipe": [("10", 0.1)]},
+    }
+    log = []
+    ingredient_rows = [{"id": 10, "branch_id": "b1", "current_stock": 0.15, "track_stock": True}]
+
+    monkeypatch.setattr(menu_service_module, "get_recipe_graph", lambda *_a, **_k: graph)
+    monkeypatch.setattr(
+        menu_service_module,
+        "get_products_using_ingredients",
+        lambda _r, _b, ids: {"1", "3"} if "10" in ids else set(),
+    )
+    monkeypatch.setattr(menu_service_module, "invalidate_recipe_graph", lambda *_a, **_k: None)
+    monkeypatch.setattr(
+        menu_service_module,
+        "supabase",
+        types.SimpleNamespace(table=lambda name: _FakeQuery(name, log, ingredient_rows)),
+    )
+
+    updated = menu_service_module.menu_service.sync_availability_for_ingredients(
+        restaurant_id="r1",
+        ingredient_ids=["10"],
+        branch_id="b1",
+    )
+
+    assert updated == 1
+    assert log[0][:2] == ("ingredients", "select")
+    assert log[1] == ("menu", "update", {"available": False}, ["1"])
+    assert len(log) == 2
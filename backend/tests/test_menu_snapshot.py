@@ -0,0 +1,142 @@
+import types
+
+from flask import Flask, g
+
+from app.controllers.menu_controller import menu_bp
+from app.services import menu_snapshot_service as snapshot_module
+from app.services import promotion_index
+from app.services.product_options_service import product_options_service
+from app.services.promotions_service import promotions_service
+
+
+_ROWS = {
+    "branches": [{"id": "b1", "restaurant_id": "r1"}],
+    "menu": [
+        {"id": 1, "name": "Latte", "category": "Cafés", "price": 2000, "available": True},
+        {"id": 2, "name": "Tostado", "category": "Salados", "price": 3000, "available": True},
+    ],
+    "menu_categories": [{"id": 7, "name": "Cafés", "active": True}],
+}
+
+
+class _FakeQuery:
+    def __init__(self, table, log):
+        self.table = table
+        self.log = log
+
+    def __getattr__(self, _name):
+        return lambda *_a, **_k: self
+
+    def execute(self):
+        self.log.append(self.table)
+        return types.SimpleNamespace(data=_ROWS[self.table])
+
+
+def _make_client():
+    app = Flask(__name__)
+
+    @app.before_request
+    def _tenant():
+        g.restaurant_id = "r1"
+
+    app.register_blueprint(menu_bp)
+    return app.test_client()
+
+
+def test_public_menu_snapshot_serves_304_without_database(monkeypatch):
+    log = []
+    monkeypatch.setattr(
+        snapshot_module, "supabase", types.SimpleNamespace(table=lambda name: _FakeQuery(name, log))
+    )
+    monkeypatch.setattr(
+        product_options_service,
+        "groups_by_product",
+        lambda _r, ids: {"1": [{"id": "g1", "productId": "1", "name": "Leche", "items": []}]},
+    )
+    monkeypatch.setattr(
+        promotions_service,
+        "list_active_for_branch",
+        lambda *_a, **_k: [
+            {"id": "p1", "name": "10% café", "type": "discount", "value": 10, "active": True,
+             "applies_to_all": True, "applicable_products": ["1"]},
+        ],
+    )
+    promotion_index.invalidate_promotion_index()
+    snapshot_module.invalidate_menu_snapshot(None)
+    client = _make_client()
+
+    first = client.get("/menu/public?branch_id=b1")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    body = first.get_json()
+    assert body["categories"] == ["Cafés", "Salados"]
+    assert [item["displayPrice"] for item in body["items"]] == [1800.0, 3000.0]
+    assert body["items"][0]["hasOptions"] is True
+    assert body["promotions"][0]["id"] == "p1"
+    queries = len(log)
+
+    again = client.get("/menu/public?branch_id=b1", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert len(log) == queries
+
+    snapshot_module.invalidate_menu_snapshot("r1", "b1")
+    rebuilt = client.get("/menu/public?branch_id=b1", headers={"If-None-Match": etag})
+    assert rebuilt.status_code == 304
+    assert len(log) > queries
+
+
+def test_snapshot_option_items_publish_in_stock_and_stock_crossing_zero_invalidates(monkeypatch):
+    from app.services import ingredients_service as ingredients_module
+
+    log = []
+    monkeypatch.setattr(
+        snapshot_module, "supabase", types.SimpleNamespace(table=lambda name: _FakeQuery(name, log))
+    )
+    monkeypatch.setattr(
+        product_options_service,
+        "groups_by_product",
+        lambda _r, ids: {"1": [{
+            "id": "g1", "productId": "1", "name": "Leche", "isRequired": True, "maxSelections": 1,
+            "items": [
+                {"id": "i1", "groupId": "g1", "ingredientId": "10", "ingredientName": "Entera",
+                 "priceAddition": 0, "currentStock": 4.5},
+                {"id": "i2", "groupId": "g1", "ingredientId": "11", "ingredientName": "Avena",
+                 "priceAddition": 300, "currentStock": 0},
+            ],
+        }]},
+    )
+    monkeypatch.setattr(promotions_service, "list_active_for_branch", lambda *_a, **_k: [])
+    promotion_index.invalidate_promotion_index()
+    snapshot_module.invalidate_menu_snapshot(None)
+
+    entry = snapshot_module.menu_snapshot_service.get_snapshot("r1", "b1")
+    items = entry["snapshot"]["optionGroups"]["1"][0]["items"]
+    assert [(item["id"], item["inStock"]) for item in items] == [("i1", True), ("i2", False)]
+    assert all("currentStock" not in item for item in items)
+
+    # Un movimiento que deja la opción sin stock descarta el snapshot
+    service = ingredients_module.ingredients_service
+    monkeypatch.setattr(
+        ingredients_module,
+        "supabase",
+        types.SimpleNamespace(table=lambda _name: _FakeQuery("stock_movements", [])),
+    )
+    monkeypatch.setattr(service, "apply_stock_deltas", lambda deltas: {"10": 0.0})
+    monkeypatch.setattr(
+        ingredients_module.menu_service, "sync_availability_for_ingredients", lambda **_k: 0
+    )
+    _ROWS.setdefault("stock_movements", [])
+
+    service.record_movements_bulk(
+        [{"ingredient_id": "10", "qty": -4.5, "type": "sale"}], restaurant_id="r1", branch_id="b1"
+    )
+    assert snapshot_module.menu_snapshot_service.get_cached("r1", "b1") is None
+
+    # Sin cruzar cero el snapshot se conserva
+    snapshot_module.menu_snapshot_service.get_snapshot("r1", "b1")
+    monkeypatch.setattr(service, "apply_stock_deltas", lambda deltas: {"10": 2.0})
+    service.record_movements_bulk(
+        [{"ingredient_id": "10", "qty": -1, "type": "sale"}], restaurant_id="r1", branch_id="b1"
+    )
+    assert snapshot_module.menu_snapshot_service.get_cached("r1", "b1") is not None
+    snapshot_module.invalidate_menu_snapshot(None)
@@ -1,3 +1,5 @@
+import types
+
 import pytest
 
 from app.services import mesa_service as mesa_service_module
@@ -76,3 +78,105 @@ def test_get_or_create_session_generates_new_token(monkeypatch):
     )
 
     assert result["token"] == "token-new"
+
+
+def test_validate_token_uses_cached_state_until_invalidated(monkeypatch):
+    from app.utils import token_manager
+
+    rows = [{"token": "token-123", "token_expires_at": "2999-01-01T00:00:00Z", "is_active": True}]
+    selects = []
+
+    class FakeQuery:
+        def __init__(self, _table):
+            self._update = None
+
+        def select(self, *_a, **_k):
+            selects.append(1)
+            return self
+
+        def update(self, data):
+            self._update = data
+            return self
+
+        def eq(self, *_a, **_k):
+            return self
+
+        def limit(self, *_a, **_k):
+            return self
+
+        def execute(self):
+            if self._update is not None:
+                rows[0].update(self._update)
+            return types.SimpleNamespace(data=[dict(rows[0])])
+
+    monkeypatch.setattr(token_manager, "supabase", types.SimpleNamespace(table=FakeQuery))
+    token_manager.invalidate_token_state()
+
+    assert token_manager.validate_token("1", "b1", "token-123") is True
+    assert token_manager.validate_token("1", "b1", "token-123") is True
+    assert len(selects) == 1
+
+    assert token_manager.invalidate_token("1", "b1") is True
+    assert token_manager.validate_token("1", "b1", "token-123") is False
+
+    # generate_token escribe el estado nuevo: el token recién emitido valida sin releer
+    new_token = token_manager.generate_token("1", "b1", expiry_minutes=30)
+    before = len(selects)
+    assert token_manager.validate_token("1", "b1", new_token) is True
+    assert len(selects) == before
+    token_manager.invalidate_token_state()
+
+
+def test_signed_session_tokens_validate_without_db_and_revoke_by_generation(monkeypatch):
+    from app.utils import token_manager
+
+    row = {"is_active": True, "restaurant_id": "r1", "token_generation": 0, "allowed_payment_methods": ["CASH"]}
+    selects = []
+
+    class FakeQuery:
+        def __init__(self, _table):
+            pass
+
+        def select(self, *_a, **_k):
+            selects.append(1)
+            return self
+
+        def update(self, _data):
+            return self
+
+        def eq(self, *_a, **_k):
+            return self
+
+        def limit(self, *_a, **_k):
+            return self
+
+        def execute(self):
+            return types.SimpleNamespace(data=[dict(row)])
+
+    def fake_rpc(name, params):
+        assert name == "bump_mesa_token_generation"
+        row["token_generation"] += 1
+        return types.SimpleNamespace(execute=lambda: types.SimpleNamespace(data=row["token_generation"]))
+
+    monkeypatch.setattr(token_manager.Config, "MESA_TOKEN_MODE", "signed")
+    monkeypatch.setattr(
+        token_manager, "supabase", types.SimpleNamespace(table=FakeQuery, rpc=fake_rpc)
+    )
+    token_manager.invalidate_token_state()
+
+    session = mesa_service_module.mesa_service.get_or_create_session("1", "b1", expiry_minutes=30)
+    token = session["token"]
+    assert token.startswith(token_manager.SIGNED_TOKEN_PREFIX)
+    assert session["allowed_payment_methods"] == ["CASH"]
+
+    assert token_manager.validate_token("1", "b1", token) is True
+    assert token_manager.validate_token("1", "b1", token) is True
+    assert token_manager.validate_token("2", "b1", token) is False
+    assert token_manager.validate_token("1", "b1", token[:-2] + "xx") is False
+    assert len(selects) == 1
+
+    assert token_manager.invalidate_token("1", "b1") is True
+    assert token_manager.validate_token("1", "b1", token) is False
+    fresh = mesa_service_module.mesa_service.generate_token_for_mesa("1", "b1")["token"]
+    assert token_manager.validate_token("1", "b1", fresh) is True
+    token_manager.invalidate_token_state()
@@ -1,3 +1,5 @@
+import types
+
 from app.main import create_app
 
 
@@ -5,3 +7,365 @@ def test_metrics_routes_registered():
     app = create_app()
     metrics_routes = [rule for rule in app.url_map.iter_rules() if "metrics" in rule.rule]
     assert metrics_routes, "No se registraron rutas de métricas"
+
+
+def test_peak_hours_reads_rollups_without_scanning_orders(monkeypatch):
+    from app.services import metrics_service as metrics_module
+
+    from datetime import date, timedelta
+
+    hours = [0] * 24
+    hours[13] = 4
+    recent = [(date.today() - timedelta(days=n)).isoformat() for n in (1, 2)]
+    daily = {day: {"paid_orders_by_hour": hours} for day in recent}
+    daily["2000-01-01"] = {"paid_orders_by_hour": hours}
+
+    def _no_orders(name):
+        raise AssertionError(f"no debería consultar {name}")
+
+    monkeypatch.setattr(metrics_module, "supabase", types.SimpleNamespace(table=_no_orders))
+    monkeypatch.setattr(metrics_module.sales_rollup_service, "supports_offset", lambda _o: True)
+    monkeypatch.setattr(metrics_module.sales_rollup_service, "get_daily", lambda *_a, **_k: daily)
+    metrics_module._METRICS_CACHE.clear()
+
+    result = metrics_module.MetricsService.get_peak_hours("r1", "b1", tz_offset_minutes=-180)
+
+    assert result["values"][13] == 8
+    assert sum(result["values"]) == 8
+
+
+class _FakeQuery:
+    """Devuelve todas las filas en la primera página y ninguna después del cursor."""
+
+    def __init__(self, rows, name=None):
+        self.rows = rows
+        self.name = name
+        self.columns = None
+        self.filters = []
+        self.after_cursor = False
+
+    def select(self, columns):
+        self.columns = columns
+        return self
+
+    def gte(self, column, value):
+        self.filters.append(("gte", column))
+        return self
+
+    def eq(self, column, value):
+        # Filtro por estado como lo aplicaría PostgREST; el resto se ignora
+        if column == "status":
+            self.rows = [row for row in self.rows if row.get("status") == value]
+        return self
+
+    def or_(self, _expr):
+        self.after_cursor = True
+        return self
+
+    def __getattr__(self, _name):
+        return lambda *_a, **_k: self
+
+    def execute(self):
+        return types.SimpleNamespace(data=[] if self.after_cursor else self.rows)
+
+
+def test_dashboard_scans_orders_once(monkeypatch):
+    from datetime import datetime, timedelta, timezone
+    from app.services import metrics_service as metrics_module
+
+    now = datetime.now(timezone.utc)
+    orders = [
+        {
+            "total_amount": 100,
+            "status": "PAID",
+            "payment_method": "CASH",
+            "creation_date": (now - timedelta(hours=1)).isoformat(),
+            "items": [{"item_id": 7, "name": "Latte", "quantity": 2, "price": 50}],
+        },
+        {
+            "total_amount": 40,
+            "status": "CANCELLED",
+            "payment_method": "CARD",
+            "creation_date": (now - timedelta(days=2)).isoformat(),
+            "items": [],
+        },
+    ]
+    tables = {"orders": orders, "menu": [{"id": 7, "name": "Latte", "image_url": None}], "ingredients": []}
+    queried = []
+
+    def _table(name):
+        query = _FakeQuery(tables[name], name)
+        queried.append(query)
+        return query
+
+    monkeypatch.setattr(metrics_module, "supabase", types.SimpleNamespace(table=_table))
+    monkeypatch.setattr(metrics_module.sales_rollup_service, "supports_offset", lambda _o: False)
+    metrics_module._METRICS_CACHE.clear()
+
+    result = metrics_module.MetricsService.get_dashboard("r1", "b1", tz_offset_minutes=0)
+
+    def _order_scans():
+        return [q for q in queried if q.name == "orders" and not q.after_cursor]
+
+    # Una pasada acotada a la ventana más larga y otra solo con el medio de pago
+    scans = _order_scans()
+    assert len(scans) == 2
+    assert [("gte", "creation_date")] in [scan.filters for scan in scans]
+    assert "id, payment_method, creation_date" in [scan.columns for scan in scans]
+    assert all("payment_method" not in scan.columns for scan in scans if scan.filters)
+    assert result["summary"]["dailySales"] == 100
+    assert result["summary"]["totalOrders"] == 2
+    assert result["ordersStatus"]["values"] == [1, 1]
+    assert dict(zip(result["paymentMethods"]["labels"], result["paymentMethods"]["values"]))["Efectivo"] == 1
+    assert result["topProducts"]["items"][0]["quantity"] == 2
+    assert sum(result["peakHours"]["values"]) == 1
+    # El endpoint individual queda servido desde la caché del dashboard
+    assert metrics_module.MetricsService.get_peak_hours("r1", "b1", 0) == result["peakHours"]
+    assert len(_order_scans()) == 2
+
+
+def test_columnar_engine_matches_python_loop():
+    import pytest
+
+    pytest.importorskip("numpy")
+    from datetime import datetime, timedelta, timezone
+    from app.services import metrics_columnar
+    from app.services import metrics_service as metrics_module
+
+    now = datetime.now(timezone.utc)
+    orders = [
+        {
+            "status": "PAID",
+            "creation_date": (now - timedelta(days=3)).isoformat(),
+            "total_amount": "120.50",
+            "items": [
+                {"item_id": "7", "name": "Latte", "quantity": 1, "price": 50},
+                {"item_id": 7, "name": "Latte", "quantity": 2, "price": 50},
+            ],
+        },
+        {
+            "status": "PAID",
+            "creation_date": (now - timedelta(days=40)).strftime("%Y-%m-%dT%H:%M:%S-03:00"),
+            "total_amount": None,
+            "items": [{"product_id": 9, "quantity": 3, "price": 10}],
+        },
+        {"status": "PAID", "creation_date": None, "total_amount": 999, "items": []},
+        {"status": "CANCELLED", "creation_date": now.isoformat(), "total_amount": 55, "items": []},
+    ]
+    now_local = metrics_module._apply_tz_offset(now, -180)
+    year_start = now_local - timedelta(days=365)
+    month_start = now_local - timedelta(days=30)
+    _, month_keys = metrics_module._month_buckets(now_local)
+
+    assert metrics_columnar.sales_monthly_totals(
+        orders, -180, year_start, month_keys
+    ) == metrics_module._sales_monthly_totals(orders, -180, year_start, month_keys)
+    assert metrics_columnar.top_products_bucket(
+        orders, -180, month_start
+    ) == metrics_module._top_products_bucket(orders, -180, month_start)
+
+
+def test_order_event_invalidates_only_affected_branch_and_windows(monkeypatch):
+    from datetime import datetime, timedelta, timezone
+    from app.services import domain_events
+    from app.services import metrics_service as metrics_module
+
+    monkeypatch.setattr(metrics_module.sales_rollup_service, "record_order", lambda _order_id: None)
+
+    cache = metrics_module._METRICS_CACHE
+    cache.clear()
+    for key in (
+        "r1:b1:summary:-180",
+        "r1:b1:sales-monthly:-180",
+        "r1:all:payment-methods:-180",
+        "r1:all:dashboard:-180",
+        "r1:b2:sales-monthly:-180",
+        "r2:b1:sales-monthly:-180",
+    ):
+        cache.set(key, {"cached": True})
+
+    old_order = {
+        "id": "o1",
+        "restaurant_id": "r1",
+        "branch_id": "b1",
+        "status": "CANCELLED",
+        "creation_date": (datetime.now(timezone.utc) - timedelta(days=100)).isoformat(),
+    }
+    domain_events.publish_order_event(domain_events.ORDER_STATUS_CHANGED, old_order, "PAID")
+
+    # Un pedido de hace 100 días no cambia las ventanas de 30 días
+    assert "r1:b1:summary:-180" in cache
+    assert "r1:b1:sales-monthly:-180" not in cache
+    assert "r1:all:payment-methods:-180" not in cache
+    assert "r1:all:dashboard:-180" not in cache
+    assert "r1:b2:sales-monthly:-180" in cache
+    assert "r2:b1:sales-monthly:-180" in cache
+
+
+def _rollup_rows(orders, offset_minutes):
+    """
+    Renglones de sales_daily_rollups tal como los deja record_order_rollup
+    (migraciones 023 y 024), reproduciendo cada estado de order["history"].
+    """
+    from app.services import metrics_service as metrics_module
+
+    methods = {"CARD": "orders_card", "CASH": "orders_cash", "QR": "orders_qr", "BILLETERA": "orders_wallet"}
+    rows = {}
+    for order in orders:
+        local_dt = metrics_module._apply_tz_offset(
+            metrics_module._parse_order_datetime(order["creation_date"]), offset_minutes
+        )
+        row = rows.setdefault(local_dt.date().isoformat(), {
+            "local_date": local_dt.date().isoformat(),
+            "revenue": 0, "orders_created": 0, "paid_orders": 0, "cancelled_orders": 0,
+            "accepted_orders": 0, "paid_orders_by_hour": [0] * 24,
+            **{column: 0 for column in methods.values()},
+        })
+        row["orders_created"] += 1
+        state = "OPEN"
+        for status in order.get("history") or [order["status"]]:
+            target = status if status in ("PAID", "CANCELLED") else "OPEN"
+            sign = {state: -1, target: 1} if state != target else {}
+            for changed, delta in sign.items():
+                if changed == "PAID":
+                    row["paid_orders"] += delta
+                    row["revenue"] += delta * order["total_amount"]
+                    row["paid_orders_by_hour"][local_dt.hour] += delta
+                elif changed == "CANCELLED":
+                    row["cancelled_orders"] += delta
+            state = target
+        if order["status"] in metrics_module._ACCEPTED_ORDER_STATUSES:
+            row["accepted_orders"] += 1
+        column = methods.get((order["payment_method"] or "").upper())
+        if column:
+            row[column] += 1
+    return list(rows.values())
+
+
+def test_rollup_status_and_payment_methods_match_orders_path(monkeypatch):
+    from datetime import datetime, timedelta, timezone
+    from app.services import metrics_service as metrics_module
+    from app.services import sales_rollup_service as rollup_module
+
+    now = datetime.now(timezone.utc)
+    fixture = [
+        ("PAID", "CASH", 1),
+        ("PAYMENT_APPROVED", "CARD", 2),
+        ("IN_PREPARATION", "QR", 3),
+        ("READY", "billetera", 4),
+        ("DELIVERED", "CARD", 5),
+        ("PENDING", "CASH", 6),
+        ("CANCELLED", "CARD", 7),
+        ("CANCELLED", None, 8),
+        ("PAID", "OTRO", 9),
+    ]
+    orders = [
+        {
+            "status": status,
+            "payment_method": method,
+            "creation_date": (now - timedelta(days=days)).isoformat(),
+            "total_amount": 10,
+            "items": [],
+        }
+        for status, method, days in fixture
+    ]
+    rollup_rows = _rollup_rows(orders, -180)
+    monkeypatch.setattr(metrics_module, "supabase", types.SimpleNamespace(table=lambda _n: _FakeQuery(orders)))
+    monkeypatch.setattr(rollup_module, "supabase", types.SimpleNamespace(table=lambda _n: _FakeQuery(rollup_rows)))
+    service = metrics_module.MetricsService
+
+    results = {}
+    for use_rollups in (False, True):
+        monkeypatch.setattr(rollup_module.sales_rollup_service, "supports_offset", lambda _o, v=use_rollups: v)
+        metrics_module._METRICS_CACHE.clear()
+        results[use_rollups] = (
+            service.get_orders_status("r1", "b1", -180),
+            service.get_payment_methods("r1", "b1", -180),
+        )
+
+    assert results[True] == results[False]
+    assert results[True][0]["values"] == [6, 2]
+    assert results[True][1]["values"] == [1, 3, 2, 1]
+
+
+def test_sales_monthly_feeds_columnar_engine_from_all_pages(monkeypatch):
+    from datetime import datetime, timedelta, timezone
+    from app.services import metrics_service as metrics_module
+
+    now = datetime.now(timezone.utc)
+    orders = [
+        {"id": f"o{n}", "status": "PAID", "total_amount": 10, "items": [],
+         "creation_date": (now - timedelta(days=n)).isoformat()}
+        for n in range(5)
+    ]
+    pages = [orders[:2], orders[2:4], orders[4:], []]
+    calls = []
+
+    def _table(_name):
+        calls.append(_name)
+        query = _FakeQuery(pages[len(calls) - 1])
+        query.or_ = lambda _expr: query  # cada llamada ya trae su página
+        return query
+
+    seen = {}
+
+    def _columnar(rows, *_a):
+        seen["rows"] = len(rows)
+        return {}
+
+    monkeypatch.setattr(metrics_module, "supabase", types.SimpleNamespace(table=_table))
+    monkeypatch.setattr(metrics_module.sales_rollup_service, "supports_offset", lambda _o: False)
+    monkeypatch.setattr(metrics_module.Config, "METRICS_ORDERS_PAGE_SIZE", 2)
+    monkeypatch.setattr(metrics_module.metrics_columnar, "is_available", lambda count: count >= 5)
+    monkeypatch.setattr(metrics_module.metrics_columnar, "sales_monthly_totals", _columnar)
+    metrics_module._METRICS_CACHE.clear()
+
+    metrics_module.MetricsService.get_sales_monthly("r1", "b1", tz_offset_minutes=0)
+
+    # Cuatro páginas (la última vacía) y el motor recibe la ventana completa
+    assert len(calls) == 4
+    assert seen["rows"] == 5
+
+
+def test_rollup_revenue_matches_orders_path_after_paid_order_moves_on(monkeypatch):
+    from datetime import datetime, timedelta, timezone
+    from app.services import metrics_service as metrics_module
+    from app.services import sales_rollup_service as rollup_module
+
+    now = datetime.now(timezone.utc)
+    histories = [
+        ["PAYMENT_PENDING", "PAID"],
+        ["PAYMENT_PENDING", "PAID", "IN_PREPARATION", "DELIVERED"],
+        ["PAYMENT_PENDING", "DELIVERED", "PAID"],
+        ["PAYMENT_PENDING", "CANCELLED", "PAID"],
+    ]
+    orders = [
+        {
+            "status": history[-1],
+            "history": history,
+            "payment_method": "CASH",
+            "creation_date": (now - timedelta(days=days, hours=days)).isoformat(),
+            "total_amount": 10 * (days + 1),
+            "items": [],
+        }
+        for days, history in enumerate(histories)
+    ]
+    rollup_rows = _rollup_rows(orders, -180)
+    monkeypatch.setattr(metrics_module, "supabase", types.SimpleNamespace(table=lambda _n: _FakeQuery(orders)))
+    monkeypatch.setattr(rollup_module, "supabase", types.SimpleNamespace(table=lambda _n: _FakeQuery(rollup_rows)))
+    service = metrics_module.MetricsService
+
+    results = {}
+    for use_rollups in (False, True):
+        monkeypatch.setattr(rollup_module.sales_rollup_service, "supports_offset", lambda _o, v=use_rollups: v)
+        metrics_module._METRICS_CACHE.clear()
+        results[use_rollups] = (
+            service.get_daily_revenue("r1", "b1", -180),
+            service.get_peak_hours("r1", "b1", -180),
+            service.get_orders_status("r1", "b1", -180),
+        )
+
+    assert results[True] == results[False]
+    # El pedido que pasó de PAID a DELIVERED no suma: solo cuentan los que hoy están en PAID
+    assert sum(results[True][0]["values"]) == 10 + 30 + 40
+    assert sum(results[True][1]["values"]) == 3
@@ -1,3 +1,5 @@
+import types
+
 import pytest
 
 from app.services import order_service as order_service_module
@@ -120,3 +122,229 @@ def test_normalize_payment_method():
     assert order_service_module.order_service._normalize_payment_method(None) is None
     with pytest.raises(ValueError):
         order_service_module.order_service._normalize_payment_method("invalid")
+
+
+def test_consume_ingredients_uses_recipe_graph(monkeypatch):
+    graph_calls = []
+
+    def fake_graph(restaurant_id, branch_id):
+        graph_calls.append((restaurant_id, branch_id))
+        return {
+            "10": {"name": "Latte", "available": True, "recipe": [("1", 0.2), ("2", 1.0)]},
+            "11": {"name": "Flat white", "available": True, "recipe": [("1", 0.5)]},
+        }
+
+    monkeypatch.setattr(order_service_module, "get_recipe_graph", fake_graph)
+
+    captured = {}
+
+    def fake_bulk(movements, **kwargs):
+        captured["movements"] = movements
+        captured["kwargs"] = kwargs
+        return {}
+
+    monkeypatch.setattr(order_service_module.ingredients_service, "record_movements_bulk", fake_bulk)
+
+    order_service_module.order_service._consume_ingredients_for_order(
+        items=[{"id": "10", "quantity": 2}, {"id": "11", "quantity": 1}, {"id": "10", "quantity": 1}],
+        restaurant_id="r1",
+        branch_id="b1",
+        order_id="o1",
+    )
+
+    assert graph_calls == [("r1", "b1")]
+    qty_by_ingredient = {}
+    for movement in captured["movements"]:
+        qty_by_ingredient[movement["ingredient_id"]] = qty_by_ingredient.get(movement["ingredient_id"], 0) + movement["qty"]
+    assert qty_by_ingredient == {"1": pytest.approx(-1.1), "2": pytest.approx(-3.0)}
+    assert captured["kwargs"]["branch_id"] == "b1"
+
+
+def test_validate_stock_queries_only_ingredients(monkeypatch):
+    monkeypatch.setattr(
+        order_service_module,
+        "get_recipe_graph",
+        lambda *_a, **_k: {"10": {"name": "Latte", "available": True, "recipe": [("1", 0.2)]}},
+    )
+    queries = []
+
+    class FakeQuery:
+        def __init__(self, table):
+            queries.append(table)
+
+        def select(self, *_a, **_k):
+            return self
+
+        def in_(self, *_a, **_k):
+            return self
+
+        def eq(self, *_a, **_k):
+            return self
+
+        def execute(self):
+            return types.SimpleNamespace(data=[
+                {"id": 1, "name": "Leche", "current_stock": 1.0, "track_stock": True, "unit": "l"},
+                {"id": 7, "name": "Avena", "current_stock": 0, "track_stock": True, "unit": "unit"},
+            ])
+
+    monkeypatch.setattr(order_service_module, "supabase", types.SimpleNamespace(table=FakeQuery))
+
+    with pytest.raises(ValueError) as exc:
+        order_service_module.order_service._validate_stock_for_items(
+            [{"id": "10", "quantity": 3, "selectedOptions": [{"ingredientId": 7}]}],
+            restaurant_id="r1",
+            branch_id="b1",
+        )
+
+    assert queries == ["ingredients"]
+    assert "Avena" in str(exc.value)
+    assert "Leche" not in str(exc.value)
+
+
+class _FeedQuery:
+    """Query falsa que devuelve pedidos 'más nuevos primero' y respeta el cursor."""
+
+    def __init__(self, rows, log):
+        self.rows = rows
+        self.log = log
+        self.filters = []
+        self.after = None
+        self.row_limit = None
+
+    def select(self, columns):
+        self.filters.append(("select", columns))
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(("eq", column, value))
+        return self
+
+    def or_(self, expression):
+        self.filters.append(("or", expression))
+        self.after = expression.split('"')[1]
+        return self
+
+    def order(self, *_a, **_k):
+        return self
+
+    def limit(self, count):
+        self.row_limit = count
+        return self
+
+    def execute(self):
+        self.log.append(self.filters)
+        rows = [r for r in self.rows if self.after is None or r["creation_date"] < self.after]
+        return types.SimpleNamespace(data=rows[: self.row_limit])
+
+
+def test_orders_feed_pages_by_cursor(monkeypatch):
+    rows = [
+        {"id": f"o{n}", "status": "PAYMENT_APPROVED", "items": [], "total_amount": n,
+         "creation_date": f"2026-01-01T10:{n:02d}:00+00:00", "updated_at": f"2026-01-01T11:{n:02d}:00+00:00"}
+        for n in range(5, 0, -1)
+    ]
+    log = []
+    monkeypatch.setattr(
+        order_service_module, "supabase", types.SimpleNamespace(table=lambda _name: _FeedQuery(rows, log))
+    )
+    service = order_service_module.order_service
+
+    first = service.list_orders_page(restaurant_id="r1", branch_id="b1", status="payment_approved", limit=2)
+    assert [o["id"] for o in first["orders"]] == ["o5", "o4"]
+    assert first["next_cursor"] and first["sync_cursor"]
+    assert ("eq", "status", "PAYMENT_APPROVED") in log[0]
+
+    second = service.list_orders_page(restaurant_id="r1", branch_id="b1", limit=2, cursor=first["next_cursor"])
+    assert [o["id"] for o in second["orders"]] == ["o3", "o2"]
+
+    # La lista completa recorre todas las páginas
+    monkeypatch.setattr(order_service_module.Config, "ORDERS_PAGE_MAX_LIMIT", 2)
+    assert [o["id"] for o in service.get_all_orders("b1", "r1")] == ["o5", "o4", "o3", "o2", "o1"]
+
+    with pytest.raises(ValueError):
+        service.list_orders_page(restaurant_id="r1", cursor=first["sync_cursor"])
+
+
+class _SyncQuery:
+    """Query falsa sobre updated_at (asc): respeta gte/lte y el cursor keyset."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.filters = []
+        self.after = None
+        self.row_limit = None
+
+    def select(self, _columns):
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(("eq", column, value))
+        return self
+
+    def in_(self, column, values):
+        self.filters.append(("in", column, values))
+        return self
+
+    def gte(self, column, value):
+        self.filters.append(("gte", column, value))
+        return self
+
+    def lte(self, column, value):
+        self.filters.append(("lte", column, value))
+        return self
+
+    def or_(self, expression):
+        parts = expression.split('"')
+        self.after = (parts[1], parts[5])
+        return self
+
+    def order(self, *_a, **_k):
+        return self
+
+    def limit(self, count):
+        self.row_limit = count
+        return self
+
+    def execute(self):
+        rows = sorted(self.rows, key=lambda r: (r["updated_at"], r["id"]))
+        for op, column, value in self.filters:
+            if op == "gte":
+                rows = [r for r in rows if r[column] >= value]
+            elif op == "lte":
+                rows = [r for r in rows if r[column] <= value]
+            elif op == "eq" and column == "status":
+                rows = [r for r in rows if r[column] == value]
+        if self.after is not None:
+            rows = [r for r in rows if (r["updated_at"], r["id"]) > self.after]
+        return types.SimpleNamespace(data=rows[: self.row_limit])
+
+
+def test_orders_sync_ignores_status_and_rereads_overlap(monkeypatch):
+    from app.utils.keyset import encode_cursor
+
+    rows = [
+        {"id": "o1", "status": "DELIVERED", "items": [], "total_amount": 1,
+         "creation_date": "2026-01-01T10:00:00+00:00", "updated_at": "2026-01-01T11:00:01+00:00"},
+        {"id": "o2", "status": "PAID", "items": [], "total_amount": 2,
+         "creation_date": "2026-01-01T10:00:00+00:00", "updated_at": "2026-01-01T11:00:03+00:00"},
+        {"id": "o3", "status": "DELIVERED", "items": [], "total_amount": 3,
+         "creation_date": "2026-01-01T10:00:00+00:00", "updated_at": "2026-01-01T11:00:06+00:00"},
+    ]
+    monkeypatch.setattr(
+        order_service_module, "supabase", types.SimpleNamespace(table=lambda _name: _SyncQuery(rows))
+    )
+    monkeypatch.setattr(order_service_module.Config, "ORDERS_SYNC_OVERLAP_SECONDS", 5)
+    service = order_service_module.order_service
+
+    # o1 confirmó tarde con una marca anterior al cursor que el cliente ya tiene
+    since = encode_cursor("orders-sync", "2026-01-01T11:00:03+00:00", "o2")
+    result = service.list_orders_since(since, restaurant_id="r1", branch_id="b1", limit=10)
+
+    # o3 pasó a DELIVERED y llega igual; o1 y o2 salen de la relectura, sin repetidos
+    assert [o["id"] for o in result["orders"]] == ["o1", "o2", "o3"]
+    assert result["has_more"] is False
+    again = service.list_orders_since(result["sync_cursor"], restaurant_id="r1", limit=10)
+    assert "o3" in [o["id"] for o in again["orders"]]
+
+    monkeypatch.setattr(order_service_module.Config, "ORDERS_SYNC_OVERLAP_SECONDS", 0)
+    assert [o["id"] for o in service.list_orders_since(since, restaurant_id="r1")["orders"]] == ["o3"]
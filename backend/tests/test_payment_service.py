@@ -0,0 +1,42 @@
+import types
+
+from app.services import payment_service as payment_module
+
+
+class _FakeOrders:
+    def __init__(self, row):
+        self.row = row
+        self.payload = None
+
+    def select(self, *_a, **_k):
+        return self
+
+    def update(self, payload):
+        self.payload = payload
+        return self
+
+    def eq(self, *_a, **_k):
+        return self
+
+    def execute(self):
+        if self.payload is not None:
+            self.row = {**self.row, **self.payload}
+        return types.SimpleNamespace(data=[self.row])
+
+
+def test_accept_order_publishes_status_change(monkeypatch):
+    order = {"id": "o1", "restaurant_id": "r1", "branch_id": "b1", "mesa_id": "3",
+             "status": "PAYMENT_APPROVED", "creation_date": "2026-01-01T10:00:00+00:00"}
+    monkeypatch.setattr(
+        payment_module, "supabase", types.SimpleNamespace(table=lambda _name: _FakeOrders(dict(order)))
+    )
+    published = []
+    monkeypatch.setattr(
+        payment_module,
+        "publish_order_event",
+        lambda name, row, previous_status=None: published.append((name, row["status"], previous_status)),
+    )
+
+    payment_module.PaymentService.accept_order("o1")
+
+    assert published == [(payment_module.ORDER_STATUS_CHANGED, "IN_PREPARATION", "PAYMENT_APPROVED")]
@@ -0,0 +1,53 @@
+import types
+
+from app.services import product_options_service as options_module
+
+
+_GROUP_ROWS = [
+    {
+        "id": 1, "product_id": 10, "name": "Leche", "is_required": True, "max_selections": 1,
+        "menu": {"branch_id": "b1"},
+        "product_option_items": [
+            {"id": 6, "group_id": 1, "ingredient_id": 4, "price_addition": 300,
+             "created_at": "2026-01-02", "ingredients": {"name": "Almendras", "unit": "ml", "current_stock": 900}},
+            {"id": 5, "group_id": 1, "ingredient_id": 3, "price_addition": 0,
+             "created_at": "2026-01-01", "ingredients": {"name": "Entera", "unit": "ml", "current_stock": 5000}},
+        ],
+    },
+    {"id": 2, "product_id": 11, "name": "Extras", "max_selections": 3, "product_option_items": []},
+]
+
+
+class _FakeQuery:
+    def __init__(self, log):
+        self.log = log
+        self.calls = []
+
+    def __getattr__(self, name):
+        def _record(*args, **_kwargs):
+            self.calls.append((name, args))
+            return self
+        return _record
+
+    def execute(self):
+        self.log.append(self.calls)
+        return types.SimpleNamespace(data=[dict(row) for row in _GROUP_ROWS])
+
+
+def test_option_groups_use_one_embedded_query(monkeypatch):
+    log = []
+    monkeypatch.setattr(
+        options_module, "supabase", types.SimpleNamespace(table=lambda _name: _FakeQuery(log))
+    )
+    service = options_module.product_options_service
+
+    groups = service.list_groups("r1", "10")
+    assert len(log) == 1
+    assert [item["ingredientName"] for item in groups[0]["items"]] == ["Entera", "Almendras"]
+
+    by_product = service.groups_for_branch("r1", "b1")
+    assert len(log) == 2
+    assert ("eq", ("menu.branch_id", "b1")) in log[1]
+    assert set(by_product) == {"10", "11"}
+    assert by_product["11"][0]["items"] == []
+    assert "menu" not in by_product["10"][0]
@@ -0,0 +1,106 @@
+import os
+
+os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+os.environ.setdefault("SUPABASE_KEY", "test-anon-key")
+
+from app.services import promotion_engine, promotion_index  # noqa: E402
+from app.services.promotions_service import promotions_service  # noqa: E402
+
+
+_PROMOS = [
+    {
+        "id": "p-discount",
+        "name": "10% café",
+        "type": "discount",
+        "value": 10,
+        "active": True,
+        "applicable_products": [1],
+    },
+    {
+        "id": "p-2x1",
+        "name": "2x1 medialunas",
+        "type": "2x1",
+        "value": 0,
+        "active": True,
+        "applicable_products": ["2"],
+    },
+    {
+        "id": "p-combo",
+        "name": "Desayuno",
+        "type": "combo",
+        "value": 1500,
+        "active": True,
+        "combo_items": [{"product_id": 1, "quantity": 1}, {"product_id": 3, "quantity": 1}],
+    },
+    {
+        "id": "p-old",
+        "name": "Vencida",
+        "type": "discount",
+        "value": 50,
+        "active": True,
+        "end_date": "2000-01-01",
+    },
+]
+
+
+def test_promotion_index_is_compiled_once_per_branch(monkeypatch):
+    calls = []
+
+    def fake_list_active(restaurant_id, branch_id=None):
+        calls.append((restaurant_id, branch_id))
+        return [dict(p) for p in _PROMOS]
+
+    monkeypatch.setattr(promotions_service, "list_active_for_branch", fake_list_active)
+    promotion_index.invalidate_promotion_index()
+
+    items = [
+        {"id": 1, "price": 1000, "quantity": 1},
+        {"id": 2, "price": 500, "quantity": 2},
+        {"id": 3, "price": 800, "quantity": 1},
+    ]
+    result, savings = promotion_engine.apply_promotions_to_items(items, "rest-1", "branch-1")
+    promotion_engine.apply_promotions_to_items(items, "rest-1", "branch-1")
+
+    assert calls == [("rest-1", "branch-1")]
+    by_id = {row["id"]: row for row in savings}
+    assert by_id["p-discount"]["saving_amount"] == 100.0
+    assert by_id["p-2x1"]["saving_amount"] == 500.0
+    assert by_id["p-combo"]["name"] == "Desayuno"
+    assert "p-old" not in by_id
+    assert result[1]["finalPrice"] == 250.0
+
+    index = promotion_index.get_promotion_index("rest-1", "branch-1")
+    assert [p.id for p in index.candidates([3])] == ["p-combo", "p-old"]
+
+    promotion_index.invalidate_promotion_index("rest-1")
+    promotion_engine.apply_promotions_to_items(items, "rest-1", "branch-1")
+    assert len(calls) == 2
+
+
+def test_two_for_one_and_combo_are_count_based(monkeypatch):
+    promos = [
+        {"id": "p-2x1", "name": "2x1", "type": "2x1", "value": 0, "active": True,
+         "applicable_products": ["cafe", "te"]},
+        {"id": "p-combo", "name": "Merienda", "type": "combo", "value": 1000, "active": True,
+         "combo_items": [{"product_id": "tostado", "quantity": 1}, {"product_id": "jugo", "quantity": 2}]},
+    ]
+    monkeypatch.setattr(
+        promotions_service, "list_active_for_branch", lambda *_args, **_kw: [dict(p) for p in promos]
+    )
+    promotion_index.invalidate_promotion_index()
+
+    items = [
+        {"id": "cafe", "price": 1000, "quantity": 200},
+        {"id": "te", "price": 800, "quantity": 3},
+        {"id": "tostado", "price": 900, "quantity": 3},
+        {"id": "jugo", "price": 300, "quantity": 5},
+    ]
+    result, savings = promotion_engine.apply_promotions_to_items(items, "rest-2", "branch-1")
+    by_id = {row["id"]: row["saving_amount"] for row in savings}
+
+    # 203 unidades → 101 gratis: las 3 de té y 98 cafés
+    assert by_id["p-2x1"] == 3 * 800 + 98 * 1000
+    assert result[1]["finalPrice"] == 0.0
+    # 5 jugos alcanzan para 2 combos (tostado + 2 jugos = 1500 normal, 1000 combo)
+    assert by_id["p-combo"] == 2 * 500
+    assert result[2]["discountAmount"] == round(1000 * 900 * 2 / 3000 / 3, 2)
@@ -0,0 +1,41 @@
+import os
+import time
+
+import pytest
+
+os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+os.environ.setdefault("SUPABASE_KEY", "test-anon-key")
+
+from app.db import query_executor  # noqa: E402
+
+
+def test_run_queries_runs_concurrently_and_keeps_order():
+    def make_call(value, delay):
+        def _call():
+            time.sleep(delay)
+            return value
+        return _call
+
+    started = time.perf_counter()
+    results = query_executor.run_queries(
+        [make_call("a", 0.2), make_call("b", 0.05), make_call("c", 0.1)]
+    )
+    elapsed = time.perf_counter() - started
+
+    assert results == ["a", "b", "c"]
+    assert elapsed < 0.3
+
+
+def test_run_queries_errors_and_deadline():
+    def boom():
+        raise ValueError("falló")
+
+    results = query_executor.run_queries([lambda: 1, boom], return_exceptions=True)
+    assert results[0] == 1
+    assert isinstance(results[1], ValueError)
+
+    with pytest.raises(ValueError):
+        query_executor.run_queries([lambda: 1, boom])
+
+    with pytest.raises(query_executor.QueryDeadlineExceeded):
+        query_executor.run_queries([lambda: time.sleep(0.5), lambda: 2], timeout=0.05)
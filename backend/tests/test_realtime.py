@@ -0,0 +1,113 @@
+from flask import Flask
+
+import types
+
+from app.services import realtime
+from app.services import socket_emitter as socket_emitter_module
+from app.socketio import socketio
+
+
+def _make_app():
+    app = Flask(__name__)
+    socketio.init_app(app)
+    return app
+
+
+def test_connect_joins_branch_rooms_and_emits_are_scoped(monkeypatch):
+    users = {
+        "cajero-b1": {"id": "u1", "role": "caja", "org_id": "r1", "branch_id": "b1"},
+        "cajero-b2": {"id": "u2", "role": "caja", "org_id": "r1", "branch_id": "b2"},
+        "otro-restaurante": {"id": "u3", "role": "caja", "org_id": "r2", "branch_id": "b9"},
+    }
+    monkeypatch.setattr(socket_emitter_module.socket_emitter, "window_seconds", 0)
+    monkeypatch.setattr(realtime, "verify_token", lambda token: users[token])
+    monkeypatch.setattr(realtime, "get_restaurant_id_from_slug", lambda slug: {"cafe": "r1", "otro": "r2"}[slug])
+    app = _make_app()
+
+    b1 = socketio.test_client(app, auth={"token": "cajero-b1", "restaurantSlug": "cafe"})
+    b2 = socketio.test_client(app, auth={"token": "cajero-b2", "restaurantSlug": "cafe"})
+    other = socketio.test_client(app, auth={"token": "otro-restaurante", "restaurantSlug": "otro"})
+    assert b1.is_connected() and b2.is_connected() and other.is_connected()
+
+    # Un usuario de otro restaurante no puede unirse con el slug ajeno
+    intruder = socketio.test_client(app, auth={"token": "otro-restaurante", "restaurantSlug": "cafe"})
+    assert not intruder.is_connected()
+
+    # Al conectar cada cliente recibe la secuencia vigente de su sucursal
+    assert [m["name"] for m in b1.get_received()] == ["orders:sequence"]
+    b2.get_received()
+    other.get_received()
+
+    realtime.emit_to_branch(realtime.ORDERS_UPDATED, {"branch_id": "b1"}, "r1", "b1")
+
+    assert [m["name"] for m in b1.get_received()] == ["orders:updated"]
+    assert b2.get_received() == []
+    assert other.get_received() == []
+
+
+def test_order_delta_carries_order_and_branch_sequence(monkeypatch):
+    sent = []
+    monkeypatch.setattr(socket_emitter_module.socket_emitter, "window_seconds", 0)
+    monkeypatch.setattr(realtime.socketio, "emit", lambda event, payload, to=None: sent.append((event, payload, to)))
+
+    before = realtime.current_sequence("r1", "b7")["seq"]
+    for status in ("IN_PREPARATION", "READY"):
+        realtime.emit_order_delta({"id": "o1", "status": status, "mesa_id": "3"}, "updated", "r1", "b7")
+
+    payloads = [payload for _event, payload, _to in sent]
+    assert [p["seq"] for p in payloads] == [before + 1, before + 2]
+    assert payloads[-1]["order"]["status"] == "READY"
+    assert payloads[-1]["mesa_id"] == "3" and payloads[-1]["v"] == realtime.ORDER_EVENT_VERSION
+    assert sent[0][2] == [realtime.room_name("r1", "b7"), realtime.room_name("r1")]
+
+
+def test_emitter_coalesces_repeated_events_within_window(monkeypatch):
+    sent = []
+    fake_socketio = types.SimpleNamespace(
+        server=object(),
+        emit=lambda event, payload, to=None: sent.append((event, payload, to)),
+        start_background_task=lambda _fn: None,
+    )
+    monkeypatch.setattr(socket_emitter_module, "socketio", fake_socketio)
+    emitter = socket_emitter_module.CoalescingEmitter(window_ms=100, max_pending=10)
+
+    for status in ("PENDING", "IN_PREPARATION", "READY"):
+        emitter.emit("orders:updated", {"order": {"id": "o1", "status": status}}, ["room-b1"], coalesce_key="o1")
+    emitter.emit("orders:updated", {"order": {"id": "o2"}}, ["room-b1"], coalesce_key="o2")
+    emitter.emit("waiter_calls:updated", {"branch_id": "b1"}, ["room-b1"])
+    emitter.emit("waiter_calls:updated", {"branch_id": "b1"}, ["room-b1"])
+    assert sent == []
+
+    assert emitter.flush() == 3
+    assert [(event, payload.get("order", {}).get("status")) for event, payload, _ in sent] == [
+        ("orders:updated", "READY"),
+        ("orders:updated", None),
+        ("waiter_calls:updated", None),
+    ]
+    stats = emitter.stats()
+    assert (stats["enqueued"], stats["coalesced"], stats["emitted"], stats["pending"]) == (6, 3, 3, 0)
+
+
+def test_emitter_overflow_emits_immediately_instead_of_dropping(monkeypatch):
+    sent = []
+    fake_socketio = types.SimpleNamespace(
+        server=object(),
+        emit=lambda event, payload, to=None: sent.append((event, payload, to)),
+        start_background_task=lambda _fn: None,
+    )
+    monkeypatch.setattr(socket_emitter_module, "socketio", fake_socketio)
+    emitter = socket_emitter_module.CoalescingEmitter(window_ms=100, max_pending=1)
+    seq = iter(range(1, 10))
+
+    def _with_sequence(payload):
+        return {**payload, "seq": next(seq)}
+
+    emitter.emit("orders:updated", {"order": {"id": "o1"}}, ["room-b1"], coalesce_key="o1", prepare=_with_sequence)
+    emitter.emit("orders:updated", {"order": {"id": "o2"}}, ["room-b1"], coalesce_key="o2", prepare=_with_sequence)
+    # Cola llena: o2 sale ya, con su secuencia, sin esperar la ventana
+    assert [(payload["order"]["id"], payload["seq"]) for _, payload, _ in sent] == [("o2", 1)]
+
+    emitter.flush()
+    assert [(payload["order"]["id"], payload["seq"]) for _, payload, _ in sent] == [("o2", 1), ("o1", 2)]
+    stats = emitter.stats()
+    assert (stats["overflowed"], stats["emitted"], stats["pending"]) == (1, 2, 0)
@@ -0,0 +1,83 @@
+import types
+
+from app.controllers import reports_controller
+from app.utils import keyset
+
+
+def _fake_orders(rows, max_rows=None):
+    """orders ordenados por (creation_date, id) desc; max_rows simula db-max-rows de PostgREST."""
+    filters = []
+
+    class Query:
+        def __init__(self):
+            self._after = None
+            self._limit = None
+
+        def or_(self, expr):
+            filters.append(expr)
+            value = expr.split(".lt.", 1)[1].split(",", 1)[0].strip('"')
+            row_id = expr.rsplit("id.lt.", 1)[1].rstrip(")").strip('"')
+            self._after = (value, row_id)
+            return self
+
+        def order(self, *_a, **_k):
+            return self
+
+        def limit(self, size):
+            self._limit = size if max_rows is None else min(size, max_rows)
+            return self
+
+        def execute(self):
+            ordered = sorted(rows, key=lambda r: (r["creation_date"], r["id"]), reverse=True)
+            if self._after is not None:
+                ordered = [r for r in ordered if (r["creation_date"], r["id"]) < self._after]
+            return types.SimpleNamespace(data=ordered[: self._limit])
+
+    return Query, filters
+
+
+def test_sales_export_streams_every_page_past_the_row_cap():
+    rows = [
+        {"id": f"o{i:02d}", "creation_date": f"2026-01-{1 + i % 5:02d}T10:00:00Z", "total_amount": i}
+        for i in range(7)
+    ]
+    query_cls, filters = _fake_orders(rows, max_rows=2)
+
+    pages = keyset.iter_keyset_pages(query_cls, "creation_date", True, page_size=3)
+    response = reports_controller._csv_response(
+        "ventas.csv",
+        ["fecha", "order_id", "total", "estado", "metodo_pago", "sucursal_id"],
+        pages,
+        reports_controller._sales_row,
+    )
+
+    assert response.is_streamed
+    body = b"".join(response.response).decode("utf-8-sig")
+    lines = body.strip().splitlines()
+    assert lines[0].startswith("fecha,order_id")
+    exported = [line.split(",")[1] for line in lines[1:]]
+    assert sorted(exported) == sorted(r["id"] for r in rows)
+    assert len(exported) == len(set(exported))
+    # 4 páginas recortadas a 2 filas (la última con 1) más la vacía que cierra el recorrido
+    assert len(filters) == 4
+
+
+def test_sales_export_fails_the_stream_when_a_later_page_fails():
+    import pytest
+
+    def _pages():
+        yield [{"id": "o1", "creation_date": "2026-01-01T10:00:00Z", "total_amount": 1}]
+        raise RuntimeError("timeout de PostgREST")
+
+    response = reports_controller._csv_response(
+        "ventas.csv",
+        ["fecha", "order_id", "total", "estado", "metodo_pago", "sucursal_id"],
+        _pages(),
+        reports_controller._sales_row,
+    )
+
+    chunks = iter(response.response)
+    next(chunks)  # header
+    next(chunks)  # primera página
+    with pytest.raises(RuntimeError):
+        next(chunks)
@@ -66,6 +66,66 @@ def test_verify_token_ignores_user_metadata(monkeypatch):
     assert verified["role"] is None
 
 
+def _signed_token(secret, **claims):
+    import jwt
+
+    payload = {
+        "sub": "user-2",
+        "email": "local@example.com",
+        "aud": "authenticated",
+        "exp": int(time.time()) + 600,
+        "app_metadata": {"role": "admin", "restaurant_id": "org-2", "branch_id": "branch-2"},
+    }
+    payload.update(claims)
+    return jwt.encode(payload, secret, algorithm="HS256")
+
+
+def test_verify_token_locally_without_calling_supabase(monkeypatch):
+    def fail_get_user(_token):
+        raise AssertionError("no debería consultar Supabase Auth")
+
+    monkeypatch.setattr(supabase_client.supabase.auth, "get_user", fail_get_user)
+    monkeypatch.setattr(auth_module.Config, "SUPABASE_JWT_SECRET", "local-secret-0123456789-abcdefghij")
+    monkeypatch.setattr(auth_module.Config, "AUTH_VERIFY_MODE", "auto")
+    monkeypatch.setattr(auth_module.Config, "AUTH_REMOTE_REVOCATION_CHECK", False)
+    auth_module._auth_cache.clear()
+
+    verified = auth_module.verify_token(_signed_token("local-secret-0123456789-abcdefghij"))
+    assert verified == {
+        "id": "user-2",
+        "email": "local@example.com",
+        "role": "admin",
+        "org_id": "org-2",
+        "branch_id": "branch-2",
+    }
+
+    with pytest.raises(auth_module.AuthenticationError):
+        auth_module.verify_token(_signed_token("otro-secreto-0123456789-abcdefghij"))
+    with pytest.raises(auth_module.AuthenticationError):
+        auth_module.verify_token(
+            _signed_token("local-secret-0123456789-abcdefghij", exp=int(time.time()) - 10)
+        )
+
+
+def test_verify_token_remote_revocation_check_is_opt_in(monkeypatch):
+    calls = []
+
+    def fake_get_user(token):
+        calls.append(token)
+        return types.SimpleNamespace(user=_make_user(app_role="cashier"))
+
+    monkeypatch.setattr(supabase_client.supabase.auth, "get_user", fake_get_user)
+    monkeypatch.setattr(auth_module.Config, "SUPABASE_JWT_SECRET", "local-secret-0123456789-abcdefghij")
+    monkeypatch.setattr(auth_module.Config, "AUTH_VERIFY_MODE", "auto")
+    monkeypatch.setattr(auth_module.Config, "AUTH_REMOTE_REVOCATION_CHECK", True)
+    auth_module._auth_cache.clear()
+
+    token = _signed_token("local-secret-0123456789-abcdefghij")
+    assert auth_module.verify_token(token)["role"] == "cashier"
+    assert auth_module.verify_token(token)["role"] == "cashier"
+    assert calls == [token]
+
+
 def test_waiter_call_defaults_to_assistance():
     call, already_pending = waiter_service.create_waiter_call(
         {"mesa_id": "1", "branch_id": "b1"},
@@ -0,0 +1,107 @@
+from app.services.waiter_call_store import SharedWaiterCallStore
+from app.utils import cache as cache_module
+from app.utils import shared_state
+
+
+def _call(call_id, mesa_id="5", branch_id="b1"):
+    return {"id": call_id, "mesa_id": mesa_id, "branch_id": branch_id, "status": "PENDING", "created_at": call_id}
+
+
+def test_shared_waiter_store_deduplicates_across_workers():
+    client = shared_state.connect("fakeredis://test-waiter-store")
+    client.flushall()
+    worker_a = SharedWaiterCallStore(client, ttl_seconds=3600)
+    worker_b = SharedWaiterCallStore(shared_state.connect("fakeredis://test-waiter-store"), ttl_seconds=3600)
+
+    created, already = worker_a.add_if_no_pending(_call("c1"))
+    duplicate, already_b = worker_b.add_if_no_pending(_call("c2"))
+    assert (already, already_b) == (False, True)
+    assert duplicate["id"] == created["id"]
+
+    def _complete(call):
+        call["status"] = "COMPLETED"
+        return call
+
+    assert worker_b.update("c1", _complete)["status"] == "COMPLETED"
+    # Cerrada la llamada, la mesa puede volver a llamar (desde cualquier worker)
+    _, already_again = worker_a.add_if_no_pending(_call("c3"))
+    assert already_again is False
+    assert {c["id"] for c in worker_b.list(status="PENDING", branch_id="b1")} == {"c3"}
+    assert worker_a.list(branch_id="otra") == []
+
+
+def test_remote_invalidation_drops_local_copies_only_from_other_workers():
+    cache = cache_module.get_cache("test-remote-invalidation", max_entries=10, ttl_seconds=60)
+    cache.set("r1:b1", "index")
+    cache.set("r2:b1", "index")
+
+    own = {"origin": cache_module._ORIGIN, "namespace": "test-remote-invalidation", "prefix": "r1:"}
+    assert cache_module.apply_remote_invalidation(own) is False
+    assert cache.get("r1:b1") == "index"
+
+    remote = {**own, "origin": "otro-worker"}
+    assert cache_module.apply_remote_invalidation(remote) is True
+    assert cache.get("r1:b1") is None
+    assert cache.get("r2:b1") == "index"
+
+
+def test_multiple_workers_require_a_real_shared_backend(monkeypatch):
+    import pytest
+
+    monkeypatch.setattr(shared_state.Config, "WEB_CONCURRENCY", 1)
+    monkeypatch.setattr(shared_state.Config, "SHARED_STATE_URL", "")
+    shared_state.ensure_backend_for_workers()
+
+    monkeypatch.setattr(shared_state.Config, "WEB_CONCURRENCY", 4)
+    for url in ("", "fakeredis://local"):
+        monkeypatch.setattr(shared_state.Config, "SHARED_STATE_URL", url)
+        with pytest.raises(RuntimeError):
+            shared_state.ensure_backend_for_workers()
+
+
+def test_recipe_graph_invalidation_is_published_to_other_workers(monkeypatch):
+    from app.services import recipe_graph
+
+    published = []
+    monkeypatch.setattr(cache_module._shared_tier, "publish", lambda _channel, message: published.append(message))
+    recipe_graph._RECIPE_GRAPH_CACHE.set("r1:b1:", {"value": {}, "by_ingredient": {}})
+    recipe_graph._RECIPE_GRAPH_CACHE.set("r1:b10:", {"value": {}, "by_ingredient": {}})
+
+    recipe_graph.invalidate_recipe_graph("r1", "b1")
+
+    assert {prefix for m in published for prefix in m["prefixes"]} == {"r1:b1:", "r1:all:"}
+    assert all(m["namespace"] == "recipe-graph" for m in published)
+    assert recipe_graph._RECIPE_GRAPH_CACHE.get("r1:b1:") is None
+    assert recipe_graph._RECIPE_GRAPH_CACHE.get("r1:b10:") is not None
+
+
+def test_shared_prefix_invalidation_uses_index_and_reaches_other_workers(monkeypatch):
+    client = shared_state.connect("fakeredis://test-cache-index")
+    client.flushall()
+    tier = cache_module._SharedTier("fakeredis://test-cache-index")
+    monkeypatch.setattr(cache_module, "_shared_tier", tier)
+    monkeypatch.setattr(client, "scan_iter", lambda *_a, **_k: (_ for _ in ()).throw(AssertionError("SCAN")))
+    published = []
+    monkeypatch.setattr(tier, "publish", lambda _channel, message: published.append(message))
+
+    worker_a = cache_module.get_cache("test-index", max_entries=10, ttl_seconds=60, shared=True)
+    worker_b = cache_module.NamespaceCache("test-index", max_entries=10, ttl_seconds=60, shared=True)
+    for key in ("r1:b1:summary:0", "r1:b1:peak-hours:0:30", "r1:b10:summary:0", "r2:b1:summary:0"):
+        worker_a.set(key, {"key": key})
+    assert worker_b.get("r1:b1:summary:0") == {"key": "r1:b1:summary:0"}
+
+    cache_module.invalidate_many("test-index", ["r1:b1:summary:", "r1:b1:peak-hours:"])
+
+    assert published == [{
+        "origin": cache_module._ORIGIN,
+        "namespace": "test-index",
+        "prefixes": ["r1:b1:summary:", "r1:b1:peak-hours:"],
+    }]
+    assert cache_module.apply_remote_invalidation({**published[0], "origin": "otro-worker"}) is True
+    worker_b.drop_local()
+    assert worker_b.get("r1:b1:summary:0") is None
+    assert worker_b.get("r1:b1:peak-hours:0:30") is None
+    assert worker_b.get("r1:b10:summary:0") == {"key": "r1:b10:summary:0"}
+
+    worker_a.clear()
+    assert worker_b.get("r2:b1:summary:0") is None
@@ -1,3 +1,4 @@
+import threading
 import types
 
 from flask import Flask
@@ -40,15 +41,149 @@ def test_tenant_invalid_slug_returns_404(monkeypatch):
     def fake_select(*_args, **_kwargs):
         return types.SimpleNamespace(
             eq=lambda *_a, **_k: types.SimpleNamespace(
-                single=lambda: types.SimpleNamespace(execute=lambda: types.SimpleNamespace(data=None))
+                limit=lambda *_a: types.SimpleNamespace(execute=lambda: types.SimpleNamespace(data=[]))
             )
         )
 
     monkeypatch.setattr(supabase_client.supabase, "table", lambda *_a, **_k: types.SimpleNamespace(select=fake_select))
     monkeypatch.setattr(tenant_module, "FLASK_ENV", "development")
     monkeypatch.setattr(tenant_module, "INTERNAL_PROXY_KEY", "secret")
+    tenant_module.clear_slug_cache("nope")
 
     with app.test_request_context(path="/menu", headers={"X-Internal-Key": "secret", "X-Restaurant-Slug": "nope"}):
         resp = tenant_module.tenant_middleware()
         assert resp is not None
         assert resp[1] == 404
+
+
+class _FakeRestaurants:
+    """restaurants table: single-slug lookups (eq + limit) and the full listing (order + range)."""
+
+    def __init__(self, rows, gate=None):
+        self.rows = rows
+        self.gate = gate
+        self.slug_queries = []
+        self.list_queries = 0
+
+    def table(self, _name):
+        fake = self
+        state = {}
+
+        class Query:
+            def select(self, *_a, **_k):
+                return self
+
+            def eq(self, _column, value):
+                state["slug"] = value
+                return self
+
+            def limit(self, *_a):
+                return self
+
+            def order(self, *_a, **_k):
+                return self
+
+            def range(self, *_a):
+                return self
+
+            def execute(self):
+                if "slug" not in state:
+                    fake.list_queries += 1
+                    return types.SimpleNamespace(data=list(fake.rows))
+                fake.slug_queries.append(state["slug"])
+                if fake.gate is not None:
+                    fake.gate.wait(timeout=2)
+                return types.SimpleNamespace(
+                    data=[{"id": r["id"]} for r in fake.rows if r["slug"] == state["slug"]]
+                )
+
+        return Query()
+
+
+def test_registry_serves_preloaded_slugs_and_negative_caches_misses(monkeypatch):
+    fake = _FakeRestaurants([{"id": "r1", "slug": "demo"}])
+    monkeypatch.setattr(supabase_client, "supabase", fake)
+    tenant_module.clear_slug_cache()
+
+    assert tenant_module.tenant_registry.reload() == 1
+    assert tenant_module.get_restaurant_id_from_slug("demo") == "r1"
+    assert tenant_module.get_restaurant_id_from_slug("bot-probe") is None
+    assert tenant_module.get_restaurant_id_from_slug("bot-probe") is None
+    assert fake.slug_queries == ["bot-probe"]
+    tenant_module.clear_slug_cache()
+
+
+def test_registry_collapses_concurrent_lookups_of_the_same_slug(monkeypatch):
+    gate = threading.Event()
+    fake = _FakeRestaurants([{"id": "r2", "slug": "nuevo"}], gate=gate)
+    monkeypatch.setattr(supabase_client, "supabase", fake)
+    tenant_module.clear_slug_cache()
+
+    results = []
+    workers = [
+        threading.Thread(target=lambda: results.append(tenant_module.get_restaurant_id_from_slug("nuevo")))
+        for _ in range(5)
+    ]
+    for worker in workers:
+        worker.start()
+    while tenant_module.tenant_registry.stats()["collapsed"] < 4:
+        threading.Event().wait(0.01)
+    gate.set()
+    for worker in workers:
+        worker.join(timeout=2)
+
+    assert results == ["r2"] * 5
+    assert fake.slug_queries == ["nuevo"]
+    # Learned: no further queries
+    assert tenant_module.get_restaurant_id_from_slug("nuevo") == "r2"
+    assert fake.slug_queries == ["nuevo"]
+    tenant_module.clear_slug_cache()
+
+
+def test_registry_follower_looks_up_itself_when_the_leader_stalls(monkeypatch):
+    gate = threading.Event()
+    fake = _FakeRestaurants([{"id": "r3", "slug": "lento"}], gate=gate)
+    monkeypatch.setattr(supabase_client, "supabase", fake)
+    monkeypatch.setattr(tenant_module.TenantRegistry, "FLIGHT_WAIT_SECONDS", 0.05)
+    tenant_module.clear_slug_cache()
+
+    leader = threading.Thread(target=tenant_module.get_restaurant_id_from_slug, args=("lento",))
+    leader.start()
+    while not tenant_module.tenant_registry.stats()["in_flight"]:
+        threading.Event().wait(0.01)
+    fake.gate = None
+
+    # A timed-out wait must not turn a valid slug into a 404
+    assert tenant_module.get_restaurant_id_from_slug("lento") == "r3"
+    gate.set()
+    leader.join(timeout=2)
+    tenant_module.clear_slug_cache()
+
+
+def test_remote_slug_invalidation_drops_the_registry_entry():
+    from app.utils import cache as cache_module
+
+    tenant_module.tenant_registry.remember("viejo", "r9")
+    applied = cache_module.apply_remote_invalidation(
+        {"origin": "otro-worker", "namespace": "tenant-slug", "prefixes": ["viejo"]}
+    )
+
+    assert applied is True
+    assert "viejo" not in tenant_module.tenant_registry._slugs
+
+
+def test_health_is_minimal_and_stats_require_internal_key(monkeypatch):
+    from app.main import create_app
+
+    monkeypatch.setattr(tenant_module, "FLASK_ENV", "production")
+    monkeypatch.setattr(tenant_module, "INTERNAL_PROXY_KEY", "secret")
+    client = create_app().test_client()
+
+    health = client.get("/health").get_json()
+    assert health["status"] == "healthy"
+    assert not {"cache", "realtime", "tenants"} & set(health)
+
+    assert client.get("/health/stats").status_code == 401
+    stats = client.get("/health/stats", headers={"X-Internal-Key": "secret"})
+    assert stats.status_code == 200
+    assert {"cache", "realtime", "tenants"} <= set(stats.get_json())
@@ -1,11 +1,12 @@
 import pytest
 
 from app.services import waiter_service as waiter_service_module
+from app.services.waiter_call_store import LocalWaiterCallStore
 
 
 @pytest.fixture(autouse=True)
 def _clear_waiter_calls():
-    waiter_service_module.waiter_service._calls.clear()
+    waiter_service_module.waiter_service._store.clear()
 
 
 def test_waiter_call_requires_mesa_and_branch():
@@ -98,3 +99,29 @@ def test_waiter_call_invalid_token_raises_permission_error(monkeypatch):
             token="invalid-token",
             skip_token_validation=False,
         )
+
+
+def test_local_store_indexes_by_branch_and_evicts_finished_calls():
+    store = LocalWaiterCallStore(finished_ttl_seconds=60, pending_ttl_seconds=3600, max_finished=1)
+    for call_id, branch_id, mesa_id in (("c1", "b1", "1"), ("c2", "b1", "2"), ("c3", "b2", "1")):
+        _, already = store.add_if_no_pending(
+            {"id": call_id, "mesa_id": mesa_id, "branch_id": branch_id, "status": "PENDING"}
+        )
+        assert already is False
+
+    # Misma mesa en otra sucursal no es duplicado; en la misma sí
+    _, already = store.add_if_no_pending({"id": "c4", "mesa_id": "1", "branch_id": "b1", "status": "PENDING"})
+    assert already is True
+    assert {c["id"] for c in store.list(status="PENDING", branch_id="b1")} == {"c1", "c2"}
+
+    def _complete(call):
+        call["status"] = "COMPLETED"
+        return call
+
+    store.update("c1", _complete)
+    store.update("c2", _complete)
+    # max_finished=1: la llamada cerrada más vieja se descarta
+    assert store.get("c1") is None
+    assert [c["id"] for c in store.list(status="COMPLETED", branch_id="b1")] == ["c2"]
+    assert [c["id"] for c in store.list(branch_id="b2")] == ["c3"]
+    assert len(store) == 2
@@ -20,6 +20,7 @@ import {
   calculateSelectedOptionsTotal,
   formatSelectedOptionLabel,
   getItemSelectedOptions,
+  isOptionItemInStock,
   type ProductOptionGroup,
   type ProductOptionItem,
   type SelectedProductOption,
@@ -206,6 +207,8 @@ export default function CajeroDashboard() {
   const [closingAmount, setClosingAmount] = useState("")
   const skipNextOrdersSocketRefreshRef = useRef(0)
   const skipNextWaiterCallsSocketRefreshRef = useRef(0)
+  // Última secuencia de orders:updated vista por sucursal ("*" = todas), para detectar saltos
+  const orderEventSeqRef = useRef<Record<string, { epoch: string; seq: number }>>({})
 
   const backendUrl = getTenantApiBase()
   const socketBaseUrl = getBackendBaseUrl()
@@ -573,9 +576,19 @@ export default function CajeroDashboard() {
   // --- Socket.io: invalidate queries on real-time events ---
 
   useEffect(() => {
+    // El backend autentica la conexión y la une sólo a las salas de esta sucursal
     const socket = io(socketBaseUrl || undefined, {
       transports: ["websocket"],
       withCredentials: true,
+      auth: (cb) => {
+        void supabase.auth.getSession().then(({ data }) => {
+          cb({
+            token: data.session?.access_token,
+            restaurantSlug: getRestaurantSlug(),
+            branchId: branchId || undefined,
+          })
+        })
+      },
     })
 
     if (process.env.NODE_ENV !== "production") {
@@ -597,10 +610,37 @@ export default function CajeroDashboard() {
       queryClient.invalidateQueries({ queryKey: ["cajero-waiterCalls", backendUrl, branchId] })
     })
 
+    socket.on("orders:sequence", (payload: any) => {
+      if (payload?.epoch) {
+        orderEventSeqRef.current[payload.branch_id || "*"] = { epoch: payload.epoch, seq: Number(payload.seq) || 0 }
+      }
+    })
+
     socket.on("orders:updated", (payload: any) => {
       if (payload?.branch_id && branchId && payload.branch_id !== branchId) {
         return
       }
+      if (payload?.v >= 2 && payload.epoch) {
+        const seqKey = payload.branch_id || "*"
+        const last = orderEventSeqRef.current[seqKey]
+        orderEventSeqRef.current[seqKey] = { epoch: payload.epoch, seq: payload.seq }
+        const inSequence = last && last.epoch === payload.epoch && payload.seq === last.seq + 1
+        if (inSequence && payload.order?.id) {
+          // Delta: aplicar el pedido recibido sin volver a pedir la lista
+          queryClient.setQueryData<Order[]>(["cajero-orders", backendUrl, branchId], (current) => {
+            if (!current) return current
+            const exists = current.some((order) => order.id === payload.order.id)
+            const next = exists
+              ? current.map((order) => (order.id === payload.order.id ? payload.order : order))
+              : [payload.order, ...current]
+            return filterRecentOrders(next)
+          })
+          return
+        }
+        // Salto de secuencia, reinicio del servidor o evento sin pedido: resync completo
+        queryClient.invalidateQueries({ queryKey: ["cajero-orders", backendUrl, branchId] })
+        return
+      }
       if (skipNextOrdersSocketRefreshRef.current > 0) {
         skipNextOrdersSocketRefreshRef.current -= 1
         return
@@ -807,7 +847,7 @@ export default function CajeroDashboard() {
   }
 
   const toggleOptionSelection = (group: ProductOptionGroup, item: ProductOptionItem): void => {
-    if ((item.currentStock || 0) <= 0) return
+    if (!isOptionItemInStock(item)) return
 
     setOptionsDialogError(null)
     setSelectedOptionIds((previous) => {
@@ -851,7 +891,7 @@ export default function CajeroDashboard() {
       const selectedIds = getSelectedIdsForGroup(group.id)
       selectedIds.forEach((selectedId) => {
         const selectedItem = group.items.find((item) => item.id === selectedId)
-        if (!selectedItem || (selectedItem.currentStock || 0) <= 0) return
+        if (!selectedItem || !isOptionItemInStock(selectedItem)) return
         selectedOptions.push({
           id: selectedItem.id,
           groupId: group.id,
@@ -867,7 +907,7 @@ export default function CajeroDashboard() {
 
   const requiredGroupWithoutStock = optionGroups.find((group) => {
     if (!group.isRequired) return false
-    return !group.items.some((item) => (item.currentStock || 0) > 0)
+    return !group.items.some(isOptionItemInStock)
   })
 
   const missingRequiredSelection = optionGroups.find((group) => {
@@ -2181,7 +2221,7 @@ export default function CajeroDashboard() {
                       </p>
                       <div className="space-y-2">
                         {group.items.map((item) => {
-                          const outOfStock = (item.currentStock || 0) <= 0
+                          const outOfStock = !isOptionItemInStock(item)
                           const selected = isOptionSelected(group.id, item.id)
                           return (
                             <button
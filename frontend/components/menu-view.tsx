@@ -23,6 +23,7 @@ import {
 import {
   buildCartLineId,
   calculateSelectedOptionsTotal,
+  isOptionItemInStock,
   type ProductOptionGroup,
   type ProductOptionItem,
   type SelectedProductOption,
@@ -40,6 +41,23 @@ interface ApiProduct {
   available?: boolean
 }
 
+interface PublicPromotion {
+  id: string
+  name: string
+  type: string
+  value: number
+  description: string
+  applicable_products: string[] | null
+}
+
+interface MenuSnapshot {
+  version: string
+  categories: string[]
+  items: Array<ApiProduct & { displayPrice: number; promotionId: string | null; hasOptions: boolean }>
+  optionGroups: Record<string, ProductOptionGroup[]>
+  promotions: PublicPromotion[]
+}
+
 export default function MenuView() {
   const { state, addItem, removeOneByProductId, getProductQuantity } = useCart()
   const [products, setProducts] = useState<ApiProduct[]>([])
@@ -56,7 +74,8 @@ export default function MenuView() {
   const [optionGroups, setOptionGroups] = useState<ProductOptionGroup[]>([])
   const [selectedOptionIds, setSelectedOptionIds] = useState<Record<string, string[]>>({})
   const [optionsLoadingProductId, setOptionsLoadingProductId] = useState<string | null>(null)
-  const [activePromos, setActivePromos] = useState<Array<{ id: string; name: string; type: string; value: number; description: string; applicable_products: string[] | null }>>([])
+  const [activePromos, setActivePromos] = useState<PublicPromotion[]>([])
+  const [snapshotOptionGroups, setSnapshotOptionGroups] = useState<Record<string, ProductOptionGroup[]>>({})
   const t = useTranslations("usuario.menu")
   useEffect(() => {
     setSelectedCategory(t("all"))
@@ -89,15 +108,21 @@ export default function MenuView() {
         return
       }
 
-      const query = `?mesa_id=${encodeURIComponent(session.mesa_id)}&branch_id=${encodeURIComponent(session.branch_id)}`
+      // Snapshot público de la sucursal: productos, opciones y promos en una sola respuesta
+      // (versionado con ETag, las recargas se revalidan con 304)
       const { apiFetchTenant } = await import('@/lib/apiClient')
-      const data: ApiProduct[] = await apiFetchTenant(`/menu${query}`)
-      
-      const normalized = Array.isArray(data) ? data.map((item: any) => ({
+      const snapshot: MenuSnapshot = await apiFetchTenant(
+        `/menu/public?branch_id=${encodeURIComponent(session.branch_id)}`
+      )
+
+      const data = Array.isArray(snapshot?.items) ? snapshot.items : []
+      const normalized = data.map((item: any) => ({
         ...item,
         image: item.image || item.image_url || undefined
-      })) : []
+      }))
       setProducts(normalized)
+      setSnapshotOptionGroups(snapshot?.optionGroups || {})
+      setActivePromos(Array.isArray(snapshot?.promotions) ? snapshot.promotions : [])
       
       const uniqueCategories = getUniqueCategories(normalized)
       setCategories(uniqueCategories)
@@ -113,20 +138,6 @@ export default function MenuView() {
     fetchProducts()
   }, [])
 
-  useEffect(() => {
-    if (!branch_id) return
-    const fetchPromos = async () => {
-      try {
-        const { getTenantApiBase } = await import("@/lib/apiClient")
-        const backendUrl = getTenantApiBase()
-        const res = await fetch(`${backendUrl}/promotions/public?branch_id=${branch_id}`)
-        const json = await res.json()
-        setActivePromos(Array.isArray(json) ? json : [])
-      } catch {}
-    }
-    fetchPromos()
-  }, [branch_id])
-
   // Filtrar productos basado en categoría, búsqueda y disponibilidad
   // y ordenar alfabéticamente por nombre dentro de cada categoría
   const filteredProducts = products
@@ -160,11 +171,8 @@ export default function MenuView() {
   }
 
   const fetchProductOptionGroups = async (productId: string): Promise<ProductOptionGroup[]> => {
-    const { apiFetchTenant } = await import("@/lib/apiClient")
-    const response = await apiFetchTenant(
-      `/product-options/groups?productId=${encodeURIComponent(productId)}`
-    )
-    return Array.isArray(response?.data) ? response.data : []
+    const groups = snapshotOptionGroups[productId]
+    return Array.isArray(groups) ? groups : []
   }
 
   const closeOptionsDialog = (): void => {
@@ -208,7 +216,7 @@ export default function MenuView() {
   }
 
   const toggleOptionSelection = (group: ProductOptionGroup, item: ProductOptionItem): void => {
-    if ((item.currentStock || 0) <= 0) return
+    if (!isOptionItemInStock(item)) return
 
     setSelectedOptionIds((previous) => {
       const currentGroupSelection = previous[group.id] || []
@@ -252,7 +260,7 @@ export default function MenuView() {
       const selectedIds = getSelectedIdsForGroup(group.id)
       selectedIds.forEach((selectedId) => {
         const selectedItem = group.items.find((item) => item.id === selectedId)
-        if (!selectedItem || (selectedItem.currentStock || 0) <= 0) return
+        if (!selectedItem || !isOptionItemInStock(selectedItem)) return
         selectedOptions.push({
           id: selectedItem.id,
           groupId: group.id,
@@ -268,7 +276,7 @@ export default function MenuView() {
 
   const requiredGroupWithoutStock = optionGroups.find((group) => {
     if (!group.isRequired) return false
-    return !group.items.some((item) => (item.currentStock || 0) > 0)
+    return !group.items.some(isOptionItemInStock)
   })
 
   const missingRequiredSelection = optionGroups.find((group) => {
@@ -766,7 +774,7 @@ export default function MenuView() {
             {optionGroups.map((group) => {
               const selectedCount = getSelectedIdsForGroup(group.id).length
               const requiredNoStock =
-                group.isRequired && !group.items.some((item) => (item.currentStock || 0) > 0)
+                group.isRequired && !group.items.some(isOptionItemInStock)
 
               return (
                 <div key={group.id} className="rounded-xl border border-gray-200 p-4 space-y-3">
@@ -805,7 +813,7 @@ export default function MenuView() {
                   <div className="space-y-2">
                     {group.items.map((item) => {
                       const selected = isOptionSelected(group.id, item.id)
-                      const outOfStock = (item.currentStock || 0) <= 0
+                      const outOfStock = !isOptionItemInStock(item)
                       const groupSelections = getSelectedIdsForGroup(group.id)
                       const reachedLimit =
                         !selected &&
@@ -5,7 +5,10 @@ export interface ProductOptionItem {
   priceAddition: number
   ingredientName: string
   ingredientUnit?: string
-  currentStock: number
+  // Cantidad exacta: sólo en las respuestas de administración (el snapshot público no la trae)
+  currentStock?: number
+  // Disponibilidad publicada por el snapshot del menú
+  inStock?: boolean
 }
 
 export interface ProductOptionGroup {
@@ -128,6 +131,13 @@ export const getItemSelectedOptions = (item: unknown): SelectedProductOption[] =
   )
 }
 
+export const isOptionItemInStock = (item: Pick<ProductOptionItem, "inStock" | "currentStock">): boolean => {
+  if (typeof item.inStock === "boolean") {
+    return item.inStock
+  }
+  return (item.currentStock || 0) > 0
+}
+
 export const formatSelectedOptionLabel = (option: SelectedProductOption): string => {
   if (option.groupName) {
     return `${option.groupName}: ${option.ingredientName}`
@@ -40,6 +40,11 @@ export async function proxyToBackend(
       headers['Accept'] = accept
     }
 
+    const ifNoneMatch = request.headers.get('if-none-match')
+    if (ifNoneMatch) {
+      headers['If-None-Match'] = ifNoneMatch
+    }
+
     const authHeader = request.headers.get('authorization') || request.headers.get('Authorization')
     if (authHeader) {
       headers['Authorization'] = authHeader
@@ -77,9 +82,21 @@ export async function proxyToBackend(
 
     const responseContentType = response.headers.get('content-type') || ''
 
+    // Respuestas versionadas (ETag): reenviar validadores y 304 sin cuerpo
+    const cachingHeaders = new Headers()
+    const etag = response.headers.get('etag')
+    if (etag) cachingHeaders.set('ETag', etag)
+    if (etag && response.headers.get('cache-control')) {
+      cachingHeaders.set('Cache-Control', response.headers.get('cache-control') as string)
+    }
+
+    if (response.status === 304) {
+      return new NextResponse(null, { status: 304, headers: cachingHeaders })
+    }
+
     if (responseContentType.includes('application/json')) {
       const data = await response.json()
-      return NextResponse.json(data, { status: response.status })
+      return NextResponse.json(data, { status: response.status, headers: cachingHeaders })
     }
 
     const passthroughHeaders = new Headers()
@@ -0,0 +1,19 @@
+-- Migration 018: aplicar deltas de stock en una sola llamada atómica
+-- Recibe un array JSON [{"ingredient_id": 1, "delta": -0.25}, ...] y hace un único
+-- UPDATE current_stock = current_stock + delta. Devuelve el stock resultante.
+
+CREATE OR REPLACE FUNCTION apply_ingredient_stock_deltas(p_deltas JSONB)
+RETURNS TABLE (ingredient_id BIGINT, current_stock NUMERIC) AS $$
+BEGIN
+    RETURN QUERY
+    UPDATE ingredients AS i
+    SET current_stock = ROUND(COALESCE(i.current_stock, 0) + d.delta, 4)
+    FROM (
+        SELECT x.ingredient_id, SUM(x.delta) AS delta
+        FROM jsonb_to_recordset(p_deltas) AS x(ingredient_id BIGINT, delta NUMERIC)
+        GROUP BY x.ingredient_id
+    ) AS d
+    WHERE i.id = d.ingredient_id
+    RETURNING i.id, i.current_stock;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,246 @@
+-- Migration 019: agregados de ventas pre-calculados para métricas
+-- Un renglón por restaurante / sucursal / día local (según tz_offset_minutes),
+-- con pedidos por hora, y un renglón por producto vendido en ese día.
+-- Se actualizan de forma incremental con record_order_rollup() cuando un pedido
+-- se crea, se paga o se cancela; backfill_sales_rollups() recalcula el histórico.
+
+CREATE TABLE IF NOT EXISTS sales_daily_rollups (
+    restaurant_id UUID NOT NULL,
+    branch_id UUID NOT NULL,
+    tz_offset_minutes INT NOT NULL,
+    local_date DATE NOT NULL,
+    revenue NUMERIC(14,2) NOT NULL DEFAULT 0,
+    orders_created INT NOT NULL DEFAULT 0,
+    paid_orders INT NOT NULL DEFAULT 0,
+    cancelled_orders INT NOT NULL DEFAULT 0,
+    payments_card INT NOT NULL DEFAULT 0,
+    payments_cash INT NOT NULL DEFAULT 0,
+    payments_qr INT NOT NULL DEFAULT 0,
+    payments_wallet INT NOT NULL DEFAULT 0,
+    paid_orders_by_hour INT[] NOT NULL DEFAULT array_fill(0, ARRAY[24]),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (restaurant_id, branch_id, tz_offset_minutes, local_date)
+);
+
+CREATE TABLE IF NOT EXISTS sales_product_daily_rollups (
+    restaurant_id UUID NOT NULL,
+    branch_id UUID NOT NULL,
+    tz_offset_minutes INT NOT NULL,
+    local_date DATE NOT NULL,
+    product_id TEXT NOT NULL,
+    name TEXT,
+    quantity NUMERIC(14,3) NOT NULL DEFAULT 0,
+    revenue NUMERIC(14,2) NOT NULL DEFAULT 0,
+    orders_count INT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (restaurant_id, branch_id, tz_offset_minutes, local_date, product_id)
+);
+
+-- Estado ya contabilizado de cada pedido (hace idempotente record_order_rollup)
+CREATE TABLE IF NOT EXISTS sales_rollup_orders (
+    order_id UUID NOT NULL,
+    tz_offset_minutes INT NOT NULL,
+    state TEXT NOT NULL CHECK (state IN ('OPEN', 'PAID', 'CANCELLED')),
+    local_date DATE NOT NULL,
+    local_hour INT NOT NULL,
+    paid_total NUMERIC(14,2) NOT NULL DEFAULT 0,
+    payment_method TEXT,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (order_id, tz_offset_minutes)
+);
+
+CREATE OR REPLACE FUNCTION _sales_rollup_apply(
+    p_restaurant_id UUID,
+    p_branch_id UUID,
+    p_tz_offset_minutes INT,
+    p_local_date DATE,
+    p_local_hour INT,
+    p_created INT,
+    p_paid INT,
+    p_cancelled INT,
+    p_revenue NUMERIC,
+    p_payment_method TEXT,
+    p_items JSONB
+) RETURNS VOID AS $$
+DECLARE
+    v_hours INT[] := array_fill(0, ARRAY[24]);
+    v_method TEXT := UPPER(COALESCE(p_payment_method, ''));
+BEGIN
+    v_hours[p_local_hour + 1] := p_paid;
+
+    INSERT INTO sales_daily_rollups AS r (
+        restaurant_id, branch_id, tz_offset_minutes, local_date,
+        revenue, orders_created, paid_orders, cancelled_orders,
+        payments_card, payments_cash, payments_qr, payments_wallet,
+        paid_orders_by_hour
+    ) VALUES (
+        p_restaurant_id, p_branch_id, p_tz_offset_minutes, p_local_date,
+        p_revenue, p_created, p_paid, p_cancelled,
+        CASE WHEN v_method = 'CARD' THEN p_paid ELSE 0 END,
+        CASE WHEN v_method = 'CASH' THEN p_paid ELSE 0 END,
+        CASE WHEN v_method = 'QR' THEN p_paid ELSE 0 END,
+        CASE WHEN v_method = 'BILLETERA' THEN p_paid ELSE 0 END,
+        v_hours
+    )
+    ON CONFLICT (restaurant_id, branch_id, tz_offset_minutes, local_date) DO UPDATE SET
+        revenue = r.revenue + EXCLUDED.revenue,
+        orders_created = r.orders_created + EXCLUDED.orders_created,
+        paid_orders = r.paid_orders + EXCLUDED.paid_orders,
+        cancelled_orders = r.cancelled_orders + EXCLUDED.cancelled_orders,
+        payments_card = r.payments_card + EXCLUDED.payments_card,
+        payments_cash = r.payments_cash + EXCLUDED.payments_cash,
+        payments_qr = r.payments_qr + EXCLUDED.payments_qr,
+        payments_wallet = r.payments_wallet + EXCLUDED.payments_wallet,
+        paid_orders_by_hour = (
+            SELECT array_agg(a + b ORDER BY i)
+            FROM unnest(r.paid_orders_by_hour, EXCLUDED.paid_orders_by_hour) WITH ORDINALITY AS t(a, b, i)
+        ),
+        updated_at = NOW();
+
+    IF p_paid = 0 OR p_items IS NULL OR jsonb_typeof(p_items) <> 'array' THEN
+        RETURN;
+    END IF;
+
+    INSERT INTO sales_product_daily_rollups AS r (
+        restaurant_id, branch_id, tz_offset_minutes, local_date,
+        product_id, name, quantity, revenue, orders_count
+    )
+    SELECT
+        p_restaurant_id, p_branch_id, p_tz_offset_minutes, p_local_date,
+        line.product_id,
+        MAX(line.name),
+        SUM(line.qty) * p_paid,
+        SUM(line.qty * line.price) * p_paid,
+        p_paid
+    FROM (
+        SELECT
+            COALESCE(item->>'item_id', item->>'product_id', item->>'id') AS product_id,
+            COALESCE(item->>'name', item->>'title', item->>'product_name', item->>'producto') AS name,
+            CASE WHEN COALESCE(item->>'quantity', item->>'qty') ~ '^-?[0-9]+(\.[0-9]+)?$'
+                 THEN COALESCE(item->>'quantity', item->>'qty')::NUMERIC ELSE 0 END AS qty,
+            CASE WHEN COALESCE(item->>'price', item->>'unit_price') ~ '^-?[0-9]+(\.[0-9]+)?$'
+                 THEN COALESCE(item->>'price', item->>'unit_price')::NUMERIC ELSE 0 END AS price
+        FROM jsonb_array_elements(p_items) AS item
+        WHERE jsonb_typeof(item) = 'object'
+    ) AS line
+    WHERE line.product_id IS NOT NULL AND line.qty > 0
+    GROUP BY line.product_id
+    ON CONFLICT (restaurant_id, branch_id, tz_offset_minutes, local_date, product_id) DO UPDATE SET
+        name = COALESCE(EXCLUDED.name, r.name),
+        quantity = r.quantity + EXCLUDED.quantity,
+        revenue = r.revenue + EXCLUDED.revenue,
+        orders_count = r.orders_count + EXCLUDED.orders_count,
+        updated_at = NOW();
+END;
+$$ LANGUAGE plpgsql;
+
+-- Contabiliza el estado actual de un pedido. Idempotente: solo aplica la
+-- diferencia contra lo ya registrado en sales_rollup_orders.
+--   nuevo               -> orders_created + 1
+--   OPEN -> PAID        -> revenue, pagos, pedidos por hora y productos
+--   PAID -> CANCELLED   -> revierte lo anterior y suma cancelled_orders
+CREATE OR REPLACE FUNCTION record_order_rollup(
+    p_order_id UUID,
+    p_tz_offset_minutes INT DEFAULT -180
+) RETURNS TEXT AS $$
+DECLARE
+    o RECORD;
+    prev RECORD;
+    v_target TEXT;
+    v_local TIMESTAMP;
+    v_date DATE;
+    v_hour INT;
+    v_total NUMERIC;
+BEGIN
+    SELECT id, restaurant_id, branch_id, status, creation_date, total_amount, payment_method, items
+    INTO o
+    FROM orders
+    WHERE id = p_order_id;
+
+    IF NOT FOUND OR o.restaurant_id IS NULL OR o.branch_id IS NULL OR o.creation_date IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    v_target := CASE o.status
+        WHEN 'PAID' THEN 'PAID'
+        WHEN 'CANCELLED' THEN 'CANCELLED'
+        ELSE 'OPEN'
+    END;
+
+    SELECT * INTO prev
+    FROM sales_rollup_orders
+    WHERE order_id = p_order_id AND tz_offset_minutes = p_tz_offset_minutes
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        v_local := (o.creation_date AT TIME ZONE 'UTC') + make_interval(mins => p_tz_offset_minutes);
+        v_date := v_local::DATE;
+        v_hour := EXTRACT(HOUR FROM v_local)::INT;
+        INSERT INTO sales_rollup_orders (order_id, tz_offset_minutes, state, local_date, local_hour)
+        VALUES (p_order_id, p_tz_offset_minutes, 'OPEN', v_date, v_hour);
+        PERFORM _sales_rollup_apply(
+            o.restaurant_id, o.branch_id, p_tz_offset_minutes, v_date, v_hour,
+            1, 0, 0, 0, NULL, NULL
+        );
+        SELECT * INTO prev
+        FROM sales_rollup_orders
+        WHERE order_id = p_order_id AND tz_offset_minutes = p_tz_offset_minutes;
+    END IF;
+
+    IF v_target = 'OPEN' OR prev.state = v_target OR prev.state = 'CANCELLED' THEN
+        RETURN prev.state;
+    END IF;
+
+    IF v_target = 'PAID' THEN
+        v_total := COALESCE(o.total_amount, 0);
+        PERFORM _sales_rollup_apply(
+            o.restaurant_id, o.branch_id, p_tz_offset_minutes, prev.local_date, prev.local_hour,
+            0, 1, 0, v_total, o.payment_method, o.items
+        );
+        UPDATE sales_rollup_orders
+        SET state = 'PAID', paid_total = v_total, payment_method = o.payment_method, updated_at = NOW()
+        WHERE order_id = p_order_id AND tz_offset_minutes = p_tz_offset_minutes;
+        RETURN 'PAID';
+    END IF;
+
+    -- v_target = 'CANCELLED'
+    IF prev.state = 'PAID' THEN
+        PERFORM _sales_rollup_apply(
+            o.restaurant_id, o.branch_id, p_tz_offset_minutes, prev.local_date, prev.local_hour,
+            0, -1, 0, -prev.paid_total, prev.payment_method, o.items
+        );
+    END IF;
+    PERFORM _sales_rollup_apply(
+        o.restaurant_id, o.branch_id, p_tz_offset_minutes, prev.local_date, prev.local_hour,
+        0, 0, 1, 0, NULL, NULL
+    );
+    UPDATE sales_rollup_orders
+    SET state = 'CANCELLED', updated_at = NOW()
+    WHERE order_id = p_order_id AND tz_offset_minutes = p_tz_offset_minutes;
+    RETURN 'CANCELLED';
+END;
+$$ LANGUAGE plpgsql;
+
+-- Recorre el histórico de pedidos y los contabiliza (idempotente).
+CREATE OR REPLACE FUNCTION backfill_sales_rollups(
+    p_restaurant_id UUID DEFAULT NULL,
+    p_tz_offset_minutes INT DEFAULT -180
+) RETURNS INT AS $$
+DECLARE
+    r RECORD;
+    v_count INT := 0;
+BEGIN
+    FOR r IN
+        SELECT id FROM orders
+        WHERE p_restaurant_id IS NULL OR restaurant_id = p_restaurant_id
+        ORDER BY creation_date
+    LOOP
+        PERFORM record_order_rollup(r.id, p_tz_offset_minutes);
+        v_count := v_count + 1;
+    END LOOP;
+    RETURN v_count;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Contabilizar el histórico existente con el offset por defecto (Argentina)
+SELECT backfill_sales_rollups(NULL, -180);
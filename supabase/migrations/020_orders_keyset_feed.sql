@@ -0,0 +1,31 @@
+-- Migration 020: feed de pedidos paginado por cursor
+-- GET /orders pagina por (creation_date, id) y el modo since=<cursor> devuelve
+-- los pedidos modificados después de (updated_at, id). Hasta ahora updated_at
+-- sólo tenía el DEFAULT del insert: el trigger lo mantiene al día en cada UPDATE.
+
+ALTER TABLE orders ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT NOW();
+UPDATE orders SET updated_at = COALESCE(creation_date, NOW()) WHERE updated_at IS NULL;
+
+-- clock_timestamp() y no NOW(): dentro de una misma transacción larga NOW() queda fijo
+-- y un pedido modificado al final podría quedar detrás del cursor de un cliente
+CREATE OR REPLACE FUNCTION touch_orders_updated_at()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at = clock_timestamp();
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS update_orders_updated_at ON orders;
+CREATE TRIGGER update_orders_updated_at
+    BEFORE UPDATE ON orders
+    FOR EACH ROW
+    EXECUTE FUNCTION touch_orders_updated_at();
+
+-- Historial: página por sucursal, más nuevos primero
+CREATE INDEX IF NOT EXISTS idx_orders_feed
+    ON orders(restaurant_id, branch_id, creation_date DESC, id DESC);
+
+-- Sync incremental: cambios posteriores al cursor del cliente
+CREATE INDEX IF NOT EXISTS idx_orders_sync
+    ON orders(restaurant_id, branch_id, updated_at, id);
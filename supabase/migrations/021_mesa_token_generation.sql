@@ -0,0 +1,21 @@
+-- Migration 021: contador de generación de tokens por mesa (modo MESA_TOKEN_MODE=signed)
+-- Los tokens firmados llevan la generación vigente al emitirse; incrementarla revoca
+-- todos los tokens emitidos hasta el momento sin tener que guardarlos.
+
+ALTER TABLE mesas ADD COLUMN IF NOT EXISTS token_generation INTEGER NOT NULL DEFAULT 0;
+
+-- Incremento atómico; devuelve la generación nueva (NULL si la mesa no existe)
+CREATE OR REPLACE FUNCTION bump_mesa_token_generation(p_mesa_id TEXT, p_branch_id TEXT)
+RETURNS INTEGER AS $$
+DECLARE
+    v_generation INTEGER;
+BEGIN
+    UPDATE mesas
+    SET token_generation = token_generation + 1,
+        updated_at = NOW()
+    WHERE mesa_id = p_mesa_id
+      AND branch_id::TEXT = p_branch_id
+    RETURNING token_generation INTO v_generation;
+    RETURN v_generation;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,14 @@
+-- Migration 022: índices para recorrer las exportaciones CSV por cursor (keyset)
+-- Cada página filtra por restaurante y sigue el orden (columna, id) del export.
+
+-- /reports/sales.csv sin sucursal (con sucursal usa idx_orders_feed)
+CREATE INDEX IF NOT EXISTS idx_orders_export
+    ON orders(restaurant_id, creation_date DESC, id DESC);
+
+-- /reports/movements.csv
+CREATE INDEX IF NOT EXISTS idx_stock_movements_export
+    ON stock_movements(restaurant_id, created_at DESC, id DESC);
+
+-- /reports/stock.csv
+CREATE INDEX IF NOT EXISTS idx_ingredients_export
+    ON ingredients(restaurant_id, name, id);
@@ -0,0 +1,157 @@
+-- Migration 023: aceptados y medios de pago en los agregados de ventas
+-- Los widgets "estado de pedidos" y "métodos de pago" cuentan pedidos por su
+-- estado actual, no solo los pagados:
+--   accepted_orders -> pedidos en PAYMENT_APPROVED, PAID, IN_PREPARATION, READY o DELIVERED
+--   orders_*        -> todos los pedidos por payment_method (cualquier estado)
+-- record_order_rollup() guarda en sales_rollup_orders lo ya contabilizado y solo
+-- aplica la diferencia cuando el pedido cambia de estado o de medio de pago.
+
+ALTER TABLE sales_daily_rollups
+    ADD COLUMN IF NOT EXISTS accepted_orders INT NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS orders_card INT NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS orders_cash INT NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS orders_qr INT NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS orders_wallet INT NOT NULL DEFAULT 0;
+
+ALTER TABLE sales_rollup_orders
+    ADD COLUMN IF NOT EXISTS accepted BOOLEAN NOT NULL DEFAULT FALSE,
+    ADD COLUMN IF NOT EXISTS counted_method TEXT;
+
+CREATE OR REPLACE FUNCTION _sales_rollup_apply_breakdown(
+    p_restaurant_id UUID,
+    p_branch_id UUID,
+    p_tz_offset_minutes INT,
+    p_local_date DATE,
+    p_accepted INT,
+    p_old_method TEXT,
+    p_new_method TEXT
+) RETURNS VOID AS $$
+BEGIN
+    INSERT INTO sales_daily_rollups AS r (
+        restaurant_id, branch_id, tz_offset_minutes, local_date,
+        accepted_orders, orders_card, orders_cash, orders_qr, orders_wallet
+    ) VALUES (
+        p_restaurant_id, p_branch_id, p_tz_offset_minutes, p_local_date,
+        p_accepted,
+        (CASE WHEN p_new_method = 'CARD' THEN 1 ELSE 0 END) - (CASE WHEN p_old_method = 'CARD' THEN 1 ELSE 0 END),
+        (CASE WHEN p_new_method = 'CASH' THEN 1 ELSE 0 END) - (CASE WHEN p_old_method = 'CASH' THEN 1 ELSE 0 END),
+        (CASE WHEN p_new_method = 'QR' THEN 1 ELSE 0 END) - (CASE WHEN p_old_method = 'QR' THEN 1 ELSE 0 END),
+        (CASE WHEN p_new_method = 'BILLETERA' THEN 1 ELSE 0 END) - (CASE WHEN p_old_method = 'BILLETERA' THEN 1 ELSE 0 END)
+    )
+    ON CONFLICT (restaurant_id, branch_id, tz_offset_minutes, local_date) DO UPDATE SET
+        accepted_orders = r.accepted_orders + EXCLUDED.accepted_orders,
+        orders_card = r.orders_card + EXCLUDED.orders_card,
+        orders_cash = r.orders_cash + EXCLUDED.orders_cash,
+        orders_qr = r.orders_qr + EXCLUDED.orders_qr,
+        orders_wallet = r.orders_wallet + EXCLUDED.orders_wallet,
+        updated_at = NOW();
+END;
+$$ LANGUAGE plpgsql;
+
+-- Igual que en 019, más la reconciliación de aceptados / medio de pago, que
+-- sigue el estado actual del pedido en ambos sentidos (p. ej. PAID -> CANCELLED).
+CREATE OR REPLACE FUNCTION record_order_rollup(
+    p_order_id UUID,
+    p_tz_offset_minutes INT DEFAULT -180
+) RETURNS TEXT AS $$
+DECLARE
+    o RECORD;
+    prev RECORD;
+    v_target TEXT;
+    v_local TIMESTAMP;
+    v_date DATE;
+    v_hour INT;
+    v_total NUMERIC;
+    v_accepted BOOLEAN;
+    v_method TEXT;
+BEGIN
+    SELECT id, restaurant_id, branch_id, status, creation_date, total_amount, payment_method, items
+    INTO o
+    FROM orders
+    WHERE id = p_order_id;
+
+    IF NOT FOUND OR o.restaurant_id IS NULL OR o.branch_id IS NULL OR o.creation_date IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    v_target := CASE o.status
+        WHEN 'PAID' THEN 'PAID'
+        WHEN 'CANCELLED' THEN 'CANCELLED'
+        ELSE 'OPEN'
+    END;
+
+    SELECT * INTO prev
+    FROM sales_rollup_orders
+    WHERE order_id = p_order_id AND tz_offset_minutes = p_tz_offset_minutes
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        v_local := (o.creation_date AT TIME ZONE 'UTC') + make_interval(mins => p_tz_offset_minutes);
+        v_date := v_local::DATE;
+        v_hour := EXTRACT(HOUR FROM v_local)::INT;
+        INSERT INTO sales_rollup_orders (order_id, tz_offset_minutes, state, local_date, local_hour)
+        VALUES (p_order_id, p_tz_offset_minutes, 'OPEN', v_date, v_hour);
+        PERFORM _sales_rollup_apply(
+            o.restaurant_id, o.branch_id, p_tz_offset_minutes, v_date, v_hour,
+            1, 0, 0, 0, NULL, NULL
+        );
+        SELECT * INTO prev
+        FROM sales_rollup_orders
+        WHERE order_id = p_order_id AND tz_offset_minutes = p_tz_offset_minutes;
+    END IF;
+
+    v_accepted := UPPER(COALESCE(o.status, '')) IN (
+        'PAYMENT_APPROVED', 'PAID', 'IN_PREPARATION', 'READY', 'DELIVERED'
+    );
+    v_method := UPPER(COALESCE(o.payment_method, ''));
+    IF v_method NOT IN ('CARD', 'CASH', 'QR', 'BILLETERA') THEN
+        v_method := NULL;
+    END IF;
+    IF v_accepted IS DISTINCT FROM prev.accepted OR v_method IS DISTINCT FROM prev.counted_method THEN
+        PERFORM _sales_rollup_apply_breakdown(
+            o.restaurant_id, o.branch_id, p_tz_offset_minutes, prev.local_date,
+            (CASE WHEN v_accepted THEN 1 ELSE 0 END) - (CASE WHEN prev.accepted THEN 1 ELSE 0 END),
+            prev.counted_method, v_method
+        );
+        UPDATE sales_rollup_orders
+        SET accepted = v_accepted, counted_method = v_method, updated_at = NOW()
+        WHERE order_id = p_order_id AND tz_offset_minutes = p_tz_offset_minutes;
+    END IF;
+
+    IF v_target = 'OPEN' OR prev.state = v_target OR prev.state = 'CANCELLED' THEN
+        RETURN prev.state;
+    END IF;
+
+    IF v_target = 'PAID' THEN
+        v_total := COALESCE(o.total_amount, 0);
+        PERFORM _sales_rollup_apply(
+            o.restaurant_id, o.branch_id, p_tz_offset_minutes, prev.local_date, prev.local_hour,
+            0, 1, 0, v_total, o.payment_method, o.items
+        );
+        UPDATE sales_rollup_orders
+        SET state = 'PAID', paid_total = v_total, payment_method = o.payment_method, updated_at = NOW()
+        WHERE order_id = p_order_id AND tz_offset_minutes = p_tz_offset_minutes;
+        RETURN 'PAID';
+    END IF;
+
+    -- v_target = 'CANCELLED'
+    IF prev.state = 'PAID' THEN
+        PERFORM _sales_rollup_apply(
+            o.restaurant_id, o.branch_id, p_tz_offset_minutes, prev.local_date, prev.local_hour,
+            0, -1, 0, -prev.paid_total, prev.payment_method, o.items
+        );
+    END IF;
+    PERFORM _sales_rollup_apply(
+        o.restaurant_id, o.branch_id, p_tz_offset_minutes, prev.local_date, prev.local_hour,
+        0, 0, 1, 0, NULL, NULL
+    );
+    UPDATE sales_rollup_orders
+    SET state = 'CANCELLED', updated_at = NOW()
+    WHERE order_id = p_order_id AND tz_offset_minutes = p_tz_offset_minutes;
+    RETURN 'CANCELLED';
+END;
+$$ LANGUAGE plpgsql;
+
+-- Los pedidos ya contabilizados arrancan con accepted = FALSE y sin medio de
+-- pago: el backfill (idempotente) completa solo las columnas nuevas.
+SELECT backfill_sales_rollups(NULL, -180);
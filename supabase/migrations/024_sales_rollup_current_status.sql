@@ -0,0 +1,123 @@
+-- Migration 024: los agregados siguen el estado ACTUAL del pedido
+-- Hasta acá un pedido que pasaba de PAID a IN_PREPARATION / READY / DELIVERED
+-- seguía sumando revenue, productos y pedidos por hora, y CANCELLED era final.
+-- El recálculo desde orders (cuando los agregados no aplican) cuenta solo los
+-- pedidos cuyo estado actual es PAID, así que los dos caminos daban distinto.
+-- Regla única: revenue, pagos, productos y horas = pedidos hoy en PAID;
+-- cancelled_orders = pedidos hoy en CANCELLED. Cada transición aplica la
+-- diferencia entre el estado registrado y el actual, en cualquier sentido.
+
+CREATE OR REPLACE FUNCTION record_order_rollup(
+    p_order_id UUID,
+    p_tz_offset_minutes INT DEFAULT -180
+) RETURNS TEXT AS $$
+DECLARE
+    o RECORD;
+    prev RECORD;
+    v_target TEXT;
+    v_local TIMESTAMP;
+    v_date DATE;
+    v_hour INT;
+    v_total NUMERIC;
+    v_accepted BOOLEAN;
+    v_method TEXT;
+BEGIN
+    SELECT id, restaurant_id, branch_id, status, creation_date, total_amount, payment_method, items
+    INTO o
+    FROM orders
+    WHERE id = p_order_id;
+
+    IF NOT FOUND OR o.restaurant_id IS NULL OR o.branch_id IS NULL OR o.creation_date IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    v_target := CASE o.status
+        WHEN 'PAID' THEN 'PAID'
+        WHEN 'CANCELLED' THEN 'CANCELLED'
+        ELSE 'OPEN'
+    END;
+
+    SELECT * INTO prev
+    FROM sales_rollup_orders
+    WHERE order_id = p_order_id AND tz_offset_minutes = p_tz_offset_minutes
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        v_local := (o.creation_date AT TIME ZONE 'UTC') + make_interval(mins => p_tz_offset_minutes);
+        v_date := v_local::DATE;
+        v_hour := EXTRACT(HOUR FROM v_local)::INT;
+        INSERT INTO sales_rollup_orders (order_id, tz_offset_minutes, state, local_date, local_hour)
+        VALUES (p_order_id, p_tz_offset_minutes, 'OPEN', v_date, v_hour);
+        PERFORM _sales_rollup_apply(
+            o.restaurant_id, o.branch_id, p_tz_offset_minutes, v_date, v_hour,
+            1, 0, 0, 0, NULL, NULL
+        );
+        SELECT * INTO prev
+        FROM sales_rollup_orders
+        WHERE order_id = p_order_id AND tz_offset_minutes = p_tz_offset_minutes;
+    END IF;
+
+    v_accepted := UPPER(COALESCE(o.status, '')) IN (
+        'PAYMENT_APPROVED', 'PAID', 'IN_PREPARATION', 'READY', 'DELIVERED'
+    );
+    v_method := UPPER(COALESCE(o.payment_method, ''));
+    IF v_method NOT IN ('CARD', 'CASH', 'QR', 'BILLETERA') THEN
+        v_method := NULL;
+    END IF;
+    IF v_accepted IS DISTINCT FROM prev.accepted OR v_method IS DISTINCT FROM prev.counted_method THEN
+        PERFORM _sales_rollup_apply_breakdown(
+            o.restaurant_id, o.branch_id, p_tz_offset_minutes, prev.local_date,
+            (CASE WHEN v_accepted THEN 1 ELSE 0 END) - (CASE WHEN prev.accepted THEN 1 ELSE 0 END),
+            prev.counted_method, v_method
+        );
+        UPDATE sales_rollup_orders
+        SET accepted = v_accepted, counted_method = v_method, updated_at = NOW()
+        WHERE order_id = p_order_id AND tz_offset_minutes = p_tz_offset_minutes;
+    END IF;
+
+    IF prev.state = v_target THEN
+        RETURN prev.state;
+    END IF;
+
+    -- Sale del estado registrado
+    IF prev.state = 'PAID' THEN
+        PERFORM _sales_rollup_apply(
+            o.restaurant_id, o.branch_id, p_tz_offset_minutes, prev.local_date, prev.local_hour,
+            0, -1, 0, -prev.paid_total, prev.payment_method, o.items
+        );
+    ELSIF prev.state = 'CANCELLED' THEN
+        PERFORM _sales_rollup_apply(
+            o.restaurant_id, o.branch_id, p_tz_offset_minutes, prev.local_date, prev.local_hour,
+            0, 0, -1, 0, NULL, NULL
+        );
+    END IF;
+
+    -- Entra al estado actual
+    IF v_target = 'PAID' THEN
+        v_total := COALESCE(o.total_amount, 0);
+        PERFORM _sales_rollup_apply(
+            o.restaurant_id, o.branch_id, p_tz_offset_minutes, prev.local_date, prev.local_hour,
+            0, 1, 0, v_total, o.payment_method, o.items
+        );
+        UPDATE sales_rollup_orders
+        SET state = 'PAID', paid_total = v_total, payment_method = o.payment_method, updated_at = NOW()
+        WHERE order_id = p_order_id AND tz_offset_minutes = p_tz_offset_minutes;
+        RETURN 'PAID';
+    END IF;
+
+    IF v_target = 'CANCELLED' THEN
+        PERFORM _sales_rollup_apply(
+            o.restaurant_id, o.branch_id, p_tz_offset_minutes, prev.local_date, prev.local_hour,
+            0, 0, 1, 0, NULL, NULL
+        );
+    END IF;
+    UPDATE sales_rollup_orders
+    SET state = v_target, paid_total = 0, payment_method = NULL, updated_at = NOW()
+    WHERE order_id = p_order_id AND tz_offset_minutes = p_tz_offset_minutes;
+    RETURN v_target;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Los pedidos que quedaron en PAID tras salir de ese estado se corrigen al
+-- volver a contabilizarlos con la regla nueva.
+SELECT backfill_sales_rollups(NULL, -180);